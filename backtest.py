@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BACKTEST ENGINE v7.2 - ОФЛАЙН-ПРОГОН ИСТОРИЧЕСКИХ СВЕЧЕЙ ЧЕРЕЗ ЛОГИКУ БОТА
+Прогоняет сохраненные OHLCV через те же analyze_symbol_with_filters, open_position,
+check_position_exits и update_trailing_stop из bybit_multy_7_2.py,
+подменяя биржу, часы и базу данных симуляцией.
+
+Скорость: около 5 мс на символ-свечу на одном ядре (индикаторы и DataFrame на каждом шаге,
+как в живом скане) - месяц 15m по 20 символам прогоняется за минуты, а не за секунды.
+Прогон за секунды - backtest_vectorized.py, сверяемый с этим движком через --validate.
+"""
+
+import os
+import sys
+import json
+import time as _time
+import logging
+import argparse
+import importlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_archive import CandleArchive, to_ohlcv_array
+
+BOT_MODULE = "bybit_multy_7_2"
+BASE_TIMEFRAME = "15m"
+
+# Цена внутри бара проходит O -> L -> H -> C (бычий бар) или O -> H -> L -> C (медвежий)
+INTRABAR_TICKS = 4
+
+logger = logging.getLogger("backtest")
+
+# ====== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ======
+def timeframe_to_ms(timeframe: str) -> int:
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+    return int(timeframe[:-1]) * units[timeframe[-1]] * 1000
+
+def symbol_to_filename(symbol: str, timeframe: str) -> str:
+    """BTC/USDT:USDT + 15m -> BTC_USDT_USDT_15m.csv"""
+    return f"{symbol.replace('/', '_').replace(':', '_')}_{timeframe}.csv"
+
+def load_candles_csv(path: str) -> np.ndarray:
+    """Загрузка CSV (timestamp,open,high,low,close,volume) в массив float64 (n, 6)"""
+    df = pd.read_csv(path)
+    if list(df.columns[:6]) != ['timestamp', 'open', 'high', 'low', 'close', 'volume']:
+        df = pd.read_csv(path, header=None, names=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    data = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+    data = data[np.argsort(data[:, 0], kind="stable")]
+    return data
+
+def save_candles_csv(path: str, candles: np.ndarray):
+    df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = df['timestamp'].astype(np.int64)
+    df.to_csv(path, index=False)
+
+def load_candle_dir(data_dir: str, symbols: List[str], timeframe: str = BASE_TIMEFRAME) -> Dict[str, np.ndarray]:
+    """Свечи символов из каталога: бинарный архив (candle_archive.py, без разбора) или CSV"""
+    archive = CandleArchive(data_dir) if os.path.isdir(data_dir) else None
+    candles = {}
+    for symbol in symbols:
+        if archive is not None and os.path.exists(archive.path(symbol, timeframe)):
+            candles[symbol] = to_ohlcv_array(archive.read(symbol, timeframe))
+            continue
+        path = os.path.join(data_dir, symbol_to_filename(symbol, timeframe))
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ No candles for {symbol}: {path}")
+            continue
+        candles[symbol] = load_candles_csv(path)
+    return candles
+
+def synthetic_candles(n_bars: int, seed: int = 0, start_price: float = 100.0,
+                      timeframe: str = BASE_TIMEFRAME, start_ms: int = 1704067200000) -> np.ndarray:
+    """Детерминированный ценовой ряд с чередованием трендов и боковиков (для демо и бенчмарков)"""
+    rng = np.random.default_rng(seed)
+    steps = 8
+    regime_len = 96
+    n_regimes = n_bars // regime_len + 1
+    drift = rng.choice([-0.0004, -0.0002, 0.0, 0.0002, 0.0004], size=n_regimes)
+    vol = rng.choice([0.0015, 0.003, 0.005], size=n_regimes)
+    bar_drift = np.repeat(drift, regime_len)[:n_bars] / steps
+    bar_vol = np.repeat(vol, regime_len)[:n_bars] / np.sqrt(steps)
+
+    log_steps = rng.standard_normal((n_bars, steps)) * bar_vol[:, None] + bar_drift[:, None]
+    path = start_price * np.exp(np.cumsum(log_steps.ravel())).reshape(n_bars, steps)
+    opens = np.concatenate(([start_price], path[:-1, -1]))
+    highs = np.maximum(path.max(axis=1), opens)
+    lows = np.minimum(path.min(axis=1), opens)
+    closes = path[:, -1]
+    volume = rng.lognormal(mean=10.0, sigma=0.5, size=n_bars) * (1 + 50 * np.abs(closes - opens) / opens)
+    timestamps = start_ms + np.arange(n_bars, dtype=np.float64) * timeframe_to_ms(timeframe)
+    return np.column_stack([timestamps, opens, highs, lows, closes, volume])
+
+# ====== СИМУЛЯЦИЯ ЧАСОВ ======
+class SimClock:
+    """Симулированные часы: подменяют модуль time внутри бота (perf_counter и пр. - настоящие)"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(_time, name)
+
+def make_sim_datetime(clock: SimClock):
+    class SimDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(clock.now, tz)
+    return SimDatetime
+
+# ====== СИМУЛЯЦИЯ БИРЖИ ======
+class TimeframeView:
+    """Старший таймфрейм, собранный из базовых свечей, с незакрытой (текущей) свечой на каждом шаге"""
+
+    def __init__(self, base: np.ndarray, timeframe_ms: int):
+        buckets = (base[:, 0] // timeframe_ms).astype(np.int64)
+        df = pd.DataFrame(base[:, 1:], columns=['open', 'high', 'low', 'close', 'volume'])
+        df['bucket'] = buckets
+        grouped = df.groupby('bucket', sort=True)
+
+        bars = grouped.agg(open=('open', 'first'), high=('high', 'max'), low=('low', 'min'),
+                           close=('close', 'last'), volume=('volume', 'sum'))
+        self.bars = np.column_stack([
+            bars.index.to_numpy(dtype=np.float64) * timeframe_ms,
+            bars.to_numpy(dtype=np.float64)
+        ])
+        self.bucket_index = np.searchsorted(bars.index.to_numpy(), buckets)
+        self.run_high = grouped['high'].cummax().to_numpy()
+        self.run_low = grouped['low'].cummin().to_numpy()
+        self.run_volume = grouped['volume'].cumsum().to_numpy()
+        self.close = base[:, 4]
+
+    def window(self, i: int, limit: int) -> np.ndarray:
+        j = self.bucket_index[i]
+        full = self.bars[max(0, j - limit + 1):j]
+        partial = np.array([[self.bars[j, 0], self.bars[j, 1], self.run_high[i],
+                             self.run_low[i], self.close[i], self.run_volume[i]]])
+        return np.vstack([full, partial])
+
+class SimExchange:
+    """ccxt-совместимая заглушка: свечи и цены по текущему шагу симуляции"""
+
+    def __init__(self, candles: Dict[str, np.ndarray], base_timeframe: str = BASE_TIMEFRAME):
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.candles = candles
+        self.cursor = {symbol: -1 for symbol in candles}
+        self.prices = {symbol: 0.0 for symbol in candles}
+        self.balance_usdt = 0.0
+        self.orders = []
+        self._views = {}
+        self._fetch_cache = {}
+
+    def new_step(self):
+        self._fetch_cache.clear()
+
+    def _view(self, symbol: str, timeframe: str) -> TimeframeView:
+        key = (symbol, timeframe)
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = TimeframeView(self.candles[symbol], timeframe_to_ms(timeframe))
+        return view
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        i = self.cursor.get(symbol, -1)
+        if i < 0:
+            return []
+        limit = limit or 100
+        key = (symbol, timeframe, limit, i)
+        cached = self._fetch_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if timeframe_to_ms(timeframe) == self.base_ms:
+            rows = self.candles[symbol][max(0, i - limit + 1):i + 1]
+        else:
+            rows = self._view(symbol, timeframe).window(i, limit)
+
+        result = rows.tolist()
+        self._fetch_cache[key] = result
+        return result
+
+    def fetch_ticker(self, symbol, params=None):
+        price = self.prices.get(symbol, 0.0)
+        return {"symbol": symbol, "last": price, "bid": price, "ask": price}
+
+    def fetch_balance(self, params=None):
+        return {"free": {"USDT": self.balance_usdt}, "total": {"USDT": self.balance_usdt}}
+
+    def load_markets(self, reload=False, params=None):
+        return {
+            symbol: {
+                "symbol": symbol,
+                "limits": {"amount": {"min": 0}, "cost": {"min": 0}},
+                "precision": {"price": 8, "amount": 8},
+                "contractSize": 1
+            } for symbol in self.candles
+        }
+
+    def set_leverage(self, leverage, symbol=None, params=None):
+        return {"leverage": leverage, "symbol": symbol}
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        order = {"id": f"SIM_{len(self.orders) + 1}", "symbol": symbol, "type": type, "side": side,
+                 "amount": amount, "price": price, "params": params or {}, "status": "closed"}
+        self.orders.append(order)
+        return order
+
+    def cancel_order(self, id, symbol=None, params=None):
+        return {"id": id, "status": "canceled"}
+
+# ====== ЗАГРУЗКА БОТА ======
+def load_bot_module(module_name: str = BOT_MODULE):
+    """Импорт бота с БД в памяти, без лог-файла, метрик и снимка состояния.
+    Буфер свечей выключен: SimExchange отдает окно по курсору симуляции, а не по since"""
+    os.environ.setdefault("BOT_DB_FILE", ":memory:")
+    os.environ.setdefault("BOT_LOG_FILE", os.devnull)
+    os.environ.setdefault("BOT_METRICS_ENABLED", "0")
+    os.environ.setdefault("BOT_CANDLE_BUFFER", "0")
+    os.environ.setdefault("BOT_SNAPSHOT_FILE", "")
+    os.environ.setdefault("BOT_CANDLE_ARCHIVE_DIR", "")
+    bot = importlib.import_module(module_name)
+    logging.getLogger(bot.__name__).setLevel(logging.WARNING)
+    return bot
+
+def required_warmup_bars(settings: Dict, base_timeframe: str = BASE_TIMEFRAME) -> int:
+    """Сколько базовых свечей нужно, чтобы все запросы бота получали полную историю"""
+    base_ms = timeframe_to_ms(base_timeframe)
+    requests = [
+        (settings['timeframe_entry'], 100),
+        (settings['timeframe_trend'], 100),
+        (settings['timeframe_volatility'], 50),
+        ("4h", 20),
+    ]
+    if settings.get('require_trend_confirmation', False):
+        requests.append(("4h" if settings['timeframe_trend'] == "1h" else "1h", 50))
+    return max(limit * max(1, timeframe_to_ms(tf) // base_ms) for tf, limit in requests)
+
+# ====== РЕЗУЛЬТАТ ======
+class BacktestResult:
+    def __init__(self, trades: List[Dict], equity_curve: List[Tuple[int, float]],
+                 funnel: Dict, initial_balance: float, elapsed: float, bars: int):
+        self.trades = trades
+        self.equity_curve = equity_curve
+        self.funnel = funnel
+        self.initial_balance = initial_balance
+        self.elapsed = elapsed
+        self.bars = bars
+
+    def summary(self) -> Dict:
+        pnls = np.array([t['pnl'] - t['fee'] for t in self.trades], dtype=np.float64)
+        equity = np.array([e for _, e in self.equity_curve], dtype=np.float64)
+        wins = pnls[pnls > 0].sum() if len(pnls) else 0.0
+        losses = abs(pnls[pnls < 0].sum()) if len(pnls) else 0.0
+
+        max_drawdown = 0.0
+        if len(equity):
+            peaks = np.maximum.accumulate(equity)
+            max_drawdown = float(((peaks - equity) / peaks).max() * 100)
+
+        final_equity = float(equity[-1]) if len(equity) else self.initial_balance
+        return {
+            "trades": len(self.trades),
+            "win_rate": float((pnls > 0).mean() * 100) if len(pnls) else 0.0,
+            "net_pnl": float(pnls.sum()) if len(pnls) else 0.0,
+            "return_pct": (final_equity / self.initial_balance - 1) * 100,
+            "profit_factor": float(wins / losses) if losses > 0 else 99.0,
+            "max_drawdown_pct": max_drawdown,
+            "final_equity": final_equity,
+            "bars": self.bars,
+            "elapsed_sec": self.elapsed,
+            "signals_checked": self.funnel.get("total_signals", 0),
+            "signals_passed": self.funnel.get("passed_filters", 0)
+        }
+
+    def save(self, out_dir: str):
+        os.makedirs(out_dir, exist_ok=True)
+        pd.DataFrame(self.trades).to_csv(os.path.join(out_dir, "trades.csv"), index=False)
+        pd.DataFrame(self.equity_curve, columns=['timestamp', 'equity']).to_csv(
+            os.path.join(out_dir, "equity.csv"), index=False)
+        with open(os.path.join(out_dir, "funnel.json"), "w", encoding="utf-8") as f:
+            json.dump(self.funnel, f, indent=2, ensure_ascii=False)
+        with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+# ====== ДВИЖОК ======
+class BacktestEngine:
+    """Событийный прогон: на каждой базовой свече - проверки выхода по внутрибарной траектории,
+    затем на закрытии свечи - scan_for_opportunities как в основном цикле бота"""
+
+    def __init__(self, candles: Dict[str, np.ndarray], mode: str = "AGGRESSIVE",
+                 initial_balance: float = 1000.0, base_timeframe: str = BASE_TIMEFRAME,
+                 start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                 warmup_bars: Optional[int] = None, settings_override: Optional[Dict] = None,
+                 bot=None):
+        self.candles = {s: c for s, c in candles.items() if len(c)}
+        self.mode = mode
+        self.initial_balance = initial_balance
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.warmup_bars = warmup_bars
+        self.settings_override = settings_override or {}
+        self.bot = bot or load_bot_module()
+
+    # ---- подмена окружения бота ----
+    def _install(self, exchange: SimExchange, clock: SimClock):
+        bot = self.bot
+        self._saved = {name: getattr(bot, name) for name in (
+            "exchange", "time", "datetime", "DRY_RUN", "CURRENT_MODE", "active_symbols",
+            "BOT_RUNNING", "bot", "safe_send", "compute_available_usdt", "get_trend_analysis",
+            "TRADING_MODES"
+        )}
+
+        settings = dict(bot.TRADING_MODES[self.mode])
+        settings.update(self.settings_override)
+        trading_modes = dict(bot.TRADING_MODES)
+        trading_modes[self.mode] = settings
+
+        bot.exchange = exchange
+        bot.time = clock
+        bot.datetime = make_sim_datetime(clock)
+        bot.DRY_RUN = True
+        bot.CURRENT_MODE = self.mode
+        bot.TRADING_MODES = trading_modes
+        bot.active_symbols = list(self.candles)
+        bot.BOT_RUNNING = True
+        bot.bot = None
+        bot.safe_send = lambda text, max_retries=3: False
+        bot.compute_available_usdt = self._available_usdt
+
+        # Тренд запрашивается дважды за скан (статистика + фильтры) - кэшируем на шаг
+        original_trend = self._saved["get_trend_analysis"]
+        self._trend_cache = {}
+
+        def cached_trend_analysis(symbol: str, timeframe: str = "1h") -> Dict:
+            key = (symbol, timeframe)
+            result = self._trend_cache.get(key)
+            if result is None:
+                result = self._trend_cache[key] = original_trend(symbol, timeframe)
+            return dict(result)
+
+        bot.get_trend_analysis = cached_trend_analysis
+
+        # Чистая БД в памяти на каждый прогон
+        if bot.db.db_file != ":memory:":
+            bot.db.db_file = ":memory:"
+        bot.db._initialize_database()
+        bot.log_filter_stats(reset=True)
+        return settings
+
+    def _restore(self):
+        for name, value in self._saved.items():
+            setattr(self.bot, name, value)
+
+    def _realized_pnl(self) -> float:
+        # pnl открытых позиций - это уже зафиксированные частичные выходы
+        row = self.bot.db.fetchone("""
+            SELECT COALESCE(SUM(pnl), 0) - COALESCE(SUM(CASE WHEN status='CLOSED' THEN fee_paid ELSE 0 END), 0)
+            FROM positions
+        """)
+        return float(row[0] or 0.0)
+
+    def _available_usdt(self) -> float:
+        return max(self.initial_balance + self._realized_pnl(), 0.0)
+
+    def _equity(self, exchange: SimExchange) -> float:
+        unrealized = 0.0
+        for symbol, position in self.bot.get_open_positions().items():
+            price = exchange.prices.get(symbol, position['open_price'])
+            direction = 1 if position['position_type'] == 'LONG' else -1
+            unrealized += direction * (price - position['open_price']) * position['base_amount'] * position['leverage']
+        return self.initial_balance + self._realized_pnl() + unrealized
+
+    def _timeline(self, warmup: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        timeline = np.unique(np.concatenate([c[:, 0] for c in self.candles.values()])).astype(np.int64)
+        start = self.start_ms if self.start_ms is not None else timeline[min(warmup, len(timeline) - 1)]
+        end = self.end_ms if self.end_ms is not None else timeline[-1]
+        timeline = timeline[(timeline >= start) & (timeline <= end)]
+        # Индекс последней базовой свечи символа с open <= t
+        last_index = {s: np.searchsorted(c[:, 0], timeline, side="right") - 1 for s, c in self.candles.items()}
+        return timeline, last_index
+
+    def run(self) -> BacktestResult:
+        started = _time.perf_counter()
+        exchange = SimExchange(self.candles, self.base_timeframe)
+        clock = SimClock()
+        bot = self.bot
+        settings = self._install(exchange, clock)
+
+        try:
+            warmup = self.warmup_bars if self.warmup_bars is not None else required_warmup_bars(settings, self.base_timeframe)
+            timeline, last_index = self._timeline(warmup)
+            equity_curve = []
+            has_positions = False
+
+            for k, t_open in enumerate(timeline):
+                # 1. Выходы по внутрибарной траектории текущей свечи
+                if has_positions:
+                    paths = {}
+                    for symbol, candles in self.candles.items():
+                        i = last_index[symbol][k]
+                        if i < 0:
+                            continue
+                        o, h, l, c = candles[i, 1:5]
+                        if int(candles[i, 0]) == t_open:
+                            paths[symbol] = (o, l, h, c) if c >= o else (o, h, l, c)
+                        else:
+                            paths[symbol] = (c, c, c, c)
+
+                    for tick in range(INTRABAR_TICKS):
+                        clock.now = (t_open + self.base_ms * tick / INTRABAR_TICKS) / 1000
+                        for symbol, path in paths.items():
+                            exchange.prices[symbol] = path[tick]
+                        bot.check_position_exits()
+
+                # 2. Закрытие свечи - сканирование
+                clock.now = (t_open + self.base_ms) / 1000
+                for symbol, candles in self.candles.items():
+                    i = last_index[symbol][k]
+                    exchange.cursor[symbol] = i
+                    if i >= 0:
+                        exchange.prices[symbol] = candles[i, 4]
+                exchange.new_step()
+                self._trend_cache.clear()
+                exchange.balance_usdt = self._available_usdt()
+
+                bot.scan_for_opportunities()
+
+                has_positions = bot.get_concurrent_trades_count() > 0
+                equity_curve.append((int(t_open + self.base_ms), self._equity(exchange)))
+
+            # Незакрытые позиции закрываем по последней цене
+            for symbol in list(bot.get_open_positions().keys()):
+                bot.safe_close_position(symbol, "BACKTEST_END")
+            if equity_curve:
+                equity_curve[-1] = (equity_curve[-1][0], self._equity(exchange))
+
+            trades = self._collect_trades()
+            funnel = json.loads(json.dumps(bot.filter_stats))
+            return BacktestResult(trades, equity_curve, funnel, self.initial_balance,
+                                  _time.perf_counter() - started, len(timeline))
+        finally:
+            self._restore()
+
+    def _collect_trades(self) -> List[Dict]:
+        rows = self.bot.db.fetchall("""
+            SELECT symbol, position_type, open_timestamp, duration_seconds, open_price, close_price,
+                   base_amount, invested_usdt, leverage, pnl, pnl_percent, fee_paid, exit_reason,
+                   signal_score, trend_strength, trailing_active
+            FROM positions WHERE status='CLOSED' ORDER BY id
+        """)
+        trades = []
+        for row in rows:
+            trades.append({
+                "symbol": row[0],
+                "position_type": row[1],
+                "open_ts": int(row[2]),
+                "close_ts": int(row[2]) + int(row[3] or 0),
+                "open_price": row[4],
+                "close_price": row[5],
+                "base_amount": row[6],
+                "invested_usdt": row[7],
+                "leverage": row[8],
+                "pnl": row[9],
+                "pnl_percent": row[10],
+                "fee": row[11] or 0.0,
+                "exit_reason": row[12],
+                "signal_score": row[13],
+                "trend_strength": row[14],
+                "trailing_active": row[15]
+            })
+        return trades
+
+def run_backtest(candles: Dict[str, np.ndarray], mode: str = "AGGRESSIVE", **kwargs) -> BacktestResult:
+    return BacktestEngine(candles, mode=mode, **kwargs).run()
+
+# ====== CLI ======
+def parse_date_ms(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    return int(datetime.strptime(value, "%Y-%m-%d").timestamp() * 1000)
+
+def print_result(result: BacktestResult, mode: str):
+    summary = result.summary()
+    print(f"\n{'='*60}")
+    print(f"📊 BACKTEST v7.2: {mode}")
+    print(f"{'='*60}")
+    print(f"Свечей: {summary['bars']}, время прогона: {summary['elapsed_sec']:.2f}s")
+    print(f"Сделок: {summary['trades']}, винрейт: {summary['win_rate']:.1f}%")
+    print(f"PnL: {summary['net_pnl']:+.2f} USDT ({summary['return_pct']:+.2f}%)")
+    print(f"Profit Factor: {summary['profit_factor']:.2f}, Max DD: {summary['max_drawdown_pct']:.2f}%")
+    print(f"\nВоронка: {summary['signals_checked']} проверок -> {summary['signals_passed']} сигналов")
+    for name, count in sorted(result.funnel["filtered_by"].items(), key=lambda x: x[1], reverse=True):
+        if count:
+            print(f"  {name}: {count}")
+    print(f"{'='*60}\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бэктест стратегии v7.2")
+    parser.add_argument("--data-dir", default="data", help="каталог со свечами: <SYMBOL>_<tf>.csv или архив <SYMBOL>_<tf>.candles")
+    parser.add_argument("--symbols", nargs="*", help="символы (по умолчанию SYMBOLS из бота)")
+    parser.add_argument("--mode", default="AGGRESSIVE")
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    parser.add_argument("--warmup-bars", type=int)
+    parser.add_argument("--synthetic-bars", type=int, help="вместо CSV - синтетические свечи")
+    parser.add_argument("--out", help="каталог для trades.csv / equity.csv / funnel.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    bot = load_bot_module()
+    symbols = args.symbols or list(bot.SYMBOLS)
+
+    if args.synthetic_bars:
+        candles = {s: synthetic_candles(args.synthetic_bars, seed=n) for n, s in enumerate(symbols)}
+    else:
+        candles = load_candle_dir(args.data_dir, symbols)
+    if not candles:
+        print("❌ Нет данных для бэктеста")
+        return 1
+
+    result = BacktestEngine(candles, mode=args.mode, initial_balance=args.balance,
+                            start_ms=parse_date_ms(args.start), end_ms=parse_date_ms(args.end),
+                            warmup_bars=args.warmup_bars, bot=bot).run()
+    print_result(result, args.mode)
+    if args.out:
+        result.save(args.out)
+        print(f"💾 Результаты сохранены в {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
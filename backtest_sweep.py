@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PARAMETER SWEEP v7.2 - ПЕРЕБОР НАСТРОЕК TRADING_MODES
+Сетка или случайный поиск по параметрам режима, прогоны VectorizedBacktest
+в пуле процессов. Свечи лежат в shared memory и не копируются в каждую задачу,
+воркер держит кэш индикаторов между своими прогонами.
+Результаты - колоночный файл (parquet, без pyarrow - csv) + рейтинг лучших комбинаций.
+"""
+
+import os
+import sys
+import json
+import time as _time
+import random
+import logging
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import BacktestResult, load_bot_module, load_candle_dir, parse_date_ms, synthetic_candles
+from backtest_vectorized import VectorizedBacktest
+
+logger = logging.getLogger("backtest_sweep")
+
+# Метрики, по которым можно ранжировать (True - больше лучше)
+RANK_METRICS = {
+    "return_pct": True,
+    "net_pnl": True,
+    "profit_factor": True,
+    "win_rate": True,
+    "max_drawdown_pct": False,
+}
+SUMMARY_COLUMNS = ["trades", "win_rate", "net_pnl", "return_pct", "profit_factor",
+                   "max_drawdown_pct", "final_equity", "signals_passed", "elapsed_sec"]
+
+# ====== SHARED MEMORY ======
+class SharedCandles:
+    """Свечи всех символов одним массивом (symbols, bars, 6) в shared memory"""
+
+    def __init__(self, candles: Dict[str, np.ndarray]):
+        self.symbols = list(candles)
+        lengths = {len(c) for c in candles.values()}
+        if len(lengths) != 1:
+            raise ValueError("Sweep needs aligned candles of equal length for all symbols")
+        stacked = np.stack([np.ascontiguousarray(candles[s], dtype=np.float64) for s in self.symbols])
+        self.shape = stacked.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=stacked.nbytes)
+        np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)[:] = stacked
+
+    @property
+    def spec(self) -> Tuple[str, Tuple[int, ...], List[str]]:
+        return self.shm.name, self.shape, self.symbols
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+def attach_candles(name: str, shape: Tuple[int, ...], symbols: List[str]) -> Tuple[shared_memory.SharedMemory, Dict[str, np.ndarray]]:
+    """Подключение к свечам из родительского процесса без копирования"""
+    # resource_tracker общий с родителем (запущен до пула), сегмент удаляет SharedCandles.close
+    shm = shared_memory.SharedMemory(name=name)
+    data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    data.flags.writeable = False
+    return shm, {symbol: data[i] for i, symbol in enumerate(symbols)}
+
+# ====== ВОРКЕР ======
+_worker: Dict = {}
+
+def _init_worker(candles_spec: Tuple, mode: str, backtest_kwargs: Dict):
+    shm, candles = attach_candles(*candles_spec)
+    _worker.update(shm=shm, candles=candles, mode=mode, kwargs=backtest_kwargs,
+                   bot=load_bot_module(), cache={})
+
+def worker_backtest(params: Dict, **kwargs) -> BacktestResult:
+    """Прогон в воркере пула: свечи из shared memory, индикаторы из кэша воркера"""
+    options = {**_worker["kwargs"], **kwargs}
+    return VectorizedBacktest(_worker["candles"], mode=_worker["mode"], bot=_worker["bot"],
+                              settings_override=params, cache=_worker["cache"], **options).run()
+
+@contextmanager
+def worker_pool(candles: Dict[str, np.ndarray], mode: str, workers: Optional[int] = None, **backtest_kwargs):
+    """Пул процессов со свечами в shared memory; задачи вызывают worker_backtest"""
+    shared = SharedCandles(candles)
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                                 initargs=(shared.spec, mode, backtest_kwargs)) as pool:
+            yield pool
+    finally:
+        shared.close()
+
+def _run_combination(task: Tuple[int, Dict]) -> Dict:
+    run_id, params = task
+    row = {"run_id": run_id, "error": ""}
+    try:
+        summary = worker_backtest(params).summary()
+        row.update({column: summary[column] for column in SUMMARY_COLUMNS})
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["worker_pid"] = os.getpid()
+    return row
+
+# ====== ПАРАМЕТРЫ ======
+def _coerce_value(base_value, value):
+    """JSON-списки -> кортежи там, где в TRADING_MODES кортеж (rsi_range_*)"""
+    if isinstance(base_value, tuple) and isinstance(value, list):
+        return tuple(value)
+    return value
+
+def _check_params(names, mode_settings: Dict):
+    unknown = [name for name in names if name not in mode_settings]
+    if unknown:
+        raise ValueError(f"Unknown TRADING_MODES parameters: {', '.join(unknown)}")
+
+def grid_combinations(grid: Dict[str, List], mode_settings: Dict) -> List[Dict]:
+    """Полная сетка: декартово произведение значений"""
+    _check_params(grid, mode_settings)
+    names = list(grid)
+    return [{name: _coerce_value(mode_settings[name], value) for name, value in zip(names, values)}
+            for values in itertools.product(*(grid[name] for name in names))]
+
+def random_combinations(space: Dict, samples: int, mode_settings: Dict, seed: int = 0) -> List[Dict]:
+    """Случайный поиск: список - выбор из значений, {"low", "high"} - равномерно (int, если границы int)"""
+    _check_params(space, mode_settings)
+    rng = random.Random(seed)
+    combinations = []
+    for _ in range(samples):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, dict):
+                low, high = values["low"], values["high"]
+                if isinstance(low, int) and isinstance(high, int):
+                    value = rng.randint(low, high)
+                else:
+                    value = rng.uniform(low, high)
+                    if "round" in values:
+                        value = round(value, values["round"])
+            else:
+                value = rng.choice(values)
+            params[name] = _coerce_value(mode_settings[name], value)
+        combinations.append(params)
+    return combinations
+
+def build_combinations(spec: Dict, mode_settings: Dict) -> List[Dict]:
+    """Спецификация: {"grid": {...}} или {"random": {...}, "samples": N, "seed": S}, плюс общие "fixed" """
+    fixed = spec.get("fixed", {})
+    _check_params(fixed, mode_settings)
+    fixed = {name: _coerce_value(mode_settings[name], value) for name, value in fixed.items()}
+    if "grid" in spec:
+        combinations = grid_combinations(spec["grid"], mode_settings)
+    elif "random" in spec:
+        combinations = random_combinations(spec["random"], spec.get("samples", 100), mode_settings, spec.get("seed", 0))
+    else:
+        raise ValueError("Sweep spec needs 'grid' or 'random'")
+    return [{**fixed, **params} for params in combinations]
+
+def parse_param_args(values: List[str]) -> Dict[str, List]:
+    """--param min_score=60,70,80 -> {"min_score": [60, 70, 80]}; кортежи - JSON-списком: rsi_range_long=[[30,70],[25,75]]"""
+    grid = {}
+    for item in values:
+        name, _, raw = item.partition("=")
+        if not raw:
+            raise ValueError(f"Bad --param '{item}', expected name=v1,v2,...")
+        raw = raw.strip()
+        grid[name.strip()] = json.loads(raw) if raw.startswith("[") else [json.loads(v) for v in raw.split(",")]
+    return grid
+
+# ====== ЗАПУСК ======
+def run_sweep(candles: Dict[str, np.ndarray], combinations: List[Dict], mode: str = "AGGRESSIVE",
+              workers: Optional[int] = None, chunksize: Optional[int] = None, **backtest_kwargs) -> pd.DataFrame:
+    """Прогон всех комбинаций в пуле процессов; строка на комбинацию, параметры - отдельными колонками"""
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        # Несколько пачек на воркер - ровная загрузка без лишнего IPC
+        chunksize = max(1, len(combinations) // (workers * 4))
+
+    started = _time.perf_counter()
+    with worker_pool(candles, mode, workers, **backtest_kwargs) as pool:
+        rows = list(pool.map(_run_combination, enumerate(combinations), chunksize=chunksize))
+    elapsed = _time.perf_counter() - started
+    logger.info(f"⚡ Sweep: {len(combinations)} runs on {workers} workers in {elapsed:.1f}s "
+                f"({len(combinations) / elapsed:.1f} runs/s)")
+
+    results = pd.DataFrame(rows).sort_values("run_id").reset_index(drop=True)
+    return pd.concat([combinations_frame(combinations), results], axis=1)
+
+def combinations_frame(combinations: List[Dict]) -> pd.DataFrame:
+    """Параметры колонками param_*; кортежи - JSON-строкой, чтобы колонка оставалась скалярной"""
+    return pd.DataFrame([{name: json.dumps(value) if isinstance(value, tuple) else value
+                          for name, value in combo.items()} for combo in combinations]).add_prefix("param_")
+
+def rank_results(results: pd.DataFrame, metric: str = "return_pct", min_trades: int = 1) -> pd.DataFrame:
+    if metric not in RANK_METRICS:
+        raise ValueError(f"Unknown metric {metric}, use one of: {', '.join(RANK_METRICS)}")
+    # Упавшие прогоны не содержат метрик (а если упали все - нет и столбцов) - отбрасываются до сравнения
+    valid = results[results["error"] == ""]
+    if valid.empty:
+        return valid.reset_index(drop=True)
+    valid = valid[valid["trades"] >= min_trades]
+    return valid.sort_values(metric, ascending=not RANK_METRICS[metric]).reset_index(drop=True)
+
+def parameter_summary(results: pd.DataFrame, metric: str = "return_pct") -> Dict[str, List[Dict]]:
+    """Для каждого параметра: метрика по его значениям (медиана/лучшее), чтобы видеть чувствительность"""
+    valid = results[results["error"] == ""]
+    summary = {}
+    if valid.empty:
+        return summary
+    for column in [c for c in results.columns if c.startswith("param_")]:
+        grouped = valid.groupby(column)[metric].agg(["count", "median", "max"]).reset_index()
+        summary[column[len("param_"):]] = [
+            {"value": row[column], "runs": int(row["count"]), "median": float(row["median"]), "best": float(row["max"])}
+            for _, row in grouped.iterrows()
+        ]
+    return summary
+
+def save_results(results: pd.DataFrame, path: str) -> str:
+    """Parquet, если есть движок; иначе csv рядом"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith(".parquet"):
+        try:
+            results.to_parquet(path, index=False)
+            return path
+        except ImportError as e:
+            logger.warning(f"⚠️ Parquet unavailable ({e}), writing CSV")
+            path = path[:-len(".parquet")] + ".csv"
+    results.to_csv(path, index=False)
+    return path
+
+def print_ranking(ranked: pd.DataFrame, metric: str, top: int = 10):
+    print(f"\n{'='*60}")
+    print(f"🏆 SWEEP v7.2: топ-{min(top, len(ranked))} по {metric}")
+    print(f"{'='*60}")
+    param_columns = [c for c in ranked.columns if c.startswith("param_")]
+    for place, (_, row) in enumerate(ranked.head(top).iterrows(), 1):
+        params = ", ".join(f"{c[len('param_'):]}={row[c]}" for c in param_columns)
+        print(f"{place:>2}. {metric}={row[metric]:+.2f} | сделок {int(row['trades'])}, "
+              f"PF {row['profit_factor']:.2f}, DD {row['max_drawdown_pct']:.2f}% | {params}")
+    print(f"{'='*60}\n")
+
+def print_failures(results: pd.DataFrame, limit: int = 10):
+    """Упавшие прогоны: run_id, параметры и текст ошибки"""
+    failed = results[results["error"] != ""]
+    if failed.empty:
+        return
+    param_columns = [c for c in failed.columns if c.startswith("param_")]
+    print(f"\n❌ Ошибок: {len(failed)} из {len(results)}")
+    for _, row in failed.head(limit).iterrows():
+        params = ", ".join(f"{c[len('param_'):]}={row[c]}" for c in param_columns)
+        print(f"  #{row['run_id']}: {row['error']} | {params}")
+    if len(failed) > limit:
+        print(f"  ... еще {len(failed) - limit}")
+
+# ====== CLI ======
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перебор параметров TRADING_MODES v7.2")
+    parser.add_argument("--spec", help="JSON: {\"mode\", \"grid\"|\"random\", \"samples\", \"seed\", \"fixed\"}")
+    parser.add_argument("--param", action="append", default=[], help="сетка без файла: name=v1,v2,...")
+    parser.add_argument("--data-dir", default="data", help="каталог со свечами: <SYMBOL>_<tf>.csv или архив <SYMBOL>_<tf>.candles")
+    parser.add_argument("--symbols", nargs="*", help="символы (по умолчанию SYMBOLS из бота)")
+    parser.add_argument("--mode", help="режим (по умолчанию из spec или AGGRESSIVE)")
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    parser.add_argument("--synthetic-bars", type=int, help="вместо CSV - синтетические свечи")
+    parser.add_argument("--workers", type=int, help="процессов (по умолчанию все ядра)")
+    parser.add_argument("--metric", default="return_pct", choices=list(RANK_METRICS))
+    parser.add_argument("--min-trades", type=int, default=5, help="меньше сделок - не попадает в рейтинг")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default="sweep_results.parquet", help="колоночный файл результатов")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    spec = {}
+    if args.spec:
+        with open(args.spec, encoding="utf-8") as f:
+            spec = json.load(f)
+    if args.param:
+        spec["grid"] = {**spec.get("grid", {}), **parse_param_args(args.param)}
+    mode = args.mode or spec.get("mode", "AGGRESSIVE")
+
+    bot = load_bot_module()
+    combinations = build_combinations(spec, bot.TRADING_MODES[mode])
+    symbols = args.symbols or list(bot.SYMBOLS)
+    if args.synthetic_bars:
+        candles = {s: synthetic_candles(args.synthetic_bars, seed=n) for n, s in enumerate(symbols)}
+    else:
+        candles = load_candle_dir(args.data_dir, symbols)
+    if not candles:
+        print("❌ Нет данных для перебора")
+        return 1
+
+    logger.info(f"🔍 Sweep {mode}: {len(combinations)} combinations, {len(candles)} symbols")
+    results = run_sweep(candles, combinations, mode=mode, workers=args.workers, initial_balance=args.balance,
+                        start_ms=parse_date_ms(args.start), end_ms=parse_date_ms(args.end))
+
+    path = save_results(results, args.out)
+    ranked = rank_results(results, args.metric, args.min_trades)
+    summary_path = os.path.splitext(path)[0] + "_summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "mode": mode,
+            "metric": args.metric,
+            "runs": len(results),
+            "errors": int((results["error"] != "").sum()),
+            "top": ranked.head(args.top).to_dict(orient="records"),
+            "parameters": parameter_summary(results, args.metric)
+        }, f, indent=2, default=str, ensure_ascii=False)
+
+    print_failures(results)
+    print_ranking(ranked, args.metric, args.top)
+    print(f"💾 Результаты: {path}, рейтинг: {summary_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
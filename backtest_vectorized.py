@@ -0,0 +1,991 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VECTORIZED BACKTEST v7.2 - HYBRID_TREND_CORRECTION НА МАССИВАХ
+Все индикаторы и фильтры analyze_symbol_with_filters считаются сразу по всей истории:
+на каждом шаге - по тому же окну свечей, что бот получает из fetch_ohlcv,
+с теми же рекуррентными формулами, что в ta. Входы - булевы маски,
+выходы (SL/TP/quick exit/partial/trailing) - поиском по массиву внутрибарных тиков.
+Результат сверяется с событийным backtest.BacktestEngine (--validate).
+"""
+
+import sys
+import json
+import time as _time
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bybit_core.features import (
+    adx_last, adx_prefix, adx_step, atr_last, atr_prefix, atr_step, bollinger_last, ewm_last,
+    macd_histogram_last, rsi_last, trend_age
+)
+from bybit_core.risk import allocate_signals
+from backtest import (
+    BASE_TIMEFRAME, INTRABAR_TICKS, BacktestEngine, BacktestResult, TimeframeView,
+    load_bot_module, load_candle_dir, parse_date_ms, print_result, required_warmup_bars,
+    synthetic_candles, timeframe_to_ms
+)
+
+logger = logging.getLogger("backtest_vectorized")
+
+# Шагов в одном блоке расчета индикаторов (ограничивает память под окна)
+FEATURE_CHUNK_STEPS = 4096
+# Тиков, просматриваемых за один поиск события выхода
+EXIT_SCAN_HORIZON = 4096
+
+# Коды фильтров в порядке проверки analyze_symbol_with_filters
+PASSED = -1
+STATEFUL_FILTERS = ["position_already_open", "cooldown", "weekly_limit"]
+SIGNAL_FILTERS = [
+    "trend_not_confirmed", "weak_trend", "old_trend", "trend_direction_not_allowed",
+    "high_volatility", "low_volatility", "low_bb_width", "macd_not_aligned",
+    "rsi_out_of_range", "low_volume", "price_not_at_key_level", "low_score"
+]
+
+# ====== ОКНА СВЕЧЕЙ ======
+# Окна хранятся по времени: (limit, n) - строка = свеча окна, столбец = шаг симуляции
+OHLCV_COLUMNS = {"open": 1, "high": 2, "low": 3, "close": 4, "volume": 5}
+
+def window_columns(base: np.ndarray, view: Optional[TimeframeView], steps: np.ndarray, limit: int,
+                   columns: Tuple[str, ...]) -> Dict[str, np.ndarray]:
+    """Окна, которые SimExchange.fetch_ohlcv отдает на шагах steps, по колонкам: {name: (limit, n)}"""
+    offsets = np.arange(-limit + 1, 1)[:, None]
+    if view is None:
+        index = steps[None, :] + offsets
+        return {name: base[:, OHLCV_COLUMNS[name]][index] for name in columns}
+
+    # Закрытые свечи старшего ТФ + текущая (незакрытая) последней строкой
+    j = view.bucket_index[steps]
+    index = j[None, :] + offsets
+    partial = {"open": view.bars[j, 1], "high": view.run_high[steps], "low": view.run_low[steps],
+               "close": view.close[steps], "volume": view.run_volume[steps]}
+    result = {}
+    for name in columns:
+        rows = view.bars[:, OHLCV_COLUMNS[name]][index]
+        rows[-1] = partial[name]
+        result[name] = rows
+    return result
+
+def bucket_windows(view: TimeframeView, steps: np.ndarray, limit: int,
+                   columns: Tuple[str, ...]) -> Tuple[Dict[str, np.ndarray], np.ndarray, Dict[str, np.ndarray]]:
+    """Окно старшего ТФ, разделенное на закрытые свечи (одни на все шаги внутри свечи старшего ТФ)
+    и текущую свечу шага: ({name: (limit - 1, n_buckets)}, шаг -> бакет, {name: (n,)})"""
+    j = view.bucket_index[steps]
+    buckets, inverse = np.unique(j, return_inverse=True)
+    index = buckets[None, :] + np.arange(-limit + 1, 0)[:, None]
+    completed = {name: view.bars[:, OHLCV_COLUMNS[name]][index] for name in columns}
+    partial = {"open": view.bars[j, 1], "high": view.run_high[steps], "low": view.run_low[steps],
+               "close": view.close[steps], "volume": view.run_volume[steps]}
+    return completed, inverse, {name: partial[name] for name in columns}
+
+def first_full_step(base: np.ndarray, view: Optional[TimeframeView], limit: int) -> int:
+    """Первый шаг, на котором окно таймфрейма заполнено полностью"""
+    if view is None:
+        return limit - 1
+    return int(np.searchsorted(view.bucket_index, limit - 1, side="left"))
+
+# ====== ПРИЗНАКИ ======
+def higher_timeframe(timeframe: str) -> str:
+    return "4h" if timeframe == "1h" else "1h"
+
+def timeframe_view(base: np.ndarray, timeframe: str, base_timeframe: str = BASE_TIMEFRAME,
+                   views: Optional[Dict[str, TimeframeView]] = None) -> Optional[TimeframeView]:
+    """None для базового ТФ; views - кэш собранных старших ТФ символа"""
+    if timeframe_to_ms(timeframe) == timeframe_to_ms(base_timeframe):
+        return None
+    if views is None:
+        return TimeframeView(base, timeframe_to_ms(timeframe))
+    if timeframe not in views:
+        views[timeframe] = TimeframeView(base, timeframe_to_ms(timeframe))
+    return views[timeframe]
+
+def compute_features(base: np.ndarray, settings: Dict, mode: str, steps: np.ndarray,
+                     base_timeframe: str = BASE_TIMEFRAME, chunk: int = FEATURE_CHUNK_STEPS,
+                     views: Optional[Dict[str, TimeframeView]] = None) -> Dict[str, np.ndarray]:
+    """Все входные данные решений бота на шагах steps (индексы базовых свечей).
+    Для старших ТФ рекурсии по закрытым свечам считаются один раз на свечу старшего ТФ"""
+    views = {} if views is None else views
+
+    def view(timeframe: str) -> Optional[TimeframeView]:
+        return timeframe_view(base, timeframe, base_timeframe, views)
+
+    def window(timeframe: str, part: np.ndarray, limit: int, *columns: str) -> Dict[str, np.ndarray]:
+        return window_columns(base, view(timeframe), part, limit, columns)
+
+    trend_tf = settings['timeframe_trend']
+    confirm = settings.get('require_trend_confirmation', False) and trend_tf in ["1h", "30m"]
+    ranging = mode == "AGGRESSIVE"
+
+    names = ["price", "adx", "plus_di", "minus_di", "age_up", "age_down", "atr", "atr_percentage",
+             "rsi", "volume_ratio", "macd_histogram", "bb_width", "price_position", "ema_20", "ema_50",
+             "sma_20_higher", "sma_50_higher", "price_range"]
+    features = {name: np.full(len(steps), np.nan) for name in names}
+
+    for lo in range(0, len(steps), chunk):
+        part = steps[lo:lo + chunk]
+        out = slice(lo, lo + len(part))
+
+        if view(trend_tf) is None:
+            rows = window(trend_tf, part, 100, "high", "low", "close")
+            adx, plus_di, minus_di = adx_last(rows["high"], rows["low"], rows["close"])
+            trend_close = rows["close"]
+        else:
+            completed, inverse, partial = bucket_windows(view(trend_tf), part, 100, ("high", "low", "close"))
+            state = tuple(x[inverse] for x in adx_prefix(completed["high"], completed["low"], completed["close"]))
+            adx, plus_di, minus_di = adx_step(state, completed["high"][-1][inverse], completed["low"][-1][inverse],
+                                              completed["close"][-1][inverse], partial["high"], partial["low"])
+            trend_close = np.vstack([completed["close"][-20:][:, inverse], partial["close"][None, :]])
+        features["adx"][out] = adx
+        features["plus_di"][out] = plus_di
+        features["minus_di"][out] = minus_di
+        features["age_up"][out], features["age_down"][out] = trend_age(trend_close)
+
+        if confirm:
+            higher = window(higher_timeframe(trend_tf), part, 50, "close")["close"]
+            features["sma_20_higher"][out] = higher[-20:].mean(axis=0)
+            features["sma_50_higher"][out] = higher[-50:].mean(axis=0)
+
+        volatility_view = view(settings['timeframe_volatility'])
+        if volatility_view is None:
+            rows = window(settings['timeframe_volatility'], part, 50, "high", "low", "close")
+            atr = atr_last(rows["high"], rows["low"], rows["close"])
+            last_close = rows["close"][-1]
+        else:
+            completed, inverse, partial = bucket_windows(volatility_view, part, 50, ("high", "low", "close"))
+            atr = atr_prefix(completed["high"], completed["low"], completed["close"])[inverse]
+            atr = atr_step(atr, completed["close"][-1][inverse], partial["high"], partial["low"])
+            last_close = partial["close"]
+        features["atr"][out] = atr
+        with np.errstate(divide="ignore", invalid="ignore"):
+            features["atr_percentage"][out] = np.where(last_close > 0, atr / last_close * 100, 0)
+
+        rows = window(settings['timeframe_entry'], part, 100, "close", "volume")
+        close, volume = rows["close"], rows["volume"]
+        price = close[-1]
+        features["price"][out] = price
+        features["rsi"][out] = rsi_last(close)
+        volume_sma = volume[-20:].mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            features["volume_ratio"][out] = np.where(volume_sma > 0, volume[-1] / volume_sma, 1)
+        features["macd_histogram"][out] = macd_histogram_last(close)
+        bb_upper, bb_lower, bb_middle = bollinger_last(close)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            features["bb_width"][out] = np.where(bb_middle != 0, (bb_upper - bb_lower) / bb_middle, 0)
+        features["price_position"][out] = (price - bb_lower) / (bb_upper - bb_lower + 1e-9)
+        features["ema_20"][out] = ewm_last(close, 2 / 21, adjust=True)
+        features["ema_50"][out] = ewm_last(close, 2 / 51, adjust=True)
+
+        if ranging:
+            rows = window("4h", part, 20, "high", "low", "close")
+            features["price_range"][out] = (rows["high"].max(axis=0) - rows["low"].min(axis=0)) / rows["close"].mean(axis=0)
+
+    return features
+
+def first_feature_step(base: np.ndarray, settings: Dict, mode: str, base_timeframe: str = BASE_TIMEFRAME,
+                       views: Optional[Dict[str, TimeframeView]] = None) -> int:
+    """Первый шаг, на котором все окна compute_features полные"""
+    requests = [(settings['timeframe_trend'], 100), (settings['timeframe_volatility'], 50),
+                (settings['timeframe_entry'], 100)]
+    if settings.get('require_trend_confirmation', False) and settings['timeframe_trend'] in ["1h", "30m"]:
+        requests.append((higher_timeframe(settings['timeframe_trend']), 50))
+    if mode == "AGGRESSIVE":
+        requests.append(("4h", 20))
+    first = 0
+    for timeframe, limit in requests:
+        first = max(first, first_full_step(base, timeframe_view(base, timeframe, base_timeframe, views), limit))
+    return first
+
+# ====== РЕШАЮЩИЙ СЛОЙ ======
+def evaluate_signals(features: Dict[str, np.ndarray], settings: Dict, mode: str, symbol: str,
+                     symbol_categories: Dict) -> Dict[str, np.ndarray]:
+    """Маски фильтров analyze_symbol_with_filters: код первого сработавшего фильтра, тип позиции и score"""
+    adx = features["adx"]
+    price = features["price"]
+    atr_pct = features["atr_percentage"]
+    rsi = features["rsi"]
+    volume_ratio = features["volume_ratio"]
+    macd_histogram = features["macd_histogram"]
+    bb_width = features["bb_width"]
+    price_position = features["price_position"]
+
+    # Направление: уровень 3 - BULLISH/BEARISH, 2 - WEAK_*, 1 - VERY_WEAK_*, 0 - NEUTRAL
+    level = np.select([adx > 25, adx > 18, adx > 12], [3, 2, 1], 0)
+    sign = np.where(level > 0, np.where(features["plus_di"] > features["minus_di"], 1, -1), 0)
+    very_weak = level == 1
+    age = np.where(sign > 0, features["age_up"], np.where(sign < 0, features["age_down"], 0))
+
+    confirmed = np.ones(len(adx), dtype=bool)
+    if settings.get('require_trend_confirmation', False) and settings['timeframe_trend'] in ["1h", "30m"]:
+        sma_20, sma_50 = features["sma_20_higher"], features["sma_50_higher"]
+        confirmed = np.where(sign > 0, sma_20 > sma_50 * 0.99, np.where(sign < 0, sma_20 < sma_50 * 1.01, True))
+
+    if mode == "AGGRESSIVE":
+        min_level = 1
+    elif mode == "CONSERVATIVE":
+        min_level = 2
+    else:
+        min_level = 3
+    allowed = level >= min_level
+    is_long = sign > 0
+
+    if mode == "AGGRESSIVE":
+        min_atr_required = settings['min_atr_percentage'] * 100 * 0.6
+        max_atr_allowed = settings['max_atr_percentage'] * 100 * 1.4
+        min_bb_width_required = settings.get('bb_width_min', 0.01) * 0.6
+    else:
+        min_atr_required = settings['min_atr_percentage'] * 100
+        max_atr_allowed = settings['max_atr_percentage'] * 100
+        min_bb_width_required = settings.get('bb_width_min', 0.01)
+
+    is_ranging = (features["price_range"] < 0.03) if mode == "AGGRESSIVE" else np.zeros(len(adx), dtype=bool)
+
+    macd_threshold = np.select([level == 1, level == 2], [0.0003, 0.0002], 0.0001)
+    macd_threshold = np.where(is_ranging, macd_threshold * 2.0, macd_threshold)
+    strong = adx > 30
+    macd_threshold = macd_threshold * np.where(strong, 2.0, 1.0)
+    macd_aligned = np.where(is_long, macd_histogram > -macd_threshold, macd_histogram < macd_threshold)
+
+    # Ключевой уровень: BB, затем близость к EMA20/EMA50 (перекрывает глубину)
+    ema_20, ema_50 = features["ema_20"], features["ema_50"]
+    price_to_ema20 = np.abs(price - ema_20) / ema_20
+    price_to_ema50 = np.abs(price - ema_50) / ema_50
+    near_ema = (price_to_ema20 < 0.015) | (price_to_ema50 < 0.02)
+    bb_long = (0.05 <= price_position) & (price_position <= 0.45)
+    bb_short = (0.55 <= price_position) & (price_position <= 0.95)
+    bb_level = np.where(is_long, bb_long, bb_short)
+    price_at_key_level = bb_level | near_ema
+    correction_depth = np.where(near_ema, np.minimum(price_to_ema20, price_to_ema50),
+                                np.where(bb_level, np.where(is_long, 1 - price_position, price_position), 0.0))
+
+    bearish = sign < 0
+    rsi_long = np.where(bearish, settings.get('rsi_range_bearish_long', settings['rsi_range_long'])[0], settings['rsi_range_long'][0]), \
+        np.where(bearish, settings.get('rsi_range_bearish_long', settings['rsi_range_long'])[1], settings['rsi_range_long'][1])
+    rsi_short = np.where(bearish, settings.get('rsi_range_bearish_short', settings['rsi_range_short'])[0], settings['rsi_range_short'][0]), \
+        np.where(bearish, settings.get('rsi_range_bearish_short', settings['rsi_range_short'])[1], settings['rsi_range_short'][1])
+    rsi_low = np.where(is_long, rsi_long[0], rsi_short[0])
+    rsi_high = np.where(is_long, rsi_long[1], rsi_short[1])
+    rsi_ok = (rsi_low <= rsi) & (rsi <= rsi_high)
+
+    required_volume_ratio = np.full(len(adx), float(settings['volume_multiplier']))
+    if symbol_categories.get(symbol, {}).get("volatility") in ["HIGH", "VERY_HIGH"]:
+        required_volume_ratio = np.where(is_ranging, required_volume_ratio * 0.5, required_volume_ratio * 0.8)
+    else:
+        required_volume_ratio = np.where(is_ranging, required_volume_ratio * 0.5, required_volume_ratio)
+    required_volume_ratio = np.where(very_weak, required_volume_ratio * 0.7, required_volume_ratio)
+    required_volume_ratio = required_volume_ratio * np.where(strong, 0.7, 1.0)
+
+    # Score
+    score = np.minimum(adx, 30)
+    score = score + np.where(strong, 5, np.where((adx > 25) & ~very_weak, 3, np.where(very_weak, 2, 0)))
+    score = score + np.where(volume_ratio >= required_volume_ratio, np.minimum(volume_ratio * 8, 15), 0)
+    score = score + np.where(rsi_ok, 15 + np.where(~very_weak & ((is_long & (rsi < 35)) | (~is_long & (rsi > 65))), 3, 0), 0)
+    score = score + np.minimum(correction_depth * 80, 20)
+    score = score + np.where(correction_depth > 0.03, 5, np.where(correction_depth > 0.02, 3,
+                             np.where((correction_depth > 0.01) & very_weak, 2, 0)))
+    score = score + np.where(bb_width >= min_bb_width_required,
+                             10 + np.where(~very_weak & (0.02 <= bb_width) & (bb_width <= 0.05), 3, 0), 0)
+    strong_macd = np.where(is_long, macd_histogram > 0.001, macd_histogram < -0.001)
+    score = score + np.where(macd_aligned, 10 + np.where(~very_weak & strong_macd, 3, 0), 0)
+    score = score + np.where(is_ranging, 5, 0)
+
+    if settings.get('adaptive_scoring', False):
+        bonus = np.select([adx > 40, adx > 30, adx > 25], [15, 10, 5], 0)
+        bonus = bonus - np.where(atr_pct > 6, 5, np.where(atr_pct < 2, 3, 0))
+        bonus = bonus + np.where(price_at_key_level, np.select(
+            [correction_depth > 0.03, correction_depth > 0.02, correction_depth > 0.01], [10, 5, 2], 0), 0)
+        bonus = bonus + np.select([volume_ratio > 2.0, volume_ratio > 1.5], [5, 3], 0)
+        bonus = bonus + np.where(np.where(is_long, macd_histogram > 0, macd_histogram < 0), 3, 0)
+        score = np.minimum(np.maximum(0, score + bonus), 150)
+
+    fail = np.select([
+        ~confirmed & settings.get('require_trend_confirmation', True),
+        adx < settings['min_trend_strength'],
+        age > settings.get('max_trend_age', 20),
+        ~allowed,
+        atr_pct > max_atr_allowed,
+        atr_pct < min_atr_required,
+        bb_width < min_bb_width_required,
+        ~macd_aligned,
+        ~rsi_ok,
+        volume_ratio < required_volume_ratio,
+        ~price_at_key_level,
+        score < settings['min_score'],
+    ], np.arange(len(SIGNAL_FILTERS)), PASSED)
+
+    return {
+        "fail": fail.astype(np.int8),
+        "sign": np.where(is_long, 1, -1).astype(np.int8),
+        "score": score,
+        "price": price,
+        "trend_strength": adx,
+        "atr": features["atr"],
+        "atr_percentage": atr_pct
+    }
+
+# ====== ВЫХОДЫ ======
+def intrabar_ticks(candles: np.ndarray) -> np.ndarray:
+    """Траектория O -> L -> H -> C (бычий бар) или O -> H -> L -> C, как в BacktestEngine"""
+    o, h, l, c = candles[:, 1], candles[:, 2], candles[:, 3], candles[:, 4]
+    bullish = c >= o
+    return np.column_stack([o, np.where(bullish, l, h), np.where(bullish, h, l), c]).ravel()
+
+def _exit_candidates(position: Dict, prices: np.ndarray, settings: Dict) -> np.ndarray:
+    """Тики, на которых check_position_exits может что-то сделать (надмножество)"""
+    open_price = position['open_price']
+    quick_exit = settings.get('quick_exit', 0) > 0 and position['quick_exit_price'] > 0
+    if position['position_type'] == 'LONG':
+        mask = (prices <= position['stop_loss']) | (prices >= position['take_profit'])
+        if quick_exit:
+            mask |= prices >= position['quick_exit_price']
+        profit = (prices - open_price) / open_price
+    else:
+        mask = (prices >= position['stop_loss']) | (prices <= position['take_profit'])
+        if quick_exit:
+            mask |= prices <= position['quick_exit_price']
+        profit = (open_price - prices) / open_price
+
+    if settings.get('partial_exit_enabled', False):
+        if not position['partial_exit_1']:
+            mask |= profit >= settings['partial_exit_1']
+        if not position['partial_exit_2']:
+            mask |= profit >= settings['partial_exit_2']
+
+    if settings.get('trailing_stop_activation', 0):
+        distance = settings['trailing_stop_distance']
+        stop = position['stop_loss']
+        if position['position_type'] == 'LONG':
+            extreme = np.maximum(position['max_price'], prices)
+            if position['trailing_active']:
+                mask |= extreme * (1 - distance) > stop + stop * settings['trailing_stop_update_frequency']
+            else:
+                mask |= (extreme - open_price) / open_price >= settings['trailing_stop_activation']
+        else:
+            extreme = np.minimum(position['min_price'], prices)
+            if position['trailing_active']:
+                mask |= extreme * (1 + distance) < stop - stop * settings['trailing_stop_update_frequency']
+            else:
+                mask |= (open_price - extreme) / open_price >= settings['trailing_stop_activation']
+    return mask
+
+def _apply_exit_tick(position: Dict, price: float, settings: Dict) -> Optional[str]:
+    """Один вызов check_position_exits для позиции: QUICK_EXIT / PARTIAL_EXIT_N / STOP_LOSS / TAKE_PROFIT / None"""
+    is_long = position['position_type'] == 'LONG'
+    open_price = position['open_price']
+
+    quick_exit_price = position['quick_exit_price']
+    if settings.get('quick_exit', 0) > 0 and quick_exit_price > 0:
+        if (is_long and price >= quick_exit_price) or (not is_long and price <= quick_exit_price):
+            return "QUICK_EXIT"
+
+    if settings.get('partial_exit_enabled', False):
+        profit_pct = (price - open_price) / open_price if is_long else (open_price - price) / open_price
+        for n in (1, 2):
+            key = f'partial_exit_{n}'
+            if profit_pct >= settings[key] and not position[key]:
+                close_amount = position['base_amount'] * settings[f'partial_exit_pct_{n}']
+                if is_long:
+                    partial_pnl = (price - open_price) * close_amount * position['leverage']
+                else:
+                    partial_pnl = (open_price - price) * close_amount * position['leverage']
+                position['base_amount'] = position['base_amount'] - close_amount
+                position[key] = 1
+                position['partial_pnl'] = partial_pnl
+                return f"PARTIAL_EXIT_{n}"
+
+    if settings.get('trailing_stop_activation', 0):
+        distance = settings['trailing_stop_distance']
+        if is_long:
+            max_price = max(position['max_price'], price)
+            price_change = (max_price - open_price) / open_price
+            new_stop = max_price * (1 - distance)
+            if price_change >= settings['trailing_stop_activation'] and not position['trailing_active']:
+                if new_stop > position['stop_loss']:
+                    position.update(stop_loss=new_stop, trailing_active=1, max_price=max_price)
+            elif position['trailing_active']:
+                if new_stop > position['stop_loss'] + position['stop_loss'] * settings['trailing_stop_update_frequency']:
+                    position.update(stop_loss=new_stop, max_price=max_price)
+        else:
+            min_price = min(position['min_price'], price)
+            price_change = (open_price - min_price) / open_price
+            new_stop = min_price * (1 + distance)
+            if price_change >= settings['trailing_stop_activation'] and not position['trailing_active']:
+                if new_stop < position['stop_loss']:
+                    position.update(stop_loss=new_stop, trailing_active=1, min_price=min_price)
+            elif position['trailing_active']:
+                if new_stop < position['stop_loss'] - position['stop_loss'] * settings['trailing_stop_update_frequency']:
+                    position.update(stop_loss=new_stop, min_price=min_price)
+
+    if is_long:
+        if price <= position['stop_loss']:
+            return "STOP_LOSS"
+        if price >= position['take_profit']:
+            return "TAKE_PROFIT"
+    else:
+        if price >= position['stop_loss']:
+            return "STOP_LOSS"
+        if price <= position['take_profit']:
+            return "TAKE_PROFIT"
+    return None
+
+def resolve_exit(position: Dict, ticks: np.ndarray, start: int, settings: Dict,
+                 horizon: int = EXIT_SCAN_HORIZON) -> Tuple[Optional[int], Optional[str], List[Tuple[int, float, float]]]:
+    """Первый тик закрытия позиции начиная с start; частичные выходы - (тик, pnl, остаток)"""
+    partials = []
+    k = start
+    while k < len(ticks):
+        segment = ticks[k:k + horizon]
+        mask = _exit_candidates(position, segment, settings)
+        hit = int(mask.argmax())
+        if not mask[hit]:
+            k += len(segment)
+            continue
+        tick = k + hit
+        outcome = _apply_exit_tick(position, float(ticks[tick]), settings)
+        if outcome is None:
+            pass
+        elif outcome.startswith("PARTIAL"):
+            partials.append((tick, position['partial_pnl'], position['base_amount']))
+        else:
+            return tick, outcome, partials
+        k = tick + 1
+    return None, None, partials
+
+# ====== ПОРТФЕЛЬ ======
+def week_start_days(timestamps: np.ndarray) -> np.ndarray:
+    """Номер дня (от эпохи) понедельника локальной недели - как week_start в check_weekly_limit"""
+    hours = np.floor(timestamps / 3600)
+    unique_hours, inverse = np.unique(hours, return_inverse=True)
+    # Смещение часового пояса (с учетом перехода на летнее время) - по одному разу на час
+    offsets = np.array([_time.localtime(h * 3600).tm_gmtoff for h in unique_hours])[inverse]
+    days = np.floor((timestamps + offsets) / 86400).astype(np.int64)
+    # 1970-01-01 - четверг (weekday = 3)
+    return days - (days + 3) % 7
+
+class VectorizedBacktest:
+    """Векторные сигналы по всем символам + разреженный проход по барам с сигналами
+    (лимиты, кулдауны, недельный лимит, распределение сигналов по слотам - как в scan_for_opportunities)"""
+
+    def __init__(self, candles: Dict[str, np.ndarray], mode: str = "AGGRESSIVE",
+                 initial_balance: float = 1000.0, base_timeframe: str = BASE_TIMEFRAME,
+                 start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                 warmup_bars: Optional[int] = None, settings_override: Optional[Dict] = None,
+                 bot=None, cache: Optional[Dict] = None):
+        self.candles = {s: c for s, c in candles.items() if len(c)}
+        self.mode = mode
+        self.initial_balance = initial_balance
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.warmup_bars = warmup_bars
+        self.bot = bot or load_bot_module()
+        self.settings = dict(self.bot.TRADING_MODES[mode])
+        self.settings.update(settings_override or {})
+        # Кэш между прогонами на тех же свечах (перебор параметров): старшие ТФ и индикаторы
+        self._shared_cache = cache is not None
+        self.cache = cache if cache is not None else {}
+        views = self.cache.setdefault("views", {})
+        self._views = {symbol: views.setdefault(symbol, {}) for symbol in self.candles}
+
+    def timeline(self, full: bool = False) -> np.ndarray:
+        """Индексы базовых свечей, на которых выполняется скан (full - вся история после прогрева, без start/end)"""
+        symbols = list(self.candles)
+        timestamps = self.candles[symbols[0]][:, 0]
+        for symbol in symbols[1:]:
+            if not np.array_equal(self.candles[symbol][:, 0], timestamps):
+                raise ValueError(f"Vectorized backtest needs aligned candles: {symbol} differs from {symbols[0]}")
+        warmup = self.warmup_bars if self.warmup_bars is not None else required_warmup_bars(self.settings, self.base_timeframe)
+        first = max(first_feature_step(self.candles[s], self.settings, self.mode, self.base_timeframe, self._views[s])
+                    for s in symbols)
+        if full:
+            return np.arange(first, len(timestamps))
+        start = self.start_ms if self.start_ms is not None else timestamps[min(warmup, len(timestamps) - 1)]
+        end = self.end_ms if self.end_ms is not None else timestamps[-1]
+        steps = np.flatnonzero((timestamps >= start) & (timestamps <= end))
+        if len(steps) and steps[0] < first:
+            logger.warning(f"⚠️ Start moved by {first - steps[0]} bars: not enough history for full indicator windows")
+            steps = steps[steps >= first]
+        return steps
+
+    def feature_key(self) -> Tuple:
+        """Настройки, от которых зависят индикаторы (остальные влияют только на фильтры и выходы)"""
+        return (self.mode, self.settings['timeframe_entry'], self.settings['timeframe_trend'],
+                self.settings['timeframe_volatility'], bool(self.settings.get('require_trend_confirmation', False)))
+
+    def signals(self, steps: np.ndarray) -> Dict[str, Dict[str, np.ndarray]]:
+        """Сигналы на шагах steps. С общим кэшем индикаторы считаются один раз по всей истории,
+        а любое окно (перебор, walk-forward) - срез этих массивов"""
+        features_cache = self.cache.setdefault("features", {})
+        result = {}
+        for symbol, candles in self.candles.items():
+            result[symbol] = evaluate_signals(self._features(symbol, candles, steps, features_cache), self.settings,
+                                              self.mode, symbol, self.bot.SYMBOL_CATEGORIES)
+        return result
+
+    def _features(self, symbol: str, candles: np.ndarray, steps: np.ndarray, features_cache: Dict) -> Dict[str, np.ndarray]:
+        if not len(steps):
+            return compute_features(candles, self.settings, self.mode, steps, self.base_timeframe, views=self._views[symbol])
+        key = (symbol, self.feature_key())
+        entry = features_cache.get(key)
+        if entry is None or steps[0] < entry[0] or steps[-1] >= entry[0] + len(entry[1]["price"]):
+            computed = self.timeline(full=True) if self._shared_cache else steps
+            entry = features_cache[key] = (int(computed[0]), compute_features(
+                candles, self.settings, self.mode, computed, self.base_timeframe, views=self._views[symbol]))
+        offset = int(steps[0]) - entry[0]
+        return {name: values[offset:offset + len(steps)] for name, values in entry[1].items()}
+
+    def _position_usdt(self, symbol: str, score: float, available_usdt: float) -> float:
+        """Повтор planned_position_usdt: адаптивный размер или trade_pct, множитель риска; мало - 0"""
+        bot, settings = self.bot, self.settings
+        category = bot.SYMBOL_CATEGORIES.get(symbol, {})
+        min_trade = category.get("min_trade_usdt", bot.MIN_TRADE_USDT)
+
+        if settings.get('adaptive_position_sizing', False):
+            if score >= 100:
+                multiplier = 1.2
+            elif score >= 90:
+                multiplier = 1.1
+            elif score >= 80:
+                multiplier = 1.0
+            elif score >= 70:
+                multiplier = 0.9
+            else:
+                multiplier = 0.8
+            trade_usdt = available_usdt * min(settings['trade_pct'] * multiplier, 0.05)
+            if trade_usdt < min_trade:
+                return 0
+        else:
+            trade_usdt = available_usdt * settings['trade_pct']
+        if trade_usdt <= 0:
+            return 0
+        trade_usdt *= category.get("risk_multiplier", 1.0)
+        if trade_usdt < min_trade:
+            return 0
+        return trade_usdt
+
+    def _open(self, symbol: str, signal: Dict[str, np.ndarray], k: int, trade_usdt: float,
+              funnel_extra: List[Tuple[int, str, str]]) -> Optional[Dict]:
+        """Повтор open_position с объемом из распределения: RR, комиссионный фильтр, адаптивные SL/TP"""
+        bot, settings = self.bot, self.settings
+        price = float(signal["price"][k])
+        score = float(signal["score"][k])
+        position_type = "LONG" if signal["sign"][k] > 0 else "SHORT"
+
+        base_amount = round(trade_usdt / (price * 1.0), 8)
+        direction = 1 if position_type == 'LONG' else -1
+
+        def risk_reward(stop_loss: float, take_profit: float) -> Tuple[bool, float]:
+            risk = (price - stop_loss) * direction
+            reward = (take_profit - price) * direction
+            if risk <= 0:
+                return False, 0
+            ratio = reward / risk
+            return ratio >= settings.get('min_risk_reward', 2.0), ratio
+
+        passes, _ = risk_reward(price * (1 - direction * settings['max_stop_loss']),
+                                price * (1 + direction * settings['take_profit']))
+        if not passes:
+            funnel_extra.extend([(k, "", "risk_reward"), (k, symbol, "risk_reward")])
+            return None
+
+        max_stop_loss = settings['max_stop_loss']
+        if settings.get('adaptive_sl', False):
+            max_stop_loss = settings['max_stop_loss'] * min(float(signal["atr_percentage"][k]) / 100 * 2, 1.5)
+        take_profit = settings['take_profit']
+        if settings.get('adaptive_tp', False):
+            take_profit = settings['take_profit'] * min(float(signal["trend_strength"][k]) / 25, 1.5)
+
+        stop_loss = price * (1 - direction * max_stop_loss)
+        take_profit_price = price * (1 + direction * take_profit)
+        quick_exit_price = price * (1 + direction * settings.get('quick_exit', 0))
+
+        if settings.get('commission_filter', False):
+            potential_profit_pct = (take_profit_price - price) / price * 100 * direction
+            entry_fee = bot.TAKER_FEE if settings.get('use_market_entry', False) else bot.MAKER_FEE
+            exit_fee = bot.TAKER_FEE if settings.get('use_market_exit', False) else bot.MAKER_FEE
+            if not potential_profit_pct > entry_fee * 100 + exit_fee * 100 + settings.get('commission_requirement', 1.0):
+                funnel_extra.append((k, symbol, "commission_filter"))
+                return None
+
+        passes, rr_ratio = risk_reward(stop_loss, take_profit_price)
+        if not passes:
+            funnel_extra.extend([(k, "", "risk_reward"), (k, symbol, "adaptive_sl_tp_failed")])
+            return None
+
+        open_price = round(price, 8)
+        return {
+            "symbol": symbol,
+            "position_type": position_type,
+            "open_price": open_price,
+            "base_amount": base_amount,
+            "stop_loss": round(stop_loss, 8),
+            "take_profit": round(take_profit_price, 8),
+            "quick_exit_price": round(quick_exit_price, 8),
+            "max_price": open_price,
+            "min_price": open_price,
+            "trailing_active": 0,
+            "partial_exit_1": 0,
+            "partial_exit_2": 0,
+            "leverage": settings['leverage'],
+            "invested_usdt": trade_usdt,
+            "signal_score": score,
+            "trend_strength": float(signal["trend_strength"][k]),
+            "risk_reward_ratio": rr_ratio,
+            "open_step": k
+        }
+
+    def run(self) -> BacktestResult:
+        started = _time.perf_counter()
+        bot, settings = self.bot, self.settings
+        symbols = list(self.candles)
+        steps = self.timeline()
+        n = len(steps)
+        bar_open = self.candles[symbols[0]][steps, 0]
+        scan_times = (bar_open + self.base_ms) / 1000
+        signals = self.signals(steps)
+        ticks = {s: intrabar_ticks(self.candles[s][steps]) for s in symbols}
+        closes = {s: self.candles[s][steps, 4] for s in symbols}
+
+        exit_fee_rate = bot.TAKER_FEE if settings.get('use_market_exit', False) else bot.MAKER_FEE
+        min_possible_trade = min(cat.get('min_trade_usdt', bot.MIN_TRADE_USDT) for cat in bot.SYMBOL_CATEGORIES.values())
+        week_keys = week_start_days(scan_times)
+        max_entries = bot.MAX_ENTRIES_PER_SCAN
+
+        passed = np.array([signals[s]["fail"] == PASSED for s in symbols])
+        candidate_steps = np.flatnonzero(passed.any(axis=0))
+
+        trades = []
+        open_positions: Dict[str, Dict] = {}
+        cooldown: Dict[str, Tuple[int, int]] = {}
+        weekly: Dict[int, int] = {}
+        funnel_extra: List[Tuple[int, str, str]] = []
+        realized = 0.0
+
+        def settle(k: int):
+            """Применяет частичные выходы и закрытия, случившиеся до скана на шаге k"""
+            nonlocal realized
+            for symbol in list(open_positions):
+                position = open_positions[symbol]
+                while position["pending_partials"] and position["pending_partials"][0][0] // INTRABAR_TICKS <= k:
+                    _, partial_pnl, _ = position["pending_partials"].pop(0)
+                    realized += partial_pnl
+                if position["exit_tick"] is not None and position["exit_tick"] // INTRABAR_TICKS <= k:
+                    # Частичные выходы уже учтены выше
+                    realized += position["pnl"] - position["fee"] - sum(p for _, p, _ in position["partials"])
+                    losses = cooldown.get(symbol, (0, 0))[1]
+                    cooldown[symbol] = (position["close_ts"], 0 if position["pnl_percent"] > 0 else losses + 1)
+                    del open_positions[symbol]
+
+        for k in candidate_steps:
+            settle(k)
+            available = max(self.initial_balance + realized, 0.0)
+            if available < min_possible_trade or len(open_positions) >= settings['max_trades']:
+                continue
+
+            now = scan_times[k]
+            week_count = weekly.get(week_keys[k], 0)
+            candidates = []
+            for s_idx, symbol in enumerate(symbols):
+                if not passed[s_idx, k] or symbol in open_positions:
+                    continue
+                if symbol in cooldown:
+                    last_closed, losses = cooldown[symbol]
+                    period = settings['cooldown'] * (2 if losses >= 3 else 1)
+                    if (now - last_closed) < period:
+                        continue
+                if week_count >= settings.get('max_weekly_trades', 99):
+                    continue
+                candidates.append({"symbol": symbol, "score": signals[symbol]["score"][k]})
+            if not candidates:
+                continue
+
+            # Распределение по слотам - как open_scan_signals: раунды с заменой не открывшихся сигналов
+            # (трекер корреляций запускается только в main бота - в бэктестах его нет)
+            free_slots = min(settings['max_trades'] - len(open_positions),
+                             settings.get('max_weekly_trades', 99) - week_count)
+            if max_entries > 0:
+                free_slots = min(free_slots, max_entries)
+            attempts, rejected = 2 * free_slots, set()
+            while free_slots > 0 and attempts > 0:
+                plan = allocate_signals(
+                    [c for c in candidates if c["symbol"] not in rejected], min(free_slots, attempts), available,
+                    lambda c, remaining: self._position_usdt(c["symbol"], float(c["score"]), remaining),
+                    leverage=settings['leverage'], held=open_positions)
+                if not plan:
+                    break
+                attempts -= len(plan)
+                failed = False
+                for candidate, trade_usdt in plan:
+                    symbol = candidate["symbol"]
+                    position = self._open(symbol, signals[symbol], k, trade_usdt, funnel_extra)
+                    if position is None:
+                        rejected.add(symbol)
+                        failed = True
+                        continue
+                    free_slots -= 1
+                    available -= trade_usdt / settings['leverage']
+                    week_count += 1
+                    weekly[week_keys[k]] = week_count
+                    position["open_ts"] = int(now)
+                    position["initial_base_amount"] = position["base_amount"]
+
+                    exit_tick, reason, partials = resolve_exit(position, ticks[symbol], (k + 1) * INTRABAR_TICKS, settings)
+                    position["pending_partials"] = list(partials)
+                    position["partials"] = list(partials)
+                    position["exit_tick"] = exit_tick
+                    position["exit_reason"] = reason
+                    if exit_tick is not None:
+                        close_price = float(ticks[symbol][exit_tick])
+                        close_ts = int((bar_open[exit_tick // INTRABAR_TICKS]
+                                        + self.base_ms * (exit_tick % INTRABAR_TICKS) / INTRABAR_TICKS) / 1000)
+                        self._close(position, close_price, close_ts, reason, exit_fee_rate)
+                    open_positions[symbol] = position
+                    trades.append(position)
+                if not failed:
+                    break
+
+        # Незакрытые к концу данных - по последней цене
+        for position in trades:
+            if position["exit_tick"] is None:
+                self._close(position, float(closes[position["symbol"]][-1]), int(scan_times[-1]), "BACKTEST_END", exit_fee_rate)
+
+        equity_curve = self._equity_curve(trades, closes, bar_open, n)
+        funnel = self._funnel(signals, trades, funnel_extra, scan_times, week_keys, min_possible_trade)
+        result_trades = [self._trade_record(p) for p in sorted(
+            trades, key=lambda p: (p["exit_tick"] if p["exit_tick"] is not None else 4 * n, p["open_step"]))]
+        return BacktestResult(result_trades, equity_curve, funnel, self.initial_balance,
+                              _time.perf_counter() - started, n)
+
+    @staticmethod
+    def _close(position: Dict, close_price: float, close_ts: int, reason: str, exit_fee_rate: float):
+        direction = 1 if position["position_type"] == 'LONG' else -1
+        open_price = position["open_price"]
+        pnl = direction * (close_price - open_price) * position["base_amount"] * position["leverage"]
+        pnl += sum(partial_pnl for _, partial_pnl, _ in position["partials"])
+        position.update(
+            close_price=close_price,
+            close_ts=close_ts,
+            pnl=pnl,
+            pnl_percent=direction * ((close_price - open_price) / open_price) * 100 * position["leverage"],
+            fee=exit_fee_rate * position["invested_usdt"],
+            exit_reason=reason
+        )
+
+    @staticmethod
+    def _trade_record(position: Dict) -> Dict:
+        return {
+            "symbol": position["symbol"],
+            "position_type": position["position_type"],
+            "open_ts": position["open_ts"],
+            "close_ts": position["close_ts"],
+            "open_price": position["open_price"],
+            "close_price": position["close_price"],
+            "base_amount": position["base_amount"],
+            "invested_usdt": position["invested_usdt"],
+            "leverage": position["leverage"],
+            "pnl": position["pnl"],
+            "pnl_percent": position["pnl_percent"],
+            "fee": position["fee"],
+            "exit_reason": position["exit_reason"],
+            "signal_score": position["signal_score"],
+            "trend_strength": position["trend_strength"],
+            "trailing_active": position["trailing_active"]
+        }
+
+    def _exit_step(self, position: Dict, n: int) -> int:
+        return position["exit_tick"] // INTRABAR_TICKS if position["exit_tick"] is not None else n
+
+    def _equity_curve(self, trades: List[Dict], closes: Dict[str, np.ndarray], bar_open: np.ndarray,
+                      n: int) -> List[Tuple[int, float]]:
+        realized = np.zeros(n + 1)
+        unrealized = np.zeros(n)
+        for position in trades:
+            k, x = position["open_step"], self._exit_step(position, n)
+            # BACKTEST_END закрывается после последнего скана - последняя точка уже без нереализованного PnL
+            x = min(x, n - 1) if position["exit_tick"] is None else x
+            direction = 1 if position["position_type"] == 'LONG' else -1
+
+            # Остаток позиции меняется после каждого частичного выхода
+            bounds = [k] + [tick // INTRABAR_TICKS for tick, _, _ in position["partials"]] + [x]
+            amounts = [position["initial_base_amount"]] + [remaining for _, _, remaining in position["partials"]]
+            for lo, hi, amount in zip(bounds[:-1], bounds[1:], amounts):
+                prices = closes[position["symbol"]][lo:hi]
+                unrealized[lo:hi] += direction * (prices - position["open_price"]) * amount * position["leverage"]
+            for tick, partial_pnl, _ in position["partials"]:
+                realized[tick // INTRABAR_TICKS] += partial_pnl
+            realized[x] += position["pnl"] - position["fee"] - sum(p for _, p, _ in position["partials"])
+
+        equity = self.initial_balance + np.cumsum(realized[:n]) + unrealized
+        times = (bar_open + self.base_ms).astype(np.int64)
+        return list(zip(times.tolist(), equity.tolist()))
+
+    def _funnel(self, signals: Dict[str, Dict[str, np.ndarray]], trades: List[Dict],
+                funnel_extra: List[Tuple[int, str, str]], scan_times: np.ndarray, week_keys: np.ndarray,
+                min_possible_trade: float) -> Dict:
+        """Воронка filter_stats: состояние (открытые позиции, кулдауны, недельный лимит) восстанавливается по сделкам"""
+        settings = self.settings
+        symbols = list(self.candles)
+        n = len(scan_times)
+
+        realized = np.zeros(n + 1)
+        open_count = np.zeros(n + 1, dtype=np.int64)
+        weekly_opened = np.zeros(n + 1, dtype=np.int64)
+        symbol_open = {s: np.zeros(n + 1, dtype=np.int64) for s in symbols}
+        symbol_cooldown = {s: np.zeros(n, dtype=bool) for s in symbols}
+        losses = {s: 0 for s in symbols}
+        week_bounds = np.flatnonzero(np.r_[True, week_keys[1:] != week_keys[:-1], True])
+
+        for position in sorted(trades, key=lambda p: (self._exit_step(p, n), p["open_step"])):
+            k, x = position["open_step"], self._exit_step(position, n)
+            symbol = position["symbol"]
+            for tick, partial_pnl, _ in position["partials"]:
+                realized[tick // INTRABAR_TICKS] += partial_pnl
+            # Позиция открыта на сканах k+1 .. x-1
+            open_count[k + 1] += 1
+            open_count[x] -= 1
+            symbol_open[symbol][k + 1] += 1
+            symbol_open[symbol][x] -= 1
+            week_end = week_bounds[np.searchsorted(week_bounds, k, side="right")]
+            weekly_opened[k + 1] += 1
+            weekly_opened[week_end] -= 1
+            if position["exit_tick"] is not None and x < n:
+                realized[x] += position["pnl"] - position["fee"] - sum(p for _, p, _ in position["partials"])
+                losses[symbol] = 0 if position["pnl_percent"] > 0 else losses[symbol] + 1
+                period = settings['cooldown'] * (2 if losses[symbol] >= 3 else 1)
+                end = np.searchsorted(scan_times, position["close_ts"] + period, side="left")
+                symbol_cooldown[symbol][x:end] = True
+
+        available = np.maximum(self.initial_balance + np.cumsum(realized[:n]), 0.0)
+        active = (available >= min_possible_trade) & (np.cumsum(open_count)[:n] < settings['max_trades'])
+        weekly_reached = np.cumsum(weekly_opened)[:n] >= settings.get('max_weekly_trades', 99)
+
+        names = list(self.bot.filter_stats["filtered_by"].keys())
+        funnel = {"total_signals": 0, "filtered_by": {name: 0 for name in names},
+                  "passed_filters": 0, "signals_by_symbol": {}}
+        all_filters = STATEFUL_FILTERS + SIGNAL_FILTERS
+        for symbol in symbols:
+            fail = signals[symbol]["fail"].astype(np.int64)
+            code = np.select([np.cumsum(symbol_open[symbol])[:n] > 0, symbol_cooldown[symbol], weekly_reached],
+                             [0, 1, 2], fail + len(STATEFUL_FILTERS) * (fail >= 0))
+            code = code[active]
+            counts = np.bincount(code[code >= 0], minlength=len(all_filters))
+            for name, count in zip(all_filters, counts):
+                funnel["filtered_by"][name] = funnel["filtered_by"].get(name, 0) + int(count)
+            n_passed = int((code == PASSED).sum())
+            funnel["passed_filters"] += n_passed
+            funnel["total_signals"] += int(len(code))
+            funnel["signals_by_symbol"][symbol] = {"total": int(len(code)), "passed": n_passed}
+
+        for _, symbol, name in funnel_extra:
+            funnel["total_signals"] += 1
+            funnel["filtered_by"][name] = funnel["filtered_by"].get(name, 0) + 1
+            stats = funnel["signals_by_symbol"].setdefault(symbol, {"total": 0, "passed": 0})
+            stats["total"] += 1
+        return funnel
+
+
+def run_vectorized_backtest(candles: Dict[str, np.ndarray], mode: str = "AGGRESSIVE", **kwargs) -> BacktestResult:
+    return VectorizedBacktest(candles, mode=mode, **kwargs).run()
+
+# ====== СВЕРКА С СОБЫТИЙНЫМ ПРОГОНОМ ======
+def compare_results(event: BacktestResult, vectorized: BacktestResult, pnl_tolerance: float = 1e-6) -> Dict:
+    """Сделки сопоставляются по (symbol, open_ts); расхождения по выходу, PnL и воронке"""
+    event_trades = {(t["symbol"], t["open_ts"]): t for t in event.trades}
+    vector_trades = {(t["symbol"], t["open_ts"]): t for t in vectorized.trades}
+    common = sorted(set(event_trades) & set(vector_trades))
+
+    exit_mismatch = []
+    max_pnl_diff = 0.0
+    for key in common:
+        a, b = event_trades[key], vector_trades[key]
+        diff = abs(a["pnl"] - b["pnl"])
+        max_pnl_diff = max(max_pnl_diff, diff)
+        if a["exit_reason"] != b["exit_reason"] or a["close_ts"] != b["close_ts"] or diff > pnl_tolerance:
+            exit_mismatch.append({"symbol": key[0], "open_ts": key[1],
+                                  "event": (a["exit_reason"], a["close_ts"], a["pnl"]),
+                                  "vectorized": (b["exit_reason"], b["close_ts"], b["pnl"])})
+
+    funnel_diff = {}
+    for name in set(event.funnel["filtered_by"]) | set(vectorized.funnel["filtered_by"]):
+        a = event.funnel["filtered_by"].get(name, 0)
+        b = vectorized.funnel["filtered_by"].get(name, 0)
+        if a != b:
+            funnel_diff[name] = (a, b)
+    for name in ("total_signals", "passed_filters"):
+        if event.funnel[name] != vectorized.funnel[name]:
+            funnel_diff[name] = (event.funnel[name], vectorized.funnel[name])
+
+    return {
+        "event_trades": len(event.trades),
+        "vectorized_trades": len(vectorized.trades),
+        "matched_trades": len(common),
+        "only_event": sorted(set(event_trades) - set(vector_trades)),
+        "only_vectorized": sorted(set(vector_trades) - set(event_trades)),
+        "exit_mismatch": exit_mismatch,
+        "max_pnl_diff": max_pnl_diff,
+        "funnel_diff": funnel_diff,
+        "event_elapsed_sec": event.elapsed,
+        "vectorized_elapsed_sec": vectorized.elapsed,
+        "ok": not exit_mismatch and len(common) == len(event_trades) == len(vector_trades) and not funnel_diff
+    }
+
+def validate(candles: Dict[str, np.ndarray], mode: str = "AGGRESSIVE", bot=None, **kwargs) -> Dict:
+    bot = bot or load_bot_module()
+    vectorized = VectorizedBacktest(candles, mode=mode, bot=bot, **kwargs)
+    steps = vectorized.timeline()
+    timestamps = next(iter(vectorized.candles.values()))[:, 0]
+    kwargs = dict(kwargs)
+    kwargs["start_ms"] = int(timestamps[steps[0]])
+    kwargs["end_ms"] = int(timestamps[steps[-1]])
+    event = BacktestEngine(candles, mode=mode, bot=bot, **kwargs).run()
+    return compare_results(event, vectorized.run())
+
+# ====== CLI ======
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Векторный бэктест стратегии v7.2")
+    parser.add_argument("--data-dir", default="data", help="каталог со свечами: <SYMBOL>_<tf>.csv или архив <SYMBOL>_<tf>.candles")
+    parser.add_argument("--symbols", nargs="*", help="символы (по умолчанию SYMBOLS из бота)")
+    parser.add_argument("--mode", default="AGGRESSIVE")
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    parser.add_argument("--warmup-bars", type=int)
+    parser.add_argument("--synthetic-bars", type=int, help="вместо CSV - синтетические свечи")
+    parser.add_argument("--validate", action="store_true", help="сверить с событийным BacktestEngine")
+    parser.add_argument("--out", help="каталог для trades.csv / equity.csv / funnel.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    bot = load_bot_module()
+    symbols = args.symbols or list(bot.SYMBOLS)
+
+    if args.synthetic_bars:
+        candles = {s: synthetic_candles(args.synthetic_bars, seed=n) for n, s in enumerate(symbols)}
+    else:
+        candles = load_candle_dir(args.data_dir, symbols)
+    if not candles:
+        print("❌ Нет данных для бэктеста")
+        return 1
+
+    kwargs = dict(initial_balance=args.balance, start_ms=parse_date_ms(args.start),
+                  end_ms=parse_date_ms(args.end), warmup_bars=args.warmup_bars)
+
+    if args.validate:
+        report = validate(candles, mode=args.mode, bot=bot, **kwargs)
+        print(json.dumps(report, indent=2, default=str, ensure_ascii=False))
+        print(f"{'✅' if report['ok'] else '❌'} Сверка: {report['matched_trades']}/{report['event_trades']} сделок, "
+              f"векторно {report['vectorized_elapsed_sec']:.2f}s против {report['event_elapsed_sec']:.2f}s")
+        return 0 if report['ok'] else 2
+
+    result = VectorizedBacktest(candles, mode=args.mode, bot=bot, **kwargs).run()
+    print_result(result, args.mode)
+    if args.out:
+        result.save(args.out)
+        print(f"💾 Результаты сохранены в {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WALK-FORWARD v7.2 - ОПТИМИЗАЦИЯ НА СКОЛЬЗЯЩИХ ОКНАХ
+Для каждого окна: перебор параметров на обучающем отрезке, лучшая комбинация
+проверяется на следующем (out-of-sample) отрезке. Все прогоны всех окон идут
+в одном пуле процессов backtest_sweep; индикаторы считаются воркером один раз
+по всей истории, окна - срезы кэша. Итог - склеенная OOS-кривая капитала.
+"""
+
+import os
+import sys
+import json
+import time as _time
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import (
+    BASE_TIMEFRAME, BacktestResult, load_bot_module, load_candle_dir, synthetic_candles, timeframe_to_ms
+)
+from backtest_sweep import (
+    RANK_METRICS, SUMMARY_COLUMNS, build_combinations, combinations_frame, parse_param_args,
+    rank_results, save_results, worker_backtest, worker_pool
+)
+from backtest_vectorized import VectorizedBacktest
+
+logger = logging.getLogger("backtest_walkforward")
+
+DAY_MS = 24 * 3600 * 1000
+
+# ====== ОКНА ======
+def walk_forward_windows(timestamps: np.ndarray, first_step: int, train_bars: int, test_bars: int,
+                         step_bars: Optional[int] = None, anchored: bool = False) -> List[Dict]:
+    """Окна [train][test] с шагом step_bars (по умолчанию длина test - OOS-отрезки стыкуются без перекрытия).
+    anchored - обучающий отрезок всегда с начала истории"""
+    step_bars = step_bars or test_bars
+    if step_bars < test_bars:
+        raise ValueError("Walk-forward step must be >= test window, otherwise OOS windows overlap")
+    windows = []
+    start = first_step
+    while start + train_bars + test_bars <= len(timestamps):
+        train_start = first_step if anchored else start
+        test_start = start + train_bars
+        windows.append({
+            "window": len(windows),
+            "train_start_ms": int(timestamps[train_start]),
+            "train_end_ms": int(timestamps[test_start - 1]),
+            "test_start_ms": int(timestamps[test_start]),
+            "test_end_ms": int(timestamps[test_start + test_bars - 1]),
+        })
+        start += step_bars
+    return windows
+
+def first_common_step(candles: Dict[str, np.ndarray], combinations: List[Dict], mode: str, bot,
+                      base_timeframe: str = BASE_TIMEFRAME) -> int:
+    """Первый бар, на котором у всех комбинаций полные окна индикаторов"""
+    cache = {}
+    first = 0
+    seen = set()
+    for params in combinations:
+        vectorized = VectorizedBacktest(candles, mode=mode, bot=bot, settings_override=params,
+                                        base_timeframe=base_timeframe, cache=cache)
+        if vectorized.feature_key() in seen:
+            continue
+        seen.add(vectorized.feature_key())
+        first = max(first, int(vectorized.timeline(full=True)[0]))
+    return first
+
+# ====== ЗАДАЧИ ВОРКЕРА ======
+def _train_task(task: Tuple[int, int, Dict, int, int]) -> Dict:
+    window, run_id, params, start_ms, end_ms = task
+    row = {"window": window, "run_id": run_id, "error": ""}
+    try:
+        summary = worker_backtest(params, start_ms=start_ms, end_ms=end_ms).summary()
+        row.update({column: summary[column] for column in SUMMARY_COLUMNS})
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+def _test_task(task: Tuple[int, Dict, int, int]) -> Tuple[int, BacktestResult]:
+    window, params, start_ms, end_ms = task
+    return window, worker_backtest(params, start_ms=start_ms, end_ms=end_ms)
+
+# ====== СКЛЕЙКА ======
+# Денежные поля сделки, пересчитываемые вместе с кривой капитала окна
+SCALED_TRADE_FIELDS = ("pnl", "fee", "invested_usdt", "base_amount")
+
+def stitch_oos(results: List[BacktestResult], initial_balance: float) -> Tuple[List[Dict], List[Tuple[int, float]]]:
+    """Каждое OOS-окно стартует с initial_balance - масштабируем его кривую и денежные поля сделок
+    на капитал конца предыдущего, чтобы net_pnl сделок сходился с return_pct склеенной кривой"""
+    trades, stitched = [], []
+    balance = initial_balance
+    for result in results:
+        scale = balance / result.initial_balance
+        trades.extend({**trade, **{field: trade[field] * scale for field in SCALED_TRADE_FIELDS
+                                   if trade.get(field) is not None}}
+                      for trade in result.trades)
+        if not result.equity_curve:
+            continue
+        stitched.extend((ts, equity * scale) for ts, equity in result.equity_curve)
+        balance = stitched[-1][1]
+    return trades, stitched
+
+# ====== ЗАПУСК ======
+def run_walk_forward(candles: Dict[str, np.ndarray], combinations: List[Dict], windows: List[Dict],
+                     mode: str = "AGGRESSIVE", metric: str = "return_pct", min_trades: int = 5,
+                     workers: Optional[int] = None, initial_balance: float = 1000.0) -> Dict:
+    started = _time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    train_tasks = [(w["window"], run_id, params, w["train_start_ms"], w["train_end_ms"])
+                   for w in windows for run_id, params in enumerate(combinations)]
+
+    with worker_pool(candles, mode, workers, initial_balance=initial_balance) as pool:
+        chunksize = max(1, len(train_tasks) // (workers * 4))
+        train = pd.DataFrame(list(pool.map(_train_task, train_tasks, chunksize=chunksize)))
+        train = pd.concat([combinations_frame([combinations[i] for i in train["run_id"]]), train], axis=1)
+
+        best = {}
+        for w in windows:
+            ranked = rank_results(train[train["window"] == w["window"]], metric, min_trades)
+            if len(ranked):
+                best[w["window"]] = (int(ranked.iloc[0]["run_id"]), float(ranked.iloc[0][metric]))
+            else:
+                # Ни одна комбинация не набрала сделок - окно проверяется на базовых настройках режима
+                logger.warning(f"⚠️ Window {w['window']}: no combination with >= {min_trades} trades, using mode defaults")
+                best[w["window"]] = (None, None)
+
+        test_tasks = [(w["window"], combinations[best[w["window"]][0]] if best[w["window"]][0] is not None else {},
+                       w["test_start_ms"], w["test_end_ms"]) for w in windows]
+        tested = dict(pool.map(_test_task, test_tasks))
+
+    rows = []
+    for w in windows:
+        run_id, train_metric = best[w["window"]]
+        summary = tested[w["window"]].summary()
+        rows.append({
+            **w,
+            "run_id": run_id,
+            "params": json.dumps(combinations[run_id] if run_id is not None else {}),
+            f"train_{metric}": train_metric,
+            **{f"test_{column}": summary[column] for column in SUMMARY_COLUMNS if column != "elapsed_sec"}
+        })
+
+    oos_results = [tested[w["window"]] for w in windows]
+    trades, stitched = stitch_oos(oos_results, initial_balance)
+    oos = BacktestResult(trades, stitched, {}, initial_balance,
+                         _time.perf_counter() - started, sum(r.bars for r in oos_results))
+    logger.info(f"⚡ Walk-forward: {len(windows)} windows x {len(combinations)} combinations "
+                f"on {workers} workers in {oos.elapsed:.1f}s")
+    return {"windows": pd.DataFrame(rows), "train": train, "oos": oos}
+
+def walk_forward_report(result: Dict, metric: str) -> Dict:
+    windows = result["windows"]
+    summary = result["oos"].summary()
+    train_metric = windows[f"train_{metric}"].dropna()
+    test_metric = windows[f"test_{metric}"]
+    return {
+        "windows": len(windows),
+        "oos": summary,
+        f"mean_train_{metric}": float(train_metric.mean()) if len(train_metric) else None,
+        f"mean_test_{metric}": float(test_metric.mean()) if len(test_metric) else None,
+        # Доля окон, где выбранные параметры заработали и вне выборки
+        "profitable_windows_pct": float((windows["test_net_pnl"] > 0).mean() * 100) if len(windows) else 0.0,
+        "parameter_changes": int((windows["params"] != windows["params"].shift()).sum() - 1) if len(windows) else 0,
+    }
+
+def save_walk_forward(result: Dict, report: Dict, out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    result["windows"].to_csv(os.path.join(out_dir, "windows.csv"), index=False)
+    save_results(result["train"], os.path.join(out_dir, "train_results.parquet"))
+    pd.DataFrame(result["oos"].equity_curve, columns=["timestamp", "equity"]).to_csv(
+        os.path.join(out_dir, "oos_equity.csv"), index=False)
+    pd.DataFrame(result["oos"].trades).to_csv(os.path.join(out_dir, "oos_trades.csv"), index=False)
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str, ensure_ascii=False)
+
+def print_walk_forward(result: Dict, report: Dict, mode: str, metric: str):
+    oos = report["oos"]
+    print(f"\n{'='*60}")
+    print(f"🚶 WALK-FORWARD v7.2: {mode}, {report['windows']} окон, отбор по {metric}")
+    print(f"{'='*60}")
+    for _, row in result["windows"].iterrows():
+        test_start = pd.to_datetime(row["test_start_ms"], unit="ms").strftime("%Y-%m-%d")
+        train_value = row[f"train_{metric}"]
+        train_text = f"{train_value:+.2f}" if pd.notna(train_value) else "—"
+        print(f"{int(row['window']):>3}. OOS с {test_start}: train {train_text} -> test {row[f'test_{metric}']:+.2f} "
+              f"({int(row['test_trades'])} сделок) | {row['params']}")
+    print(f"\nOOS: {oos['trades']} сделок, PnL {oos['return_pct']:+.2f}%, "
+          f"PF {oos['profit_factor']:.2f}, Max DD {oos['max_drawdown_pct']:.2f}%")
+    print(f"Прибыльных окон: {report['profitable_windows_pct']:.0f}%, смен параметров: {report['parameter_changes']}")
+    print(f"{'='*60}\n")
+
+# ====== CLI ======
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward оптимизация параметров TRADING_MODES v7.2")
+    parser.add_argument("--spec", help="JSON как у backtest_sweep: {\"mode\", \"grid\"|\"random\", \"fixed\"}")
+    parser.add_argument("--param", action="append", default=[], help="сетка без файла: name=v1,v2,...")
+    parser.add_argument("--data-dir", default="data", help="каталог со свечами: <SYMBOL>_<tf>.csv или архив <SYMBOL>_<tf>.candles")
+    parser.add_argument("--symbols", nargs="*", help="символы (по умолчанию SYMBOLS из бота)")
+    parser.add_argument("--mode", help="режим (по умолчанию из spec или AGGRESSIVE)")
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--train-days", type=float, default=90)
+    parser.add_argument("--test-days", type=float, default=30)
+    parser.add_argument("--step-days", type=float, help="шаг окна (по умолчанию = test-days)")
+    parser.add_argument("--anchored", action="store_true", help="обучение всегда с начала истории")
+    parser.add_argument("--synthetic-bars", type=int, help="вместо CSV - синтетические свечи")
+    parser.add_argument("--workers", type=int, help="процессов (по умолчанию все ядра)")
+    parser.add_argument("--metric", default="return_pct", choices=list(RANK_METRICS))
+    parser.add_argument("--min-trades", type=int, default=5)
+    parser.add_argument("--out", default="walkforward", help="каталог результатов")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    spec = {}
+    if args.spec:
+        with open(args.spec, encoding="utf-8") as f:
+            spec = json.load(f)
+    if args.param:
+        spec["grid"] = {**spec.get("grid", {}), **parse_param_args(args.param)}
+    mode = args.mode or spec.get("mode", "AGGRESSIVE")
+
+    bot = load_bot_module()
+    combinations = build_combinations(spec, bot.TRADING_MODES[mode])
+    symbols = args.symbols or list(bot.SYMBOLS)
+    if args.synthetic_bars:
+        candles = {s: synthetic_candles(args.synthetic_bars, seed=n) for n, s in enumerate(symbols)}
+    else:
+        candles = load_candle_dir(args.data_dir, symbols)
+    if not candles:
+        print("❌ Нет данных для walk-forward")
+        return 1
+
+    bar_ms = timeframe_to_ms(BASE_TIMEFRAME)
+    timestamps = next(iter(candles.values()))[:, 0]
+    windows = walk_forward_windows(
+        timestamps, first_common_step(candles, combinations, mode, bot),
+        int(args.train_days * DAY_MS // bar_ms), int(args.test_days * DAY_MS // bar_ms),
+        int(args.step_days * DAY_MS // bar_ms) if args.step_days else None, args.anchored)
+    if not windows:
+        print("❌ Истории не хватает ни на одно окно train + test")
+        return 1
+
+    logger.info(f"🔍 Walk-forward {mode}: {len(windows)} windows, {len(combinations)} combinations, {len(candles)} symbols")
+    result = run_walk_forward(candles, combinations, windows, mode=mode, metric=args.metric,
+                              min_trades=args.min_trades, workers=args.workers, initial_balance=args.balance)
+    report = walk_forward_report(result, args.metric)
+    save_walk_forward(result, report, args.out)
+    print_walk_forward(result, report, mode, args.metric)
+    print(f"💾 Результаты сохранены в {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BENCHMARKS v7.2 - ГОРЯЧИЕ ПУТИ БОТА
+Свечи OHLCV -> DataFrame, индикаторы get_trend_analysis / get_volatility_analysis,
+признаки тренда пачкой (trend_features) против ta по символу на 100 и 10 000 символов,
+полный analyze_symbol_with_filters, check_position_exits на 10/100/1000 позициях,
+пропускная способность DatabaseManager. Данные синтетические, биржа - backtest.SimExchange.
+Для каждого кейса: медиана/p95 времени, операций в секунду, пик памяти (tracemalloc).
+Результаты сохраняются в JSON и сравниваются с базовой линией (--compare): регрессия -> код 1.
+Медленные кейсы (ta на 10 000 символов - около двух минут на вызов, три вызова на замер)
+запускаются только с --slow.
+
+Базовая линия baselines/benchmark.json снята на эталонной машине (1 CPU, python 3.11, параметры -
+в meta). Повторные прогоны там же расходятся до x1.5 на кейсах короче миллисекунды, поэтому сверка
+идет с --min-time 2 и порогом 1.5:
+
+    python benchmark.py --min-time 2 --compare baselines/benchmark.json --threshold 1.5
+
+На другой машине времена несопоставимы (будет предупреждение): сначала --save своей базовой линии
+с того же коммита, затем --compare с ней.
+"""
+
+import os
+import sys
+import gc
+import json
+import time as _time
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from ta.trend import ADXIndicator
+from ta.volatility import AverageTrueRange, BollingerBands
+
+from backtest import SimExchange, load_bot_module, synthetic_candles
+from bybit_core.features import EMA_SPANS, trend_features
+
+logger = logging.getLogger("benchmark")
+
+POSITION_COUNTS = (10, 100, 1000)
+TREND_SYMBOL_COUNTS = (100, 10000)
+CANDLE_BARS = 2000
+DEFAULT_MIN_TIME = 0.5
+DEFAULT_THRESHOLD = 1.25
+# Рост пика памяти меньше стольких KB не считается регрессией: у мелких кейсов пик - единицы KB
+# и колеблется между прогонами сильнее любого порога
+MEMORY_NOISE_KB = 64
+# Поля meta, при расхождении которых времена базовой линии несопоставимы
+MACHINE_FIELDS = ("python", "platform", "cpu_count", "numpy", "pandas")
+
+# ====== РЕЕСТР ======
+BENCHMARKS: List[Dict] = []
+
+def benchmark(name: str, group: str, min_rounds: int = 5, slow: bool = False):
+    """Регистрация кейса: функция получает окружение и возвращает вызываемый объект для замера
+    (min_rounds меньше - для кейсов на десятки секунд; slow - только с --slow)"""
+    def register(factory: Callable):
+        BENCHMARKS.append({"name": name, "group": group, "factory": factory, "min_rounds": min_rounds,
+                           "slow": slow})
+        return factory
+    return register
+
+# ====== ОКРУЖЕНИЕ ======
+class BenchEnvironment:
+    """Бот поверх SimExchange с синтетическими свечами; курсор - на последней свече"""
+
+    def __init__(self, bot, n_symbols: int = max(POSITION_COUNTS), mode: str = "AGGRESSIVE"):
+        self.bot = bot
+        self.mode = mode
+        self.symbols = list(bot.SYMBOLS) + [f"BENCH{i:04d}/USDT:USDT" for i in range(max(0, n_symbols - len(bot.SYMBOLS)))]
+        candles = {s: synthetic_candles(CANDLE_BARS, seed=n) for n, s in enumerate(self.symbols)}
+        self.exchange = SimExchange(candles)
+        for symbol, rows in candles.items():
+            self.exchange.cursor[symbol] = len(rows) - 1
+            self.exchange.prices[symbol] = float(rows[-1, 4])
+        self._saved = {}
+
+    def install(self):
+        bot = self.bot
+        self._saved = {name: getattr(bot, name) for name in (
+            "exchange", "DRY_RUN", "CURRENT_MODE", "active_symbols", "BOT_RUNNING", "bot", "safe_send")}
+        bot.exchange = self.exchange
+        bot.DRY_RUN = True
+        bot.CURRENT_MODE = self.mode
+        bot.active_symbols = list(bot.SYMBOLS)
+        bot.BOT_RUNNING = True
+        bot.bot = None
+        bot.safe_send = lambda text, max_retries=3: False
+
+    def restore(self):
+        for name, value in self._saved.items():
+            setattr(self.bot, name, value)
+
+    @contextmanager
+    def database(self, db_file: str = ":memory:"):
+        """Чистая БД на время кейса (файловая - с реальной стоимостью commit)"""
+        db = self.bot.db
+        saved_file, saved_connection = db.db_file, db._connection
+        db.db_file = db_file
+        db._initialize_database()
+        try:
+            yield db
+        finally:
+            db._connection.close()
+            db.db_file = saved_file
+            db._connection = saved_connection
+            db._cursor = saved_connection.cursor() if saved_connection is not None else None
+
+    def insert_position(self, symbol: str, price: Optional[float] = None):
+        """Открытая DRY_RUN позиция, далекая от SL/TP/частичных выходов - проверка выходов ее не закрывает"""
+        price = price if price is not None else self.exchange.prices[symbol]
+        self.bot.db.execute("""
+            INSERT INTO positions (
+                symbol, trading_mode, strategy, base_amount, open_price, stop_loss, take_profit,
+                quick_exit_price, max_price, min_price, open_time, fee_paid, original_stop_loss,
+                open_timestamp, position_type, leverage, invested_usdt, exchange_order_ids,
+                entry_type, status, risk_multiplier, atr_value, trend_strength, signal_score,
+                risk_reward_ratio
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?, 'OPEN', ?, ?, ?, ?, ?)
+        """, (symbol, self.mode, "bench", 1.0, price, price * 0.5, price * 1.5, price * 1.4, price, price,
+              0.0, price * 0.5, int(_time.time()), "LONG", 1, price, "", "DRY_RUN", 1.0, price * 0.01, 25.0, 80, 3.0))
+
+# ====== ЗАМЕР ======
+def measure(func: Callable, min_time: float = DEFAULT_MIN_TIME, min_rounds: int = 5,
+            max_rounds: int = 100000) -> Dict:
+    """Повторы до min_time секунд (не меньше min_rounds), затем один прогон под tracemalloc"""
+    func()
+    timings = []
+    started = _time.perf_counter()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while len(timings) < max_rounds and (len(timings) < min_rounds or _time.perf_counter() - started < min_time):
+            t0 = _time.perf_counter()
+            func()
+            timings.append(_time.perf_counter() - t0)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    return {
+        "rounds": len(timings),
+        "min_ms": ordered[0] * 1000,
+        "median_ms": median * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] * 1000,
+        "stdev_ms": (statistics.stdev(ordered) if len(ordered) > 1 else 0.0) * 1000,
+        "ops_per_sec": 1.0 / median if median > 0 else float("inf"),
+        "peak_memory_kb": peak / 1024,
+    }
+
+# ====== КЕЙСЫ: СВЕЧИ ======
+for _timeframe, _limit in (("15m", 100), ("1h", 100), ("4h", 50)):
+    def _ohlcv_factory(env, timeframe=_timeframe, limit=_limit):
+        return lambda: env.bot.get_ohlcv_data("BTC/USDT:USDT", timeframe, limit)
+    benchmark(f"get_ohlcv_data[{_timeframe}x{_limit}]", "ohlcv")(_ohlcv_factory)
+
+# ====== КЕЙСЫ: ИНДИКАТОРЫ ======
+def _frame(env, timeframe: str, limit: int) -> pd.DataFrame:
+    return env.bot.get_ohlcv_data("BTC/USDT:USDT", timeframe, limit)
+
+@benchmark("trend.features", "indicators")
+def bench_trend_features(env):
+    """ADX/+DI/-DI, EMA и возраст тренда одним вызовом - как в trend_indicators"""
+    df = _frame(env, "1h", 100)
+    high, low, close = (df[col].to_numpy() for col in ("high", "low", "close"))
+    return lambda: trend_features(high, low, close)[0]
+
+@benchmark("trend.higher_tf_sma", "indicators")
+def bench_higher_sma(env):
+    close = _frame(env, "4h", 50)['close']
+    return lambda: (close.tail(20).mean(), close.tail(50).mean())
+
+@benchmark("volatility.atr", "indicators")
+def bench_atr(env):
+    df = _frame(env, "4h", 50)
+    return lambda: AverageTrueRange(df['high'], df['low'], df['close'], window=14).average_true_range().iloc[-1]
+
+@benchmark("volatility.bollinger", "indicators")
+def bench_bollinger(env):
+    close = _frame(env, "4h", 50)['close']
+    def run():
+        bb = BollingerBands(close, window=20, window_dev=2)
+        return bb.bollinger_hband().iloc[-1], bb.bollinger_lband().iloc[-1], bb.bollinger_mavg().iloc[-1]
+    return run
+
+@benchmark("volatility.hist_volatility", "indicators")
+def bench_hist_volatility(env):
+    close = _frame(env, "4h", 50)['close']
+    return lambda: close.pct_change().dropna().std() * np.sqrt(365) * 100
+
+@benchmark("get_trend_analysis", "indicators")
+def bench_trend_analysis(env):
+    return lambda: env.bot.get_trend_analysis("BTC/USDT:USDT", env.bot.get_current_settings()['timeframe_trend'])
+
+@benchmark("get_volatility_analysis", "indicators")
+def bench_volatility_analysis(env):
+    return lambda: env.bot.get_volatility_analysis("BTC/USDT:USDT", env.bot.get_current_settings()['timeframe_volatility'])
+
+# ====== КЕЙСЫ: ПРИЗНАКИ ТРЕНДА ПАЧКОЙ ======
+def _trend_frames(env, n_symbols: int) -> List[pd.DataFrame]:
+    """Окна 1h x 100 по символам окружения, по кругу до n_symbols"""
+    frames = [env.bot.get_ohlcv_data(symbol, "1h", 100) for symbol in env.symbols[:n_symbols]]
+    return [frames[i % len(frames)] for i in range(n_symbols)]
+
+def _ta_trend(df: pd.DataFrame):
+    """Расчет trend_indicators до trend_features: ta.ADXIndicator, ewm на каждый период, возраст циклом"""
+    indicator = ADXIndicator(df['high'], df['low'], df['close'], window=14)
+    close = df['close']
+    emas = [close.ewm(span=span).mean().iloc[-1] for span in EMA_SPANS]
+    age = 0
+    for i in range(1, min(21, len(close))):
+        if close.iloc[-i] > close.iloc[-i - 1]:
+            age += 1
+        else:
+            break
+    return indicator.adx().iloc[-1], indicator.adx_pos().iloc[-1], indicator.adx_neg().iloc[-1], emas, age
+
+for _count in TREND_SYMBOL_COUNTS:
+    def _ta_trend_factory(env, count=_count):
+        frames = _trend_frames(env, count)
+        return lambda: [_ta_trend(df) for df in frames]
+    # Эталон ta на 10 000 символов - минуты на замер, в обычный прогон не входит
+    benchmark(f"trend_features.ta[{_count}]", "trend_batch", min_rounds=1, slow=_count > 1000)(_ta_trend_factory)
+
+    def _trend_features_factory(env, count=_count):
+        frames = _trend_frames(env, count)
+        high, low, close = (np.column_stack([df[col].to_numpy() for df in frames]) for col in ("high", "low", "close"))
+        return lambda: trend_features(high, low, close)
+    benchmark(f"trend_features[{_count}]", "trend_batch")(_trend_features_factory)
+
+# ====== КЕЙСЫ: АНАЛИЗ И ВЫХОДЫ ======
+@benchmark("analyze_symbol_with_filters", "scan")
+def bench_analyze(env):
+    symbols = list(env.bot.SYMBOLS)
+    state = {"i": 0}
+    def run():
+        symbol = symbols[state["i"] % len(symbols)]
+        state["i"] += 1
+        return env.bot.analyze_symbol_with_filters(symbol)
+    return run
+
+for _count in POSITION_COUNTS:
+    def _exits_factory(env, count=_count):
+        env.stack.enter_context(env.database())
+        for symbol in env.symbols[:count]:
+            env.insert_position(symbol)
+        return env.bot.check_position_exits
+    benchmark(f"check_position_exits[{_count}]", "exits")(_exits_factory)
+
+# ====== КЕЙСЫ: БАЗА ДАННЫХ ======
+@benchmark("db.insert_position", "db")
+def bench_db_insert(env):
+    env.stack.enter_context(env.database(env.db_path("insert")))
+    state = {"i": 0}
+    def run():
+        env.insert_position(env.symbols[state["i"] % len(env.symbols)])
+        state["i"] += 1
+    return run
+
+@benchmark("db.update_max_price", "db")
+def bench_db_update(env):
+    db = env.stack.enter_context(env.database(env.db_path("update")))
+    for symbol in env.symbols[:100]:
+        env.insert_position(symbol)
+    state = {"i": 0}
+    def run():
+        state["i"] += 1
+        db.execute("UPDATE positions SET max_price=? WHERE id=?", (100.0 + state["i"], state["i"] % 100 + 1))
+    return run
+
+@benchmark("db.select_open_positions[100]", "db")
+def bench_db_select(env):
+    env.stack.enter_context(env.database(env.db_path("select")))
+    for symbol in env.symbols[:100]:
+        env.insert_position(symbol)
+    return env.bot.get_open_positions
+
+@benchmark("db.fetchone_by_symbol", "db")
+def bench_db_fetchone(env):
+    db = env.stack.enter_context(env.database(env.db_path("fetchone")))
+    for symbol in env.symbols[:100]:
+        env.insert_position(symbol)
+    symbols = env.symbols[:100]
+    state = {"i": 0}
+    def run():
+        state["i"] += 1
+        return db.fetchone("SELECT id, open_price FROM positions WHERE symbol=? AND status='OPEN'",
+                           (symbols[state["i"] % len(symbols)],))
+    return run
+
+# ====== ЗАПУСК ======
+def run_benchmarks(bot=None, name_filter: Optional[str] = None, min_time: float = DEFAULT_MIN_TIME,
+                   mode: str = "AGGRESSIVE", slow: bool = False) -> Dict:
+    bot = bot or load_bot_module()
+    env = BenchEnvironment(bot, mode=mode)
+    workdir = tempfile.mkdtemp(prefix="bot_bench_")
+    env.db_path = lambda name: os.path.join(workdir, f"{name}.db")
+    results = {}
+    env.install()
+    try:
+        for case in BENCHMARKS:
+            if (name_filter and name_filter not in case["name"]) or (case["slow"] and not slow):
+                continue
+            with ExitStack() as stack:
+                env.stack = stack
+                func = case["factory"](env)
+                result = measure(func, min_time=min_time, min_rounds=case["min_rounds"])
+            result["group"] = case["group"]
+            results[case["name"]] = result
+            logger.info(f"⏱ {case['name']}: {result['median_ms']:.3f} ms median, "
+                        f"{result['ops_per_sec']:.0f} ops/s, peak {result['peak_memory_kb']:.0f} KB")
+    finally:
+        env.restore()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"meta": environment_info(), "results": results}
+
+def environment_info() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except Exception:
+        commit = ""
+    import ta
+    return {
+        "timestamp": int(_time.time()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "ta": getattr(ta, "__version__", ""),
+    }
+
+def compare_to_baseline(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """Отношение медиан и пиков памяти к базовой линии; regression - хуже порога"""
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        time_ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] > 0 else 1.0
+        memory_ratio = (result["peak_memory_kb"] / base["peak_memory_kb"]) if base["peak_memory_kb"] > 0 else 1.0
+        rows.append({
+            "name": name,
+            "baseline_ms": base["median_ms"],
+            "current_ms": result["median_ms"],
+            "time_ratio": time_ratio,
+            "memory_ratio": memory_ratio,
+            "regression": time_ratio > threshold or (
+                memory_ratio > threshold and result["peak_memory_kb"] - base["peak_memory_kb"] > MEMORY_NOISE_KB),
+        })
+    return rows
+
+def print_results(report: Dict, comparison: Optional[List[Dict]] = None):
+    print(f"\n{'='*78}")
+    print(f"⏱ BENCHMARKS v7.2 ({report['meta'].get('commit') or 'no git'}, python {report['meta']['python']})")
+    print(f"{'='*78}")
+    print(f"{'case':<36}{'median ms':>11}{'p95 ms':>10}{'ops/s':>10}{'peak KB':>11}")
+    for name, r in report["results"].items():
+        print(f"{name:<36}{r['median_ms']:>11.3f}{r['p95_ms']:>10.3f}{r['ops_per_sec']:>10.0f}{r['peak_memory_kb']:>11.0f}")
+    if comparison:
+        print(f"\n{'vs baseline':<36}{'base ms':>11}{'now ms':>10}{'time x':>10}{'mem x':>11}")
+        for row in comparison:
+            mark = " ❌" if row["regression"] else ""
+            print(f"{row['name']:<36}{row['baseline_ms']:>11.3f}{row['current_ms']:>10.3f}"
+                  f"{row['time_ratio']:>10.2f}{row['memory_ratio']:>11.2f}{mark}")
+    print(f"{'='*78}\n")
+
+# ====== CLI ======
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей бота v7.2")
+    parser.add_argument("-k", "--filter", help="только кейсы, содержащие подстроку")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="секунд на кейс")
+    parser.add_argument("--mode", default="AGGRESSIVE")
+    parser.add_argument("--save", help="сохранить результаты как JSON (базовая линия)")
+    parser.add_argument("--compare", help="JSON базовой линии для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое замедление/рост памяти (1.25 = +25%%)")
+    parser.add_argument("--slow", action="store_true", help="включить медленные кейсы (ta на 10 000 символов)")
+    parser.add_argument("--list", action="store_true", help="показать кейсы и выйти")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for case in BENCHMARKS:
+            print(f"{case['group']:<12}{case['name']}{'  (--slow)' if case['slow'] else ''}")
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = run_benchmarks(name_filter=args.filter, min_time=args.min_time, mode=args.mode, slow=args.slow)
+
+    comparison = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare_to_baseline(report, baseline, args.threshold)
+        differs = [field for field in MACHINE_FIELDS
+                   if baseline.get("meta", {}).get(field) != report["meta"].get(field)]
+        if differs:
+            print(f"⚠️ Базовая линия снята в другом окружении ({', '.join(differs)}): времена несопоставимы")
+    print_results(report, comparison)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Результаты сохранены в {args.save}")
+
+    if comparison and any(row["regression"] for row in comparison):
+        print(f"❌ Регрессия больше x{args.threshold}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
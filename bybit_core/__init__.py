@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+BYBIT CORE v7.2 - СТРАТЕГИЯ, ИНДИКАТОРЫ, РАЗМЕР ПОЗИЦИИ И РИСК БЕЗ ПОБОЧНЫХ ЭФФЕКТОВ
+Импорт пакета не трогает логирование, БД, биржу и Telegram и не тянет pandas/ta:
+подмодули загружаются при первом обращении. Внешние зависимости передаются явно через CoreContext.
+
+    from bybit_core import CoreContext, analyze_symbol_with_filters
+    ctx = CoreContext(exchange=exchange, db=db, notifier=send, mode="AGGRESSIVE")
+    signal = analyze_symbol_with_filters(ctx, "BTC/USDT:USDT")
+"""
+
+import importlib
+
+__version__ = "7.2"
+
+_SUBMODULES = ("candles", "config", "context", "correlation", "features", "indicators", "resample", "risk", "shadow", "strategy", "universe")
+
+# Имя -> подмодуль, из которого оно экспортируется
+_EXPORTS = {
+    "TRADING_MODES": "config",
+    "SYMBOLS": "config",
+    "SYMBOL_CATEGORIES": "config",
+    "TAKER_FEE": "config",
+    "MAKER_FEE": "config",
+    "MIN_TRADE_USDT": "config",
+    "get_settings": "config",
+    "safe_float_convert": "config",
+    "timeframe_ms": "config",
+    "CoreContext": "context",
+    "new_filter_stats": "context",
+    "merge_filter_stats": "context",
+    "count_filter": "context",
+    "CandleSeries": "candles",
+    "RollingCorrelation": "correlation",
+    "CorrelationSnapshot": "correlation",
+    "trend_features": "features",
+    "ohlcv_frame": "indicators",
+    "trend_indicators": "indicators",
+    "volatility_indicators": "indicators",
+    "entry_indicators": "indicators",
+    "resample_ohlcv": "resample",
+    "get_trend_analysis": "strategy",
+    "get_volatility_analysis": "strategy",
+    "calculate_adaptive_score": "strategy",
+    "analyze_symbol_with_filters": "strategy",
+    "SymbolFeatures": "strategy",
+    "evaluate_mode": "strategy",
+    "evaluate_modes": "strategy",
+    "calculate_position_size": "risk",
+    "allocate_signals": "risk",
+    "commission_filter": "risk",
+    "validate_risk_reward": "risk",
+    "calculate_pnl_percent": "risk",
+    "select_universe": "universe",
+}
+
+__all__ = list(_SUBMODULES) + list(_EXPORTS)
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f"{__name__}.{_EXPORTS[name]}"), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
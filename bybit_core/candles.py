@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Свечи колонками: ответ ccxt (список списков) -> типизированные массивы numpy за один проход"""
+
+from typing import List
+
+import numpy as np
+
+from bybit_core.config import safe_float_convert
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+class CandleSeries:
+    """timestamp - int64 (n,), values - float64 (n, 5) одним блоком в порядке PRICE_COLUMNS.
+    Колонки (open, close, ...) - представления блока, без копий"""
+
+    __slots__ = ("timestamp", "values")
+
+    def __init__(self, timestamp: np.ndarray, values: np.ndarray):
+        self.timestamp = timestamp
+        self.values = values
+
+    @classmethod
+    def from_ohlcv(cls, rows: List, validate: bool = True) -> "CandleSeries":
+        """[[ts, o, h, l, c, v], ...] -> CandleSeries. None, NaN и нечисловое в ценах и объеме -> 0.0
+        (как safe_float_convert); validate - ValueError на неупорядоченных временах или high < low"""
+        try:
+            data = np.array(rows, dtype=np.float64)
+        except (TypeError, ValueError):
+            # Строки вроде "n/a" в ответе - медленный путь по ячейкам, только для таких ответов
+            data = np.array([[safe_float_convert(x, np.nan) for x in row[:6]] for row in rows], dtype=np.float64)
+        if data.ndim != 2 or data.shape[1] < 6:
+            raise ValueError(f"OHLCV rows must have 6 columns, got shape {data.shape}")
+
+        timestamp = data[:, 0]
+        if not np.isfinite(timestamp).all():
+            raise ValueError("OHLCV timestamp is missing")
+        # Колонка за колонкой подряд в памяти: индикаторы читают по колонкам
+        values = np.asfortranarray(data[:, 1:6])
+        values[~np.isfinite(values)] = 0.0
+
+        series = cls(timestamp.astype(np.int64), values)
+        if validate:
+            series.validate()
+        return series
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def validate(self):
+        """Времена строго по возрастанию, high >= low"""
+        if len(self.timestamp) > 1 and not (np.diff(self.timestamp) > 0).all():
+            raise ValueError("OHLCV timestamps are not strictly increasing")
+        bad = np.flatnonzero(self.high < self.low)
+        if len(bad):
+            raise ValueError(f"OHLCV high < low in {len(bad)} candles (first at {int(self.timestamp[bad[0]])})")
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.values[:, 0]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.values[:, 1]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.values[:, 2]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.values[:, 3]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self.values[:, 4]
+
+    def frame(self):
+        """DataFrame поверх тех же массивов (без копии) - для кода на pandas/ta"""
+        import pandas as pd
+        columns = {'timestamp': self.timestamp}
+        columns.update((name, self.values[:, i]) for i, name in enumerate(PRICE_COLUMNS))
+        return pd.DataFrame(columns, copy=False)
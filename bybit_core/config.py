@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""Настройки стратегии v7.2: комиссии, символы и режимы TRADING_MODES (только данные, без импорта зависимостей)"""
+
+from typing import Dict, Optional
+
+# КОМИССИИ BYBIT
+TAKER_FEE = 0.0006  # 0.06%
+MAKER_FEE = 0.0002  # 0.02%
+
+# СИМВОЛЫ (ограничиваем для фокусировки)
+SYMBOLS = [
+    "BTC/USDT:USDT", "ETH/USDT:USDT", "BNB/USDT:USDT", "SOL/USDT:USDT"
+]
+
+# Настройки для разных категорий символов
+SYMBOL_CATEGORIES = {
+    "BTC/USDT:USDT": {"volatility": "LOW", "risk_multiplier": 1.0, "min_trade_usdt": 20.0},
+    "ETH/USDT:USDT": {"volatility": "LOW", "risk_multiplier": 1.0, "min_trade_usdt": 15.0},
+    "BNB/USDT:USDT": {"volatility": "MEDIUM", "risk_multiplier": 0.8, "min_trade_usdt": 10.0},
+    "SOL/USDT:USDT": {"volatility": "HIGH", "risk_multiplier": 0.6, "min_trade_usdt": 8.0},
+}
+
+# ====== НАСТРОЙКИ С БАЛАНСИРОВАННЫМИ ФИЛЬТРАМИ ======
+TRADING_MODES = {
+    "ULTRA_CONSERVATIVE": {
+        "name": "🟣 УЛЬТРА-КОНСЕРВАТИВНЫЙ",
+        "type": "trend_correction",
+        "scan_interval": 300,
+        "exit_check_interval": 30,
+        "status_interval": 600,
+        "sync_interval": 1800,
+        "max_trades": 1,
+        "trade_pct": 0.03,
+        
+        # Таймфреймы
+        "timeframe_entry": "15m",
+        "timeframe_trend": "1h",
+        "timeframe_volatility": "4h",
+        
+        # Риск-менеджмент
+        "max_stop_loss": 0.006,
+        "take_profit": 0.018,
+        "quick_exit": 0.012,
+        "min_risk_reward": 2.5,
+        
+        # Фильтры тренда
+        "min_trend_strength": 25,
+        "max_trend_age": 30,  # Увеличено
+        "require_trend_alignment": True,
+        "require_trend_confirmation": True,  # Для этого режима оставляем
+        
+        # RSI фильтры
+        "rsi_range_long": (28, 72),
+        "rsi_range_short": (28, 72),
+        
+        # Фильтры объема
+        "volume_multiplier": 1.5,
+        "min_volume_score": 15,
+        
+        # Фильтры волатильности
+        "max_atr_percentage": 0.08,
+        "min_atr_percentage": 0.015,
+        "bb_width_min": 0.012,
+        
+        # Общий фильтр
+        "min_score": 90,
+        "adaptive_scoring": True,
+        
+        # Лимиты
+        "cooldown": 3600,
+        "max_daily_trades_per_symbol": 1,
+        "max_weekly_trades": 5,
+        
+        # Стратегия
+        "strategy": "HYBRID_TREND_CORRECTION",
+        "risk_level": "VERY_LOW",
+        
+        # Trailing stop
+        "trailing_stop_activation": 0.010,
+        "trailing_stop_distance": 0.005,
+        "trailing_stop_update_frequency": 0.002,
+        
+        # Адаптивные настройки
+        "adaptive_sl": True,
+        "adaptive_tp": True,
+        "adaptive_position_sizing": True,
+        
+        # Частичный выход
+        "partial_exit_enabled": True,
+        "partial_exit_1": 0.010,
+        "partial_exit_2": 0.015,
+        "partial_exit_pct_1": 0.25,
+        "partial_exit_pct_2": 0.25,
+        
+        # Технические параметры
+        "leverage": 2,
+        "use_exchange_orders": True,
+        "use_market_entry": False,
+        "use_market_exit": False,
+        "limit_order_timeout": 180,
+        "commission_filter": True,
+        "commission_requirement": 0.5,
+    },
+    
+    "CONSERVATIVE": {
+        "name": "🟡 КОНСЕРВАТИВНЫЙ",
+        "type": "trend_correction",
+        "scan_interval": 180,
+        "exit_check_interval": 20,
+        "status_interval": 300,
+        "sync_interval": 1800,
+        "max_trades": 2,
+        "trade_pct": 0.05,
+        
+        "timeframe_entry": "15m",
+        "timeframe_trend": "1h",
+        "timeframe_volatility": "4h",
+        
+        "max_stop_loss": 0.008,
+        "take_profit": 0.024,
+        "quick_exit": 0.015,
+        "min_risk_reward": 2.5,
+        
+        "min_trend_strength": 20,  # Снижено с 22
+        "max_trend_age": 25,  # Увеличено
+        "require_trend_alignment": True,
+        "require_trend_confirmation": True,  # Оставляем для консервативного
+        
+        "rsi_range_long": (25, 75),
+        "rsi_range_short": (25, 75),
+        
+        "volume_multiplier": 1.3,
+        "min_volume_score": 12,
+        
+        "max_atr_percentage": 0.09,
+        "min_atr_percentage": 0.015,
+        "bb_width_min": 0.010,
+        
+        "min_score": 85,
+        "adaptive_scoring": True,
+        
+        "cooldown": 1800,
+        "max_daily_trades_per_symbol": 2,
+        "max_weekly_trades": 8,
+        
+        "strategy": "HYBRID_TREND_CORRECTION",
+        "risk_level": "LOW",
+        
+        "trailing_stop_activation": 0.012,
+        "trailing_stop_distance": 0.006,
+        "trailing_stop_update_frequency": 0.0025,
+        
+        "adaptive_sl": True,
+        "adaptive_tp": True,
+        "adaptive_position_sizing": True,
+        
+        "partial_exit_enabled": True,
+        "partial_exit_1": 0.012,
+        "partial_exit_2": 0.020,
+        "partial_exit_pct_1": 0.3,
+        "partial_exit_pct_2": 0.3,
+        
+        "leverage": 3,
+        "use_exchange_orders": True,
+        "use_market_entry": False,
+        "use_market_exit": False,
+        "limit_order_timeout": 120,
+        "commission_filter": True,
+        "commission_requirement": 0.5,
+    },
+    
+    "AGGRESSIVE": {
+        "name": "🟢 АГРЕССИВНЫЙ",
+        "type": "trend_correction",
+        "scan_interval": 120,
+        "exit_check_interval": 15,
+        "status_interval": 180,
+        "sync_interval": 1800,
+        "max_trades": 3,
+        "trade_pct": 0.08,
+        
+        "timeframe_entry": "15m",
+        "timeframe_trend": "30m",
+        "timeframe_volatility": "2h",
+        
+        "max_stop_loss": 0.010,
+        "take_profit": 0.030,
+        "quick_exit": 0.018,
+        "min_risk_reward": 2.0,
+        
+        "min_trend_strength": 12,  # Было 16 (СНИЖЕНО!)
+        "allowed_trends_for_long": ["BULLISH", "WEAK_BULLISH", "VERY_WEAK_BULLISH"],  # НОВОЕ!
+        "allowed_trends_for_short": ["BEARISH", "WEAK_BEARISH", "VERY_WEAK_BEARISH"],  # НОВОЕ!
+        "max_trend_age": 20,  # Увеличено с 15
+        "require_trend_alignment": False,  # ИСПРАВЛЕНО: False для агрессивного
+        "require_trend_confirmation": False,  # Уже было False
+        
+        "rsi_range_long": (22, 78),
+        "rsi_range_short": (22, 78),
+        
+        "volume_multiplier": 0.8,
+        "min_volume_score": 8,
+        
+        "max_atr_percentage": 0.10,
+        "min_atr_percentage": 0.008,
+        "bb_width_min": 0.006,
+        
+        "min_score": 75,  # Снижено с 80
+        "adaptive_scoring": True,
+        
+        "cooldown": 1200,
+        "max_daily_trades_per_symbol": 3,
+        "max_weekly_trades": 12,
+        
+        "strategy": "HYBRID_TREND_CORRECTION",
+        "risk_level": "MEDIUM",
+        
+        "trailing_stop_activation": 0.015,
+        "trailing_stop_distance": 0.008,
+        "trailing_stop_update_frequency": 0.003,
+        
+        "adaptive_sl": True,
+        "adaptive_tp": True,
+        "adaptive_position_sizing": True,
+        
+        "partial_exit_enabled": True,
+        "partial_exit_1": 0.015,
+        "partial_exit_2": 0.025,
+        "partial_exit_pct_1": 0.35,
+        "partial_exit_pct_2": 0.35,
+        
+        "leverage": 4,
+        "use_exchange_orders": True,
+        "use_market_entry": False,
+        "use_market_exit": False,
+        "limit_order_timeout": 90,
+        "commission_filter": True,
+        "commission_requirement": 0.3,
+    }
+}
+
+# Минимальные настройки
+MIN_TRADE_USDT = 10.0
+
+# Фильтры воронки analyze_symbol_with_filters / open_position (ключи filter_stats["filtered_by"])
+FILTER_NAMES = (
+    "position_already_open", "cooldown", "weekly_limit", "trend_not_confirmed", "weak_trend",
+    "old_trend", "trend_direction_not_allowed", "high_volatility", "low_volatility",
+    "rsi_out_of_range", "low_volume", "low_bb_width", "macd_not_aligned", "low_score",
+    "commission_filter", "risk_reward", "price_not_at_key_level", "adaptive_sl_tp_failed",
+)
+
+def get_settings(mode: str, trading_modes: Optional[Dict] = None) -> Dict:
+    """Настройки режима; неизвестный режим - CONSERVATIVE, как в боте"""
+    modes = TRADING_MODES if trading_modes is None else trading_modes
+    return modes.get(mode, modes["CONSERVATIVE"])
+
+TIMEFRAME_UNITS_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+def timeframe_ms(timeframe: str) -> int:
+    """15m -> 900000"""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS_MS[timeframe[-1]]
+
+def safe_float_convert(value, default=0.0):
+    """Число из ответа биржи/БД; None и нечисловое - default (здесь, а не в indicators: боту нужна без pandas)"""
+    try:
+        if value is None:
+            return default
+        return float(value)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Зависимости ядра: биржа, БД, уведомления, режим и часы - явно, через CoreContext"""
+
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from bybit_core import config
+
+def new_filter_stats(now: Optional[float] = None) -> Dict:
+    """Пустая статистика воронки фильтров"""
+    return {
+        "total_signals": 0,
+        "filtered_by": {name: 0 for name in config.FILTER_NAMES},
+        "passed_filters": 0,
+        "signals_by_symbol": {},
+        "last_reset": time.time() if now is None else now
+    }
+
+def merge_filter_stats(into: Dict, stats: Dict) -> Dict:
+    """Счетчики stats (например, из другого процесса) - в into; last_reset у into свой"""
+    into["total_signals"] += stats["total_signals"]
+    into["passed_filters"] += stats["passed_filters"]
+    for name, count in stats["filtered_by"].items():
+        into["filtered_by"][name] = into["filtered_by"].get(name, 0) + count
+    for symbol, counts in stats["signals_by_symbol"].items():
+        target = into["signals_by_symbol"].setdefault(symbol, {"total": 0, "passed": 0})
+        target["total"] += counts["total"]
+        target["passed"] += counts["passed"]
+    return into
+
+def count_filter(stats: Dict, symbol: str, filter_name: Optional[str] = None, passed: bool = False):
+    """Результат фильтра в статистику воронки (без filter_name и passed - ничего)"""
+    if not (filter_name or passed):
+        return
+    stats["total_signals"] += 1
+    by_symbol = stats["signals_by_symbol"].setdefault(symbol, {"total": 0, "passed": 0})
+    by_symbol["total"] += 1
+    if passed:
+        stats["passed_filters"] += 1
+        by_symbol["passed"] += 1
+    else:
+        stats["filtered_by"][filter_name] = stats["filtered_by"].get(filter_name, 0) + 1
+
+class _NullStageTimer:
+    __slots__ = ()
+
+    def lap(self, step: str):
+        pass
+
+class CoreContext:
+    """Все внешние эффекты функций ядра идут через этот объект:
+    exchange - ccxt-совместимый клиент (fetch_ohlcv), db - execute/fetchone/fetchall как у DatabaseManager,
+    notifier - callable(text) -> bool, clock - объект с time()/sleep()/perf_counter() (модуль time по умолчанию).
+    Методы можно переопределить в наследнике (бот, бэктест, бенчмарки)."""
+
+    max_retries = 3
+    retry_delay = 1.0
+    min_candles = 20
+
+    def __init__(self, exchange=None, db=None, notifier: Optional[Callable[[str], bool]] = None,
+                 mode: str = "AGGRESSIVE", trading_modes: Optional[Dict] = None,
+                 symbol_categories: Optional[Dict] = None, clock=None,
+                 logger: Optional[logging.Logger] = None):
+        self.exchange = exchange
+        self.db = db
+        self.notifier = notifier
+        self.mode = mode
+        self.trading_modes = config.TRADING_MODES if trading_modes is None else trading_modes
+        self.symbol_categories = config.SYMBOL_CATEGORIES if symbol_categories is None else symbol_categories
+        self.clock = clock or time
+        self.logger = logger or logging.getLogger("bybit_core")
+        self.filter_stats = new_filter_stats(self.clock.time())
+
+    @property
+    def settings(self) -> Dict:
+        return config.get_settings(self.mode, self.trading_modes)
+
+    def time(self) -> float:
+        return self.clock.time()
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock.time())
+
+    # ---- биржа ----
+    def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 100) -> List:
+        """Свечи; ошибка биржи - повтор с экспоненциальной паузой, меньше min_candles - []"""
+        for attempt in range(self.max_retries):
+            try:
+                data = self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+            except Exception as e:
+                self.logger.warning(f"⚠️ OHLCV fetch failed for {symbol}: {e}")
+                if attempt < self.max_retries - 1:
+                    self.clock.sleep(self.retry_delay * (2 ** attempt))
+                continue
+            if not data or len(data) < self.min_candles:
+                self.logger.warning(f"⚠️ Insufficient OHLCV data for {symbol}: {len(data) if data else 0} candles")
+                return []
+            return data
+        return []
+
+    def get_ohlcv_data(self, symbol: str, timeframe: str, limit: int):
+        from bybit_core.indicators import ohlcv_frame
+        ohlcv = self.fetch_ohlcv(symbol, timeframe, limit)
+        if not ohlcv:
+            return None
+        try:
+            return ohlcv_frame(ohlcv)
+        except Exception as e:
+            self.logger.error(f"❌ Dataframe creation error for {symbol}: {e}")
+            return None
+
+    # ---- анализ (точки подмены для кэширования в бэктесте) ----
+    def trend_analysis(self, symbol: str, timeframe: str) -> Dict:
+        from bybit_core.strategy import get_trend_analysis
+        return get_trend_analysis(self, symbol, timeframe)
+
+    def volatility_analysis(self, symbol: str, timeframe: str) -> Dict:
+        from bybit_core.strategy import get_volatility_analysis
+        return get_volatility_analysis(self, symbol, timeframe)
+
+    # ---- позиции и лимиты (БД) ----
+    def is_position_open(self, symbol: str) -> bool:
+        from bybit_core.risk import is_position_already_open
+        return is_position_already_open(self, symbol)
+
+    def in_cooldown(self, symbol: str) -> bool:
+        from bybit_core.risk import is_in_cooldown
+        return is_in_cooldown(self, symbol)
+
+    def weekly_limit_reached(self) -> bool:
+        from bybit_core.risk import check_weekly_limit
+        return check_weekly_limit(self)
+
+    # ---- наблюдаемость ----
+    def record_filter(self, symbol: str, filter_name: Optional[str] = None, passed: bool = False):
+        """Учет результата фильтра в filter_stats (без filter_name и passed - ничего)"""
+        count_filter(self.filter_stats, symbol, filter_name, passed)
+
+    def observe(self, stage: str, seconds: float, **labels):
+        pass
+
+    def stage_timer(self, stage: str):
+        return _NullStageTimer()
+
+    def notify(self, text: str) -> bool:
+        return bool(self.notifier(text)) if self.notifier else False
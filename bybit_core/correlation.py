@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""Скользящая корреляция лог-доходностей закрытых свечей между символами.
+Строка доходностей на свечу: попарные суммы (n, n) обновляются внешними произведениями строки,
+вошедшей в окно, и вышедшей из него - O(n²) на свечу, а не на скан. Матрица корреляций считается
+по суммам при обращении и кэшируется до следующей свечи. Пропуски (нет свечи у символа) учитываются
+попарно: пара считается только по свечам, где есть оба символа"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from bybit_core.config import timeframe_ms
+
+class RollingCorrelation:
+    """Окно window последних доходностей по symbols на таймфрейме timeframe.
+    observe() - закрытые свечи символа (строки ccxt), advance() - перенос собранных свечей в окно"""
+
+    def __init__(self, symbols: Iterable[str], timeframe: str, window: int = 96,
+                 min_periods: Optional[int] = None):
+        if window < 2:
+            raise ValueError(f"window must be >= 2, got {window}")
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_ms(timeframe)
+        self.window = window
+        self.min_periods = min_periods if min_periods is not None else max(window // 2, 2)
+        self.symbols: List[str] = []
+        self._index: Dict[str, int] = {}
+        # Время свечи -> цены закрытия по символам (NaN - свечи еще нет), пока не перенесены в окно
+        self._pending: Dict[int, np.ndarray] = {}
+        self.last_ts = 0
+        self.updates = 0
+        self._last_valid = 0
+        self._corr: Optional[np.ndarray] = None
+        self._allocate(list(dict.fromkeys(symbols)))
+
+    def _allocate(self, symbols: List[str]):
+        n = len(symbols)
+        self.symbols = symbols
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+        self._returns = np.zeros((self.window, n))
+        self._valid = np.zeros((self.window, n), dtype=bool)
+        self._last_close = np.full(n, np.nan)
+        # Время последней закрытой свечи, переданной в observe, по символам (0 - не было)
+        self._seen = np.zeros(n, dtype=np.int64)
+        self._pos = 0
+        self._recompute()
+
+    def set_symbols(self, symbols: Iterable[str]):
+        """Новый состав (смена вселенной): история оставшихся символов сохраняется, суммы пересчитываются"""
+        symbols = list(dict.fromkeys(symbols))
+        if symbols == self.symbols:
+            return
+        returns, valid, last_close, seen, index = self._returns, self._valid, self._last_close, self._seen, self._index
+        self._allocate(symbols)
+        keep = [(i, index[s]) for i, s in enumerate(symbols) if s in index]
+        if keep:
+            new, old = map(list, zip(*keep))
+            self._returns[:, new] = returns[:, old]
+            self._valid[:, new] = valid[:, old]
+            self._last_close[new] = last_close[old]
+            self._seen[new] = seen[old]
+        self._pending = {ts: self._remap(closes, index) for ts, closes in self._pending.items()}
+        self._recompute()
+
+    def _remap(self, closes: np.ndarray, old_index: Dict[str, int]) -> np.ndarray:
+        row = np.full(len(self.symbols), np.nan)
+        for symbol, i in self._index.items():
+            if symbol in old_index:
+                row[i] = closes[old_index[symbol]]
+        return row
+
+    # ---- данные ----
+    def observe(self, symbol: str, rows: List, now_ms: int):
+        """Закрытые к now_ms свечи символа, еще не попавшие в окно (незакрытая последняя отбрасывается)"""
+        i = self._index.get(symbol)
+        if i is None or not rows:
+            return
+        closed_before = now_ms - self.timeframe_ms
+        for row in reversed(rows):
+            if row[0] <= closed_before:
+                self._seen[i] = max(self._seen[i], int(row[0]))
+                break
+        # При первом заполнении хватает window + 1 свечей: доходности всего окна
+        oldest = self.last_ts or closed_before - (self.window + 1) * self.timeframe_ms
+        # С конца до уже известных свечей: в обычном скане это одна-две строки
+        for row in reversed(rows):
+            ts = int(row[0])
+            if ts <= oldest:
+                break
+            if ts <= closed_before and row[4] and row[4] > 0:
+                closes = self._pending.get(ts)
+                if closes is None:
+                    closes = self._pending[ts] = np.full(len(self.symbols), np.nan)
+                closes[i] = float(row[4])
+
+    def missing(self, now_ms: int) -> List[str]:
+        """Символы без последней закрытой к now_ms свечи: их свечи не проходили через observe
+        (символ не сканировался) - догружаются отдельно, иначе в окне пропуски"""
+        last_closed = now_ms // self.timeframe_ms * self.timeframe_ms - self.timeframe_ms
+        return [self.symbols[i] for i in np.flatnonzero(self._seen < last_closed)]
+
+    def advance(self) -> int:
+        """Собранные свечи - в окно по порядку времени. Последняя переносится, когда по ней есть
+        не меньше символов, чем было в предыдущей свече (остальные успеют догрузиться к следующему скану).
+        Возвращает число новых свечей"""
+        if not self._pending:
+            return 0
+        times = sorted(self._pending)
+        newest = self._pending[times[-1]]
+        if int(np.count_nonzero(~np.isnan(newest))) < self._last_valid:
+            times = times[:-1]
+        if not times:
+            return 0
+        # Длинная догрузка (первое заполнение, простой) - окно целиком пересчитывается один раз
+        bulk = len(times) >= max(self.window // 4, 2)
+        for ts in times:
+            self._push(ts, self._pending.pop(ts), incremental=not bulk)
+        if bulk:
+            self._recompute()
+        return len(times)
+
+    def _push(self, ts: int, closes: np.ndarray, incremental: bool = True):
+        valid_close = ~np.isnan(closes)
+        self._last_valid = int(np.count_nonzero(valid_close))
+        if self.last_ts and ts - self.last_ts != self.timeframe_ms:
+            # Разрыв (бот стоял): доходность через разрыв не сопоставима с соседними
+            self._last_close[:] = np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = np.log(closes / self._last_close)
+        valid = valid_close & np.isfinite(returns)
+        returns = np.where(valid, returns, 0.0)
+        self._last_close = np.where(valid_close, closes, np.nan)
+        self.last_ts = ts
+
+        pos = self._pos
+        if incremental:
+            self._update(np.stack([returns, self._returns[pos]]), np.stack([valid, self._valid[pos]]))
+        self._returns[pos] = returns
+        self._valid[pos] = valid
+        self._pos = (pos + 1) % self.window
+        self.updates += 1
+        self._corr = None
+        # Периодический полный пересчет - накопленная ошибка сложений и вычитаний не растет
+        if incremental and self.updates % self.window == 0:
+            self._recompute()
+
+    # Знаки строк в _update: вошедшая в окно прибавляется, вышедшая - вычитается
+    _SIGNS = np.array([[1.0], [-1.0]])
+
+    def _update(self, returns: np.ndarray, valid: np.ndarray):
+        """Вклад вошедшей (строка 0) и вышедшей (строка 1) свечей в попарные суммы: произведения
+        матриц (2, n) - одно обновление ранга 2 на каждую сумму"""
+        v = valid.astype(np.float64)
+        signed_v = self._SIGNS * v
+        self._n += v.T @ signed_v
+        self._sx += returns.T @ signed_v
+        self._sxx += (returns * returns).T @ signed_v
+        self._sxy += returns.T @ (self._SIGNS * returns)
+
+    def _recompute(self):
+        """Попарные суммы по всему окну: n[i, j] - свечей с обоими символами, sx[i, j] / sxx[i, j] -
+        сумма доходностей / квадратов i по этим свечам, sxy - сумма произведений"""
+        v = self._valid.astype(np.float64)
+        r = self._returns
+        self._n = v.T @ v
+        self._sx = r.T @ v
+        self._sxx = (r * r).T @ v
+        self._sxy = r.T @ r
+        self._corr = None
+
+    # ---- чтение ----
+    def matrix(self) -> np.ndarray:
+        """Корреляции (n, n); меньше min_periods общих свечей или нулевая дисперсия - NaN"""
+        if self._corr is None:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                n = self._n
+                mean_x = self._sx / n
+                mean_y = mean_x.T
+                cov = self._sxy / n - mean_x * mean_y
+                var_x = self._sxx / n - mean_x * mean_x
+                var_y = var_x.T
+                corr = cov / np.sqrt(var_x * var_y)
+            corr[(n < self.min_periods) | ~np.isfinite(corr)] = np.nan
+            self._corr = np.clip(corr, -1.0, 1.0, out=corr)
+        return self._corr
+
+    def correlation(self, a: str, b: str) -> float:
+        i, j = self._index.get(a), self._index.get(b)
+        if i is None or j is None:
+            return float("nan")
+        return float(self.matrix()[i, j])
+
+    def top_pairs(self, limit: int = 10, symbols: Optional[Iterable[str]] = None) -> List[Tuple[str, str, float]]:
+        """Пары с наибольшей по модулю корреляцией (среди symbols, по умолчанию - все)"""
+        if symbols is None:
+            idx = np.arange(len(self.symbols))
+        else:
+            idx = np.array([self._index[s] for s in symbols if s in self._index], dtype=np.int64)
+        if len(idx) < 2:
+            return []
+        sub = self.matrix()[np.ix_(idx, idx)]
+        rows, cols = np.triu_indices(len(idx), k=1)
+        values = sub[rows, cols]
+        keep = np.flatnonzero(~np.isnan(values))
+        order = keep[np.argsort(-np.abs(values[keep]), kind="stable")[:limit]]
+        return [(self.symbols[idx[rows[k]]], self.symbols[idx[cols[k]]], float(values[k])) for k in order]
+
+    def neighbours(self, symbol: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Символы, сильнее всего (по модулю) коррелирующие с symbol"""
+        i = self._index.get(symbol)
+        if i is None:
+            return []
+        row = self.matrix()[i].copy()
+        row[i] = np.nan
+        keep = np.flatnonzero(~np.isnan(row))
+        order = keep[np.argsort(-np.abs(row[keep]), kind="stable")[:limit]]
+        return [(self.symbols[k], float(row[k])) for k in order]
+
+    def exposure(self, symbol: str, position_type: str, others: Iterable[Tuple[str, str]]) -> float:
+        """Наибольшая корреляция с учетом направления с позициями others [(символ, LONG/SHORT)]:
+        LONG и SHORT по коррелирующим символам - хедж (отрицательная величина), не дубль"""
+        return CorrelationSnapshot(self.symbols, self.matrix()).exposure(symbol, position_type, others)
+
+    def snapshot(self) -> "CorrelationSnapshot":
+        """Копия текущей матрицы: читается без блокировки, пока трекер обновляется"""
+        return CorrelationSnapshot(self.symbols, self.matrix().copy())
+
+    def coverage(self) -> Dict:
+        """Состояние окна: символов, свечей в окне, символов с достаточной историей, время последней свечи"""
+        filled = min(self.updates, self.window)
+        counts = self._valid.sum(axis=0) if len(self.symbols) else np.zeros(0)
+        return {"symbols": len(self.symbols), "candles": filled,
+                "ready": int((counts >= self.min_periods).sum()), "last_ts": self.last_ts,
+                "pending": len(self._pending)}
+
+class CorrelationSnapshot:
+    """Матрица корреляций (n, n) по symbols, зафиксированная на момент снимка"""
+
+    def __init__(self, symbols: List[str], matrix: np.ndarray):
+        self.symbols = list(symbols)
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._matrix = matrix
+
+    def exposure(self, symbol: str, position_type: str, others: Iterable[Tuple[str, str]]) -> float:
+        """Как RollingCorrelation.exposure"""
+        i = self._index.get(symbol)
+        if i is None:
+            return 0.0
+        row = self._matrix[i]
+        best = 0.0
+        for other, other_type in others:
+            j = self._index.get(other)
+            if j is None or j == i or np.isnan(row[j]):
+                continue
+            best = max(best, float(row[j]) * (1 if other_type == position_type else -1))
+        return best
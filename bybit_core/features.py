@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Индикаторы на последней свече окна сразу по многим окнам (символам или шагам бэктеста):
+окна по времени (limit, n) - строка = свеча, столбец = окно. Те же рекурсии и порядок операций,
+что в pandas/ta, - результат совпадает с ними до бита"""
+
+from typing import Tuple
+
+import numpy as np
+
+# ====== ИНДИКАТОРЫ (последняя точка окна, формулы pandas/ta) ======
+def ewm_last(x: np.ndarray, alpha: float, adjust: bool) -> np.ndarray:
+    """Series.ewm(alpha).mean().iloc[-1] по столбцам - тот же порядок операций, что в pandas.
+    alpha-столбец (k, 1) - k таких EMA за один проход, результат (k, n)"""
+    alpha = np.asarray(alpha, dtype=np.float64)
+    old_wt_factor = 1.0 - alpha
+    new_wt = 1.0 if adjust else alpha
+    weighted = np.broadcast_to(x[0], np.broadcast_shapes(alpha.shape, x[0].shape)).copy()
+    old_wt = 1.0
+    for cur in x[1:]:
+        old_wt = old_wt * old_wt_factor
+        total = old_wt + new_wt
+        updated = old_wt * weighted
+        updated += cur if adjust else new_wt * cur
+        updated /= total
+        np.copyto(weighted, updated, where=weighted != cur)
+        old_wt = total if adjust else 1.0
+    return weighted
+
+def rsi_last(close: np.ndarray, window: int = 14) -> np.ndarray:
+    diff = np.diff(close, axis=0)
+    zeros = np.zeros((1, close.shape[1]))
+    up = np.concatenate([zeros, np.where(diff > 0, diff, 0.0)])
+    down = np.concatenate([zeros, -np.where(diff < 0, diff, 0.0)])
+    emaup = ewm_last(up, 1 / window, adjust=False)
+    emadn = ewm_last(down, 1 / window, adjust=False)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn)))
+
+def macd_histogram_last(close: np.ndarray, fast: int = 12, slow: int = 26, sign: int = 9) -> np.ndarray:
+    """MACD(12, 26, 9): линии по всему окну, сигнальная - с первой валидной точки MACD"""
+    a_fast, a_slow = 2 / (fast + 1), 2 / (slow + 1)
+    ema_fast = close[0].copy()
+    ema_slow = close[0].copy()
+    macd = np.zeros_like(close)
+    for c in range(1, len(close)):
+        cur = close[c]
+        ema_fast = np.where(ema_fast != cur, ((1 - a_fast) * ema_fast + a_fast * cur) / ((1 - a_fast) + a_fast), ema_fast)
+        ema_slow = np.where(ema_slow != cur, ((1 - a_slow) * ema_slow + a_slow * cur) / ((1 - a_slow) + a_slow), ema_slow)
+        macd[c] = ema_fast - ema_slow
+    signal = ewm_last(macd[slow - 1:], 2 / (sign + 1), adjust=False)
+    return macd[-1] - signal
+
+def bollinger_last(close: np.ndarray, window: int = 20, window_dev: int = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    tail = close[-window:]
+    mavg = tail.mean(axis=0)
+    mstd = tail.std(axis=0)
+    return mavg + window_dev * mstd, mavg - window_dev * mstd, mavg
+
+def _true_range(high: np.ndarray, low: np.ndarray, prev_close: np.ndarray) -> np.ndarray:
+    return np.maximum(np.maximum(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+def atr_prefix(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """ATR (ta.volatility.AverageTrueRange) на последней строке окна"""
+    tr = np.empty_like(high)
+    tr[0] = high[0] - low[0]
+    tr[1:] = _true_range(high[1:], low[1:], close[:-1])
+    atr = tr[:window].mean(axis=0)
+    for cur in tr[window:]:
+        atr = (atr * (window - 1) + cur) / float(window)
+    return atr
+
+def atr_step(atr: np.ndarray, prev_close: np.ndarray, high: np.ndarray, low: np.ndarray,
+             window: int = 14) -> np.ndarray:
+    """Продление ATR на одну свечу"""
+    return (atr * (window - 1) + _true_range(high, low, prev_close)) / float(window)
+
+def atr_last(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    return atr_step(atr_prefix(high[:-1], low[:-1], close[:-1], window), close[-2], high[-1], low[-1], window)
+
+def _safe_percent(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """100 * (a / b), 0 где b == 0 (как в ta)"""
+    if denominator.all():
+        return 100 * (numerator / denominator)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, 100 * (numerator / denominator), 0.0)
+
+def adx_prefix(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> Tuple[np.ndarray, ...]:
+    """Состояние рекурсий ta.trend.ADXIndicator для окна без последней свечи: (trs, dip, din, adx).
+    Окно из L строк дает сглаживания по свече L-1 и ADX по DX[0..L-window-1]"""
+    prev_close = close[:-1]
+    tr = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+    diff_up = high[1:] - high[:-1]
+    diff_down = low[:-1] - low[1:]
+    pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+    neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+
+    # Строка c в tr/pos/neg соответствует свече c + 1; три сглаживания Уайлдера идут одним массивом
+    moves = np.stack([tr, pos, neg], axis=1)
+    n_dx = len(close) - window
+    smoothed = np.empty((n_dx,) + moves.shape[1:])
+    smoothed[0] = moves[:window].sum(axis=0)
+    for i in range(1, n_dx):
+        prev = smoothed[i - 1]
+        smoothed[i] = prev - (prev / float(window)) + moves[window + i - 1]
+
+    trs, dip, din = smoothed[:, 0], smoothed[:, 1], smoothed[:, 2]
+    plus_di, minus_di = _safe_percent(dip, trs), _safe_percent(din, trs)
+    directional_index = np.abs(_safe_percent(plus_di - minus_di, plus_di + minus_di))
+    trs, dip, din = trs[-1], dip[-1], din[-1]
+
+    adx = directional_index[:window].mean(axis=0)
+    for i in range(window + 1, n_dx + 1):
+        adx = ((adx * (window - 1)) + directional_index[i - 1]) / float(window)
+    return trs, dip, din, adx
+
+def adx_step(state: Tuple[np.ndarray, ...], prev_high: np.ndarray, prev_low: np.ndarray, prev_close: np.ndarray,
+             high: np.ndarray, low: np.ndarray, window: int = 14) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Последняя свеча окна: ADX, +DI, -DI"""
+    trs, dip, din, adx = state
+    tr = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+    diff_up = high - prev_high
+    diff_down = prev_low - low
+    pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+    neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+    trs = trs - (trs / float(window)) + tr
+    dip = dip - (dip / float(window)) + pos
+    din = din - (din / float(window)) + neg
+    plus_di, minus_di = _safe_percent(dip, trs), _safe_percent(din, trs)
+    directional_index = np.abs(_safe_percent(plus_di - minus_di, plus_di + minus_di))
+    adx = ((adx * (window - 1)) + directional_index) / float(window)
+    return adx, plus_di, minus_di
+
+def adx_last(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ADX, +DI, -DI на последней свече окна - повторяет рекурсии ta.trend.ADXIndicator"""
+    state = adx_prefix(high[:-1], low[:-1], close[:-1], window)
+    return adx_step(state, high[-2], low[-2], close[-2], high[-1], low[-1], window)
+
+def trend_age(close: np.ndarray, max_age: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+    """Подряд растущие / падающие свечи с конца окна (не больше 20, как в get_trend_analysis)"""
+    diff = np.diff(close[-(max_age + 1):], axis=0)[::-1]
+    age_up = np.cumprod(diff > 0, axis=0).sum(axis=0)
+    age_down = np.cumprod(diff < 0, axis=0).sum(axis=0)
+    return age_up, age_down
+
+# ====== ПРИЗНАКИ ТРЕНДА ======
+EMA_SPANS = (9, 21, 50, 200)
+
+TREND_FEATURES = np.dtype([
+    ("adx", np.float64), ("plus_di", np.float64), ("minus_di", np.float64),
+    *((f"ema_{span}", np.float64) for span in EMA_SPANS),
+    ("age_up", np.int16), ("age_down", np.int16),
+])
+
+def trend_features(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """ADX/+DI/-DI, EMA 9/21/50/200 и серии растущих/падающих закрытий (до 20) по окнам (limit,) или (limit, n):
+    одна запись TREND_FEATURES на окно. Значения - как у ta.trend.ADXIndicator, Series.ewm(span).mean()
+    и trend_indicators; окно короче 2 * window - ValueError (ta падает на таком же)"""
+    high, low, close = (np.asarray(x, dtype=np.float64) for x in (high, low, close))
+    if close.ndim == 1:
+        high, low, close = high[:, None], low[:, None], close[:, None]
+    if len(close) < 2 * window:
+        raise ValueError(f"ADX({window}) needs at least {2 * window} candles, got {len(close)}")
+
+    record = np.empty(close.shape[1], dtype=TREND_FEATURES)
+    record["adx"], record["plus_di"], record["minus_di"] = adx_last(high, low, close, window)
+    emas = ewm_last(close, 2 / (np.array(EMA_SPANS)[:, None] + 1), adjust=True)
+    for span, ema in zip(EMA_SPANS, emas):
+        record[f"ema_{span}"] = ema
+    record["age_up"], record["age_down"] = trend_age(close)
+    return record
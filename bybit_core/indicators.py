@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Индикаторы стратегии v7.2 над DataFrame свечей (без обращения к бирже и БД)"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from ta.trend import MACD
+from ta.momentum import RSIIndicator
+from ta.volatility import BollingerBands, AverageTrueRange
+
+from bybit_core.candles import CandleSeries
+from bybit_core.features import EMA_SPANS, trend_features
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+BULLISH_TRENDS = ["BULLISH", "WEAK_BULLISH", "VERY_WEAK_BULLISH"]
+BEARISH_TRENDS = ["BEARISH", "WEAK_BEARISH", "VERY_WEAK_BEARISH"]
+
+def ohlcv_frame(ohlcv: List) -> pd.DataFrame:
+    """Свечи биржи -> DataFrame поверх CandleSeries; нечисловые значения цен и объема -> 0.0,
+    неупорядоченные времена и high < low - ValueError"""
+    return CandleSeries.from_ohlcv(ohlcv).frame()
+
+# ====== ТРЕНД ======
+def trend_direction(adx: float, plus_di: float, minus_di: float) -> str:
+    """Направление и сила тренда по ADX и +DI/-DI"""
+    if adx > 25:
+        return "BULLISH" if plus_di > minus_di else "BEARISH"
+    if adx > 18:
+        return "WEAK_BULLISH" if plus_di > minus_di else "WEAK_BEARISH"
+    if adx > 12:
+        return "VERY_WEAK_BULLISH" if plus_di > minus_di else "VERY_WEAK_BEARISH"
+    return "NEUTRAL"
+
+def trend_indicators(df: pd.DataFrame) -> Dict:
+    """ADX, +DI/-DI, EMA 9/21/50/200, направление, согласованность EMA и возраст тренда
+    (возраст - подряд закрытия по направлению, до 20 свечей)"""
+    features = trend_features(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())[0]
+    adx, plus_di, minus_di = features['adx'], features['plus_di'], features['minus_di']
+    ema_9, ema_21, ema_50, ema_200 = (features[f'ema_{span}'] for span in EMA_SPANS)
+
+    direction = trend_direction(adx, plus_di, minus_di)
+
+    ema_aligned = False
+    age = 0
+    if direction in BULLISH_TRENDS:
+        ema_aligned = ema_9 > ema_21 > ema_50
+        age = int(features['age_up'])
+    elif direction in BEARISH_TRENDS:
+        ema_aligned = ema_9 < ema_21 < ema_50
+        age = int(features['age_down'])
+
+    return {
+        "strength": adx,
+        "direction": direction,
+        "age": age,
+        "ema_aligned": ema_aligned,
+        "plus_di": plus_di,
+        "minus_di": minus_di,
+        "ema_9": ema_9,
+        "ema_21": ema_21,
+        "ema_50": ema_50,
+        "ema_200": ema_200
+    }
+
+def higher_timeframe_confirms(df_higher: Optional[pd.DataFrame], direction: str) -> bool:
+    """SMA20 против SMA50 старшего ТФ с допуском 1%; мало данных - подтверждено"""
+    if df_higher is None or len(df_higher) <= 20:
+        return True
+    sma_20_higher = df_higher['close'].tail(20).mean()
+    sma_50_higher = df_higher['close'].tail(50).mean()
+    if direction in BULLISH_TRENDS:
+        return sma_20_higher > sma_50_higher * 0.99
+    if direction in BEARISH_TRENDS:
+        return sma_20_higher < sma_50_higher * 1.01
+    return True
+
+# ====== ВОЛАТИЛЬНОСТЬ ======
+def volatility_rank(hist_volatility: float) -> str:
+    if hist_volatility > 80:
+        return "VERY_HIGH"
+    if hist_volatility > 60:
+        return "HIGH"
+    if hist_volatility > 40:
+        return "MEDIUM"
+    return "LOW"
+
+def volatility_indicators(df: pd.DataFrame) -> Dict:
+    """ATR (в % от цены), ширина Bollinger и годовая историческая волатильность"""
+    current_price = df['close'].iloc[-1]
+
+    atr_indicator = AverageTrueRange(df['high'], df['low'], df['close'], window=14)
+    atr = atr_indicator.average_true_range().iloc[-1]
+    atr_percentage = (atr / current_price) * 100 if current_price > 0 else 0
+
+    bb = BollingerBands(df['close'], window=20, window_dev=2)
+    bb_upper = bb.bollinger_hband().iloc[-1]
+    bb_lower = bb.bollinger_lband().iloc[-1]
+    bb_middle = bb.bollinger_mavg().iloc[-1]
+    bb_width = ((bb_upper - bb_lower) / bb_middle) * 100 if bb_middle > 0 else 0
+
+    returns = df['close'].pct_change().dropna()
+    hist_volatility = returns.std() * np.sqrt(365) * 100 if len(returns) > 0 else 0
+
+    return {
+        "atr": atr,
+        "atr_percentage": atr_percentage,
+        "bb_width": bb_width,
+        "hist_volatility": hist_volatility,
+        "volatility_rank": volatility_rank(hist_volatility),
+        "current_price": current_price,
+        "bb_upper": bb_upper,
+        "bb_lower": bb_lower,
+        "bb_middle": bb_middle
+    }
+
+# ====== ВХОДНОЙ ТАЙМФРЕЙМ ======
+def entry_indicators(df: pd.DataFrame) -> Dict:
+    """RSI, объем к SMA20, MACD, Bollinger (ширина - доля, не %), EMA 20/50"""
+    close = df['close']
+    current_price = close.iloc[-1]
+    rsi = RSIIndicator(close, window=14).rsi().iloc[-1]
+
+    current_volume = df['volume'].iloc[-1]
+    volume_sma = df['volume'].tail(20).mean()
+    volume_ratio = current_volume / volume_sma if volume_sma > 0 else 1
+
+    macd = MACD(close)
+    macd_line = macd.macd().iloc[-1]
+    macd_signal = macd.macd_signal().iloc[-1]
+
+    bb = BollingerBands(close, window=20, window_dev=2)
+    bb_upper = bb.bollinger_hband().iloc[-1]
+    bb_lower = bb.bollinger_lband().iloc[-1]
+    bb_middle = bb.bollinger_mavg().iloc[-1]
+    bb_width = ((bb_upper - bb_lower) / bb_middle) if bb_middle != 0 else 0
+
+    return {
+        "current_price": current_price,
+        "rsi": rsi,
+        "volume_ratio": volume_ratio,
+        "macd_histogram": macd_line - macd_signal,
+        "bb_upper": bb_upper,
+        "bb_lower": bb_lower,
+        "bb_middle": bb_middle,
+        "bb_width": bb_width,
+        "price_position": (current_price - bb_lower) / (bb_upper - bb_lower + 1e-9),
+        "ema_20": close.ewm(span=20).mean().iloc[-1],
+        "ema_50": close.ewm(span=50).mean().iloc[-1],
+    }
+
+def price_range(df: pd.DataFrame) -> float:
+    """Диапазон High-Low к средней цене закрытия (боковик - меньше 3%)"""
+    return (df['high'].max() - df['low'].min()) / df['close'].mean()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Свечи старших таймфреймов из базового (15m -> 30m/1h/2h/4h/1d) с выравниванием как у Bybit"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from bybit_core.config import timeframe_ms
+
+# Bybit начинает свечи до суток включительно от полуночи UTC (кратно от эпохи),
+# недельные - с понедельника: эпоха (1970-01-01) - четверг, сдвиг 4 дня
+WEEK_OFFSET_MS = 4 * 86_400_000
+
+def _offset_ms(timeframe: str) -> int:
+    return WEEK_OFFSET_MS if timeframe.endswith("w") else 0
+
+def bucket_start(timestamps: np.ndarray, timeframe: str) -> np.ndarray:
+    """Время открытия свечи timeframe, в которую попадает каждая метка"""
+    step = timeframe_ms(timeframe)
+    offset = _offset_ms(timeframe)
+    return (timestamps - offset) // step * step + offset
+
+def can_resample(base_timeframe: str, timeframe: str) -> bool:
+    """timeframe собирается из целого числа базовых свечей и границы совпадают"""
+    try:
+        base_ms, target_ms = timeframe_ms(base_timeframe), timeframe_ms(timeframe)
+    except (KeyError, ValueError):
+        return False
+    if target_ms <= base_ms or target_ms % base_ms:
+        return False
+    # Недельная свеча с понедельника - из дневных и мельче; базовый шаг должен делить сдвиг недели
+    return WEEK_OFFSET_MS % base_ms == 0 if timeframe.endswith("w") else True
+
+def base_limit(base_timeframe: str, timeframe: str, limit: int) -> int:
+    """Сколько базовых свечей нужно на limit старших (+1 старшая: первая в окне может быть неполной)"""
+    return (limit + 1) * (timeframe_ms(timeframe) // timeframe_ms(base_timeframe))
+
+def resample_ohlcv(rows: List, timeframe: str) -> List[List[float]]:
+    """Агрегация свечей ccxt ([ts, o, h, l, c, v], по возрастанию) в timeframe:
+    open первой, max high, min low, close последней, сумма volume.
+    Первая свеча, обрезанная началом окна, отбрасывается; последняя (текущая, незакрытая) остается -
+    как и у биржи, она собрана из уже прошедших базовых свечей"""
+    if not rows:
+        return []
+    data = np.asarray(rows, dtype=np.float64)
+    timestamps = data[:, 0].astype(np.int64)
+    buckets = bucket_start(timestamps, timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(data)] - 1
+
+    result = np.column_stack([
+        data[starts, 1],
+        np.maximum.reduceat(data[:, 2], starts),
+        np.minimum.reduceat(data[:, 3], starts),
+        data[ends, 4],
+        np.add.reduceat(data[:, 5], starts),
+    ])
+    opens = buckets[starts]
+    first = 1 if timestamps[0] != opens[0] else 0
+    return [[int(ts), *values] for ts, values in zip(opens[first:].tolist(), result[first:].tolist())]
+
+def compare_candles(resampled: List, reference: List, rel_tol: float = 1e-9) -> Dict:
+    """Сверка собранных свечей со свечами биржи по совпадающим временам открытия"""
+    ours = {int(row[0]): row for row in resampled}
+    theirs = {int(row[0]): row for row in reference}
+    common = sorted(set(ours) & set(theirs))
+    max_price_diff = max_volume_diff = 0.0
+    mismatched: List[int] = []
+    for ts in common:
+        a, b = ours[ts], theirs[ts]
+        price_diff = max(abs(a[i] - b[i]) / max(abs(b[i]), 1e-12) for i in range(1, 5))
+        volume_diff = abs(a[5] - b[5]) / max(abs(b[5]), 1e-12)
+        max_price_diff = max(max_price_diff, price_diff)
+        max_volume_diff = max(max_volume_diff, volume_diff)
+        if price_diff > rel_tol or volume_diff > rel_tol:
+            mismatched.append(ts)
+    return {
+        "compared": len(common),
+        "missing": len(set(theirs) - set(ours)),
+        "mismatched": len(mismatched),
+        "first_mismatch": mismatched[0] if mismatched else None,
+        "max_price_diff": max_price_diff,
+        "max_volume_diff": max_volume_diff,
+    }
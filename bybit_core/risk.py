@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""Размер позиции, SL/TP, фильтры комиссий и risk/reward, лимиты входа (БД через контекст),
+распределение сигналов скана по свободным слотам"""
+
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from bybit_core import config
+
+# ====== ЛИМИТЫ ВХОДА ======
+# Без БД в контексте (анализ, бэктест по сигналам) лимиты не действуют
+def is_position_already_open(ctx, symbol: str) -> bool:
+    if ctx.db is None:
+        return False
+    try:
+        row = ctx.db.fetchone("SELECT COUNT(*) FROM positions WHERE symbol=? AND status='OPEN'", (symbol,))
+        return row[0] > 0 if row else False
+    except Exception as e:
+        ctx.logger.error(f"❌ Position check error for {symbol}: {e}")
+        return False
+
+def is_in_cooldown(ctx, symbol: str) -> bool:
+    """Пауза после закрытия сделки по символу; после 3 убытков подряд - вдвое дольше"""
+    if ctx.db is None:
+        return False
+    try:
+        row = ctx.db.fetchone("SELECT last_closed_ts, consecutive_losses FROM symbol_cooldown WHERE symbol=?", (symbol,))
+        if not row or not row[0]:
+            return False
+
+        last_closed = row[0]
+        consecutive_losses = row[1] or 0
+        cooldown = ctx.settings['cooldown']
+
+        if consecutive_losses >= 3:
+            cooldown *= 2
+
+        elapsed = ctx.time() - last_closed
+        in_cooldown = elapsed < cooldown
+
+        if in_cooldown:
+            ctx.logger.debug(f"⏹️ {symbol} in cooldown, {cooldown - elapsed:.0f}s remaining")
+
+        return in_cooldown
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Cooldown check error: {e}")
+        return False
+
+def week_start(today) -> str:
+    """Понедельник текущей недели (ключ weekly_limits)"""
+    return (today - timedelta(days=today.weekday())).strftime('%Y-%m-%d')
+
+def weekly_trade_count(ctx) -> int:
+    """Сделок, открытых за текущую неделю (без БД - 0)"""
+    if ctx.db is None:
+        return 0
+    row = ctx.db.fetchone(
+        "SELECT trade_count FROM weekly_limits WHERE week_start=?",
+        (week_start(ctx.now()),)
+    )
+    return row[0] if row else 0
+
+def check_weekly_limit(ctx) -> bool:
+    if ctx.db is None:
+        return False
+    try:
+        weekly_limit = ctx.settings.get('max_weekly_trades', 99)
+        current_count = weekly_trade_count(ctx)
+
+        if current_count >= weekly_limit:
+            ctx.logger.info(f"⏹️ Weekly trade limit reached: {current_count}/{weekly_limit}")
+            return True
+
+        return False
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Weekly limit check error: {e}")
+        return False
+
+# ====== РАЗМЕР ПОЗИЦИИ ======
+def score_multiplier(signal_score: int) -> float:
+    if signal_score >= 100:
+        return 1.2
+    if signal_score >= 90:
+        return 1.1
+    if signal_score >= 80:
+        return 1.0
+    if signal_score >= 70:
+        return 0.9
+    return 0.8
+
+def calculate_position_size(ctx, symbol: str, signal_score: int, available_usdt: float) -> float:
+    """Доля trade_pct с множителем по score (не больше 5% баланса); меньше минимума символа - 0"""
+    try:
+        total_pct = min(ctx.settings['trade_pct'] * score_multiplier(signal_score), 0.05)
+        position_usdt = available_usdt * total_pct
+
+        min_trade = ctx.symbol_categories.get(symbol, {}).get("min_trade_usdt", config.MIN_TRADE_USDT)
+        if position_usdt < min_trade:
+            ctx.logger.info(f"⏹️ Position too small for {symbol}: {position_usdt:.2f} < {min_trade}")
+            return 0
+
+        ctx.logger.info(f"📏 Position size for {symbol}: {total_pct*100:.1f}% = {position_usdt:.2f} USDT")
+
+        return position_usdt
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Position size calculation error: {e}")
+        return available_usdt * 0.03
+
+# ====== РАСПРЕДЕЛЕНИЕ СИГНАЛОВ ======
+def allocate_signals(signals: List[Dict], free_slots: int, available_usdt: float,
+                     position_usdt: Callable[[Dict, float], float], leverage: float = 1,
+                     held: Iterable[str] = (),
+                     conflicts: Optional[Callable[[Dict, List[Dict]], bool]] = None,
+                     rank: Optional[Callable[[Dict], float]] = None) -> List[Tuple[Dict, float]]:
+    """Сигналы скана к открытию: [(сигнал, объем USDT)] по убыванию rank(сигнал) (по умолчанию - score).
+    Не больше free_slots, один сигнал на символ, символы из held (открытые позиции) пропускаются.
+    Объем - position_usdt(сигнал, остаток баланса), 0 - сигнал не проходит по размеру;
+    маржа (объем / плечо) вычитается из остатка, следующие сигналы считаются от него.
+    conflicts(сигнал, уже выбранные) -> True - сигнал пропускается (например, по корреляции)"""
+    chosen: List[Tuple[Dict, float]] = []
+    taken = set(held)
+    remaining = available_usdt
+    for signal in sorted(signals, key=rank or (lambda s: s['score']), reverse=True):
+        if len(chosen) >= free_slots or remaining <= 0:
+            break
+        if signal['symbol'] in taken:
+            continue
+        if conflicts is not None and conflicts(signal, [s for s, _ in chosen]):
+            continue
+        usdt = position_usdt(signal, remaining)
+        if usdt <= 0 or usdt / leverage > remaining:
+            continue
+        chosen.append((signal, usdt))
+        taken.add(signal['symbol'])
+        remaining -= usdt / leverage
+    return chosen
+
+# ====== SL / TP ======
+def sl_tp_prices(price: float, position_type: str, stop_loss_pct: float, take_profit_pct: float,
+                 quick_exit_pct: float = 0.0) -> Tuple[float, float, float]:
+    """(stop_loss, take_profit, quick_exit) в цене по долям от цены входа"""
+    if position_type == 'LONG':
+        return price * (1 - stop_loss_pct), price * (1 + take_profit_pct), price * (1 + quick_exit_pct)
+    return price * (1 + stop_loss_pct), price * (1 - take_profit_pct), price * (1 - quick_exit_pct)
+
+def adaptive_sl_tp_pct(settings: Dict, signal: Dict) -> Tuple[float, float]:
+    """SL по ATR сигнала (adaptive_sl), TP по силе тренда (adaptive_tp); иначе - из настроек"""
+    if settings.get('adaptive_sl', False):
+        volatility_multiplier = signal.get('atr_percentage', 1.0) / 100
+        max_stop_loss = settings['max_stop_loss'] * min(volatility_multiplier * 2, 1.5)
+    else:
+        max_stop_loss = settings['max_stop_loss']
+
+    if settings.get('adaptive_tp', False):
+        take_profit = settings['take_profit'] * min(signal.get('trend_strength', 20) / 25, 1.5)
+    else:
+        take_profit = settings['take_profit']
+    return max_stop_loss, take_profit
+
+def risk_reward_ratio(entry_price: float, stop_loss: float, take_profit: float, position_type: str) -> float:
+    """Прибыль до TP / убыток до SL; SL не с той стороны - 0"""
+    if position_type == 'LONG':
+        risk, reward = entry_price - stop_loss, take_profit - entry_price
+    else:
+        risk, reward = stop_loss - entry_price, entry_price - take_profit
+    return reward / risk if risk > 0 else 0.0
+
+# ====== ФИЛЬТРЫ ======
+def round_trip_fee_pct(settings: Dict) -> float:
+    """Комиссии входа и выхода в % от объема (рыночный ордер - taker, лимитный - maker)"""
+    entry_fee_pct = config.TAKER_FEE * 100 if settings.get('use_market_entry', False) else config.MAKER_FEE * 100
+    exit_fee_pct = config.TAKER_FEE * 100 if settings.get('use_market_exit', False) else config.MAKER_FEE * 100
+    return entry_fee_pct + exit_fee_pct
+
+def commission_filter(ctx, symbol: str, entry_price: float, take_profit: float,
+                      position_type: str, trade_amount_usdt: float) -> bool:
+    """Потенциальная прибыль до TP должна покрывать комиссии входа/выхода + commission_requirement"""
+    try:
+        if position_type == "LONG":
+            potential_profit_pct = (take_profit - entry_price) / entry_price * 100
+        else:
+            potential_profit_pct = (entry_price - take_profit) / entry_price * 100
+
+        settings = ctx.settings
+        total_fee_pct = round_trip_fee_pct(settings)
+
+        required_profit = total_fee_pct + settings.get('commission_requirement', 1.0)
+
+        passes = potential_profit_pct > required_profit
+
+        if not passes:
+            ctx.logger.info(f"⏹️ Commission filter failed for {symbol}: "
+                            f"Profit {potential_profit_pct:.2f}% < Required {required_profit:.2f}%")
+            ctx.record_filter(symbol, "commission_filter", False)
+
+        return passes
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Commission filter error: {e}")
+        return False
+
+def validate_risk_reward(ctx, entry_price: float, stop_loss: float, take_profit: float,
+                         position_type: str) -> Tuple[bool, float]:
+    try:
+        if position_type == 'LONG':
+            risk = entry_price - stop_loss
+            reward = take_profit - entry_price
+        else:
+            risk = stop_loss - entry_price
+            reward = entry_price - take_profit
+
+        if risk <= 0:
+            ctx.logger.error(f"❌ Invalid risk calculation: risk={risk}")
+            return False, 0
+
+        risk_reward_ratio = reward / risk
+        min_risk_reward = ctx.settings.get('min_risk_reward', 2.0)
+
+        passes = risk_reward_ratio >= min_risk_reward
+
+        if not passes:
+            ctx.logger.info(f"⏹️ Risk/Reward filter failed: {risk_reward_ratio:.2f} < {min_risk_reward}")
+            ctx.record_filter("", "risk_reward", False)
+
+        return passes, risk_reward_ratio
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Risk/Reward validation error: {e}")
+        return False, 0
+
+# ====== PNL ======
+def calculate_pnl_percent(open_price: float, close_price: float, position_type: str, leverage: int = 1) -> float:
+    """PnL в % от маржи (с плечом, без комиссий)"""
+    if position_type == 'LONG':
+        price_change_pct = (close_price - open_price) / open_price
+    else:
+        price_change_pct = (open_price - close_price) / open_price
+    return price_change_pct * leverage * 100
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""Теневые конфигурации: режим с правками порогов оценивается на тех же признаках символа
+(strategy.SymbolFeatures), что и живой, без записей в БД и на бирже. Лучший сигнал скана
+открывает гипотетическую позицию в памяти, дальше - те же правила выхода, что у бота:
+быстрый выход, частичные выходы, трейлинг, SL/TP"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from bybit_core import config
+from bybit_core.context import count_filter, new_filter_stats
+from bybit_core.risk import (adaptive_sl_tp_pct, calculate_pnl_percent, risk_reward_ratio,
+                             round_trip_fee_pct, sl_tp_prices, week_start)
+from bybit_core.strategy import SymbolFeatures, evaluate_mode
+
+def parse_overrides(base: Dict, items: Iterable[str]) -> Dict:
+    """["min_score=70", "rsi_range_long=30,60", "adaptive_sl=false"] -> правки с типами как в base;
+    неизвестный ключ или нечитаемое значение - ValueError"""
+    overrides = {}
+    for item in items:
+        key, sep, raw = item.partition("=")
+        key = key.strip()
+        if not sep or key not in base:
+            raise ValueError(f"Unknown setting {key!r}")
+        current = base[key]
+        try:
+            if isinstance(current, bool):
+                if raw.lower() not in ("1", "0", "true", "false", "yes", "no", "on", "off"):
+                    raise ValueError(raw)
+                value = raw.lower() in ("1", "true", "yes", "on")
+            elif isinstance(current, (tuple, list)):
+                value = type(current)(type(current[0])(part) for part in raw.split(","))
+                if len(value) != len(current):
+                    raise ValueError(raw)
+            elif isinstance(current, int):
+                value = int(raw)
+            elif isinstance(current, float):
+                value = float(raw)
+            else:
+                value = raw
+        except (TypeError, ValueError, IndexError):
+            raise ValueError(f"Bad value for {key}: {raw!r}") from None
+        overrides[key] = value
+    return overrides
+
+class ShadowConfig:
+    """Одна теневая конфигурация: настройки (режим + правки), своя воронка, гипотетические позиции
+    и закрытые сделки. Лимиты входа (позиция, кулдаун, недельный лимит, max_trades) - свои"""
+
+    def __init__(self, name: str, mode: str, overrides: Optional[Dict] = None,
+                 trading_modes: Optional[Dict] = None, now: float = 0.0):
+        modes = config.TRADING_MODES if trading_modes is None else trading_modes
+        if mode not in modes:
+            raise ValueError(f"Unknown mode {mode!r}")
+        self.name = name
+        self.mode = mode
+        self.overrides = dict(overrides or {})
+        self.settings = {**modes[mode], **self.overrides}
+        self.created = now
+        self.filter_stats = new_filter_stats(now)
+        self.positions: Dict[str, Dict] = {}
+        self.closed: List[Dict] = []
+        self.pending: List[Dict] = []
+        self._cooldown: Dict[str, tuple] = {}  # символ -> (время закрытия, убытков подряд)
+        self._weekly: Dict[str, int] = {}
+
+    # ---- скан ----
+    def _blocked(self, symbol: str, now: float) -> Optional[str]:
+        if symbol in self.positions:
+            return "position_already_open"
+        closed_at, losses = self._cooldown.get(symbol, (0.0, 0))
+        cooldown = self.settings['cooldown'] * (2 if losses >= 3 else 1)
+        if closed_at and now - closed_at < cooldown:
+            return "cooldown"
+        if self._weekly.get(week_start(datetime.fromtimestamp(now)), 0) >= self.settings.get('max_weekly_trades', 99):
+            return "weekly_limit"
+        return None
+
+    def evaluate(self, features: SymbolFeatures, now: float) -> Optional[Dict]:
+        """Воронка конфигурации по признакам символа; прошедший сигнал - в кандидаты скана"""
+        if self._blocked(features.symbol, now) is not None:
+            return self.add_result(features.symbol, None, None, now)
+        return self.add_result(features.symbol, *evaluate_mode(features, self.mode, self.settings), now)
+
+    def add_result(self, symbol: str, signal: Optional[Dict], filter_name: Optional[str],
+                   now: float) -> Optional[Dict]:
+        """Итог evaluate_mode(features, mode, settings), посчитанный вне конфигурации (воркер
+        шардированного скана); позиция, кулдаун и недельный лимит проверяются здесь"""
+        blocked = self._blocked(symbol, now)
+        if blocked is not None:
+            signal, filter_name = None, blocked
+        count_filter(self.filter_stats, symbol, filter_name, passed=signal is not None)
+        if signal:
+            self.pending.append(signal)
+        return signal
+
+    def finish_scan(self, now: float) -> Optional[Dict]:
+        """Как у бота: после скана открывается только лучший по score сигнал"""
+        pending, self.pending = self.pending, []
+        if not pending or len(self.positions) >= self.settings['max_trades']:
+            return None
+        return self.open_position(max(pending, key=lambda s: s['score']), now)
+
+    def open_position(self, signal: Dict, now: float) -> Optional[Dict]:
+        """SL/TP и проверки risk/reward и комиссий как в open_position бота; не прошло - None"""
+        settings = self.settings
+        symbol, price, position_type = signal['symbol'], signal['price'], signal['signal_type']
+
+        base_stop_loss, base_take_profit, _ = sl_tp_prices(price, position_type, settings['max_stop_loss'],
+                                                           settings['take_profit'])
+        min_risk_reward = settings.get('min_risk_reward', 2.0)
+        if risk_reward_ratio(price, base_stop_loss, base_take_profit, position_type) < min_risk_reward:
+            count_filter(self.filter_stats, symbol, "risk_reward")
+            return None
+
+        max_stop_loss, take_profit = adaptive_sl_tp_pct(settings, signal)
+        stop_loss, take_profit_price, quick_exit_price = sl_tp_prices(
+            price, position_type, max_stop_loss, take_profit, settings.get('quick_exit', 0))
+        if settings.get('commission_filter', False):
+            potential_profit_pct = abs(take_profit_price - price) / price * 100
+            if not potential_profit_pct > round_trip_fee_pct(settings) + settings.get('commission_requirement', 1.0):
+                count_filter(self.filter_stats, symbol, "commission_filter")
+                return None
+        if risk_reward_ratio(price, stop_loss, take_profit_price, position_type) < min_risk_reward:
+            count_filter(self.filter_stats, symbol, "adaptive_sl_tp_failed")
+            return None
+
+        position = {
+            "symbol": symbol, "position_type": position_type, "open_price": price, "score": signal['score'],
+            "stop_loss": stop_loss, "take_profit": take_profit_price, "quick_exit_price": quick_exit_price,
+            "max_price": price, "min_price": price, "trailing_active": 0,
+            "partial_exit_1": 0, "partial_exit_2": 0,
+            # Доля позиции, оставшаяся после частичных выходов, и PnL (% маржи) уже закрытых частей
+            "remaining": 1.0, "realized_pnl": 0.0, "open_time": now,
+        }
+        self.positions[symbol] = position
+        week = week_start(datetime.fromtimestamp(now))
+        self._weekly[week] = self._weekly.get(week, 0) + 1
+        return position
+
+    # ---- выходы ----
+    def _trail(self, position: Dict, price: float):
+        """update_trailing_stop бота без БД"""
+        settings = self.settings
+        activation = settings.get('trailing_stop_activation', 0)
+        if not activation:
+            return
+        distance = settings['trailing_stop_distance']
+        if position['position_type'] == 'LONG':
+            max_price = max(position['max_price'], price)
+            new_stop = max_price * (1 - distance)
+            if not position['trailing_active']:
+                if (max_price - position['open_price']) / position['open_price'] >= activation and new_stop > position['stop_loss']:
+                    position.update(stop_loss=new_stop, trailing_active=1, max_price=max_price)
+            elif new_stop > position['stop_loss'] * (1 + settings['trailing_stop_update_frequency']):
+                position.update(stop_loss=new_stop, max_price=max_price)
+        else:
+            min_price = min(position['min_price'], price)
+            new_stop = min_price * (1 + distance)
+            if not position['trailing_active']:
+                if (position['open_price'] - min_price) / position['open_price'] >= activation and new_stop < position['stop_loss']:
+                    position.update(stop_loss=new_stop, trailing_active=1, min_price=min_price)
+            elif new_stop < position['stop_loss'] * (1 - settings['trailing_stop_update_frequency']):
+                position.update(stop_loss=new_stop, min_price=min_price)
+
+    def _partial_exit(self, position: Dict, price: float) -> bool:
+        settings = self.settings
+        if not settings.get('partial_exit_enabled', False):
+            return False
+        open_price = position['open_price']
+        profit_pct = (price - open_price) / open_price if position['position_type'] == 'LONG' else (open_price - price) / open_price
+        for level in ("partial_exit_1", "partial_exit_2"):
+            if profit_pct >= settings[level] and not position[level]:
+                part = position['remaining'] * settings[f"partial_exit_pct_{level[-1]}"]
+                position['realized_pnl'] += part * calculate_pnl_percent(open_price, price, position['position_type'],
+                                                                         settings['leverage'])
+                position['remaining'] -= part
+                position[level] = 1
+                return True
+        return False
+
+    def update(self, symbol: str, price: float, now: float) -> Optional[Dict]:
+        """Проверка выходов позиции по цене, порядок как в check_position_exits; закрытая сделка или None"""
+        position = self.positions.get(symbol)
+        if position is None or price <= 0:
+            return None
+        position_type = position['position_type']
+        long = position_type == 'LONG'
+
+        quick_exit_price = position['quick_exit_price']
+        if self.settings.get('quick_exit', 0) > 0 and quick_exit_price > 0 and \
+                (price >= quick_exit_price if long else price <= quick_exit_price):
+            return self.close(symbol, price, "QUICK_EXIT", now)
+        if self._partial_exit(position, price):
+            return None
+        self._trail(position, price)
+
+        if price <= position['stop_loss'] if long else price >= position['stop_loss']:
+            return self.close(symbol, price, "STOP_LOSS", now)
+        if price >= position['take_profit'] if long else price <= position['take_profit']:
+            return self.close(symbol, price, "TAKE_PROFIT", now)
+        return None
+
+    def close(self, symbol: str, price: float, reason: str, now: float) -> Dict:
+        """PnL в % маржи: закрытые части + остаток по цене выхода - комиссии входа/выхода с плечом"""
+        position = self.positions.pop(symbol)
+        leverage = self.settings['leverage']
+        pnl_percent = (position['realized_pnl']
+                       + position['remaining'] * calculate_pnl_percent(position['open_price'], price,
+                                                                       position['position_type'], leverage)
+                       - round_trip_fee_pct(self.settings) * leverage)
+        trade = {"symbol": symbol, "position_type": position['position_type'], "open_price": position['open_price'],
+                 "close_price": price, "reason": reason, "pnl_percent": pnl_percent,
+                 "open_time": position['open_time'], "close_time": now}
+        self.closed.append(trade)
+        _, losses = self._cooldown.get(symbol, (0.0, 0))
+        self._cooldown[symbol] = (now, 0 if pnl_percent > 0 else losses + 1)
+        return trade
+
+    # ---- отчет ----
+    def summary(self) -> Dict:
+        stats = self.filter_stats
+        pnl = [trade['pnl_percent'] for trade in self.closed]
+        top = sorted(((name, count) for name, count in stats["filtered_by"].items() if count),
+                     key=lambda item: item[1], reverse=True)[:3]
+        return {
+            "name": self.name, "mode": self.mode, "overrides": dict(self.overrides),
+            "checked": stats["total_signals"], "passed": stats["passed_filters"], "top_filters": top,
+            "open": len(self.positions), "trades": len(pnl), "wins": sum(1 for p in pnl if p > 0),
+            "pnl_percent": sum(pnl), "avg_pnl_percent": sum(pnl) / len(pnl) if pnl else 0.0,
+        }
@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+"""Стратегия v7.2 (тренд + коррекция): анализ тренда/волатильности, адаптивный score, воронка фильтров"""
+
+import traceback
+from typing import Dict, Optional, Tuple
+
+from bybit_core.context import _NullStageTimer
+from bybit_core.indicators import (BEARISH_TRENDS, BULLISH_TRENDS, entry_indicators,
+                                   higher_timeframe_confirms, price_range, trend_indicators,
+                                   volatility_indicators)
+
+NEUTRAL_TREND = {"strength": 0, "direction": "NEUTRAL", "age": 0, "confirmed": True, "ema_aligned": False}
+NEUTRAL_VOLATILITY = {"atr": 0, "atr_percentage": 0, "bb_width": 0, "volatility_rank": "LOW"}
+
+# Допустимые направления тренда для входа по режимам (остальные режимы - как ULTRA_CONSERVATIVE)
+ALLOWED_TRENDS = {
+    "AGGRESSIVE": (BULLISH_TRENDS, BEARISH_TRENDS),
+    "CONSERVATIVE": (["BULLISH", "WEAK_BULLISH"], ["BEARISH", "WEAK_BEARISH"]),
+}
+STRICT_TRENDS = (["BULLISH"], ["BEARISH"])
+
+# ====== ТРЕНД И ВОЛАТИЛЬНОСТЬ ======
+def get_trend_analysis(ctx, symbol: str, timeframe: str = "1h") -> Dict:
+    """Тренд по ADX/EMA; при require_trend_confirmation - подтверждение на старшем ТФ"""
+    try:
+        df = ctx.get_ohlcv_data(symbol, timeframe, 100)
+        if df is None or len(df) < 50:
+            return dict(NEUTRAL_TREND)
+
+        indicators_started = ctx.clock.perf_counter()
+        trend = trend_indicators(df)
+        ctx.observe("indicators", ctx.clock.perf_counter() - indicators_started, name="trend")
+
+        confirmed = True
+        if ctx.settings.get('require_trend_confirmation', False):
+            confirmed = confirm_trend(ctx, symbol, timeframe, trend["direction"])
+
+        trend["confirmed"] = confirmed
+        return trend
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Trend analysis error for {symbol}: {e}")
+        return dict(NEUTRAL_TREND)
+
+def confirm_trend(ctx, symbol: str, timeframe: str, direction: str) -> bool:
+    """Подтверждение тренда 1h/30m на старшем ТФ (4h/1h); остальные ТФ - подтверждены"""
+    if timeframe not in ["1h", "30m"]:
+        return True
+    try:
+        higher_tf = "4h" if timeframe == "1h" else "1h"
+        return higher_timeframe_confirms(ctx.get_ohlcv_data(symbol, higher_tf, 50), direction)
+    except Exception as e:
+        ctx.logger.warning(f"⚠️ Multi-timeframe check error for {symbol}: {e}")
+        return True  # Если ошибка - считаем подтвержденным
+
+def get_volatility_analysis(ctx, symbol: str, timeframe: str = "4h") -> Dict:
+    try:
+        df = ctx.get_ohlcv_data(symbol, timeframe, 50)
+        if df is None or len(df) < 20:
+            return dict(NEUTRAL_VOLATILITY)
+
+        indicators_started = ctx.clock.perf_counter()
+        volatility = volatility_indicators(df)
+        ctx.observe("indicators", ctx.clock.perf_counter() - indicators_started, name="volatility")
+        return volatility
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Volatility analysis error for {symbol}: {e}")
+        return dict(NEUTRAL_VOLATILITY)
+
+# ====== АДАПТИВНЫЙ SCORE ======
+def calculate_adaptive_score(ctx, signal: Dict, settings: Optional[Dict] = None) -> int:
+    """Бонусы/штрафы к score за силу тренда, ATR, глубину коррекции, объем и MACD (0..150);
+    settings - настройки режима (по умолчанию ctx.settings)"""
+    try:
+        base_score = signal.get('score', 0)
+
+        if not (ctx.settings if settings is None else settings).get('adaptive_scoring', False):
+            return base_score
+
+        # Учитываем силу тренда
+        trend_strength = signal.get('trend_strength', 0)
+        if trend_strength > 40:
+            bonus = 15
+        elif trend_strength > 30:
+            bonus = 10
+        elif trend_strength > 25:
+            bonus = 5
+        else:
+            bonus = 0
+
+        # Учитываем волатильность
+        atr_percentage = signal.get('atr_percentage', 0)
+        if atr_percentage > 6:
+            bonus -= 5
+        elif atr_percentage < 2:
+            bonus -= 3
+
+        # Учитываем коррекцию
+        if signal.get('price_at_key_level', False):
+            correction_depth = signal.get('correction_depth', 0)
+            if correction_depth > 0.03:
+                bonus += 10
+            elif correction_depth > 0.02:
+                bonus += 5
+            elif correction_depth > 0.01:
+                bonus += 2
+
+        # Учитываем объем
+        volume_ratio = signal.get('volume_ratio', 1)
+        if volume_ratio > 2.0:
+            bonus += 5
+        elif volume_ratio > 1.5:
+            bonus += 3
+
+        # Учитываем согласованность индикаторов
+        macd_histogram = signal.get('macd_histogram', 0)
+        position_type = signal.get('signal_type', 'LONG')
+
+        if position_type == 'LONG' and macd_histogram > 0:
+            bonus += 3
+        elif position_type == 'SHORT' and macd_histogram < 0:
+            bonus += 3
+
+        final_score = max(0, base_score + bonus)
+        final_score = min(final_score, 150)
+
+        ctx.logger.debug(f"🔢 Adaptive score: {base_score} + {bonus} = {final_score}")
+
+        return final_score
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Adaptive score calculation error: {e}")
+        return signal.get('score', 0)
+
+# ====== ПРИЗНАКИ СИМВОЛА ======
+class _NullLogger:
+    """Логгер для оценки режимов, кроме текущего: без записей в лог"""
+    __slots__ = ()
+
+    def debug(self, *args, **kwargs):
+        pass
+
+    info = debug
+
+class SymbolFeatures:
+    """Признаки символа без порогов режима: тренд, подтверждение и волатильность по таймфрейму,
+    входные индикаторы, боковик на 4h. Каждый считается при первом обращении и один раз
+    на все режимы, которые его спросят"""
+
+    __slots__ = ("ctx", "symbol", "_trend", "_confirmed", "_volatility", "_entry", "_ranging")
+
+    def __init__(self, ctx, symbol: str):
+        self.ctx = ctx
+        self.symbol = symbol
+        self._trend: Dict[str, Dict] = {}
+        self._confirmed: Dict[str, bool] = {}
+        self._volatility: Dict[str, Dict] = {}
+        self._entry: Dict[str, Optional[Dict]] = {}
+        self._ranging: Optional[Tuple[bool, float]] = None
+
+    def trend(self, timeframe: str) -> Dict:
+        if timeframe not in self._trend:
+            self._trend[timeframe] = self.ctx.trend_analysis(self.symbol, timeframe)
+        return self._trend[timeframe]
+
+    def trend_confirmed(self, timeframe: str) -> bool:
+        """Подтверждение на старшем ТФ: уже посчитанное в trend (если его требует текущий режим) или отдельно"""
+        if timeframe not in self._confirmed:
+            trend = self.trend(timeframe)
+            if self.ctx.settings.get('require_trend_confirmation', False):
+                self._confirmed[timeframe] = trend["confirmed"]
+            else:
+                self._confirmed[timeframe] = confirm_trend(self.ctx, self.symbol, timeframe, trend["direction"])
+        return self._confirmed[timeframe]
+
+    def volatility(self, timeframe: str) -> Dict:
+        if timeframe not in self._volatility:
+            self._volatility[timeframe] = self.ctx.volatility_analysis(self.symbol, timeframe)
+        return self._volatility[timeframe]
+
+    def entry(self, timeframe: str) -> Optional[Dict]:
+        """entry_indicators на 100 свечах; мало свечей или нулевая цена - None"""
+        if timeframe not in self._entry:
+            ctx = self.ctx
+            df = ctx.get_ohlcv_data(self.symbol, timeframe, 100)
+            if df is None or len(df) < 50 or df['close'].iloc[-1] <= 0:
+                self._entry[timeframe] = None
+            else:
+                indicators_started = ctx.clock.perf_counter()
+                self._entry[timeframe] = entry_indicators(df)
+                ctx.observe("indicators", ctx.clock.perf_counter() - indicators_started, name="entry")
+        return self._entry[timeframe]
+
+    def ranging(self) -> Tuple[bool, float]:
+        """(боковик, диапазон цены) по 20 свечам 4h: диапазон меньше 3% - боковик"""
+        if self._ranging is None:
+            is_market_ranging, higher_range = False, 0.0
+            df_higher = self.ctx.get_ohlcv_data(self.symbol, "4h", 20)
+            if df_higher is not None and len(df_higher) >= 10:
+                higher_range = price_range(df_higher)
+                is_market_ranging = higher_range < 0.03
+            self._ranging = (is_market_ranging, higher_range)
+        return self._ranging
+
+# ====== ВОРОНКА ФИЛЬТРОВ ======
+def analyze_symbol_with_filters(ctx, symbol: str, features: Optional[SymbolFeatures] = None) -> Optional[Dict]:
+    """Анализ символа со сбалансированными фильтрами и адаптацией к рынку;
+    features - уже посчитанные признаки символа (оценка нескольких режимов за проход)"""
+    try:
+        ctx.record_filter(symbol)
+
+        laps = ctx.stage_timer("filter")
+
+        # 1. Проверка что позиция не открыта
+        position_open = ctx.is_position_open(symbol)
+        laps.lap("position_already_open")
+        if position_open:
+            ctx.logger.debug(f"⏹️ Position already open for {symbol}")
+            ctx.record_filter(symbol, "position_already_open", False)
+            return None
+
+        # 2. Проверка кулдауна
+        in_cooldown = ctx.in_cooldown(symbol)
+        laps.lap("cooldown")
+        if in_cooldown:
+            ctx.logger.debug(f"⏹️ {symbol} in cooldown")
+            ctx.record_filter(symbol, "cooldown", False)
+            return None
+
+        # 3. Проверка недельного лимита
+        weekly_limit_reached = ctx.weekly_limit_reached()
+        laps.lap("weekly_limit")
+        if weekly_limit_reached:
+            ctx.logger.debug("⏹️ Weekly trade limit reached")
+            ctx.record_filter(symbol, "weekly_limit", False)
+            return None
+
+        signal, filter_name = evaluate_mode(features or SymbolFeatures(ctx, symbol), ctx.mode, ctx.settings,
+                                            ctx.logger, laps)
+        if signal:
+            ctx.record_filter(symbol, passed=True)
+        elif filter_name:
+            ctx.record_filter(symbol, filter_name, False)
+        return signal
+
+    except Exception as e:
+        ctx.logger.error(f"❌ Analyze symbol error for {symbol}: {e}")
+        traceback.print_exc()
+        return None
+
+def evaluate_modes(features: SymbolFeatures, modes: Dict[str, Dict]) -> Dict[str, Tuple[Optional[Dict], Optional[str]]]:
+    """Режим -> (сигнал, сработавший фильтр) по общим признакам, без лога и filter_stats.
+    Лимиты входа (позиция, кулдаун, неделя) не проверяются - они про счет, а не про рынок"""
+    results = {}
+    for mode, settings in modes.items():
+        try:
+            results[mode] = evaluate_mode(features, mode, settings)
+        except Exception as e:
+            features.ctx.logger.error(f"❌ Mode {mode} evaluation error for {features.symbol}: {e}")
+            results[mode] = (None, None)
+    return results
+
+def evaluate_mode(features: SymbolFeatures, mode: str, settings: Dict, logger=None,
+                  laps=None) -> Tuple[Optional[Dict], Optional[str]]:
+    """Пороги режима поверх признаков: (сигнал, None) или (None, имя фильтра);
+    (None, None) - мало данных на входном ТФ. Признаки, не нужные до отсева, не считаются"""
+    ctx, symbol = features.ctx, features.symbol
+    logger = logger or _NullLogger()
+    laps = laps or _NullStageTimer()
+
+    # 4. Анализ тренда - УЛУЧШЕННЫЙ С ДИАГНОСТИКОЙ
+    trend_analysis = features.trend(settings['timeframe_trend'])
+    # Подтверждение на старшем ТФ считается, только если режим его требует
+    confirmed = (features.trend_confirmed(settings['timeframe_trend'])
+                 if settings.get('require_trend_confirmation', False) else True)
+    laps.lap("trend_analysis")
+
+    logger.info(f"🔍 {symbol} на {settings['timeframe_trend']}: "
+                f"ADX={trend_analysis['strength']:.1f} (требуется {settings['min_trend_strength']}), "
+                f"Направление={trend_analysis['direction']}, "
+                f"Confirmed={confirmed}, "
+                f"Age={trend_analysis['age']}")
+
+    # Проверка подтверждения тренда (если требуется)
+    if not confirmed and settings.get('require_trend_confirmation', True):
+        logger.debug(f"⏹️ {symbol} filtered: trend not confirmed")
+        return None, "trend_not_confirmed"
+
+    # Проверка силы тренда
+    if trend_analysis["strength"] < settings['min_trend_strength']:
+        logger.debug(f"⏹️ {symbol} filtered: weak trend {trend_analysis['strength']:.1f} < {settings['min_trend_strength']}")
+        return None, "weak_trend"
+
+    # Проверка возраста тренда
+    if trend_analysis["age"] > settings.get('max_trend_age', 20):
+        logger.debug(f"⏹️ {symbol} filtered: old trend ({trend_analysis['age']} candles)")
+        return None, "old_trend"
+
+    # Тип позиции по направлению тренда и режиму
+    allowed_long_trends, allowed_short_trends = ALLOWED_TRENDS.get(mode, STRICT_TRENDS)
+    if trend_analysis["direction"] in allowed_long_trends:
+        position_type = "LONG"
+    elif trend_analysis["direction"] in allowed_short_trends:
+        position_type = "SHORT"
+    else:
+        logger.debug(f"⏹️ {symbol} filtered: trend direction {trend_analysis['direction']} not allowed for {mode}")
+        return None, "trend_direction_not_allowed"
+
+    # 5. Анализ волатильности С АДАПТАЦИЕЙ ДЛЯ РЕЖИМА
+    volatility = features.volatility(settings['timeframe_volatility'])
+    laps.lap("volatility")
+
+    if mode == "AGGRESSIVE":
+        # Для агрессивного режима снижаем требования на 40%
+        min_atr_required = settings['min_atr_percentage'] * 100 * 0.6
+        max_atr_allowed = settings['max_atr_percentage'] * 100 * 1.4
+        min_bb_width_required = settings.get('bb_width_min', 0.01) * 0.6
+    else:
+        min_atr_required = settings['min_atr_percentage'] * 100
+        max_atr_allowed = settings['max_atr_percentage'] * 100
+        min_bb_width_required = settings.get('bb_width_min', 0.01)
+
+    logger.info(f"📊 {symbol} Волатильность: ATR={volatility['atr_percentage']:.2f}% "
+                f"(требуется {min_atr_required:.2f}% - {max_atr_allowed:.2f}%)")
+
+    if volatility["atr_percentage"] > max_atr_allowed:
+        logger.debug(f"⏹️ {symbol} filtered: high volatility {volatility['atr_percentage']:.1f}% > {max_atr_allowed:.1f}%")
+        return None, "high_volatility"
+
+    if volatility["atr_percentage"] < min_atr_required:
+        logger.debug(f"⏹️ {symbol} filtered: low volatility {volatility['atr_percentage']:.1f}% < {min_atr_required:.1f}%")
+        return None, "low_volatility"
+
+    # 6. Технический анализ на входном ТФ
+    entry = features.entry(settings['timeframe_entry'])
+    if entry is None:
+        return None, None
+    laps.lap("entry_indicators")
+
+    current_price = entry["current_price"]
+    rsi = entry["rsi"]
+    volume_ratio = entry["volume_ratio"]
+    macd_histogram = entry["macd_histogram"]
+    bb_width = entry["bb_width"]
+    price_position = entry["price_position"]
+    ema_20 = entry["ema_20"]
+    ema_50 = entry["ema_50"]
+
+    # Проверка ширины BB с адаптацией
+    if bb_width < min_bb_width_required:
+        logger.debug(f"⏹️ {symbol} filtered: low BB width {bb_width:.3%} < {min_bb_width_required:.3%}")
+        return None, "low_bb_width"
+
+    # ГИБРИДНАЯ СТРАТЕГИЯ: Проверка коррекции к ключевым уровням
+    price_at_key_level = False
+    correction_depth = 0
+
+    # Боковик на старшем ТФ (для адаптации фильтров)
+    is_market_ranging = False
+    if mode == "AGGRESSIVE":
+        is_market_ranging, higher_range = features.ranging()
+        if is_market_ranging:
+            logger.info(f"📊 {symbol}: рынок в боковике (диапазон {higher_range:.2%} < 3%)")
+    laps.lap("ranging_check")
+
+    # ============ АДАПТИВНЫЕ MACD ПОРОГИ ============
+    if "VERY_WEAK" in trend_analysis["direction"]:
+        base_macd_threshold = 0.0003    # Очень слабый тренд - ослабляем
+    elif "WEAK" in trend_analysis["direction"]:
+        base_macd_threshold = 0.0002  # Слабый тренд
+    else:
+        base_macd_threshold = 0.0001  # Сильный тренд
+
+    if is_market_ranging:
+        base_macd_threshold *= 2.0  # Удваиваем порог в боковике
+
+    # ============ АДАПТАЦИЯ К СИЛЬНОМУ ТРЕНДУ ============
+    volume_adjustment = 1.0
+    macd_adjustment = 1.0
+
+    if trend_analysis["strength"] > 30:  # Сильный тренд
+        macd_adjustment = 2.0      # Ослабляем MACD фильтр в 2 раза
+        volume_adjustment = 0.7    # Ослабляем объем на 30%
+        logger.info(f"📊 {symbol}: сильный тренд (ADX={trend_analysis['strength']:.1f}), "
+                        f"ослабляем MACD x{macd_adjustment:.1f}, объем x{volume_adjustment:.1f}")
+
+    macd_threshold = base_macd_threshold * macd_adjustment
+
+    # Откат к поддержке (LONG) / сопротивлению (SHORT)
+    if position_type == "LONG":
+        if 0.05 <= price_position <= 0.45:
+            price_at_key_level = True
+            correction_depth = 1 - price_position
+    else:
+        if 0.55 <= price_position <= 0.95:
+            price_at_key_level = True
+            correction_depth = price_position
+
+    # Цена около EMA20 или EMA50
+    price_to_ema20 = abs(current_price - ema_20) / ema_20
+    price_to_ema50 = abs(current_price - ema_50) / ema_50
+
+    if price_to_ema20 < 0.015 or price_to_ema50 < 0.02:
+        price_at_key_level = True
+        correction_depth = min(price_to_ema20, price_to_ema50)
+
+    # Согласованность MACD с адаптивным порогом
+    if position_type == "LONG" and not (macd_histogram > -macd_threshold):
+        logger.debug(f"⏹️ {symbol} filtered: MACD not bullish enough for LONG "
+                         f"({macd_histogram:.6f} <= {-macd_threshold:.6f}, порог адаптирован для {trend_analysis['direction']})")
+        return None, "macd_not_aligned"
+    if position_type == "SHORT" and not (macd_histogram < macd_threshold):
+        logger.debug(f"⏹️ {symbol} filtered: MACD not bearish enough for SHORT "
+                         f"({macd_histogram:.6f} >= {macd_threshold:.6f}, порог адаптирован для {trend_analysis['direction']})")
+        return None, "macd_not_aligned"
+
+    # Фильтр RSI с учетом режима и направления тренда
+    if "BEARISH" in trend_analysis["direction"]:
+        rsi_range_long = settings.get('rsi_range_bearish_long', settings['rsi_range_long'])
+        rsi_range_short = settings.get('rsi_range_bearish_short', settings['rsi_range_short'])
+    else:
+        rsi_range_long = settings['rsi_range_long']
+        rsi_range_short = settings['rsi_range_short']
+
+    rsi_range = rsi_range_long if position_type == "LONG" else rsi_range_short
+    if not (rsi_range[0] <= rsi <= rsi_range[1]):
+        logger.debug(f"⏹️ {symbol} filtered: RSI {rsi:.1f} outside range {rsi_range}")
+        return None, "rsi_out_of_range"
+
+    # Фильтр объема с адаптацией к рынку
+    required_volume_ratio = settings['volume_multiplier']
+
+    if is_market_ranging:
+        required_volume_ratio *= 0.5
+        logger.info(f"📊 {symbol}: снижаем требования к объему в боковике до {required_volume_ratio:.1f}x")
+    elif ctx.symbol_categories.get(symbol, {}).get("volatility") in ["HIGH", "VERY_HIGH"]:
+        required_volume_ratio *= 0.8  # 20% снижение для волатильных
+
+    if "VERY_WEAK" in trend_analysis["direction"]:
+        required_volume_ratio *= 0.7  # Еще 30% снижение
+
+    required_volume_ratio *= volume_adjustment
+
+    if volume_ratio < required_volume_ratio:
+        logger.debug(f"⏹️ {symbol} filtered: low volume {volume_ratio:.1f}x < {required_volume_ratio:.1f}x "
+                         f"(адаптировано для {trend_analysis['direction']})")
+        return None, "low_volume"
+    laps.lap("entry_filters")
+
+    # Расчет score с адаптацией для слабых трендов
+    score = 0
+    reasons = []
+
+    # Тренд (макс 30)
+    score += min(trend_analysis["strength"], 30)
+    reasons.append(f"TREND_{trend_analysis['direction']}")
+
+    if trend_analysis["strength"] > 30:
+        score += 5
+        reasons.append("STRONG_TREND")
+    elif trend_analysis["strength"] > 25 and "VERY_WEAK" not in trend_analysis["direction"]:
+        score += 3
+        reasons.append("MODERATE_TREND")
+    elif "VERY_WEAK" in trend_analysis["direction"]:
+        score += 2
+        reasons.append("VERY_WEAK_PASSED")
+
+    # Объем (макс 15)
+    volume_score = min(volume_ratio * 8, 15) if volume_ratio >= required_volume_ratio else 0
+    score += volume_score
+    if volume_score > 0:
+        reasons.append("HIGH_VOLUME")
+
+    # RSI (макс 15) с бонусами за экстремальные значения
+    if rsi_range[0] <= rsi <= rsi_range[1]:
+        score += 15
+        reasons.append("GOOD_RSI")
+
+        if "VERY_WEAK" not in trend_analysis["direction"]:
+            if position_type == "LONG" and rsi < 35:
+                score += 3
+                reasons.append("RSI_OVERSOLD")
+            elif position_type == "SHORT" and rsi > 65:
+                score += 3
+                reasons.append("RSI_OVERBOUGHT")
+
+    # Коррекция к ключевому уровню (макс 20)
+    if price_at_key_level:
+        score += min(correction_depth * 80, 20)
+        reasons.append("PRICE_AT_KEY_LEVEL")
+
+        if correction_depth > 0.03:
+            score += 5
+            reasons.append("DEEP_CORRECTION")
+        elif correction_depth > 0.02:
+            score += 3
+            reasons.append("MEDIUM_CORRECTION")
+        elif correction_depth > 0.01 and "VERY_WEAK" in trend_analysis["direction"]:
+            score += 2
+            reasons.append("LIGHT_CORRECTION")
+    else:
+        logger.debug(f"⏹️ {symbol} filtered: price not at key level")
+        return None, "price_not_at_key_level"
+
+    # Волатильность (макс 10)
+    if bb_width >= min_bb_width_required:
+        score += 10
+        reasons.append("GOOD_VOLATILITY")
+
+        if "VERY_WEAK" not in trend_analysis["direction"] and 0.02 <= bb_width <= 0.05:
+            score += 3
+            reasons.append("OPTIMAL_VOLATILITY")
+
+    # Согласованность индикаторов (макс 10)
+    if position_type == "LONG" and macd_histogram > -macd_threshold:
+        score += 10
+        reasons.append("MACD_BULLISH")
+
+        if "VERY_WEAK" not in trend_analysis["direction"] and macd_histogram > 0.001:
+            score += 3
+            reasons.append("STRONG_MACD_BULLISH")
+    elif position_type == "SHORT" and macd_histogram < macd_threshold:
+        score += 10
+        reasons.append("MACD_BEARISH")
+
+        if "VERY_WEAK" not in trend_analysis["direction"] and macd_histogram < -0.001:
+            score += 3
+            reasons.append("STRONG_MACD_BEARISH")
+
+    if is_market_ranging:
+        score += 5
+        reasons.append("RANGING_MARKET_BONUS")
+
+    base_signal = {
+        "symbol": symbol,
+        "price": current_price,
+        "score": score,
+        "reasons": reasons,
+        "volume_ratio": volume_ratio,
+        "rsi": rsi,
+        "bb_width": bb_width,
+        "bb_position": price_position,
+        "signal_type": position_type,
+        "trend_direction": trend_analysis["direction"],
+        "trend_strength": trend_analysis["strength"],
+        "trend_age": trend_analysis["age"],
+        "atr": volatility["atr"],
+        "atr_percentage": volatility["atr_percentage"],
+        "volatility_rank": volatility["volatility_rank"],
+        "price_at_key_level": price_at_key_level,
+        "correction_depth": correction_depth,
+        "macd_histogram": macd_histogram,
+        "ema_20": ema_20,
+        "ema_50": ema_50,
+        "is_market_ranging": is_market_ranging
+    }
+
+    adaptive_score = calculate_adaptive_score(ctx, base_signal, settings)
+    base_signal["score"] = adaptive_score
+    laps.lap("score")
+
+    logger.info(f"🎯 {symbol} {position_type}: Score={adaptive_score}, "
+                f"Trend={trend_analysis['direction']} ({trend_analysis['strength']:.1f}), "
+                f"RSI={rsi:.1f}, Vol={volume_ratio:.1f}x, "
+                f"Correction={'YES' if price_at_key_level else 'NO'} {correction_depth:.2%}, "
+                f"MACD={macd_histogram:.6f}, BB={bb_width:.3%}")
+
+    if adaptive_score >= settings['min_score']:
+        return base_signal, None
+
+    logger.debug(f"⏹️ {symbol} filtered: low score {adaptive_score} < {settings['min_score']}")
+    return None, "low_score"
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Вселенная символов: все линейные USDT-perp из метаданных рынков, отбор по одному ответу fetch_tickers
+(оборот за 24ч и дневной диапазон), категории как в SYMBOL_CATEGORIES - по волатильности"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bybit_core import config
+
+# Дневной диапазон (high - low) / last -> категория волатильности; выше последней границы - VERY_HIGH
+VOLATILITY_BUCKETS = ((0.04, "LOW"), (0.08, "MEDIUM"), (0.15, "HIGH"))
+RISK_MULTIPLIERS = {"LOW": 1.0, "MEDIUM": 0.8, "HIGH": 0.6, "VERY_HIGH": 0.5}
+
+def linear_usdt_symbols(markets: Dict) -> List[str]:
+    """Активные линейные бессрочные контракты с расчетом в USDT"""
+    return sorted(
+        symbol for symbol, market in markets.items()
+        if market.get("swap") and market.get("linear") and market.get("quote") == "USDT"
+        and market.get("settle") == "USDT" and market.get("active") is not False
+    )
+
+def ticker_metrics(ticker: Dict) -> Optional[Dict]:
+    """Оборот (USDT за 24ч) и дневной диапазон в долях цены; без цены - None"""
+    last = config.safe_float_convert(ticker.get("last"))
+    if last <= 0:
+        return None
+    high = config.safe_float_convert(ticker.get("high"))
+    low = config.safe_float_convert(ticker.get("low"))
+    turnover = config.safe_float_convert(ticker.get("quoteVolume"))
+    if turnover <= 0:
+        turnover = config.safe_float_convert(ticker.get("baseVolume")) * last
+    range_pct = (high - low) / last if high >= low > 0 else 0.0
+    return {"last": last, "turnover": turnover, "range_pct": range_pct}
+
+def volatility_bucket(range_pct: float) -> str:
+    for bound, bucket in VOLATILITY_BUCKETS:
+        if range_pct < bound:
+            return bucket
+    return "VERY_HIGH"
+
+def rank_symbols(metrics: Dict[str, Dict], top_k: int, min_turnover: float = 0.0,
+                 max_range_pct: float = 0.25, turnover_weight: float = 0.6) -> List[str]:
+    """Лучшие top_k: оборот не ниже min_turnover, диапазон в (0, max_range_pct];
+    балл - взвешенные процентили оборота и волатильности"""
+    eligible = {symbol: m for symbol, m in metrics.items()
+                if m["turnover"] >= min_turnover and 0 < m["range_pct"] <= max_range_pct}
+    if not eligible or top_k <= 0:
+        return []
+
+    def percentiles(key: str) -> Dict[str, float]:
+        ordered = sorted(eligible, key=lambda symbol: eligible[symbol][key])
+        return {symbol: (i + 1) / len(ordered) for i, symbol in enumerate(ordered)}
+
+    by_turnover, by_range = percentiles("turnover"), percentiles("range_pct")
+    score = {symbol: turnover_weight * by_turnover[symbol] + (1 - turnover_weight) * by_range[symbol]
+             for symbol in eligible}
+    return sorted(eligible, key=lambda symbol: (-score[symbol], symbol))[:top_k]
+
+def derive_categories(symbols: Iterable[str], metrics: Dict[str, Dict], markets: Dict,
+                      overrides: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Категория на символ: заданные вручную (config.SYMBOL_CATEGORIES) - как есть, остальные - по диапазону;
+    min_trade_usdt не меньше MIN_TRADE_USDT и минимальной стоимости ордера на бирже (+10%)"""
+    overrides = config.SYMBOL_CATEGORIES if overrides is None else overrides
+    categories = {}
+    for symbol in symbols:
+        if symbol in overrides:
+            categories[symbol] = overrides[symbol]
+            continue
+        m = metrics.get(symbol)
+        bucket = volatility_bucket(m["range_pct"]) if m else "MEDIUM"
+        limits = markets.get(symbol, {}).get("limits", {})
+        min_cost = config.safe_float_convert(limits.get("cost", {}).get("min"))
+        if m:
+            min_cost = max(min_cost, config.safe_float_convert(limits.get("amount", {}).get("min")) * m["last"])
+        categories[symbol] = {
+            "volatility": bucket,
+            "risk_multiplier": RISK_MULTIPLIERS[bucket],
+            "min_trade_usdt": max(config.MIN_TRADE_USDT, round(min_cost * 1.1, 2)),
+        }
+    return categories
+
+def select_universe(markets: Dict, tickers: Dict, top_k: int, min_turnover: float = 0.0,
+                    pinned: Iterable[str] = ()) -> Tuple[List[str], Dict[str, Dict], Dict[str, Dict]]:
+    """(символы, категории, метрики): pinned (например, с открытыми позициями) - всегда и первыми,
+    затем лучшие по rank_symbols до top_k всего"""
+    metrics = {}
+    for symbol in linear_usdt_symbols(markets):
+        m = ticker_metrics(tickers[symbol]) if symbol in tickers else None
+        if m:
+            metrics[symbol] = m
+    pinned = list(dict.fromkeys(pinned))
+    ranked = [s for s in rank_symbols(metrics, top_k + len(pinned), min_turnover) if s not in pinned]
+    symbols = pinned + ranked[:max(0, top_k - len(pinned))]
+    return symbols, derive_categories(symbols, metrics, markets), metrics
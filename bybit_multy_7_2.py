@@ -9,35 +9,45 @@ import os
 import sys
 import time
 import math
-import ccxt
-import pandas as pd
 import sqlite3
 import logging
 from datetime import datetime, timedelta
-import numpy as np
 from typing import Dict, List, Optional, Tuple, Any
 import threading
 import signal
 import json
 import traceback
+import bisect
+import cProfile
+import pstats
+import io
+import gzip
+import zlib
+import queue
+import html
+import importlib.util
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Время от старта процесса (отчет о запуске)
+PROCESS_STARTED = time.perf_counter()
+
+# ccxt, pandas/ta (через bybit_core.strategy) и telegram импортируются лениво - в потоках запуска,
+# параллельно с сетью (run_startup). Здесь только проверка установки, без импорта
+for _module, _label, _package in (("ccxt", "CCXT", "ccxt"), ("ta", "TA-Lib", "ta"),
+                                  ("telegram", "Telegram", "python-telegram-bot")):
+    if importlib.util.find_spec(_module) is None:
+        print(f"{_label} import error: No module named '{_module}'")
+        print(f"Install with: pip install {_package}")
+        sys.exit(1)
 
-try:
-    from ta.trend import EMAIndicator, MACD, ADXIndicator
-    from ta.momentum import RSIIndicator, StochasticOscillator
-    from ta.volatility import BollingerBands, AverageTrueRange
-    from ta.volume import VolumeWeightedAveragePrice, OnBalanceVolumeIndicator
-except ImportError as e:
-    print(f"TA-Lib import error: {e}")
-    print("Install with: pip install ta")
-    sys.exit(1)
-
-try:
-    from telegram import Bot, ParseMode
-    from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackQueryHandler
-except ImportError as e:
-    print(f"Telegram import error: {e}")
-    print("Install with: pip install python-telegram-bot")
-    sys.exit(1)
+import bybit_core
+from bybit_core import risk as core_risk
+from bybit_core.config import (TAKER_FEE, MAKER_FEE, SYMBOLS, SYMBOL_CATEGORIES,
+                               TRADING_MODES, MIN_TRADE_USDT, safe_float_convert, timeframe_ms)
+from bybit_core.context import CoreContext, count_filter, new_filter_stats
 
 # ====== CONFIGURATION ======
 API_KEY = os.getenv("BYBIT_API_KEY", "YOUR_API_KEY")
@@ -48,250 +58,77 @@ CHAT_ID = int(os.getenv("TELEGRAM_CHAT_ID", "0"))
 # РЕЖИМЫ РАБОТЫ
 DRY_RUN = True  # True = тестовый режим, False = реальная торговля
 SANDBOX_MODE = False  # True = тестовая сеть Bybit
-
-# КОМИССИИ BYBIT
-TAKER_FEE = 0.0006  # 0.06%
-MAKER_FEE = 0.0002  # 0.02%
-
-# СИМВОЛЫ (ограничиваем для фокусировки)
-SYMBOLS = [
-    "BTC/USDT:USDT", "ETH/USDT:USDT", "BNB/USDT:USDT", "SOL/USDT:USDT"
-]
-
-# Настройки для разных категорий символов
-SYMBOL_CATEGORIES = {
-    "BTC/USDT:USDT": {"volatility": "LOW", "risk_multiplier": 1.0, "min_trade_usdt": 20.0},
-    "ETH/USDT:USDT": {"volatility": "LOW", "risk_multiplier": 1.0, "min_trade_usdt": 15.0},
-    "BNB/USDT:USDT": {"volatility": "MEDIUM", "risk_multiplier": 0.8, "min_trade_usdt": 10.0},
-    "SOL/USDT:USDT": {"volatility": "HIGH", "risk_multiplier": 0.6, "min_trade_usdt": 8.0},
-}
-
+# Свой адрес REST API (локальный mock_exchange.py для нагрузочных тестов), пусто = Bybit
+EXCHANGE_API_URL = os.getenv("BYBIT_API_URL", "")
+# Кассета ответов биржи: record - писать все вызовы, replay - отдавать записанное без сети
+CASSETTE_MODE = os.getenv("BOT_CASSETTE_MODE", "")
+CASSETTE_FILE = os.getenv("BOT_CASSETTE_FILE", "exchange_cassette.jsonl.gz")
+CASSETTE_REAL_TIMING = os.getenv("BOT_CASSETTE_TIMING", "0") == "1"
+
+# Комиссии, символы (SYMBOLS, SYMBOL_CATEGORIES), режимы TRADING_MODES и MIN_TRADE_USDT - в bybit_core/config.py
 active_symbols = SYMBOLS
 
-# ====== НАСТРОЙКИ С БАЛАНСИРОВАННЫМИ ФИЛЬТРАМИ ======
-TRADING_MODES = {
-    "ULTRA_CONSERVATIVE": {
-        "name": "🟣 УЛЬТРА-КОНСЕРВАТИВНЫЙ",
-        "type": "trend_correction",
-        "scan_interval": 300,
-        "exit_check_interval": 30,
-        "status_interval": 600,
-        "sync_interval": 1800,
-        "max_trades": 1,
-        "trade_pct": 0.03,
-        
-        # Таймфреймы
-        "timeframe_entry": "15m",
-        "timeframe_trend": "1h",
-        "timeframe_volatility": "4h",
-        
-        # Риск-менеджмент
-        "max_stop_loss": 0.006,
-        "take_profit": 0.018,
-        "quick_exit": 0.012,
-        "min_risk_reward": 2.5,
-        
-        # Фильтры тренда
-        "min_trend_strength": 25,
-        "max_trend_age": 30,  # Увеличено
-        "require_trend_alignment": True,
-        "require_trend_confirmation": True,  # Для этого режима оставляем
-        
-        # RSI фильтры
-        "rsi_range_long": (28, 72),
-        "rsi_range_short": (28, 72),
-        
-        # Фильтры объема
-        "volume_multiplier": 1.5,
-        "min_volume_score": 15,
-        
-        # Фильтры волатильности
-        "max_atr_percentage": 0.08,
-        "min_atr_percentage": 0.015,
-        "bb_width_min": 0.012,
-        
-        # Общий фильтр
-        "min_score": 90,
-        "adaptive_scoring": True,
-        
-        # Лимиты
-        "cooldown": 3600,
-        "max_daily_trades_per_symbol": 1,
-        "max_weekly_trades": 5,
-        
-        # Стратегия
-        "strategy": "HYBRID_TREND_CORRECTION",
-        "risk_level": "VERY_LOW",
-        
-        # Trailing stop
-        "trailing_stop_activation": 0.010,
-        "trailing_stop_distance": 0.005,
-        "trailing_stop_update_frequency": 0.002,
-        
-        # Адаптивные настройки
-        "adaptive_sl": True,
-        "adaptive_tp": True,
-        "adaptive_position_sizing": True,
-        
-        # Частичный выход
-        "partial_exit_enabled": True,
-        "partial_exit_1": 0.010,
-        "partial_exit_2": 0.015,
-        "partial_exit_pct_1": 0.25,
-        "partial_exit_pct_2": 0.25,
-        
-        # Технические параметры
-        "leverage": 2,
-        "use_exchange_orders": True,
-        "use_market_entry": False,
-        "use_market_exit": False,
-        "limit_order_timeout": 180,
-        "commission_filter": True,
-        "commission_requirement": 0.5,
-    },
-    
-    "CONSERVATIVE": {
-        "name": "🟡 КОНСЕРВАТИВНЫЙ",
-        "type": "trend_correction",
-        "scan_interval": 180,
-        "exit_check_interval": 20,
-        "status_interval": 300,
-        "sync_interval": 1800,
-        "max_trades": 2,
-        "trade_pct": 0.05,
-        
-        "timeframe_entry": "15m",
-        "timeframe_trend": "1h",
-        "timeframe_volatility": "4h",
-        
-        "max_stop_loss": 0.008,
-        "take_profit": 0.024,
-        "quick_exit": 0.015,
-        "min_risk_reward": 2.5,
-        
-        "min_trend_strength": 20,  # Снижено с 22
-        "max_trend_age": 25,  # Увеличено
-        "require_trend_alignment": True,
-        "require_trend_confirmation": True,  # Оставляем для консервативного
-        
-        "rsi_range_long": (25, 75),
-        "rsi_range_short": (25, 75),
-        
-        "volume_multiplier": 1.3,
-        "min_volume_score": 12,
-        
-        "max_atr_percentage": 0.09,
-        "min_atr_percentage": 0.015,
-        "bb_width_min": 0.010,
-        
-        "min_score": 85,
-        "adaptive_scoring": True,
-        
-        "cooldown": 1800,
-        "max_daily_trades_per_symbol": 2,
-        "max_weekly_trades": 8,
-        
-        "strategy": "HYBRID_TREND_CORRECTION",
-        "risk_level": "LOW",
-        
-        "trailing_stop_activation": 0.012,
-        "trailing_stop_distance": 0.006,
-        "trailing_stop_update_frequency": 0.0025,
-        
-        "adaptive_sl": True,
-        "adaptive_tp": True,
-        "adaptive_position_sizing": True,
-        
-        "partial_exit_enabled": True,
-        "partial_exit_1": 0.012,
-        "partial_exit_2": 0.020,
-        "partial_exit_pct_1": 0.3,
-        "partial_exit_pct_2": 0.3,
-        
-        "leverage": 3,
-        "use_exchange_orders": True,
-        "use_market_entry": False,
-        "use_market_exit": False,
-        "limit_order_timeout": 120,
-        "commission_filter": True,
-        "commission_requirement": 0.5,
-    },
-    
-    "AGGRESSIVE": {
-        "name": "🟢 АГРЕССИВНЫЙ",
-        "type": "trend_correction",
-        "scan_interval": 120,
-        "exit_check_interval": 15,
-        "status_interval": 180,
-        "sync_interval": 1800,
-        "max_trades": 3,
-        "trade_pct": 0.08,
-        
-        "timeframe_entry": "15m",
-        "timeframe_trend": "30m",
-        "timeframe_volatility": "2h",
-        
-        "max_stop_loss": 0.010,
-        "take_profit": 0.030,
-        "quick_exit": 0.018,
-        "min_risk_reward": 2.0,
-        
-        "min_trend_strength": 12,  # Было 16 (СНИЖЕНО!)
-        "allowed_trends_for_long": ["BULLISH", "WEAK_BULLISH", "VERY_WEAK_BULLISH"],  # НОВОЕ!
-        "allowed_trends_for_short": ["BEARISH", "WEAK_BEARISH", "VERY_WEAK_BEARISH"],  # НОВОЕ!
-        "max_trend_age": 20,  # Увеличено с 15
-        "require_trend_alignment": False,  # ИСПРАВЛЕНО: False для агрессивного
-        "require_trend_confirmation": False,  # Уже было False
-        
-        "rsi_range_long": (22, 78),
-        "rsi_range_short": (22, 78),
-        
-        "volume_multiplier": 0.8,
-        "min_volume_score": 8,
-        
-        "max_atr_percentage": 0.10,
-        "min_atr_percentage": 0.008,
-        "bb_width_min": 0.006,
-        
-        "min_score": 75,  # Снижено с 80
-        "adaptive_scoring": True,
-        
-        "cooldown": 1200,
-        "max_daily_trades_per_symbol": 3,
-        "max_weekly_trades": 12,
-        
-        "strategy": "HYBRID_TREND_CORRECTION",
-        "risk_level": "MEDIUM",
-        
-        "trailing_stop_activation": 0.015,
-        "trailing_stop_distance": 0.008,
-        "trailing_stop_update_frequency": 0.003,
-        
-        "adaptive_sl": True,
-        "adaptive_tp": True,
-        "adaptive_position_sizing": True,
-        
-        "partial_exit_enabled": True,
-        "partial_exit_1": 0.015,
-        "partial_exit_2": 0.025,
-        "partial_exit_pct_1": 0.35,
-        "partial_exit_pct_2": 0.35,
-        
-        "leverage": 4,
-        "use_exchange_orders": True,
-        "use_market_entry": False,
-        "use_market_exit": False,
-        "limit_order_timeout": 90,
-        "commission_filter": True,
-        "commission_requirement": 0.3,
-    }
-}
-
-# Минимальные настройки
-MIN_TRADE_USDT = 10.0
+# Метрики производительности (локальный endpoint в формате Prometheus)
+METRICS_ENABLED = os.getenv("BOT_METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("BOT_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "9108"))
 
 LOCK_FILE = "/tmp/ultimate_trading_bot_v7_2.lock"
-DB_FILE = "trades_ultimate_futures_v7_2.db"
+DB_FILE = os.getenv("BOT_DB_FILE", "trades_ultimate_futures_v7_2.db")
+LOG_FILE = os.getenv("BOT_LOG_FILE", "ultimate_bot_futures_v7_2.log")
+
+# Буфер свечей: повторные запросы догружают только новые свечи (0 - каждый раз вся серия)
+CANDLE_BUFFER_ENABLED = os.getenv("BOT_CANDLE_BUFFER", "1") == "1"
+CANDLE_BUFFER_MAX = 1000
+# Свежая серия (моложе TTL секунд) отдается из буфера без запроса к бирже
+CANDLE_BUFFER_TTL = float(os.getenv("BOT_CANDLE_TTL", "5"))
+# Старшие таймфреймы собираются из этого (bybit_core.resample), пусто - каждый грузится с биржи
+RESAMPLE_BASE_TIMEFRAME = os.getenv("BOT_RESAMPLE_BASE", "15m")
+# Архив закрытых свечей на диске (candle_archive.py), пусто - выключен
+CANDLE_ARCHIVE_DIR = os.getenv("BOT_CANDLE_ARCHIVE_DIR", "")
+# Свечи и тренд в разделяемой памяти для других процессов (shared_candles.py): имя сегмента, пусто - выключено
+SHARED_CANDLES_NAME = os.getenv("BOT_SHARED_CANDLES", "")
+SHARED_CANDLES_SYMBOLS = int(os.getenv("BOT_SHARED_CANDLES_SYMBOLS", "256"))
+
+# Динамическая вселенная: SYMBOLS + лучшие линейные USDT-perp по обороту и волатильности
+# из одного fetch_tickers (bybit_core.universe), всего до TOP_K; 0 - только SYMBOLS
+UNIVERSE_TOP_K = int(os.getenv("BOT_UNIVERSE_TOP_K", "0"))
+UNIVERSE_REFRESH = int(os.getenv("BOT_UNIVERSE_REFRESH", "900"))
+UNIVERSE_MIN_TURNOVER = float(os.getenv("BOT_UNIVERSE_MIN_TURNOVER", "5000000"))
+
+# Скан в процессах-воркерах по шардам active_symbols (0/1 - в основном процессе)
+SCAN_WORKERS = int(os.getenv("BOT_SCAN_WORKERS", "0"))
+# Ожидание шардов одного скана (меньше самого короткого scan_interval); мертвый воркер заменяется раньше
+SCAN_WORKER_TIMEOUT = float(os.getenv("BOT_SCAN_TIMEOUT", "60"))
+# Входов за скан: лучшие сигналы в свободные слоты max_trades с учетом баланса и недельного лимита
+# (0 - сколько позволяют слоты, 1 - только лучший сигнал); в реальном режиме ордера выставляются параллельно
+MAX_ENTRIES_PER_SCAN = int(os.getenv("BOT_MAX_ENTRIES_PER_SCAN", "0"))
+# Скользящая корреляция доходностей active_symbols (bybit_core.correlation): окно в свечах
+# CORRELATION_TIMEFRAME, 0 - выключена
+CORRELATION_WINDOW = int(os.getenv("BOT_CORRELATION_WINDOW", "96"))
+CORRELATION_TIMEFRAME = os.getenv("BOT_CORRELATION_TIMEFRAME", RESAMPLE_BASE_TIMEFRAME or "15m")
+# Корреляция (с учетом направления) с открытой позицией или уже выбранным сигналом выше порога -
+# та же сделка, сигнал не открывается
+MAX_CORRELATION = float(os.getenv("BOT_MAX_CORRELATION", "0.8"))
+# Приоритет сигнала при распределении: score * (1 - вес * корреляция с открытыми позициями)
+CORRELATION_RANK_WEIGHT = float(os.getenv("BOT_CORRELATION_RANK_WEIGHT", "0.3"))
+
+# Оценка всех режимов TRADING_MODES за скан по одним признакам символа (и в воркерах шардированного скана)
+COMPARE_MODES = os.getenv("BOT_COMPARE_MODES", "0") == "1"
+# Теневые конфигурации при запуске: "ИМЯ РЕЖИМ ключ=значение ...; ИМЯ2 РЕЖИМ ..." (как /shadow add)
+SHADOW_CONFIGS = os.getenv("BOT_SHADOW_CONFIGS", "")
+# Цена для выходов теневых позиций берется из last_prices, если она не старше стольких секунд
+SHADOW_PRICE_MAX_AGE = 10
+
+# Снимок состояния для теплого перезапуска (пусто - выключен)
+SNAPSHOT_FILE = os.getenv("BOT_SNAPSHOT_FILE", "runtime_snapshot_v7_2.json.gz")
+SNAPSHOT_INTERVAL = int(os.getenv("BOT_SNAPSHOT_INTERVAL", "60"))
+# Старше - рынки и цены из снимка не используются (свечи догружаются или грузятся заново сами)
+SNAPSHOT_MAX_AGE = int(os.getenv("BOT_SNAPSHOT_MAX_AGE", "21600"))
+
+# Профилирование по запросу (/profile N или SIGUSR1)
+PROFILE_DEFAULT_CYCLES = int(os.getenv("BOT_PROFILE_CYCLES", "3"))
+PROFILE_TOP_FUNCTIONS = 20
 
 # Глобальные переменные
 CURRENT_MODE = "AGGRESSIVE"  # Начинаем с агрессивного
@@ -299,58 +136,255 @@ BOT_RUNNING = True
 exchange = None
 bot = None
 updater = None
+# Классы python-telegram-bot - после load_telegram()
+Bot = ParseMode = Updater = CommandHandler = None
 
 # Глобальная статистика фильтров
-filter_stats = {
-    "total_signals": 0,
-    "filtered_by": {
-        "position_already_open": 0,
-        "cooldown": 0,
-        "weekly_limit": 0,
-        "trend_not_confirmed": 0,
-        "weak_trend": 0,
-        "old_trend": 0,
-        "high_volatility": 0,
-        "low_volatility": 0,
-        "rsi_out_of_range": 0,
-        "low_volume": 0,
-        "low_bb_width": 0,
-        "macd_not_aligned": 0,
-        "low_score": 0,
-        "commission_filter": 0,
-        "risk_reward": 0,
-        "price_not_at_key_level": 0,
-        "adaptive_sl_tp_failed": 0
-    },
-    "passed_filters": 0,
-    "signals_by_symbol": {},
-    "last_reset": time.time()
-}
+filter_stats = new_filter_stats()
+# Воронка остальных режимов (COMPARE_MODES) и их сигналы последнего скана
+mode_filter_stats: Dict[str, Dict] = {}
+mode_scan_signals: Dict[str, List[str]] = {}
+# Охват последнего скана: символов в active_symbols и оцененных каждым режимом
+mode_scan_coverage: Dict[str, Any] = {"universe": 0, "evaluated": {}}
+# Теневые конфигурации (bybit_core.shadow.ShadowConfig): имя -> конфигурация
+shadow_configs: Dict[str, Any] = {}
+
+# Последние цены fetch_ticker: символ -> (цена, время)
+last_prices: Dict[str, Tuple[float, float]] = {}
 
 # ====== ЛОГГИРОВАНИЕ ======
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
     handlers=[
-        logging.FileHandler('ultimate_bot_futures_v7_2.log', encoding='utf-8'),
+        logging.FileHandler(LOG_FILE, encoding='utf-8'),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# ====== МЕТРИКИ ПРОИЗВОДИТЕЛЬНОСТИ ======
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LATENCY_WINDOW = 2048
+
+class LatencyHistogram:
+    """Гистограмма задержек одного этапа + окно последних замеров для перцентилей"""
+    __slots__ = ("bucket_counts", "total", "count", "recent")
+    
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+    
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+    
+    def quantiles(self, qs=(0.5, 0.95, 0.99)) -> List[float]:
+        if not self.recent:
+            return [0.0 for _ in qs]
+        ordered = sorted(self.recent)
+        last = len(ordered) - 1
+        return [ordered[min(last, int(round(q * last)))] for q in qs]
+
+class PerfMetrics:
+    """Потокобезопасный сборщик задержек по этапам (stage + метки)"""
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+    
+    def observe(self, stage: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.observe(seconds)
+    
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+    
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+    
+    def summary(self) -> List[Dict]:
+        """Сводка p50/p95/p99 по каждому этапу, отсортированная по суммарному времени"""
+        with self._lock:
+            items = list(self._histograms.items())
+            rows = []
+            for (stage, labels), histogram in items:
+                p50, p95, p99 = histogram.quantiles()
+                rows.append({
+                    "stage": stage,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "total": histogram.total,
+                    "p50": p50,
+                    "p95": p95,
+                    "p99": p99
+                })
+        rows.sort(key=lambda x: x["total"], reverse=True)
+        return rows
+    
+    def render_prometheus(self) -> str:
+        """Экспорт гистограмм в текстовом формате Prometheus"""
+        lines = [
+            "# HELP bot_stage_latency_seconds Latency of trading bot stages",
+            "# TYPE bot_stage_latency_seconds histogram"
+        ]
+        with self._lock:
+            for (stage, labels), histogram in sorted(self._histograms.items()):
+                label_text = ",".join([f'stage="{prometheus_label(stage)}"'] +
+                                      [f'{k}="{prometheus_label(v)}"' for k, v in labels])
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'bot_stage_latency_seconds_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'bot_stage_latency_seconds_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+                lines.append(f"bot_stage_latency_seconds_sum{{{label_text}}} {histogram.total:.6f}")
+                lines.append(f"bot_stage_latency_seconds_count{{{label_text}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def prometheus_label(value) -> str:
+    """Значение метки в формате Prometheus: экранируются обратный слэш, кавычка и перевод строки"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class StageTimer:
+    """Последовательные замеры шагов внутри одной функции (время с предыдущего lap)"""
+    __slots__ = ("stage", "_last")
+    
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._last = time.perf_counter()
+    
+    def lap(self, step: str):
+        now = time.perf_counter()
+        perf_metrics.observe(self.stage, now - self._last, step=step)
+        self._last = now
+
+perf_metrics = PerfMetrics(enabled=METRICS_ENABLED)
+metrics_server = None
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = perf_metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server():
+    """Запуск локального HTTP endpoint /metrics в фоновом потоке"""
+    global metrics_server
+    if not METRICS_ENABLED or metrics_server is not None:
+        return metrics_server
+    try:
+        metrics_server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), MetricsRequestHandler)
+        metrics_server.daemon_threads = True
+        threading.Thread(target=metrics_server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"📈 Metrics endpoint: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    except Exception as e:
+        logger.error(f"❌ Metrics server start failed: {e}")
+        metrics_server = None
+    return metrics_server
+
+# ====== ПРОФИЛИРОВАНИЕ ПО ЗАПРОСУ ======
+class ScanProfiler:
+    """cProfile для N следующих циклов сканирования, выключен по умолчанию"""
+    
+    def __init__(self):
+        self.remaining = 0
+        self.requested = 0
+        self._stats = None
+    
+    def request(self, cycles: int):
+        # Только присваивания: метод вызывается из обработчика сигнала и потока Telegram
+        cycles = max(1, int(cycles))
+        self.requested = cycles
+        self.remaining = cycles
+    
+    def run(self, func, *args, **kwargs):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.remaining = max(0, self.remaining - 1)
+            if self.remaining == 0:
+                self._finish()
+    
+    def _finish(self):
+        stats, self._stats = self._stats, None
+        if stats is None:
+            return
+        try:
+            log_dir = os.path.dirname(os.path.abspath(LOG_FILE))
+            path = os.path.join(log_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pstats")
+            stats.dump_stats(path)
+            
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            report = buffer.getvalue()
+            logger.info(f"🔬 Profile saved: {path}\n{report}")
+            
+            safe_send(
+                f"🔬 <b>Профиль {self.requested} цикл(ов) сканирования</b>\n"
+                f"Файл: {path}\n\n"
+                f"<pre>{html.escape(summarize_profile(stats))}</pre>"
+            )
+        except Exception as e:
+            logger.error(f"❌ Profile dump error: {e}")
+
+def summarize_profile(stats, limit: int = PROFILE_TOP_FUNCTIONS) -> str:
+    """Компактный топ функций по cumulative time для Telegram"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    lines = ["cum,s   tot,s   calls  function"]
+    for (filename, lineno, func_name), (cc, nc, tt, ct, callers) in rows:
+        location = f"{os.path.basename(filename)}:{lineno}" if lineno else filename
+        lines.append(f"{ct:7.3f} {tt:7.3f} {nc:7d}  {func_name} ({location})")
+    return "\n".join(lines)
+
+scan_profiler = ScanProfiler()
+
+def profile_signal_handler(signum, frame):
+    scan_profiler.request(PROFILE_DEFAULT_CYCLES)
+    logger.info(f"🔬 SIGUSR1: profiling next {PROFILE_DEFAULT_CYCLES} scan cycles")
+
 # ====== СТАТИСТИКА ФИЛЬТРОВ ======
 def log_filter_stats(reset: bool = False):
     """Логирование статистики фильтров"""
     global filter_stats
     
     if reset:
-        filter_stats = {
-            "total_signals": 0,
-            "filtered_by": {k: 0 for k in filter_stats["filtered_by"].keys()},
-            "passed_filters": 0,
-            "signals_by_symbol": {},
-            "last_reset": time.time()
-        }
+        filter_stats = new_filter_stats(time.time())
+        mode_filter_stats.clear()
         logger.info("🔄 Статистика фильтров сброшена")
         return
     
@@ -390,7 +424,7 @@ def update_filter_stats(symbol: str, filter_name: str = None, passed: bool = Fal
     """Обновление статистики фильтров"""
     global filter_stats
     
-    if filter_name:
+    if filter_name or passed:
         filter_stats["total_signals"] += 1
         
         if symbol not in filter_stats["signals_by_symbol"]:
@@ -424,6 +458,9 @@ class DatabaseManager:
             self.db_file = DB_FILE
             self._connection = None
             self._cursor = None
+            # Одно соединение и курсор на все потоки (параллельное открытие позиций):
+            # запрос и чтение его результата - под этой блокировкой
+            self.lock = threading.RLock()
             self._initialize_database()
             self._initialized = True
     
@@ -565,26 +602,31 @@ class DatabaseManager:
             return self._connection, self._cursor
     
     def execute(self, query, params=()):
-        conn, cursor = self.get_connection()
-        try:
-            cursor.execute(query, params)
-            conn.commit()
-            return cursor
-        except Exception as e:
-            logger.error(f"❌ Database execute error: {e}")
+        started = time.perf_counter()
+        with self.lock:
+            conn, cursor = self.get_connection()
             try:
-                conn.rollback()
-            except:
-                pass
-            raise
+                cursor.execute(query, params)
+                conn.commit()
+                perf_metrics.observe("db", time.perf_counter() - started, op=query.split(None, 1)[0].upper())
+                return cursor
+            except Exception as e:
+                logger.error(f"❌ Database execute error: {e}")
+                try:
+                    conn.rollback()
+                except:
+                    pass
+                raise
     
     def fetchone(self, query, params=()):
-        cursor = self.execute(query, params)
-        return cursor.fetchone()
+        with self.lock:
+            cursor = self.execute(query, params)
+            return cursor.fetchone()
     
     def fetchall(self, query, params=()):
-        cursor = self.execute(query, params)
-        return cursor.fetchall()
+        with self.lock:
+            cursor = self.execute(query, params)
+            return cursor.fetchall()
     
     def update_symbol_stats(self, symbol: str, pnl_percent: float):
         """Обновление статистики символа"""
@@ -636,9 +678,178 @@ class DatabaseManager:
 
 db = DatabaseManager()
 
+# ====== ЗАПИСЬ/ВОСПРОИЗВЕДЕНИЕ ОТВЕТОВ БИРЖИ ======
+class CassetteMiss(Exception):
+    """В кассете нет ответа на вызов"""
+
+class ExchangeCassette:
+    """Обертка над ccxt: в record пишет каждый вызов (аргументы, ответ или ошибка, задержка)
+    строкой JSON в дописываемый файл (.gz - сжатый), в replay отдает те же ответы без сети"""
+    
+    RECORDED_METHODS = ("fetch_ohlcv", "fetch_ticker", "fetch_tickers", "fetch_balance", "load_markets",
+                        "set_leverage", "create_order", "cancel_order", "fetch_order", "fetch_open_orders",
+                        "fetch_positions")
+    # Цена и объем ордера в повторе могут отличаться от записи - такие вызовы сопоставляются по порядку.
+    # Остальные (свечи, тикеры, баланс, позиции) - только по аргументам: чужой ответ хуже повтора последнего
+    ORDERED_METHODS = ("create_order", "cancel_order")
+    # ccxt кэширует рынки после первой загрузки - пишем один раз, дальше отдаем тот же ответ
+    CACHED_METHODS = ("load_markets",)
+    
+    def __init__(self, path: str, mode: str, exchange=None, real_timing: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.exchange = exchange
+        self.real_timing = real_timing
+        self.calls = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._by_key: Dict[str, deque] = {}
+        self._by_method: Dict[str, deque] = {}
+        self._last: Dict[str, Dict] = {}
+        if mode == "record":
+            self._file = self._open(path, "at")
+        else:
+            self._load(path)
+    
+    @staticmethod
+    def _open(path: str, mode: str):
+        if path.endswith(".gz"):
+            return gzip.open(path, mode, encoding="utf-8")
+        return open(path, mode, encoding="utf-8")
+    
+    @staticmethod
+    def call_key(method: str, args: tuple, kwargs: dict) -> str:
+        return json.dumps([method, list(args), kwargs], sort_keys=True, default=str, separators=(",", ":"))
+    
+    def _load(self, path: str):
+        records = 0
+        with self._open(path, "rt") as f:
+            try:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя строка после падения при записи
+                        continue
+                    record["used"] = False
+                    self._by_key.setdefault(record["key"], deque()).append(record)
+                    if record["m"] in self.ORDERED_METHODS:
+                        self._by_method.setdefault(record["m"], deque()).append(record)
+                    records += 1
+            except EOFError:
+                pass
+        logger.info(f"📼 Cassette loaded: {records} calls from {path}")
+    
+    def _take(self, method: str, key: str) -> Optional[Dict]:
+        """Сначала точное совпадение аргументов; для ордеров - иначе следующий по порядку вызов того же метода"""
+        candidates = [self._by_key.get(key)]
+        if method in self.ORDERED_METHODS:
+            candidates.append(self._by_method.get(method))
+        for pending in candidates:
+            while pending:
+                record = pending.popleft()
+                if not record["used"]:
+                    record["used"] = True
+                    return record
+        return None
+    
+    def _replay(self, method: str, args: tuple, kwargs: dict):
+        key = self.call_key(method, args, kwargs)
+        with self._lock:
+            self.calls += 1
+            if method in self.CACHED_METHODS and key in self._last:
+                return self._last[key]["r"]
+            record = self._take(method, key)
+            if record is None:
+                self.misses += 1
+                # Сессия длиннее записи - повторяем последний ответ на эти же аргументы
+                record = self._last.get(key)
+                if record is None:
+                    raise CassetteMiss(f"No recorded response for {method}{args}")
+            self._last[key] = record
+        if self.real_timing and record.get("d"):
+            time.sleep(record["d"])
+        if "e" in record:
+            import ccxt
+            raise getattr(ccxt, record["e"]["type"], ccxt.ExchangeError)(record["e"]["msg"])
+        return record["r"]
+    
+    def _record(self, method: str, args: tuple, kwargs: dict):
+        key = self.call_key(method, args, kwargs)
+        if method in self.CACHED_METHODS:
+            if key in self._last:
+                return getattr(self.exchange, method)(*args, **kwargs)
+            self._last[key] = {}
+        started_wall = time.time()
+        started = time.perf_counter()
+        entry = {"m": method, "key": key, "t": round(started_wall, 3)}
+        try:
+            result = getattr(self.exchange, method)(*args, **kwargs)
+            entry["r"] = result
+            return result
+        except Exception as e:
+            entry["e"] = {"type": type(e).__name__, "msg": str(e)}
+            raise
+        finally:
+            entry["d"] = round(time.perf_counter() - started, 4)
+            line = json.dumps(entry, default=str, separators=(",", ":"))
+            with self._lock:
+                self.calls += 1
+                self._file.write(line + "\n")
+                self._file.flush()
+    
+    def __getattr__(self, name):
+        if name in self.RECORDED_METHODS:
+            handler = self._record if self.mode == "record" else self._replay
+            return lambda *args, **kwargs: handler(name, args, kwargs)
+        if self.exchange is None:
+            raise AttributeError(f"Cassette replay has no exchange attribute '{name}'")
+        return getattr(self.exchange, name)
+    
+    def close(self):
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
+                self._file = None
+    
+    def summary(self) -> str:
+        text = f"📼 Cassette {self.mode}: {self.calls} calls, {self.path}"
+        if self.mode == "replay":
+            text += f", misses: {self.misses}"
+        return text
+
+exchange_cassette = None
+
 # ====== ИНИЦИАЛИЗАЦИЯ БИРЖИ ======
+def create_exchange_client():
+    """Клиент ccxt.bybit по настройкам бота (и для процессов-воркеров сканирования)"""
+    import ccxt
+    client = ccxt.bybit({
+        "apiKey": API_KEY,
+        "secret": API_SECRET,
+        "enableRateLimit": True,
+        "options": {
+            "defaultType": "swap",
+            "adjustForTimeDifference": True,
+            # Только USDT-фьючерсы: один запрос instruments-info вместо spot/inverse/option
+            "fetchMarkets": {"types": ["linear"]},
+        },
+        "timeout": 30000,
+    })
+    
+    if SANDBOX_MODE:
+        client.set_sandbox_mode(True)
+    
+    if EXCHANGE_API_URL:
+        client.urls['api'] = {key: EXCHANGE_API_URL for key in client.urls['api']}
+    return client
+
 def initialize_exchange():
-    global exchange
+    """Lock-файл и клиент биржи без сетевых запросов (связь и ключи проверяет startup_balance)"""
+    global exchange, exchange_cassette
     
     if os.path.exists(LOCK_FILE):
         logger.error("❌ Lock file exists — bot already running")
@@ -648,31 +859,35 @@ def initialize_exchange():
         f.write(str(os.getpid()))
 
     try:
-        exchange = ccxt.bybit({
-            "apiKey": API_KEY,
-            "secret": API_SECRET,
-            "enableRateLimit": True,
-            "options": {
-                "defaultType": "swap",
-                "adjustForTimeDifference": True,
-            },
-            "timeout": 30000,
-        })
-        
-        if SANDBOX_MODE:
-            exchange.set_sandbox_mode(True)
-            
-        exchange.fetch_balance()
-        logger.info("✅ Bybit Futures connected successfully")
+        if CASSETTE_MODE == "replay":
+            # Сеть не нужна: все ответы из записанной сессии
+            exchange = exchange_cassette = ExchangeCassette(CASSETTE_FILE, "replay", real_timing=CASSETTE_REAL_TIMING)
+            logger.info(f"✅ Exchange replayed from cassette {CASSETTE_FILE}")
+            return
+        
+        exchange = create_exchange_client()
+        if EXCHANGE_API_URL:
+            logger.info(f"🧪 Exchange API redirected to {EXCHANGE_API_URL}")
+        
+        if CASSETTE_MODE == "record":
+            exchange = exchange_cassette = ExchangeCassette(CASSETTE_FILE, "record", exchange)
+            logger.info(f"📼 Recording exchange calls to {CASSETTE_FILE}")
             
     except Exception as e:
         logger.error(f"❌ Exchange initialization failed: {e}")
         sys.exit(1)
 
+def load_telegram():
+    """Импорт python-telegram-bot (~0.6 с) при запуске, а не при загрузке модуля"""
+    global Bot, ParseMode, Updater, CommandHandler
+    from telegram import Bot, ParseMode
+    from telegram.ext import Updater, CommandHandler
+
 def setup_telegram():
     """Инициализация Telegram бота"""
     global bot, updater
     try:
+        load_telegram()
         bot = Bot(token=TELEGRAM_TOKEN)
         updater = Updater(TELEGRAM_TOKEN, use_context=True)
         dp = updater.dispatcher
@@ -697,8 +912,13 @@ def setup_telegram():
         dp.add_handler(CommandHandler("balance", cmd_balance))
         dp.add_handler(CommandHandler("limits", cmd_limits))
         dp.add_handler(CommandHandler("filter_stats", cmd_filter_stats))
+        dp.add_handler(CommandHandler("modes", cmd_modes))
+        dp.add_handler(CommandHandler("shadow", cmd_shadow))
+        dp.add_handler(CommandHandler("correlation", cmd_correlation))
         dp.add_handler(CommandHandler("reset_stats", cmd_reset_stats))
         dp.add_handler(CommandHandler("trend_stats", cmd_trend_stats))
+        dp.add_handler(CommandHandler("perf", cmd_perf))
+        dp.add_handler(CommandHandler("profile", cmd_profile))
         
         return updater
     except Exception as e:
@@ -711,17 +931,18 @@ def safe_send(text: str, max_retries: int = 3) -> bool:
     if bot is None:
         logger.warning("⚠️ Telegram bot not initialized, skipping message")
         return False
-        
-    for attempt in range(max_retries):
-        try:
-            bot.send_message(chat_id=CHAT_ID, text=text, parse_mode=ParseMode.HTML)
-            logger.info(f"📨 Telegram sent: {text[:50]}...")
-            return True
-        except Exception as e:
-            if attempt == max_retries - 1:
-                logger.error(f"❌ Failed to send Telegram message: {e}")
-            time.sleep(2)
-    return False
+    
+    with perf_metrics.timer("safe_send"):
+        for attempt in range(max_retries):
+            try:
+                bot.send_message(chat_id=CHAT_ID, text=text, parse_mode=ParseMode.HTML)
+                logger.info(f"📨 Telegram sent: {text[:50]}...")
+                return True
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    logger.error(f"❌ Failed to send Telegram message: {e}")
+                time.sleep(2)
+        return False
 
 # ====== УПРАВЛЕНИЕ СОСТОЯНИЕМ БОТА ======
 def stop_bot():
@@ -767,19 +988,228 @@ def retry_api_call(func, max_retries=3, delay=1.0):
             logger.warning(f"🔄 API retry {attempt + 1}/{max_retries} in {sleep_time:.1f}s: {e}")
             time.sleep(sleep_time)
 
-def safe_float_convert(value, default=0.0):
+# ====== БУФЕР СВЕЧЕЙ ======
+class CandleBuffer:
+    """Последние свечи по (символ, таймфрейм). Повторный запрос догружает только свечи
+    с последней известной (она могла быть незакрытой), а не всю серию заново"""
+    
+    def __init__(self, max_candles: int = CANDLE_BUFFER_MAX):
+        self.max_candles = max_candles
+        self._series: Dict[Tuple[str, str], List[List[float]]] = {}
+        # Когда серия последний раз сверялась с биржей (time.time())
+        self._fetched_at: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+    
+    def fresh(self, symbol: str, timeframe: str, limit: int, ttl: float) -> List:
+        """Хвост серии, если она загружена не раньше ttl секунд назад, иначе []"""
+        key = (symbol, timeframe)
+        with self._lock:
+            rows = self._series.get(key)
+            if not rows or len(rows) < limit or time.time() - self._fetched_at.get(key, 0.0) > ttl:
+                return []
+            return rows[-limit:]
+    
+    def delta_request(self, symbol: str, timeframe: str, limit: int, now_ms: int) -> Optional[Tuple[int, int]]:
+        """(since, limit) для догрузки или None - нужна полная загрузка"""
+        with self._lock:
+            rows = self._series.get((symbol, timeframe))
+            if not rows or len(rows) < limit:
+                return None
+            last_ts = int(rows[-1][0])
+        # +2: последняя известная свеча и запас на расхождение часов
+        missing = max(0, (now_ms - last_ts) // timeframe_ms(timeframe)) + 2
+        if missing >= limit:
+            return None
+        return last_ts, missing
+    
+    def merge(self, symbol: str, timeframe: str, rows: List, limit: int) -> List:
+        """Новые свечи поверх буфера; разрыв между буфером и догрузкой - [] (нужна полная загрузка)"""
+        key = (symbol, timeframe)
+        with self._lock:
+            series = self._series.get(key, [])
+            if not series or int(rows[0][0]) > int(series[-1][0]):
+                return []
+            first_ts = int(rows[0][0])
+            keep = len(series)
+            while keep and int(series[keep - 1][0]) >= first_ts:
+                keep -= 1
+            series = (series[:keep] + [list(r) for r in rows])[-self.max_candles:]
+            self._series[key] = series
+            self._fetched_at[key] = time.time()
+            return series[-limit:]
+    
+    def has(self, symbol: str, timeframe: str) -> bool:
+        with self._lock:
+            return (symbol, timeframe) in self._series
+    
+    def since(self, symbol: str, timeframe: str, after_ts: int) -> List:
+        """Свечи серии новее after_ts"""
+        with self._lock:
+            rows = self._series.get((symbol, timeframe), [])
+            start = len(rows)
+            while start and rows[start - 1][0] > after_ts:
+                start -= 1
+            return rows[start:]
+    
+    def replace(self, symbol: str, timeframe: str, rows: List):
+        with self._lock:
+            self._series[(symbol, timeframe)] = [list(r) for r in rows[-self.max_candles:]]
+            self._fetched_at[(symbol, timeframe)] = time.time()
+    
+    def snapshot(self) -> Dict[str, List]:
+        with self._lock:
+            return {f"{symbol}|{timeframe}": list(rows) for (symbol, timeframe), rows in self._series.items()}
+    
+    def restore(self, data: Dict[str, List]) -> int:
+        with self._lock:
+            for key, rows in data.items():
+                symbol, _, timeframe = key.rpartition("|")
+                if symbol and rows:
+                    self._series[(symbol, timeframe)] = rows[-self.max_candles:]
+            return len(self._series)
+
+candle_buffer = CandleBuffer()
+candle_archive = None
+# (символ, таймфрейм) -> время последней свечи, уже записанной в архив
+archived_until: Dict[Tuple[str, str], int] = {}
+
+def get_candle_archive():
+    """Архив открывается при первом обращении (numpy грузится, только если архив включен)"""
+    global candle_archive
+    if candle_archive is None and CANDLE_ARCHIVE_DIR:
+        from candle_archive import CandleArchive
+        candle_archive = CandleArchive(CANDLE_ARCHIVE_DIR)
+    return candle_archive
+
+def archive_candles(symbol: str, timeframe: str, rows: List):
+    """Закрытые свечи - в архив (незакрытая последняя пропускается, повторы архив отбрасывает сам)"""
+    archive = get_candle_archive()
+    if archive is None or not rows:
+        return
+    key = (symbol, timeframe)
+    closed_before = int(time.time() * 1000) - timeframe_ms(timeframe)
+    last_archived = archived_until.get(key, 0)
+    closed = [row for row in rows if last_archived < row[0] <= closed_before]
+    if not closed:
+        return
     try:
-        if value is None:
-            return default
-        return float(value)
-    except (TypeError, ValueError):
-        return default
+        archive.append(symbol, timeframe, closed)
+        archived_until[key] = int(closed[-1][0])
+    except Exception as e:
+        logger.warning(f"⚠️ Candle archive write failed for {symbol} {timeframe}: {e}")
 
-def fetch_ohlcv(symbol: str, timeframe: str, limit=100):
+def seed_candle_buffer(symbol: str, timeframe: str, limit: int) -> bool:
+    """Пустой буфер - из архива: дальше догружаются только свечи после последней архивной"""
+    archive = get_candle_archive()
+    if archive is None or candle_buffer.has(symbol, timeframe):
+        return False
+    try:
+        rows = archive.tail(symbol, timeframe, limit)
+    except Exception as e:
+        logger.warning(f"⚠️ Candle archive read failed for {symbol} {timeframe}: {e}")
+        return False
+    if len(rows) < limit:
+        return False
+    candle_buffer.replace(symbol, timeframe, rows)
+    archived_until[(symbol, timeframe)] = int(rows[-1][0])
+    return True
+
+# ====== СВЕЧИ В РАЗДЕЛЯЕМОЙ ПАМЯТИ ======
+shared_candles = None
+# В воркере шардированного скана: свечи и индикаторы, которые он публиковал бы сам, -
+# для координатора (писатель сегмента один). (символ, таймфрейм) -> строки / значения
+shard_outbox: Optional[Dict[str, Dict]] = None
+
+def start_shared_candles():
+    """Сегмент для процессов-читателей (SharedCandleStore.attach): бот - единственный писатель"""
+    global shared_candles
+    if not SHARED_CANDLES_NAME or shared_candles is not None:
+        return shared_candles
+    from shared_candles import SharedCandleStore
+    timeframes = {RESAMPLE_BASE_TIMEFRAME, "1h", "4h"}
+    for settings in TRADING_MODES.values():
+        timeframes.update(settings[key] for key in ("timeframe_entry", "timeframe_trend", "timeframe_volatility"))
+    try:
+        shared_candles = SharedCandleStore.create(SHARED_CANDLES_NAME, sorted(filter(None, timeframes), key=timeframe_ms),
+                                                  capacity=SHARED_CANDLES_SYMBOLS, ring=CANDLE_BUFFER_MAX)
+    except Exception as e:
+        logger.warning(f"⚠️ Shared candle store unavailable: {e}")
+    return shared_candles
+
+def publish_candles(symbol: str, timeframe: str, rows: List):
+    if shard_outbox is not None and rows:
+        shard_outbox["candles"][(symbol, timeframe)] = rows
+        return
+    if shared_candles is None or not rows or timeframe not in shared_candles.timeframes:
+        return
+    try:
+        shared_candles.write_candles(symbol, timeframe, rows)
+    except Exception as e:
+        logger.warning(f"⚠️ Shared candles write failed for {symbol} {timeframe}: {e}")
+
+def publish_indicators(symbol: str, timeframe: str, values: Dict):
+    if shard_outbox is not None:
+        shard_outbox["indicators"][(symbol, timeframe)] = values
+        return
+    if shared_candles is None or timeframe not in shared_candles.timeframes:
+        return
+    try:
+        shared_candles.write_indicators(symbol, timeframe, values)
+    except Exception as e:
+        logger.warning(f"⚠️ Shared indicators write failed for {symbol} {timeframe}: {e}")
+
+# ====== КОРРЕЛЯЦИЯ СИМВОЛОВ ======
+correlation_tracker = None
+correlation_lock = threading.Lock()
+
+def start_correlation():
+    """Трекер корреляций active_symbols, заполняется закрытыми свечами CORRELATION_TIMEFRAME из fetch_candle_series"""
+    global correlation_tracker
+    if CORRELATION_WINDOW <= 0 or correlation_tracker is not None:
+        return correlation_tracker
+    from bybit_core.correlation import RollingCorrelation
+    try:
+        correlation_tracker = RollingCorrelation(active_symbols, CORRELATION_TIMEFRAME, CORRELATION_WINDOW)
+    except Exception as e:
+        logger.warning(f"⚠️ Correlation tracker unavailable: {e}")
+    return correlation_tracker
+
+def observe_correlation(symbol: str, timeframe: str, rows: List):
+    if correlation_tracker is None or timeframe != correlation_tracker.timeframe or not rows:
+        return
+    with correlation_lock:
+        correlation_tracker.observe(symbol, rows, int(time.time() * 1000))
+
+def update_correlation(scan_started: Optional[float] = None):
+    """После скана: состав - по active_symbols; символы, чьи свечи скан не загружал (открытые позиции,
+    кулдауны, скан, остановленный лимитами), догружаются; собранные закрытые свечи - в окно
+    (O(n²) на свечу, не на скан). scan_started - начало скана: свеча, закрывшаяся во время скана,
+    не требует повторной загрузки всей вселенной"""
+    if correlation_tracker is None:
+        return
+    try:
+        with correlation_lock:
+            correlation_tracker.set_symbols(active_symbols)
+            missing = correlation_tracker.missing(int((scan_started or time.time()) * 1000))
+        for symbol in missing:
+            fetch_ohlcv(symbol, CORRELATION_TIMEFRAME, max(CORRELATION_WINDOW + 2, 20))
+        with correlation_lock, perf_metrics.timer("correlation_update"):
+            added = correlation_tracker.advance()
+        if added:
+            logger.debug(f"🔗 Correlation window: +{added} candles, {len(correlation_tracker.symbols)} symbols")
+    except Exception as e:
+        logger.warning(f"⚠️ Correlation update failed: {e}")
+
+def download_ohlcv(symbol: str, timeframe: str, limit: int, since: Optional[int] = None,
+                   min_candles: int = 20) -> List:
+    """Запрос свечей к бирже с повторами; меньше min_candles - []"""
     def _fetch():
         try:
-            data = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-            if not data or len(data) < 20:
+            if since is None:
+                data = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+            else:
+                data = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit)
+            if not data or len(data) < min_candles:
                 logger.warning(f"⚠️ Insufficient OHLCV data for {symbol}: {len(data) if data else 0} candles")
                 return []
             return data
@@ -794,6 +1224,55 @@ def fetch_ohlcv(symbol: str, timeframe: str, limit=100):
         logger.warning(f"⚠️ Failed to fetch OHLCV for {symbol}: {e}")
         return []
 
+def fetch_ohlcv(symbol: str, timeframe: str, limit=100):
+    if (RESAMPLE_BASE_TIMEFRAME and timeframe != RESAMPLE_BASE_TIMEFRAME
+            and bybit_core.resample.can_resample(RESAMPLE_BASE_TIMEFRAME, timeframe)):
+        base_limit = bybit_core.resample.base_limit(RESAMPLE_BASE_TIMEFRAME, timeframe, limit)
+        if base_limit <= CANDLE_BUFFER_MAX:
+            return fetch_resampled_ohlcv(symbol, timeframe, limit, base_limit)
+    return fetch_candle_series(symbol, timeframe, limit)
+
+def fetch_resampled_ohlcv(symbol: str, timeframe: str, limit: int, base_limit: int):
+    """Старший таймфрейм из базовых свечей: на символ один поток klines вместо одного на таймфрейм"""
+    rows = fetch_candle_series(symbol, RESAMPLE_BASE_TIMEFRAME, base_limit)
+    with perf_metrics.timer("kline_resample", timeframe=timeframe):
+        data = bybit_core.resample.resample_ohlcv(rows, timeframe)[-limit:]
+    if len(data) < 20:
+        logger.warning(f"⚠️ Insufficient {timeframe} data for {symbol} from {RESAMPLE_BASE_TIMEFRAME}: {len(data)} candles")
+        return []
+    publish_candles(symbol, timeframe, data)
+    observe_correlation(symbol, timeframe, data)
+    return data
+
+def fetch_candle_series(symbol: str, timeframe: str, limit: int):
+    """Серия таймфрейма с биржи: из буфера (свежая), догрузкой новых свечей или целиком"""
+    if CANDLE_BUFFER_ENABLED:
+        data = candle_buffer.fresh(symbol, timeframe, limit, CANDLE_BUFFER_TTL)
+        if data:
+            return data
+        now_ms = int(time.time() * 1000)
+        delta = candle_buffer.delta_request(symbol, timeframe, limit, now_ms)
+        if delta is None and seed_candle_buffer(symbol, timeframe, limit):
+            delta = candle_buffer.delta_request(symbol, timeframe, limit, now_ms)
+        if delta is not None:
+            with perf_metrics.timer("kline_fetch", timeframe=timeframe, fetch="delta"):
+                rows = download_ohlcv(symbol, timeframe, delta[1], since=delta[0], min_candles=1)
+                data = candle_buffer.merge(symbol, timeframe, rows, limit) if rows else []
+            if data:
+                archive_candles(symbol, timeframe, rows)
+                publish_candles(symbol, timeframe, data)
+                observe_correlation(symbol, timeframe, data)
+                return data
+    
+    with perf_metrics.timer("kline_fetch", timeframe=timeframe):
+        data = download_ohlcv(symbol, timeframe, limit)
+    if data and CANDLE_BUFFER_ENABLED:
+        candle_buffer.replace(symbol, timeframe, data)
+    archive_candles(symbol, timeframe, data)
+    publish_candles(symbol, timeframe, data)
+    observe_correlation(symbol, timeframe, data)
+    return data
+
 def fetch_balance():
     def _fetch():
         return exchange.fetch_balance()
@@ -811,6 +1290,7 @@ def get_current_price(symbol: str):
         if price <= 0:
             logger.error(f"❌ Invalid price for {symbol}: {price}")
             return None
+        last_prices[symbol] = (price, time.time())
         return price
     except Exception as e:
         logger.error(f"❌ Price fetch failed for {symbol}: {e}")
@@ -850,153 +1330,71 @@ def compute_available_usdt():
         logger.error(f"❌ Balance computation error: {e}")
         return 0.0
 
-# ====== ИСПРАВЛЕННЫЙ АНАЛИЗ ТРЕНДА ======
+# ====== ЯДРО СТРАТЕГИИ (bybit_core) ======
+class BotCoreContext(CoreContext):
+    """Контекст ядра поверх глобального состояния бота. Биржа, БД, режим и часы читаются
+    при каждом обращении - их подменяют /mode, бэктест и бенчмарки"""
+
+    def __init__(self):
+        pass
+
+    # lambda в теле класса видит глобальные имена модуля, а не атрибуты класса
+    exchange = property(lambda self: exchange)
+    db = property(lambda self: db)
+    mode = property(lambda self: CURRENT_MODE)
+    trading_modes = property(lambda self: TRADING_MODES)
+    symbol_categories = property(lambda self: SYMBOL_CATEGORIES)
+    clock = property(lambda self: time)
+    logger = property(lambda self: logger)
+    filter_stats = property(lambda self: filter_stats)
+
+    def now(self):
+        return datetime.now()
+
+    def fetch_ohlcv(self, symbol, timeframe, limit=100):
+        return fetch_ohlcv(symbol, timeframe, limit)
+
+    def get_ohlcv_data(self, symbol, timeframe, limit):
+        return get_ohlcv_data(symbol, timeframe, limit)
+
+    def trend_analysis(self, symbol, timeframe):
+        return get_trend_analysis(symbol, timeframe)
+
+    def volatility_analysis(self, symbol, timeframe):
+        return get_volatility_analysis(symbol, timeframe)
+
+    def is_position_open(self, symbol):
+        return is_position_already_open(symbol)
+
+    def in_cooldown(self, symbol):
+        return is_in_cooldown(symbol)
+
+    def weekly_limit_reached(self):
+        return check_weekly_limit()
+
+    def record_filter(self, symbol, filter_name=None, passed=False):
+        update_filter_stats(symbol, filter_name, passed)
+
+    def observe(self, stage, seconds, **labels):
+        perf_metrics.observe(stage, seconds, **labels)
+
+    def stage_timer(self, stage):
+        return StageTimer(stage)
+
+    def notify(self, text):
+        return safe_send(text)
+
+core_context = BotCoreContext()
+
+# ====== АНАЛИЗ ТРЕНДА И ВОЛАТИЛЬНОСТИ ======
 def get_trend_analysis(symbol: str, timeframe: str = "1h") -> Dict:
     """Улучшенный анализ тренда с исправленной логикой подтверждения"""
-    try:
-        df = get_ohlcv_data(symbol, timeframe, 100)
-        if df is None or len(df) < 50:
-            return {"strength": 0, "direction": "NEUTRAL", "age": 0, "confirmed": True, "ema_aligned": False}
-        
-        # 1. ADX для силы тренда
-        adx_indicator = ADXIndicator(df['high'], df['low'], df['close'], window=14)
-        adx = adx_indicator.adx().iloc[-1]
-        plus_di = adx_indicator.adx_pos().iloc[-1]
-        minus_di = adx_indicator.adx_neg().iloc[-1]
-        
-        # 2. EMA анализ
-        ema_9 = df['close'].ewm(span=9).mean().iloc[-1]
-        ema_21 = df['close'].ewm(span=21).mean().iloc[-1]
-        ema_50 = df['close'].ewm(span=50).mean().iloc[-1]
-        ema_200 = df['close'].ewm(span=200).mean().iloc[-1]
-        
-        # 3. Определение направления
-        direction = "NEUTRAL"
-        if adx > 25:
-            if plus_di > minus_di:
-                direction = "BULLISH"
-            else:
-                direction = "BEARISH"
-        elif adx > 18:
-            if plus_di > minus_di:
-                direction = "WEAK_BULLISH"
-            else:
-                direction = "WEAK_BEARISH"
-        elif adx > 12:
-            if plus_di > minus_di:
-                direction = "VERY_WEAK_BULLISH"
-            else:
-                direction = "VERY_WEAK_BEARISH"
-        
-        # 4. Проверка согласованности EMA
-        ema_aligned = False
-        if direction in ["BULLISH", "WEAK_BULLISH", "VERY_WEAK_BULLISH"]:
-            ema_aligned = ema_9 > ema_21 > ema_50
-        elif direction in ["BEARISH", "WEAK_BEARISH", "VERY_WEAK_BEARISH"]:
-            ema_aligned = ema_9 < ema_21 < ema_50
-        
-        # 5. Определение возраста тренда
-        trend_age = 0
-        if len(df) >= 20:
-            if direction in ["BULLISH", "WEAK_BULLISH", "VERY_WEAK_BULLISH"]:
-                for i in range(1, min(21, len(df))):
-                    if df['close'].iloc[-i] > df['close'].iloc[-i-1]:
-                        trend_age += 1
-                    else:
-                        break
-            elif direction in ["BEARISH", "WEAK_BEARISH", "VERY_WEAK_BEARISH"]:
-                for i in range(1, min(21, len(df))):
-                    if df['close'].iloc[-i] < df['close'].iloc[-i-1]:
-                        trend_age += 1
-                    else:
-                        break
-        
-        # 6. Проверка на других таймфреймах - ИСПРАВЛЕНА ЛОГИКА!
-        confirmed = True
-        settings = get_current_settings()
-        
-        # Только если требуется подтверждение тренда
-        if settings.get('require_trend_confirmation', False) and timeframe in ["1h", "30m"]:
-            try:
-                # Проверяем на старшем таймфрейме
-                higher_tf = "4h" if timeframe == "1h" else "1h"
-                df_higher = get_ohlcv_data(symbol, higher_tf, 50)
-                if df_higher is not None and len(df_higher) > 20:
-                    sma_20_higher = df_higher['close'].tail(20).mean()
-                    sma_50_higher = df_higher['close'].tail(50).mean()
-                    
-                    if direction in ["BULLISH", "WEAK_BULLISH", "VERY_WEAK_BULLISH"]:
-                        # Мягкая проверка с допуском 1%
-                        confirmed = sma_20_higher > sma_50_higher * 0.99
-                    elif direction in ["BEARISH", "WEAK_BEARISH", "VERY_WEAK_BEARISH"]:
-                        confirmed = sma_20_higher < sma_50_higher * 1.01
-                        
-            except Exception as e:
-                logger.warning(f"⚠️ Multi-timeframe check error for {symbol}: {e}")
-                confirmed = True  # Если ошибка - считаем подтвержденным
-        
-        return {
-            "strength": adx,
-            "direction": direction,
-            "age": trend_age,
-            "confirmed": confirmed,
-            "ema_aligned": ema_aligned,
-            "plus_di": plus_di,
-            "minus_di": minus_di,
-            "ema_9": ema_9,
-            "ema_21": ema_21,
-            "ema_50": ema_50,
-            "ema_200": ema_200
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Trend analysis error for {symbol}: {e}")
-        return {"strength": 0, "direction": "NEUTRAL", "age": 0, "confirmed": True, "ema_aligned": False}
+    trend = bybit_core.strategy.get_trend_analysis(core_context, symbol, timeframe)
+    publish_indicators(symbol, timeframe, trend)
+    return trend
 
 def get_volatility_analysis(symbol: str, timeframe: str = "4h") -> Dict:
-    try:
-        df = get_ohlcv_data(symbol, timeframe, 50)
-        if df is None or len(df) < 20:
-            return {"atr": 0, "atr_percentage": 0, "bb_width": 0, "volatility_rank": "LOW"}
-        
-        current_price = df['close'].iloc[-1]
-        
-        atr_indicator = AverageTrueRange(df['high'], df['low'], df['close'], window=14)
-        atr = atr_indicator.average_true_range().iloc[-1]
-        atr_percentage = (atr / current_price) * 100 if current_price > 0 else 0
-        
-        bb = BollingerBands(df['close'], window=20, window_dev=2)
-        bb_upper = bb.bollinger_hband().iloc[-1]
-        bb_lower = bb.bollinger_lband().iloc[-1]
-        bb_middle = bb.bollinger_mavg().iloc[-1]
-        bb_width = ((bb_upper - bb_lower) / bb_middle) * 100 if bb_middle > 0 else 0
-        
-        returns = df['close'].pct_change().dropna()
-        hist_volatility = returns.std() * np.sqrt(365) * 100 if len(returns) > 0 else 0
-        
-        volatility_rank = "LOW"
-        if hist_volatility > 80:
-            volatility_rank = "VERY_HIGH"
-        elif hist_volatility > 60:
-            volatility_rank = "HIGH"
-        elif hist_volatility > 40:
-            volatility_rank = "MEDIUM"
-        
-        return {
-            "atr": atr,
-            "atr_percentage": atr_percentage,
-            "bb_width": bb_width,
-            "hist_volatility": hist_volatility,
-            "volatility_rank": volatility_rank,
-            "current_price": current_price,
-            "bb_upper": bb_upper,
-            "bb_lower": bb_lower,
-            "bb_middle": bb_middle
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Volatility analysis error for {symbol}: {e}")
-        return {"atr": 0, "atr_percentage": 0, "bb_width": 0, "volatility_rank": "LOW"}
+    return bybit_core.strategy.get_volatility_analysis(core_context, symbol, timeframe)
 
 def get_ohlcv_data(symbol: str, timeframe: str, limit: int):
     ohlcv = fetch_ohlcv(symbol, timeframe, limit)
@@ -1004,587 +1402,127 @@ def get_ohlcv_data(symbol: str, timeframe: str, limit: int):
         return None
         
     try:
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = df[col].apply(lambda x: safe_float_convert(x, 0.0))
-        return df
+        return bybit_core.indicators.ohlcv_frame(ohlcv)
     except Exception as e:
         logger.error(f"❌ Dataframe creation error for {symbol}: {e}")
         return None
 
-# ====== АДАПТИВНЫЙ РАСЧЕТ SCORE ======
+# ====== АДАПТИВНЫЙ РАСЧЕТ SCORE И РАЗМЕРА ПОЗИЦИИ ======
 def calculate_adaptive_score(signal: Dict) -> int:
-    try:
-        base_score = signal.get('score', 0)
-        
-        settings = get_current_settings()
-        if not settings.get('adaptive_scoring', False):
-            return base_score
-        
-        # Учитываем силу тренда
-        trend_strength = signal.get('trend_strength', 0)
-        if trend_strength > 40:
-            bonus = 15
-        elif trend_strength > 30:
-            bonus = 10
-        elif trend_strength > 25:
-            bonus = 5
-        else:
-            bonus = 0
-        
-        # Учитываем волатильность
-        atr_percentage = signal.get('atr_percentage', 0)
-        if atr_percentage > 6:
-            bonus -= 5
-        elif atr_percentage < 2:
-            bonus -= 3
-        
-        # Учитываем коррекцию
-        if signal.get('price_at_key_level', False):
-            correction_depth = signal.get('correction_depth', 0)
-            if correction_depth > 0.03:
-                bonus += 10
-            elif correction_depth > 0.02:
-                bonus += 5
-            elif correction_depth > 0.01:
-                bonus += 2
-        
-        # Учитываем объем
-        volume_ratio = signal.get('volume_ratio', 1)
-        if volume_ratio > 2.0:
-            bonus += 5
-        elif volume_ratio > 1.5:
-            bonus += 3
-        
-        # Учитываем согласованность индикаторов
-        macd_histogram = signal.get('macd_histogram', 0)
-        position_type = signal.get('signal_type', 'LONG')
-        
-        if position_type == 'LONG' and macd_histogram > 0:
-            bonus += 3
-        elif position_type == 'SHORT' and macd_histogram < 0:
-            bonus += 3
-        
-        final_score = max(0, base_score + bonus)
-        final_score = min(final_score, 150)
-        
-        logger.debug(f"🔢 Adaptive score: {base_score} + {bonus} = {final_score}")
-        
-        return final_score
-        
-    except Exception as e:
-        logger.error(f"❌ Adaptive score calculation error: {e}")
-        return signal.get('score', 0)
+    return bybit_core.strategy.calculate_adaptive_score(core_context, signal)
 
-# ====== РАСЧЕТ АДАПТИВНОГО РАЗМЕРА ПОЗИЦИИ ======
 def calculate_position_size(symbol: str, signal_score: int, available_usdt: float):
-    try:
-        settings = get_current_settings()
-        
-        base_pct = settings['trade_pct']
-        
-        if signal_score >= 100:
-            multiplier = 1.2
-        elif signal_score >= 90:
-            multiplier = 1.1
-        elif signal_score >= 80:
-            multiplier = 1.0
-        elif signal_score >= 70:
-            multiplier = 0.9
-        else:
-            multiplier = 0.8
-        
-        total_pct = base_pct * multiplier
-        
-        max_pct = 0.05
-        total_pct = min(total_pct, max_pct)
-        
-        position_usdt = available_usdt * total_pct
-        
-        min_trade = SYMBOL_CATEGORIES.get(symbol, {}).get("min_trade_usdt", MIN_TRADE_USDT)
-        if position_usdt < min_trade:
-            logger.info(f"⏹️ Position too small for {symbol}: {position_usdt:.2f} < {min_trade}")
-            return 0
-        
-        logger.info(f"📏 Position size for {symbol}: {total_pct*100:.1f}% = {position_usdt:.2f} USDT")
-        
-        return position_usdt
-        
-    except Exception as e:
-        logger.error(f"❌ Position size calculation error: {e}")
-        return available_usdt * 0.03
+    return core_risk.calculate_position_size(core_context, symbol, signal_score, available_usdt)
 
-# ====== ИСПРАВЛЕННЫЙ FILTER КОМИССИЙ ======
+# ====== FILTER КОМИССИЙ И RISK/REWARD ======
 def commission_filter(symbol: str, entry_price: float, take_profit: float, 
                      position_type: str, trade_amount_usdt: float):
-    try:
-        if position_type == "LONG":
-            potential_profit_pct = (take_profit - entry_price) / entry_price * 100
-        else:
-            potential_profit_pct = (entry_price - take_profit) / entry_price * 100
-        
-        settings = get_current_settings()
-        entry_fee_pct = TAKER_FEE * 100 if settings.get('use_market_entry', False) else MAKER_FEE * 100
-        exit_fee_pct = TAKER_FEE * 100 if settings.get('use_market_exit', False) else MAKER_FEE * 100
-        total_fee_pct = entry_fee_pct + exit_fee_pct
-        
-        required_profit = total_fee_pct + settings.get('commission_requirement', 1.0)
-        
-        passes = potential_profit_pct > required_profit
-        
-        if not passes:
-            logger.info(f"⏹️ Commission filter failed for {symbol}: "
-                       f"Profit {potential_profit_pct:.2f}% < Required {required_profit:.2f}%")
-            update_filter_stats(symbol, "commission_filter", False)
-        
-        return passes
-        
-    except Exception as e:
-        logger.error(f"❌ Commission filter error: {e}")
-        return False
+    return core_risk.commission_filter(core_context, symbol, entry_price, take_profit,
+                                       position_type, trade_amount_usdt)
 
-# ====== ПРОВЕРКА RISK/REWARD ======
 def validate_risk_reward(entry_price: float, stop_loss: float, take_profit: float, position_type: str):
-    try:
-        if position_type == 'LONG':
-            risk = entry_price - stop_loss
-            reward = take_profit - entry_price
-        else:
-            risk = stop_loss - entry_price
-            reward = entry_price - take_profit
-        
-        if risk <= 0:
-            logger.error(f"❌ Invalid risk calculation: risk={risk}")
-            return False, 0
-        
-        risk_reward_ratio = reward / risk
-        settings = get_current_settings()
-        
-        passes = risk_reward_ratio >= settings.get('min_risk_reward', 2.0)
-        
-        if not passes:
-            logger.info(f"⏹️ Risk/Reward filter failed: {risk_reward_ratio:.2f} < {settings.get('min_risk_reward', 2.0)}")
-            update_filter_stats("", "risk_reward", False)
-        
-        return passes, risk_reward_ratio
-        
-    except Exception as e:
-        logger.error(f"❌ Risk/Reward validation error: {e}")
-        return False, 0
+    return core_risk.validate_risk_reward(core_context, entry_price, stop_loss, take_profit, position_type)
 
 # ====== УЛУЧШЕННЫЙ АНАЛИЗ СИМВОЛОВ ======
 def analyze_symbol_with_filters(symbol: str) -> Optional[Dict]:
     """Анализ символа со сбалансированными фильтрами и адаптацией к рынку"""
-    try:
-        update_filter_stats(symbol)
-        
-        settings = get_current_settings()
-        
-        # 1. Проверка что позиция не открыта
-        if is_position_already_open(symbol):
-            logger.debug(f"⏹️ Position already open for {symbol}")
-            update_filter_stats(symbol, "position_already_open", False)
-            return None
-        
-        # 2. Проверка кулдауна
-        if is_in_cooldown(symbol):
-            logger.debug(f"⏹️ {symbol} in cooldown")
-            update_filter_stats(symbol, "cooldown", False)
-            return None
-        
-        # 3. Проверка недельного лимита
-        if check_weekly_limit():
-            logger.debug(f"⏹️ Weekly trade limit reached")
-            update_filter_stats(symbol, "weekly_limit", False)
-            return None
-        
-        # 4. Анализ тренда - УЛУЧШЕННЫЙ С ДИАГНОСТИКОЙ
-        trend_analysis = get_trend_analysis(symbol, settings['timeframe_trend'])
-        
-        logger.info(f"🔍 {symbol} на {settings['timeframe_trend']}: "
-                   f"ADX={trend_analysis['strength']:.1f} (требуется {settings['min_trend_strength']}), "
-                   f"Направление={trend_analysis['direction']}, "
-                   f"Confirmed={trend_analysis['confirmed']}, "
-                   f"Age={trend_analysis['age']}")
-        
-        # Проверка подтверждения тренда (если требуется)
-        if not trend_analysis["confirmed"] and settings.get('require_trend_confirmation', True):
-            logger.debug(f"⏹️ {symbol} filtered: trend not confirmed")
-            update_filter_stats(symbol, "trend_not_confirmed", False)
-            return None
-        
-        # Проверка силы тренда
-        if trend_analysis["strength"] < settings['min_trend_strength']:
-            logger.debug(f"⏹️ {symbol} filtered: weak trend {trend_analysis['strength']:.1f} < {settings['min_trend_strength']}")
-            update_filter_stats(symbol, "weak_trend", False)
-            return None
-        
-        # Проверка возраста тренда
-        if trend_analysis["age"] > settings.get('max_trend_age', 20):
-            logger.debug(f"⏹️ {symbol} filtered: old trend ({trend_analysis['age']} candles)")
-            update_filter_stats(symbol, "old_trend", False)
-            return None
-        
-        # Определение допустимых направлений тренда в зависимости от режима
-        if CURRENT_MODE == "AGGRESSIVE":
-            allowed_long_trends = ["BULLISH", "WEAK_BULLISH", "VERY_WEAK_BULLISH"]
-            allowed_short_trends = ["BEARISH", "WEAK_BEARISH", "VERY_WEAK_BEARISH"]
-        elif CURRENT_MODE == "CONSERVATIVE":
-            allowed_long_trends = ["BULLISH", "WEAK_BULLISH"]
-            allowed_short_trends = ["BEARISH", "WEAK_BEARISH"]
-        else:  # ULTRA_CONSERVATIVE
-            allowed_long_trends = ["BULLISH"]
-            allowed_short_trends = ["BEARISH"]
-        
-        # Определяем тип позиции на основе направления тренда
-        if trend_analysis["direction"] in allowed_long_trends:
-            position_type = "LONG"
-            allowed_trends = allowed_long_trends
-        elif trend_analysis["direction"] in allowed_short_trends:
-            position_type = "SHORT"
-            allowed_trends = allowed_short_trends
-        else:
-            logger.debug(f"⏹️ {symbol} filtered: trend direction {trend_analysis['direction']} not allowed for {CURRENT_MODE}")
-            update_filter_stats(symbol, "trend_direction_not_allowed", False)
-            return None
-        
-        # 5. Анализ волатильности С АДАПТАЦИЕЙ ДЛЯ РЕЖИМА
-        volatility = get_volatility_analysis(symbol, settings['timeframe_volatility'])
-        
-        # Определяем адаптированные пороги для агрессивного режима
-        if CURRENT_MODE == "AGGRESSIVE":
-            # Для агрессивного режима снижаем требования на 40%
-            min_atr_required = settings['min_atr_percentage'] * 100 * 0.6  # 40% снижение
-            max_atr_allowed = settings['max_atr_percentage'] * 100 * 1.4   # 40% увеличение
-            min_bb_width_required = settings.get('bb_width_min', 0.01) * 0.6
-        else:
-            min_atr_required = settings['min_atr_percentage'] * 100
-            max_atr_allowed = settings['max_atr_percentage'] * 100
-            min_bb_width_required = settings.get('bb_width_min', 0.01)
-        
-        logger.info(f"📊 {symbol} Волатильность: ATR={volatility['atr_percentage']:.2f}% "
-                   f"(требуется {min_atr_required:.2f}% - {max_atr_allowed:.2f}%)")
-        
-        if volatility["atr_percentage"] > max_atr_allowed:
-            logger.debug(f"⏹️ {symbol} filtered: high volatility {volatility['atr_percentage']:.1f}% > {max_atr_allowed:.1f}%")
-            update_filter_stats(symbol, "high_volatility", False)
-            return None
-
-        if volatility["atr_percentage"] < min_atr_required:
-            logger.debug(f"⏹️ {symbol} filtered: low volatility {volatility['atr_percentage']:.1f}% < {min_atr_required:.1f}%")
-            update_filter_stats(symbol, "low_volatility", False)
-            return None
-        
-        # 6. Технический анализ на входном ТФ
-        df = get_ohlcv_data(symbol, settings['timeframe_entry'], 100)
-        if df is None or len(df) < 50:
-            return None
-        
-        current_price = df['close'].iloc[-1]
-        if current_price <= 0:
-            return None
-        
-        # Индикаторы
-        rsi = RSIIndicator(df['close'], window=14).rsi().iloc[-1]
-        
-        current_volume = df['volume'].iloc[-1]
-        volume_sma = df['volume'].tail(20).mean()
-        volume_ratio = current_volume / volume_sma if volume_sma > 0 else 1
-        
-        macd = MACD(df['close'])
-        macd_line = macd.macd().iloc[-1]
-        macd_signal = macd.macd_signal().iloc[-1]
-        macd_histogram = macd_line - macd_signal
-        
-        bb = BollingerBands(df['close'], window=20, window_dev=2)
-        bb_upper = bb.bollinger_hband().iloc[-1]
-        bb_lower = bb.bollinger_lband().iloc[-1]
-        bb_middle = bb.bollinger_mavg().iloc[-1]
-        bb_width = ((bb_upper - bb_lower) / bb_middle) if bb_middle != 0 else 0
-        
-        price_position = (current_price - bb_lower) / (bb_upper - bb_lower + 1e-9)
-        
-        # Проверка ширины BB с адаптацией
-        if bb_width < min_bb_width_required:
-            logger.debug(f"⏹️ {symbol} filtered: low BB width {bb_width:.3%} < {min_bb_width_required:.3%}")
-            update_filter_stats(symbol, "low_bb_width", False)
-            return None
-        
-        # ГИБРИДНАЯ СТРАТЕГИЯ: Проверка коррекции к ключевым уровням
-        price_at_key_level = False
-        correction_depth = 0
-        
-        # Расчет скользящих средних
-        ema_20 = df['close'].ewm(span=20).mean().iloc[-1]
-        ema_50 = df['close'].ewm(span=50).mean().iloc[-1]
-        
-        # Определяем, находится ли рынок в боковике (для адаптации фильтров)
-        is_market_ranging = False
-        if CURRENT_MODE == "AGGRESSIVE":
-            # Проверяем диапазон на старшем ТФ
-            df_higher = get_ohlcv_data(symbol, "4h", 20)
-            if df_higher is not None and len(df_higher) >= 10:
-                price_range = (df_higher['high'].max() - df_higher['low'].min()) / df_higher['close'].mean()
-                if price_range < 0.03:  # Диапазон меньше 3% = боковик
-                    is_market_ranging = True
-                    logger.info(f"📊 {symbol}: рынок в боковике (диапазон {price_range:.2%} < 3%)")
-        
-        # ============ АДАПТИВНЫЕ MACD ПОРОГИ ============
-        # Основные пороги в зависимости от силы тренда
-        if "VERY_WEAK" in trend_analysis["direction"]:
-            base_macd_threshold = 0.0003    # Очень слабый тренд - ослабляем
-        elif "WEAK" in trend_analysis["direction"]:
-            base_macd_threshold = 0.0002  # Слабый тренд
-        else:
-            base_macd_threshold = 0.0001  # Сильный тренд
-        
-        # Дополнительное ослабление в боковике
-        if is_market_ranging:
-            base_macd_threshold *= 2.0  # Удваиваем порог в боковике
-        
-        # ============ АДАПТАЦИЯ К СИЛЬНОМУ ТРЕНДУ ============
-        # ВАЖНО: Ослабляем фильтры только ПОСЛЕ объявления переменных!
-        volume_adjustment = 1.0
-        macd_adjustment = 1.0
-        
-        if trend_analysis["strength"] > 30:  # Сильный тренд
-            macd_adjustment = 2.0      # Ослабляем MACD фильтр в 2 раза
-            volume_adjustment = 0.7    # Ослабляем объем на 30%
-            logger.info(f"📊 {symbol}: сильный тренд (ADX={trend_analysis['strength']:.1f}), "
-                       f"ослабляем MACD x{macd_adjustment:.1f}, объем x{volume_adjustment:.1f}")
-        
-        # Применяем адаптацию к сильному тренду
-        macd_threshold = base_macd_threshold * macd_adjustment
-        
-        # ============ КОНЕЦ АДАПТАЦИИ MACD ============
-        
-        if position_type == "LONG":
-            # Проверяем откат к поддержке
-            
-            # Проверка 1: Цена в нижней части BB (0.05-0.45)
-            if 0.05 <= price_position <= 0.45:
-                price_at_key_level = True
-                correction_depth = 1 - price_position
-            
-            # Проверка 2: Цена около EMA20 или EMA50
-            price_to_ema20 = abs(current_price - ema_20) / ema_20
-            price_to_ema50 = abs(current_price - ema_50) / ema_50
-            
-            if price_to_ema20 < 0.015 or price_to_ema50 < 0.02:
-                price_at_key_level = True
-                correction_depth = min(price_to_ema20, price_to_ema50)
-            
-            # Проверка согласованности MACD с адаптивным порогом
-            if not (macd_histogram > -macd_threshold):
-                logger.debug(f"⏹️ {symbol} filtered: MACD not bullish enough for LONG "
-                           f"({macd_histogram:.6f} <= {-macd_threshold:.6f}, порог адаптирован для {trend_analysis['direction']})")
-                update_filter_stats(symbol, "macd_not_aligned", False)
-                return None
-                
-        else:  # SHORT
-            # Проверяем откат к сопротивлению
-            
-            # Проверка 1: Цена в верхней части BB (0.55-0.95)
-            if 0.55 <= price_position <= 0.95:
-                price_at_key_level = True
-                correction_depth = price_position
-            
-            # Проверка 2: Цена около EMA20 или EMA50
-            price_to_ema20 = abs(current_price - ema_20) / ema_20
-            price_to_ema50 = abs(current_price - ema_50) / ema_50
-            
-            if price_to_ema20 < 0.015 or price_to_ema50 < 0.02:
-                price_at_key_level = True
-                correction_depth = min(price_to_ema20, price_to_ema50)
-            
-            # Проверка согласованности MACD с адаптивным порогом
-            if not (macd_histogram < macd_threshold):
-                logger.debug(f"⏹️ {symbol} filtered: MACD not bearish enough for SHORT "
-                           f"({macd_histogram:.6f} >= {macd_threshold:.6f}, порог адаптирован для {trend_analysis['direction']})")
-                update_filter_stats(symbol, "macd_not_aligned", False)
-                return None
-        
-        # Фильтр RSI с учетом режима и направления тренда
-        if "BEARISH" in trend_analysis["direction"]:
-            # Для медвежьего рынка расширяем диапазон RSI
-            rsi_range_long = settings.get('rsi_range_bearish_long', settings['rsi_range_long'])
-            rsi_range_short = settings.get('rsi_range_bearish_short', settings['rsi_range_short'])
-        else:
-            rsi_range_long = settings['rsi_range_long']
-            rsi_range_short = settings['rsi_range_short']
-        
-        rsi_range = rsi_range_long if position_type == "LONG" else rsi_range_short
-        if not (rsi_range[0] <= rsi <= rsi_range[1]):
-            logger.debug(f"⏹️ {symbol} filtered: RSI {rsi:.1f} outside range {rsi_range}")
-            update_filter_stats(symbol, "rsi_out_of_range", False)
-            return None
-        
-        # Фильтр объема с адаптацией к рынку
-        required_volume_ratio = settings['volume_multiplier']
-        
-        # Адаптация к рынку:
-        if is_market_ranging:
-            # В боковике снижаем требования к объему на 50%
-            required_volume_ratio *= 0.5
-            logger.info(f"📊 {symbol}: снижаем требования к объему в боковике до {required_volume_ratio:.1f}x")
-        elif SYMBOL_CATEGORIES.get(symbol, {}).get("volatility") in ["HIGH", "VERY_HIGH"]:
-            required_volume_ratio *= 0.8  # 20% снижение для волатильных
-        
-        # Дополнительное ослабление для VERY_WEAK трендов
-        if "VERY_WEAK" in trend_analysis["direction"]:
-            required_volume_ratio *= 0.7  # Еще 30% снижение
-        
-        # Применяем адаптацию к сильному тренду (уже объявлена выше)
-        required_volume_ratio *= volume_adjustment
-        
-        if volume_ratio < required_volume_ratio:
-            logger.debug(f"⏹️ {symbol} filtered: low volume {volume_ratio:.1f}x < {required_volume_ratio:.1f}x "
-                        f"(адаптировано для {trend_analysis['direction']})")
-            update_filter_stats(symbol, "low_volume", False)
-            return None
-        
-        # Расчет score с адаптацией для слабых трендов
-        score = 0
-        reasons = []
-        
-        # Тренд (макс 30)
-        trend_score = min(trend_analysis["strength"], 30)
-        score += trend_score
-        reasons.append(f"TREND_{trend_analysis['direction']}")
-        
-        # Бонус за сильный тренд (только для не VERY_WEAK)
-        if trend_analysis["strength"] > 30:
-            score += 5
-            reasons.append("STRONG_TREND")
-        elif trend_analysis["strength"] > 25 and "VERY_WEAK" not in trend_analysis["direction"]:
-            score += 3
-            reasons.append("MODERATE_TREND")
-        elif "VERY_WEAK" in trend_analysis["direction"]:
-            # Для VERY_WEAK даем небольшой бонус за прохождение фильтров
-            score += 2
-            reasons.append("VERY_WEAK_PASSED")
-        
-        # Объем (макс 15) с бонусом за высокий объем
-        volume_score = min(volume_ratio * 8, 15) if volume_ratio >= required_volume_ratio else 0
-        score += volume_score
-        if volume_score > 0:
-            reasons.append("HIGH_VOLUME")
-        
-        # RSI (макс 15) с бонусами за экстремальные значения
-        if rsi_range[0] <= rsi <= rsi_range[1]:
-            score += 15
-            reasons.append("GOOD_RSI")
-            
-            # Бонус за оптимальный RSI (только для не VERY_WEAK)
-            if "VERY_WEAK" not in trend_analysis["direction"]:
-                if position_type == "LONG" and rsi < 35:
-                    score += 3
-                    reasons.append("RSI_OVERSOLD")
-                elif position_type == "SHORT" and rsi > 65:
-                    score += 3
-                    reasons.append("RSI_OVERBOUGHT")
-        
-        # Коррекция к ключевому уровню (макс 20)
-        if price_at_key_level:
-            correction_score = min(correction_depth * 80, 20)
-            score += correction_score
-            reasons.append("PRICE_AT_KEY_LEVEL")
-            
-            # Дополнительные бонусы за качество коррекции
-            if correction_depth > 0.03:  # Глубокая коррекция >3%
-                score += 5
-                reasons.append("DEEP_CORRECTION")
-            elif correction_depth > 0.02:  # Средняя коррекция >2%
-                score += 3
-                reasons.append("MEDIUM_CORRECTION")
-            elif correction_depth > 0.01 and "VERY_WEAK" in trend_analysis["direction"]:
-                # Для VERY_WEAK даже небольшая коррекция - хорошо
-                score += 2
-                reasons.append("LIGHT_CORRECTION")
-        else:
-            update_filter_stats(symbol, "price_not_at_key_level", False)
-            logger.debug(f"⏹️ {symbol} filtered: price not at key level")
-            return None
-        
-        # Волатильность (макс 10)
-        if bb_width >= min_bb_width_required:
-            score += 10
-            reasons.append("GOOD_VOLATILITY")
-            
-            # Бонус за оптимальную волатильность (только для не VERY_WEAK)
-            if "VERY_WEAK" not in trend_analysis["direction"] and 0.02 <= bb_width <= 0.05:
-                score += 3
-                reasons.append("OPTIMAL_VOLATILITY")
-        
-        # Согласованность индикаторов (макс 10)
-        if position_type == "LONG" and macd_histogram > -macd_threshold:
-            score += 10
-            reasons.append("MACD_BULLISH")
-            
-            # Бонус за сильный MACD (только для не VERY_WEAK)
-            if "VERY_WEAK" not in trend_analysis["direction"] and macd_histogram > 0.001:
-                score += 3
-                reasons.append("STRONG_MACD_BULLISH")
-        elif position_type == "SHORT" and macd_histogram < macd_threshold:
-            score += 10
-            reasons.append("MACD_BEARISH")
-            
-            # Бонус за сильный MACD (только для не VERY_WEAK)
-            if "VERY_WEAK" not in trend_analysis["direction"] and macd_histogram < -0.001:
-                score += 3
-                reasons.append("STRONG_MACD_BEARISH")
-        
-        # Дополнительный бонус за прохождение всех фильтров в боковике
-        if is_market_ranging:
-            score += 5
-            reasons.append("RANGING_MARKET_BONUS")
-        
-        # Применяем адаптивный scoring
-        base_signal = {
-            "symbol": symbol,
-            "price": current_price,
-            "score": score,
-            "reasons": reasons,
-            "volume_ratio": volume_ratio,
-            "rsi": rsi,
-            "bb_width": bb_width,
-            "bb_position": price_position,
-            "signal_type": position_type,
-            "trend_direction": trend_analysis["direction"],
-            "trend_strength": trend_analysis["strength"],
-            "trend_age": trend_analysis["age"],
-            "atr": volatility["atr"],
-            "atr_percentage": volatility["atr_percentage"],
-            "volatility_rank": volatility["volatility_rank"],
-            "price_at_key_level": price_at_key_level,
-            "correction_depth": correction_depth,
-            "macd_histogram": macd_histogram,
-            "ema_20": ema_20,
-            "ema_50": ema_50,
-            "is_market_ranging": is_market_ranging
-        }
-        
-        adaptive_score = calculate_adaptive_score(base_signal)
-        base_signal["score"] = adaptive_score
-        
-        logger.info(f"🎯 {symbol} {position_type}: Score={adaptive_score}, "
-                   f"Trend={trend_analysis['direction']} ({trend_analysis['strength']:.1f}), "
-                   f"RSI={rsi:.1f}, Vol={volume_ratio:.1f}x, "
-                   f"Correction={'YES' if price_at_key_level else 'NO'} {correction_depth:.2%}, "
-                   f"MACD={macd_histogram:.6f}, BB={bb_width:.3%}")
-        
-        if adaptive_score >= settings['min_score']:
-            update_filter_stats(symbol, passed=True)
-            return base_signal
-        else:
-            logger.debug(f"⏹️ {symbol} filtered: low score {adaptive_score} < {settings['min_score']}")
-            update_filter_stats(symbol, "low_score", False)
-            return None
-        
-    except Exception as e:
-        logger.error(f"❌ Analyze symbol error for {symbol}: {e}")
-        traceback.print_exc()
-        return None
+    return bybit_core.strategy.analyze_symbol_with_filters(core_context, symbol)
+
+def record_mode_signal(mode: str, symbol: str, filter_name: Optional[str], signal: Optional[Dict]):
+    """Итог режима сравнения по символу: воронка режима, сигналы и охват последнего скана"""
+    stats = mode_filter_stats.setdefault(mode, new_filter_stats(time.time()))
+    count_filter(stats, symbol, filter_name, passed=signal is not None)
+    evaluated = mode_scan_coverage["evaluated"]
+    evaluated[mode] = evaluated.get(mode, 0) + 1
+    if signal:
+        mode_scan_signals.setdefault(mode, []).append(f"{symbol} {signal['signal_type']} {signal['score']:.0f}")
+
+def record_live_signal(symbol: str, signal: Optional[Dict]):
+    """Текущий режим в сравнении: его воронка - filter_stats живого скана, здесь - охват и сигнал"""
+    evaluated = mode_scan_coverage["evaluated"]
+    evaluated[CURRENT_MODE] = evaluated.get(CURRENT_MODE, 0) + 1
+    if signal:
+        mode_scan_signals.setdefault(CURRENT_MODE, []).append(f"{symbol} {signal['signal_type']} {signal['score']:.0f}")
+
+def compare_modes_settings() -> Dict[str, Dict]:
+    """Режимы, оцениваемые рядом с текущим (BOT_COMPARE_MODES=1)"""
+    if not COMPARE_MODES:
+        return {}
+    return {mode: settings for mode, settings in TRADING_MODES.items() if mode != CURRENT_MODE}
+
+def observers_active() -> bool:
+    """Режимы сравнения или теневые конфигурации: скан идет по всей вселенной и без живых входов"""
+    return COMPARE_MODES or bool(shadow_configs)
+
+def analyze_symbol_all_modes(symbol: str, live: bool = True) -> Optional[Dict]:
+    """Текущий режим - как analyze_symbol_with_filters; остальные режимы (COMPARE_MODES) и теневые
+    конфигурации - по тем же признакам символа (свечи и индикаторы считаются один раз).
+    live=False - живой сигнал не ищется (слоты заняты, пауза), остальные оцениваются как обычно"""
+    features = bybit_core.strategy.SymbolFeatures(core_context, symbol)
+    signal = bybit_core.strategy.analyze_symbol_with_filters(core_context, symbol, features) if live else None
+    if COMPARE_MODES:
+        for mode, (mode_signal, filter_name) in bybit_core.strategy.evaluate_modes(features, compare_modes_settings()).items():
+            record_mode_signal(mode, symbol, filter_name, mode_signal)
+        if live:
+            record_live_signal(symbol, signal)
+    now = time.time()
+    for shadow in list(shadow_configs.values()):
+        try:
+            shadow.evaluate(features, now)
+        except Exception as e:
+            logger.error(f"❌ Shadow {shadow.name} evaluation error for {symbol}: {e}")
+    return signal
+
+# ====== ТЕНЕВЫЕ КОНФИГУРАЦИИ ======
+def register_shadow(name: str, mode: str, items: List[str]):
+    """Новая (или заменяющая одноименную) теневая конфигурация; ошибка в режиме или правках - ValueError"""
+    from bybit_core.shadow import ShadowConfig, parse_overrides
+    mode = mode.upper()
+    if mode not in TRADING_MODES:
+        raise ValueError(f"Unknown mode {mode!r}")
+    shadow = ShadowConfig(name, mode, parse_overrides(TRADING_MODES[mode], items), TRADING_MODES, time.time())
+    shadow_configs[name] = shadow
+    logger.info(f"👻 Shadow config {name}: {mode} {shadow.overrides}")
+    return shadow
+
+def load_shadow_configs():
+    for entry in SHADOW_CONFIGS.split(";"):
+        parts = entry.split()
+        if not parts:
+            continue
+        try:
+            if len(parts) < 2:
+                raise ValueError("expected NAME MODE [key=value ...]")
+            register_shadow(parts[0], parts[1], parts[2:])
+        except ValueError as e:
+            logger.warning(f"⚠️ Shadow config {entry.strip()!r} skipped: {e}")
+
+def finish_shadow_scan():
+    now = time.time()
+    for shadow in list(shadow_configs.values()):
+        position = shadow.finish_scan(now)
+        if position:
+            logger.info(f"👻 Shadow {shadow.name}: {position['position_type']} {position['symbol']} "
+                        f"@ {position['open_price']:.6f} (SL {position['stop_loss']:.6f}, TP {position['take_profit']:.6f})")
+
+def shadow_price(symbol: str) -> Optional[float]:
+    cached = last_prices.get(symbol)
+    if cached and time.time() - cached[1] <= SHADOW_PRICE_MAX_AGE:
+        return cached[0]
+    return get_current_price(symbol)
+
+def update_shadow_positions():
+    """Выходы теневых позиций; цена символа запрашивается один раз на все конфигурации"""
+    now = time.time()
+    for shadow in list(shadow_configs.values()):
+        for symbol in list(shadow.positions):
+            price = shadow_price(symbol)
+            if not price:
+                continue
+            trade = shadow.update(symbol, price, now)
+            if trade:
+                logger.info(f"👻 Shadow {shadow.name}: {trade['reason']} {symbol} "
+                            f"@ {price:.6f}, PnL {trade['pnl_percent']:+.2f}%")
 
 # ====== УПРАВЛЕНИЕ ПОЗИЦИЯМИ ======
 def get_open_positions():
@@ -1627,76 +1565,25 @@ def get_open_positions():
         return positions
         
     except Exception as e:
-        logger.error(f"❌ Positions fetch error: {e}")
-        return {}
-
-def get_concurrent_trades_count():
-    try:
-        row = db.fetchone("SELECT COUNT(*) FROM positions WHERE status='OPEN'")
-        return row[0] if row else 0
-    except Exception as e:
-        logger.error(f"❌ Concurrent trades count error: {e}")
-        return 0
-
-def is_in_cooldown(symbol: str):
-    try:
-        row = db.fetchone("SELECT last_closed_ts, consecutive_losses FROM symbol_cooldown WHERE symbol=?", (symbol,))
-        if not row or not row[0]:
-            return False
-            
-        last_closed = row[0]
-        consecutive_losses = row[1] or 0
-        settings = get_current_settings()
-        cooldown = settings['cooldown']
-        
-        if consecutive_losses >= 3:
-            cooldown *= 2
-        
-        in_cooldown = (time.time() - last_closed) < cooldown
-        
-        if in_cooldown:
-            remaining = cooldown - (time.time() - last_closed)
-            logger.debug(f"⏹️ {symbol} in cooldown, {remaining:.0f}s remaining")
-            
-        return in_cooldown
-        
-    except Exception as e:
-        logger.error(f"❌ Cooldown check error: {e}")
-        return False
-
-def is_position_already_open(symbol: str) -> bool:
-    try:
-        row = db.fetchone("SELECT COUNT(*) FROM positions WHERE symbol=? AND status='OPEN'", (symbol,))
-        return row[0] > 0 if row else False
-    except Exception as e:
-        logger.error(f"❌ Position check error for {symbol}: {e}")
-        return False
-
-def check_weekly_limit():
-    try:
-        settings = get_current_settings()
-        weekly_limit = settings.get('max_weekly_trades', 99)
-        
-        today = datetime.now()
-        week_start = today - timedelta(days=today.weekday())
-        week_start_str = week_start.strftime('%Y-%m-%d')
-        
-        row = db.fetchone(
-            "SELECT trade_count FROM weekly_limits WHERE week_start=?",
-            (week_start_str,)
-        )
-        
-        current_count = row[0] if row else 0
-        
-        if current_count >= weekly_limit:
-            logger.info(f"⏹️ Weekly trade limit reached: {current_count}/{weekly_limit}")
-            return True
-            
-        return False
-        
-    except Exception as e:
-        logger.error(f"❌ Weekly limit check error: {e}")
-        return False
+        logger.error(f"❌ Positions fetch error: {e}")
+        return {}
+
+def get_concurrent_trades_count():
+    try:
+        row = db.fetchone("SELECT COUNT(*) FROM positions WHERE status='OPEN'")
+        return row[0] if row else 0
+    except Exception as e:
+        logger.error(f"❌ Concurrent trades count error: {e}")
+        return 0
+
+def is_in_cooldown(symbol: str):
+    return core_risk.is_in_cooldown(core_context, symbol)
+
+def is_position_already_open(symbol: str) -> bool:
+    return core_risk.is_position_already_open(core_context, symbol)
+
+def check_weekly_limit():
+    return core_risk.check_weekly_limit(core_context)
 
 def can_open_new_trade():
     settings = get_current_settings()
@@ -1709,7 +1596,33 @@ def can_open_new_trade():
     return can_open
 
 # ====== ОТКРЫТИЕ ПОЗИЦИЙ ======
-def open_position(signal: Dict):
+def planned_position_usdt(symbol: str, signal_score: int, available_usdt: float) -> float:
+    """Объем позиции (USDT) из доступного баланса: адаптивный размер или trade_pct, множитель риска символа;
+    меньше минимума символа - 0"""
+    settings = get_current_settings()
+    
+    if settings.get('adaptive_position_sizing', False):
+        trade_amount_usdt = calculate_position_size(symbol, signal_score, available_usdt)
+    else:
+        trade_amount_usdt = available_usdt * settings['trade_pct']
+    
+    if trade_amount_usdt <= 0:
+        logger.info(f"⏹️ Zero position size for {symbol}")
+        return 0
+    
+    risk_multiplier = SYMBOL_CATEGORIES.get(symbol, {}).get("risk_multiplier", 1.0)
+    trade_amount_usdt *= risk_multiplier
+    
+    min_usdt = SYMBOL_CATEGORIES.get(symbol, {}).get("min_trade_usdt", MIN_TRADE_USDT)
+    if trade_amount_usdt < min_usdt:
+        logger.info(f"⏹️ Insufficient amount for {symbol}: {trade_amount_usdt:.2f} < {min_usdt}")
+        return 0
+    
+    return trade_amount_usdt
+
+def open_position(signal: Dict, trade_amount_usdt: Optional[float] = None):
+    """trade_amount_usdt - объем, уже рассчитанный при распределении сигналов скана;
+    без него - planned_position_usdt от текущего баланса"""
     try:
         logger.info(f"🚀 Пытаемся открыть позицию: {signal.get('symbol')}")
         logger.info(f"📊 Параметры сигнала: цена={signal.get('price')}, score={signal.get('score')}")
@@ -1733,28 +1646,15 @@ def open_position(signal: Dict):
         signal_score = signal['score']
         settings = get_current_settings()
         
-        available_usdt = compute_available_usdt()
-        
-        if settings.get('adaptive_position_sizing', False):
-            trade_amount_usdt = calculate_position_size(symbol, signal_score, available_usdt)
-        else:
-            trade_amount_usdt = available_usdt * settings['trade_pct']
-        
+        if trade_amount_usdt is None:
+            trade_amount_usdt = planned_position_usdt(symbol, signal_score, compute_available_usdt())
         if trade_amount_usdt <= 0:
-            logger.info(f"⏹️ Zero position size for {symbol}")
-            return False
-        
-        risk_multiplier = SYMBOL_CATEGORIES.get(symbol, {}).get("risk_multiplier", 1.0)
-        trade_amount_usdt *= risk_multiplier
-        
-        min_usdt = SYMBOL_CATEGORIES.get(symbol, {}).get("min_trade_usdt", MIN_TRADE_USDT)
-        if trade_amount_usdt < min_usdt:
-            logger.info(f"⏹️ Insufficient amount for {symbol}: {trade_amount_usdt:.2f} < {min_usdt}")
             return False
         
         symbol_info = get_symbol_info(symbol)
         contract_size = symbol_info.get('contract_size', 1)
         price_precision = symbol_info.get('price_precision', 8)
+        amount_precision = symbol_info.get('amount_precision', 8)
         
         leverage = settings['leverage']
         base_amount = trade_amount_usdt / (current_price * contract_size)
@@ -1768,12 +1668,9 @@ def open_position(signal: Dict):
         base_max_stop_loss = settings['max_stop_loss']
         base_take_profit = settings['take_profit']
         
-        if position_type == 'LONG':
-            base_stop_loss = current_price * (1 - base_max_stop_loss)
-            base_take_profit_price = current_price * (1 + base_take_profit)
-        else:
-            base_stop_loss = current_price * (1 + base_max_stop_loss)
-            base_take_profit_price = current_price * (1 - base_take_profit)
+        base_stop_loss, base_take_profit_price, _ = core_risk.sl_tp_prices(
+            current_price, position_type, base_max_stop_loss, base_take_profit
+        )
         
         rr_passes, rr_ratio = validate_risk_reward(
             current_price, base_stop_loss, base_take_profit_price, position_type
@@ -1784,26 +1681,10 @@ def open_position(signal: Dict):
             return False
         
         # Адаптация SL/TP
-        if settings.get('adaptive_sl', False):
-            volatility_multiplier = signal.get('atr_percentage', 1.0) / 100
-            max_stop_loss = settings['max_stop_loss'] * min(volatility_multiplier * 2, 1.5)
-        else:
-            max_stop_loss = settings['max_stop_loss']
-        
-        if settings.get('adaptive_tp', False):
-            take_profit = settings['take_profit'] * min(signal.get('trend_strength', 20) / 25, 1.5)
-        else:
-            take_profit = settings['take_profit']
-        
-        # Установка адаптированных SL/TP
-        if position_type == 'LONG':
-            stop_loss = current_price * (1 - max_stop_loss)
-            take_profit_price = current_price * (1 + take_profit)
-            quick_exit_price = current_price * (1 + settings.get('quick_exit', 0))
-        else:
-            stop_loss = current_price * (1 + max_stop_loss)
-            take_profit_price = current_price * (1 - take_profit)
-            quick_exit_price = current_price * (1 - settings.get('quick_exit', 0))
+        max_stop_loss, take_profit = core_risk.adaptive_sl_tp_pct(settings, signal)
+        stop_loss, take_profit_price, quick_exit_price = core_risk.sl_tp_prices(
+            current_price, position_type, max_stop_loss, take_profit, settings.get('quick_exit', 0)
+        )
         
         if settings.get('commission_filter', False):
             if not commission_filter(symbol, current_price, take_profit_price, position_type, trade_amount_usdt):
@@ -1825,7 +1706,8 @@ def open_position(signal: Dict):
         exchange_order_ids = ""
         if not DRY_RUN:
             try:
-                exchange.set_leverage(leverage, symbol)
+                with perf_metrics.timer("order_placement", order="set_leverage"):
+                    exchange.set_leverage(leverage, symbol)
                 
                 order_params = {
                     'symbol': symbol,
@@ -1838,32 +1720,35 @@ def open_position(signal: Dict):
                     }
                 }
                 
-                order = exchange.create_order(**order_params)
+                with perf_metrics.timer("order_placement", order="entry"):
+                    order = exchange.create_order(**order_params)
                 order_id = order.get('id', '')
                 
-                sl_order = exchange.create_order(
-                    symbol=symbol,
-                    type='STOP_MARKET',
-                    side='sell' if position_type == 'LONG' else 'buy',
-                    amount=base_amount,
-                    price=None,
-                    params={
-                        'stopPrice': stop_loss,
-                        'reduceOnly': True
-                    }
-                )
+                with perf_metrics.timer("order_placement", order="stop_loss"):
+                    sl_order = exchange.create_order(
+                        symbol=symbol,
+                        type='STOP_MARKET',
+                        side='sell' if position_type == 'LONG' else 'buy',
+                        amount=base_amount,
+                        price=None,
+                        params={
+                            'stopPrice': stop_loss,
+                            'reduceOnly': True
+                        }
+                    )
                 
-                tp_order = exchange.create_order(
-                    symbol=symbol,
-                    type='TAKE_PROFIT_MARKET',
-                    side='sell' if position_type == 'LONG' else 'buy',
-                    amount=base_amount,
-                    price=None,
-                    params={
-                        'stopPrice': take_profit_price,
-                        'reduceOnly': True
-                    }
-                )
+                with perf_metrics.timer("order_placement", order="take_profit"):
+                    tp_order = exchange.create_order(
+                        symbol=symbol,
+                        type='TAKE_PROFIT_MARKET',
+                        side='sell' if position_type == 'LONG' else 'buy',
+                        amount=base_amount,
+                        price=None,
+                        params={
+                            'stopPrice': take_profit_price,
+                            'reduceOnly': True
+                        }
+                    )
                 
                 exchange_order_ids = f"{order_id},{sl_order.get('id', '')},{tp_order.get('id', '')}"
                 
@@ -1874,37 +1759,39 @@ def open_position(signal: Dict):
         else:
             exchange_order_ids = f"DRY_RUN_{int(time.time())}"
         
-        db.execute("""
-            INSERT INTO positions (
-                symbol, trading_mode, strategy, base_amount, open_price, stop_loss, take_profit,
-                quick_exit_price, max_price, min_price, open_time, fee_paid, original_stop_loss, 
-                open_timestamp, position_type, leverage, invested_usdt, exchange_order_ids, 
-                entry_type, status, risk_multiplier, atr_value, trend_strength, signal_score,
-                risk_reward_ratio
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?, 'OPEN', ?, ?, ?, ?, ?)
-        """, (
-            symbol, CURRENT_MODE, settings['strategy'], base_amount, current_price, 
-            stop_loss, take_profit_price, quick_exit_price, current_price, current_price, 
-            0, stop_loss, int(time.time()), position_type, leverage, trade_amount_usdt, 
-            exchange_order_ids, "DRY_RUN" if DRY_RUN else "LIMIT" if not settings.get('use_market_entry', False) else "MARKET",
-            SYMBOL_CATEGORIES.get(symbol, {}).get("risk_multiplier", 1.0),
-            signal.get('atr', 0), signal.get('trend_strength', 0), signal_score, final_rr_ratio
-        ))
+        # Вставки и недельный счетчик (чтение-запись) - одним блоком: позиции могут открываться параллельно
+        with db.lock:
+            db.execute("""
+                INSERT INTO positions (
+                    symbol, trading_mode, strategy, base_amount, open_price, stop_loss, take_profit,
+                    quick_exit_price, max_price, min_price, open_time, fee_paid, original_stop_loss, 
+                    open_timestamp, position_type, leverage, invested_usdt, exchange_order_ids, 
+                    entry_type, status, risk_multiplier, atr_value, trend_strength, signal_score,
+                    risk_reward_ratio
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?, 'OPEN', ?, ?, ?, ?, ?)
+            """, (
+                symbol, CURRENT_MODE, settings['strategy'], base_amount, current_price, 
+                stop_loss, take_profit_price, quick_exit_price, current_price, current_price, 
+                0, stop_loss, int(time.time()), position_type, leverage, trade_amount_usdt, 
+                exchange_order_ids, "DRY_RUN" if DRY_RUN else "LIMIT" if not settings.get('use_market_entry', False) else "MARKET",
+                SYMBOL_CATEGORIES.get(symbol, {}).get("risk_multiplier", 1.0),
+                signal.get('atr', 0), signal.get('trend_strength', 0), signal_score, final_rr_ratio
+            ))
         
-        db.execute("""
-            INSERT INTO trade_history (
-                symbol, action, price, usdt_amount, base_amount, fee, time, timestamp,
-                trading_mode, strategy, position_type, leverage, exchange_order_id, entry_type
-            ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            symbol, "OPEN", current_price, trade_amount_usdt, base_amount, 
-            (TAKER_FEE if settings.get('use_market_entry', False) else MAKER_FEE) * trade_amount_usdt,
-            int(time.time()), CURRENT_MODE, settings['strategy'], position_type, leverage,
-            exchange_order_ids.split(',')[0] if exchange_order_ids else '',
-            "DRY_RUN" if DRY_RUN else "LIMIT" if not settings.get('use_market_entry', False) else "MARKET"
-        ))
+            db.execute("""
+                INSERT INTO trade_history (
+                    symbol, action, price, usdt_amount, base_amount, fee, time, timestamp,
+                    trading_mode, strategy, position_type, leverage, exchange_order_id, entry_type
+                ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                symbol, "OPEN", current_price, trade_amount_usdt, base_amount, 
+                (TAKER_FEE if settings.get('use_market_entry', False) else MAKER_FEE) * trade_amount_usdt,
+                int(time.time()), CURRENT_MODE, settings['strategy'], position_type, leverage,
+                exchange_order_ids.split(',')[0] if exchange_order_ids else '',
+                "DRY_RUN" if DRY_RUN else "LIMIT" if not settings.get('use_market_entry', False) else "MARKET"
+            ))
         
-        update_weekly_counter()
+            update_weekly_counter()
         
         logger.info(f"🎯 {'🧪 DRY_RUN:' if DRY_RUN else '🚀 REAL:'} Opened {position_type} position for {symbol}")
         logger.info(f"   Price: {current_price:.6f}, Amount: {base_amount:.6f}, USDT: {trade_amount_usdt:.2f}")
@@ -2107,7 +1994,7 @@ def check_partial_exits(symbol: str, current_price: float, position: Dict):
 def close_partial_position(symbol: str, exit_pct: float, reason: str):
     try:
         position_row = db.fetchone(
-            "SELECT * FROM positions WHERE symbol=? AND status='OPEN'", 
+            "SELECT base_amount, position_type, leverage, open_price FROM positions WHERE symbol=? AND status='OPEN'", 
             (symbol,)
         )
         
@@ -2118,23 +2005,35 @@ def close_partial_position(symbol: str, exit_pct: float, reason: str):
         if not current_price:
             return False
         
-        base_amount = position_row[4]
-        position_type = position_row[23]
-        leverage = position_row[24]
+        base_amount = position_row[0]
+        position_type = position_row[1]
+        leverage = position_row[2]
+        open_price = position_row[3]
         
         close_amount = base_amount * exit_pct
+        # Флаг частичного выхода сохраняется в БД, иначе он срабатывает на каждой проверке
+        partial_flag = "partial_exit_2" if reason == "PARTIAL_EXIT_2" else "partial_exit_1"
         
         if DRY_RUN:
             new_amount = base_amount - close_amount
+            if position_type == 'LONG':
+                partial_pnl = (current_price - open_price) * close_amount * leverage
+            else:
+                partial_pnl = (open_price - current_price) * close_amount * leverage
+            
             db.execute(
-                "UPDATE positions SET base_amount=? WHERE symbol=? AND status='OPEN'",
-                (new_amount, symbol)
+                f"UPDATE positions SET base_amount=?, pnl=pnl+?, {partial_flag}=1 WHERE symbol=? AND status='OPEN'",
+                (new_amount, partial_pnl, symbol)
             )
             
-            logger.info(f"🧪 Partial close {symbol}: {exit_pct*100:.0f}% at {current_price:.6f}")
+            logger.info(f"🧪 Partial close {symbol}: {exit_pct*100:.0f}% at {current_price:.6f}, PnL: {partial_pnl:+.4f}")
             return True
             
         else:
+            db.execute(
+                f"UPDATE positions SET {partial_flag}=1 WHERE symbol=? AND status='OPEN'",
+                (symbol,)
+            )
             logger.info(f"🚀 Would close {exit_pct*100:.0f}% of {symbol} at {current_price:.6f}")
             return True
             
@@ -2195,10 +2094,11 @@ def check_position_exits():
 
 def safe_close_position(symbol: str, reason: str):
     try:
-        position_row = db.fetchone(
-            "SELECT * FROM positions WHERE symbol=? AND status='OPEN'", 
-            (symbol,)
-        )
+        position_row = db.fetchone("""
+            SELECT id, open_price, base_amount, position_type, leverage, invested_usdt,
+                   exchange_order_ids, signal_score, fee_paid, open_timestamp, pnl
+            FROM positions WHERE symbol=? AND status='OPEN'
+        """, (symbol,))
         
         if not position_row:
             logger.warning(f"⚠️ No open position found for {symbol}")
@@ -2210,13 +2110,13 @@ def safe_close_position(symbol: str, reason: str):
             return False
         
         pos_id = position_row[0]
-        open_price = position_row[5]
-        base_amount = position_row[4]
-        position_type = position_row[23]
-        leverage = position_row[24]
-        invested_usdt = position_row[25]
-        exchange_order_ids = position_row[26]
-        signal_score = position_row[39] or 0
+        open_price = position_row[1]
+        base_amount = position_row[2]
+        position_type = position_row[3]
+        leverage = position_row[4]
+        invested_usdt = position_row[5]
+        exchange_order_ids = position_row[6]
+        signal_score = position_row[7] or 0
         
         if position_type == 'LONG':
             pnl = (current_price - open_price) * base_amount * leverage
@@ -2225,9 +2125,12 @@ def safe_close_position(symbol: str, reason: str):
             pnl = (open_price - current_price) * base_amount * leverage
             pnl_percent = ((open_price - current_price) / open_price) * 100 * leverage
         
+        # PnL уже закрытых частей позиции
+        pnl += position_row[10] or 0
+        
         settings = get_current_settings()
         exit_fee = TAKER_FEE * invested_usdt if settings.get('use_market_exit', False) else MAKER_FEE * invested_usdt
-        total_fee = exit_fee + position_row[16]
+        total_fee = exit_fee + (position_row[8] or 0)
         
         if not DRY_RUN:
             try:
@@ -2254,7 +2157,7 @@ def safe_close_position(symbol: str, reason: str):
                 logger.error(f"❌ Real close order failed for {symbol}: {e}")
                 safe_send(f"❌ <b>Ошибка закрытия позиции {symbol}:</b> {str(e)}")
         
-        duration = int(time.time()) - position_row[22]
+        duration = int(time.time()) - (position_row[9] or int(time.time()))
         
         db.execute("""
             UPDATE positions 
@@ -2361,10 +2264,421 @@ def update_cooldown(symbol: str, pnl_percent: float):
     except Exception as e:
         logger.error(f"❌ Cooldown update error for {symbol}: {e}")
 
+# ====== ВСЕЛЕННАЯ СИМВОЛОВ ======
+def refresh_universe() -> int:
+    """active_symbols и SYMBOL_CATEGORIES из рынков (кэш ccxt) и одного fetch_tickers.
+    SYMBOLS и символы открытых позиций остаются всегда; при ошибке - прежний список"""
+    global active_symbols, SYMBOL_CATEGORIES
+    try:
+        with perf_metrics.timer("universe_refresh"):
+            markets = exchange.load_markets()
+            tickers = exchange.fetch_tickers()
+    except Exception as e:
+        logger.warning(f"⚠️ Universe refresh failed, keeping {len(active_symbols)} symbols: {e}")
+        return len(active_symbols)
+
+    pinned = list(SYMBOLS) + list(get_open_positions())
+    symbols, categories, metrics = bybit_core.universe.select_universe(
+        markets, tickers, UNIVERSE_TOP_K, UNIVERSE_MIN_TURNOVER, pinned)
+    now = time.time()
+    for symbol in symbols:
+        if symbol in metrics:
+            last_prices[symbol] = (metrics[symbol]["last"], now)
+
+    active_symbols = symbols
+    SYMBOL_CATEGORIES = categories
+    logger.info(f"🌐 Universe: {len(symbols)} symbols of {len(metrics)} linear USDT perps "
+                f"(top {UNIVERSE_TOP_K}, turnover >= {UNIVERSE_MIN_TURNOVER:,.0f})")
+    return len(symbols)
+
+# ====== ШАРДИРОВАННОЕ СКАНИРОВАНИЕ ======
+class ShardContext(BotCoreContext):
+    """Контекст ядра в процессе-воркере: свечи - через буфер воркера, позиции, кулдауны и недельный
+    лимит проверяет координатор (БД координатора воркер не трогает), статистика фильтров - своя
+    на задание, тренд символа считается один раз на задание"""
+
+    def __init__(self, mode: str):
+        self._mode = mode
+        self._filter_stats = new_filter_stats()
+        self._trends: Dict[Tuple[str, str], Dict] = {}
+
+    mode = property(lambda self: self._mode)
+    db = property(lambda self: None)
+    filter_stats = property(lambda self: self._filter_stats)
+
+    def trend_analysis(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        if key not in self._trends:
+            self._trends[key] = bybit_core.strategy.get_trend_analysis(self, symbol, timeframe)
+            publish_indicators(symbol, timeframe, self._trends[key])
+        return self._trends[key]
+
+    def volatility_analysis(self, symbol, timeframe):
+        return bybit_core.strategy.get_volatility_analysis(self, symbol, timeframe)
+
+    def is_position_open(self, symbol):
+        return False
+
+    def in_cooldown(self, symbol):
+        return False
+
+    def weekly_limit_reached(self):
+        return False
+
+    def record_filter(self, symbol, filter_name=None, passed=False):
+        CoreContext.record_filter(self, symbol, filter_name, passed)
+
+    def observe(self, stage, seconds, **labels):
+        pass
+
+    def stage_timer(self, stage):
+        return CoreContext.stage_timer(self, stage)
+
+def shard_index(symbol: str, workers: int) -> int:
+    """Постоянный шард символа (crc32, а не hash(): тот различается между процессами)"""
+    return zlib.crc32(symbol.encode()) % workers
+
+def scan_worker_main(index: int, tasks, results, markets: Optional[Dict] = None):
+    """Процесс-воркер (чистый импорт бота через forkserver): свой клиент биржи с рынками координатора
+    и буфер свечей по своему шарду.
+    Задание: (scan_id, режим, настройки режима, категории символов, символы, символы живого скана
+    (None - все), режимы сравнения, теневые конфигурации) -> кандидаты, итоги режимов сравнения
+    и теневых конфигураций в results"""
+    global exchange, SYMBOL_CATEGORIES, shared_candles, shard_outbox, correlation_tracker
+    # Писатель разделяемых свечей один - основной процесс; корреляции тоже считает он,
+    # воркер возвращает свечи (новые с прошлой отправки) и индикаторы своего шарда
+    shared_candles = None
+    correlation_tracker = None
+    correlation_sent: Dict[str, int] = {}
+    published_until: Dict[Tuple[str, str], int] = {}
+    # Ctrl+C получает вся группа процессов: воркеры останавливает координатор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    exchange = create_exchange_client()
+    if markets:
+        exchange.set_markets(markets)
+    
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        scan_id, mode, settings, categories, symbols, live, modes, shadows = task
+        live = set(symbols if live is None else live)
+        TRADING_MODES[mode] = settings
+        SYMBOL_CATEGORIES = categories
+        ctx = ShardContext(mode)
+        if SHARED_CANDLES_NAME:
+            shard_outbox = {"candles": {}, "indicators": {}}
+        started = time.perf_counter()
+        signals, trends, errors, mode_results, shadow_results = [], {}, [], [], []
+        for symbol in symbols:
+            try:
+                features = bybit_core.strategy.SymbolFeatures(ctx, symbol)
+                if symbol in live:
+                    trends[symbol] = features.trend(settings['timeframe_trend']).get('direction', 'NEUTRAL')
+                    signal_data = bybit_core.strategy.analyze_symbol_with_filters(ctx, symbol, features)
+                    if signal_data:
+                        signals.append(signal_data)
+                if modes:
+                    for other, (mode_signal, filter_name) in bybit_core.strategy.evaluate_modes(features, modes).items():
+                        summary = mode_signal and {"signal_type": mode_signal['signal_type'], "score": mode_signal['score']}
+                        mode_results.append((other, symbol, filter_name, summary))
+                # Позиции и кулдауны теневых конфигураций - у координатора: здесь только пороги
+                for name, (shadow_mode, shadow_settings) in shadows.items():
+                    shadow_signal, filter_name = bybit_core.strategy.evaluate_mode(features, shadow_mode, shadow_settings)
+                    shadow_results.append((name, symbol, shadow_signal, filter_name))
+            except Exception as e:
+                errors.append(f"{symbol}: {e}")
+        closes = {}
+        if CORRELATION_WINDOW > 0:
+            closed_before = int(time.time() * 1000) - timeframe_ms(CORRELATION_TIMEFRAME)
+            for symbol in symbols:
+                rows = [row for row in candle_buffer.since(symbol, CORRELATION_TIMEFRAME, correlation_sent.get(symbol, 0))
+                        if row[0] <= closed_before][-(CORRELATION_WINDOW + 1):]
+                if rows:
+                    closes[symbol] = rows
+                    correlation_sent[symbol] = int(rows[-1][0])
+        published = {}
+        if shard_outbox is not None:
+            # Свечи - с последней отправленной (она могла быть незакрытой): слот сегмента продолжается без разрыва
+            candles = {}
+            for key, rows in shard_outbox["candles"].items():
+                rows = [row for row in rows if row[0] >= published_until.get(key, 0)]
+                if rows:
+                    candles[key] = rows
+                    published_until[key] = int(rows[-1][0])
+            published = {"candles": candles, "indicators": shard_outbox["indicators"]}
+        results.put((scan_id, index, {
+            "signals": signals, "trends": trends, "errors": errors, "modes": mode_results, "shadows": shadow_results,
+            "closes": closes, "published": published,
+            "filter_stats": ctx.filter_stats, "seconds": time.perf_counter() - started,
+        }))
+
+class ScanWorkerPool:
+    """Процессы-воркеры, каждый владеет шардом символов (shard_index). Координатор (основной процесс)
+    раздает шарды через очереди multiprocessing и собирает кандидатов; упавший воркер перезапускается,
+    его шард отдается заново. Процессы - через forkserver: fork многопоточного бота (Telegram, метрики,
+    потоки входов) может унести в дочерний процесс чужую захваченную блокировку"""
+    
+    # Шаг ожидания результатов: между шагами проверяется, живы ли воркеры с незакрытыми шардами
+    POLL_SECONDS = 0.5
+    # Перезапусков одного шарда за скан: воркер, падающий на шарде снова, не держит скан до таймаута
+    MAX_SHARD_RETRIES = 1
+    
+    def __init__(self, workers: int):
+        import multiprocessing
+        self.workers = workers
+        self._mp = multiprocessing.get_context("forkserver")
+        self._processes: List[Any] = [None] * workers
+        self._tasks: List[Any] = [None] * workers
+        self._results = self._mp.Queue()
+        self._scan_id = 0
+        # Опоздавшие ответы: сигналы устарели, но свечи в них воркер больше не пришлет
+        self.late: List[Dict] = []
+    
+    def _start(self, i: int):
+        process = self._processes[i]
+        if process is not None:
+            logger.warning(f"⚠️ Scan worker {i} exited ({process.exitcode}), restarting")
+        self._tasks[i] = self._mp.Queue()
+        self._processes[i] = self._mp.Process(
+            target=scan_worker_main, args=(i, self._tasks[i], self._results, getattr(exchange, "markets", None)),
+            name=f"scan-worker-{i}", daemon=True)
+        self._processes[i].start()
+    
+    def ensure_started(self):
+        for i in range(self.workers):
+            process = self._processes[i]
+            if process is None or not process.is_alive():
+                self._start(i)
+    
+    def scan(self, symbols: List[str], mode: str, timeout: float, live: Optional[List[str]] = None,
+             modes: Optional[Dict[str, Dict]] = None,
+             shadows: Optional[Dict[str, Tuple[str, Dict]]] = None) -> List[Dict]:
+        """Результаты воркеров по шардам symbols; не успевшие за timeout - пропускаются.
+        live - символы живого скана (None - все), остальные только для режимов сравнения modes
+        и теневых конфигураций shadows (имя -> (режим, настройки))"""
+        self.ensure_started()
+        self._scan_id += 1
+        shards: List[List[str]] = [[] for _ in range(self.workers)]
+        for symbol in symbols:
+            shards[shard_index(symbol, self.workers)].append(symbol)
+        
+        settings = TRADING_MODES.get(mode, TRADING_MODES["CONSERVATIVE"])
+        live = None if live is None else set(live)
+        tasks = {}
+        for i, shard in enumerate(shards):
+            if shard:
+                categories = {s: SYMBOL_CATEGORIES[s] for s in shard if s in SYMBOL_CATEGORIES}
+                shard_live = None if live is None else [s for s in shard if s in live]
+                tasks[i] = (self._scan_id, mode, settings, categories, shard, shard_live, modes, shadows or {})
+                self._tasks[i].put(tasks[i])
+        pending = set(tasks)
+        retries = dict.fromkeys(tasks, 0)
+        
+        results = []
+        deadline = time.time() + timeout
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                scan_id, index, payload = self._results.get(timeout=min(remaining, self.POLL_SECONDS))
+            except queue.Empty:
+                for i in sorted(pending):
+                    if self._processes[i].is_alive():
+                        continue
+                    if retries[i] >= self.MAX_SHARD_RETRIES:
+                        logger.error(f"❌ Scan worker {i} died again on its shard, skipping {len(shards[i])} symbols")
+                        pending.discard(i)
+                        continue
+                    retries[i] += 1
+                    self._start(i)
+                    self._tasks[i].put(tasks[i])
+                continue
+            # Ответ на прошлый скан, не дождавшийся таймаута, или повтор перезапущенного шарда
+            if scan_id != self._scan_id or index not in pending:
+                self.late.append(payload)
+                continue
+            pending.discard(index)
+            results.append(payload)
+        if pending:
+            logger.warning(f"⚠️ Scan workers {sorted(pending)} did not answer in {timeout:.0f}s")
+        return results
+    
+    def stop(self):
+        for i, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                self._tasks[i].put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+
+scan_pool: Optional[ScanWorkerPool] = None
+
+def apply_shard_candles(result: Dict):
+    """Свечи из ответа воркера - в трекер корреляций и разделяемую память (пишет только координатор)"""
+    for symbol, rows in result.get("closes", {}).items():
+        observe_correlation(symbol, CORRELATION_TIMEFRAME, rows)
+    published = result.get("published", {})
+    for (symbol, timeframe), rows in published.get("candles", {}).items():
+        publish_candles(symbol, timeframe, rows)
+    for (symbol, timeframe), values in published.get("indicators", {}).items():
+        publish_indicators(symbol, timeframe, values)
+
+def sharded_scan(settings: Dict, signals: List[Dict], trend_stats: Dict, live_allowed: bool = True):
+    """Скан active_symbols воркерами: позиции, кулдауны, недельный лимит и max_trades - здесь, до раздачи.
+    С режимами сравнения и теневыми конфигурациями воркеры получают всю вселенную, отсеянные
+    символы (и все при live_allowed=False) - только для них"""
+    global scan_pool
+    modes = compare_modes_settings()
+    # Снимок: /shadow add|remove во время скана не смешивает настройки и получателя итогов
+    shadows = dict(shadow_configs)
+    live = []
+    if live_allowed and not can_open_new_trade():
+        logger.info("⏹️ Max trades reached, stopping scan")
+    elif live_allowed:
+        weekly_limit = check_weekly_limit()
+        for symbol in active_symbols:
+            if weekly_limit:
+                update_filter_stats(symbol, "weekly_limit", False)
+            elif is_position_already_open(symbol):
+                update_filter_stats(symbol, "position_already_open", False)
+            elif is_in_cooldown(symbol):
+                update_filter_stats(symbol, "cooldown", False)
+            else:
+                live.append(symbol)
+                continue
+            if modes:
+                record_live_signal(symbol, None)
+    observe = bool(modes or shadows)
+    symbols = list(active_symbols) if observe else live
+    if not symbols:
+        return
+    
+    if scan_pool is None:
+        scan_pool = ScanWorkerPool(SCAN_WORKERS)
+    started = time.perf_counter()
+    with perf_metrics.timer("sharded_scan"):
+        results = scan_pool.scan(symbols, CURRENT_MODE, SCAN_WORKER_TIMEOUT,
+                                 live=live if observe else None, modes=modes,
+                                 shadows={name: (shadow.mode, shadow.settings) for name, shadow in shadows.items()})
+    
+    now = time.time()    
+    for result in results:
+        bybit_core.merge_filter_stats(filter_stats, result["filter_stats"])
+        for direction in result["trends"].values():
+            trend_stats[direction] = trend_stats.get(direction, 0) + 1
+        for signal_data in result["signals"]:
+            signals.append(signal_data)
+            trend_stats[signal_data.get('trend_direction', 'NEUTRAL')] += 1
+        for mode, symbol, filter_name, mode_signal in result.get("modes", []):
+            record_mode_signal(mode, symbol, filter_name, mode_signal)
+        if modes:
+            found = {signal_data['symbol']: signal_data for signal_data in result["signals"]}
+            for symbol in result["trends"]:
+                record_live_signal(symbol, found.get(symbol))
+        for name, symbol, shadow_signal, filter_name in result.get("shadows", []):
+            try:
+                shadows[name].add_result(symbol, shadow_signal, filter_name, now)
+            except Exception as e:
+                logger.error(f"❌ Shadow {name} evaluation error for {symbol}: {e}")
+        for error in result["errors"]:
+            logger.error(f"❌ Scan worker error: {error}")
+    late, scan_pool.late = scan_pool.late, []
+    for result in late + results:
+        apply_shard_candles(result)
+    busiest = max((r["seconds"] for r in results), default=0.0)
+    logger.info(f"🧩 Sharded scan: {len(symbols)} symbols, {len(results)}/{SCAN_WORKERS} workers, "
+                f"{time.perf_counter() - started:.2f}s (slowest shard {busiest:.2f}s)")
+
 # ====== УЛУЧШЕННОЕ СКАНИРОВАНИЕ ======
+def correlation_limits(held: Dict[str, Dict]):
+    """(conflicts, rank) для core_risk.allocate_signals по матрице корреляций; без данных - (None, None)"""
+    if correlation_tracker is None:
+        return None, None
+    # Снимок матрицы под блокировкой: advance() из другого потока не меняет ее посреди распределения
+    with correlation_lock:
+        if not correlation_tracker.updates:
+            return None, None
+        tracker = correlation_tracker.snapshot()
+    held_sides = [(symbol, position['position_type']) for symbol, position in held.items()]
+    
+    def conflicts(sig: Dict, chosen: List[Dict]) -> bool:
+        others = held_sides + [(c['symbol'], c['signal_type']) for c in chosen]
+        exposure = tracker.exposure(sig['symbol'], sig['signal_type'], others)
+        if exposure > MAX_CORRELATION:
+            logger.info(f"🔗 {sig['symbol']} {sig['signal_type']} skipped: correlation {exposure:.2f} "
+                        f"with open/selected positions > {MAX_CORRELATION}")
+            return True
+        return False
+    
+    def rank(sig: Dict) -> float:
+        exposure = tracker.exposure(sig['symbol'], sig['signal_type'], held_sides)
+        return sig['score'] * (1 - CORRELATION_RANK_WEIGHT * max(exposure, 0.0))
+    
+    return conflicts, rank
+
+def open_scan_signals(signals: List[Dict], settings: Dict, available_usdt: float) -> List[Dict]:
+    """Лучшие сигналы скана в свободные слоты (core_risk.allocate_signals): слоты max_trades и остаток
+    недельного лимита, баланс, один сигнал на символ. С трекером корреляций сигнал, дублирующий открытую
+    позицию или уже выбранный сигнал (корреляция с учетом направления выше MAX_CORRELATION), пропускается,
+    а связанные с открытыми позициями сигналы идут ниже в очереди. В реальном режиме ордера выставляются
+    параллельно; сигнал, не прошедший open_position, уступает слот следующему (не больше одной замены
+    на слот, чтобы ошибки биржи не перебирали весь список). Возвращает открытые"""
+    free_slots = min(settings['max_trades'] - get_concurrent_trades_count(),
+                     settings.get('max_weekly_trades', 99) - core_risk.weekly_trade_count(core_context))
+    if MAX_ENTRIES_PER_SCAN > 0:
+        free_slots = min(free_slots, MAX_ENTRIES_PER_SCAN)
+    leverage = settings['leverage']
+    opened, rejected = [], set()
+    attempts = 2 * free_slots
+    
+    while free_slots > 0 and attempts > 0:
+        held = get_open_positions()
+        conflicts, rank = correlation_limits(held)
+        plan = core_risk.allocate_signals(
+            [sig for sig in signals if sig['symbol'] not in rejected], min(free_slots, attempts), available_usdt,
+            lambda sig, remaining: planned_position_usdt(sig['symbol'], sig['score'], remaining),
+            leverage=leverage, held=held, conflicts=conflicts, rank=rank)
+        if not plan:
+            break
+        attempts -= len(plan)
+        
+        for i, (sig, usdt) in enumerate(plan, 1):
+            logger.info(f"🎯 {'BEST ' if not opened and i == 1 else ''}{sig['signal_type']} SIGNAL {i}/{len(plan)}: "
+                       f"{sig['symbol']} (Score: {sig['score']}, Trend: {sig.get('trend_direction')} "
+                       f"{sig.get('trend_strength', 0):.1f}, USDT: {usdt:.2f})")
+        
+        # Кассета биржи воспроизводит запросы по порядку - с ней, как и в DRY_RUN, по одному
+        if DRY_RUN or exchange_cassette is not None or len(plan) == 1:
+            results = [open_position(sig, usdt) for sig, usdt in plan]
+        else:
+            with ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix="entry") as pool:
+                results = list(pool.map(lambda item: open_position(*item), plan))
+        
+        for (sig, usdt), ok in zip(plan, results):
+            if ok:
+                logger.info(f"{'🧪 DRY_RUN:' if DRY_RUN else '🚀 REAL:'} Position opened for {sig['symbol']}")
+                opened.append(sig)
+                free_slots -= 1
+                available_usdt -= usdt / leverage
+            else:
+                logger.error(f"❌ Failed to open position for {sig['symbol']}")
+                rejected.add(sig['symbol'])
+        if all(results):
+            break
+    
+    return opened
+
 def scan_for_opportunities():
-    if not BOT_RUNNING:
+    scan_started = time.time()
+    observe = observers_active()
+    if not BOT_RUNNING and not observe:
         logger.info("⏸️ Bot is paused, skipping scan")
+        update_correlation(scan_started)
         return
         
     settings = get_current_settings()
@@ -2381,9 +2695,17 @@ def scan_for_opportunities():
     available_usdt = compute_available_usdt()
     min_possible_trade = min([cat.get('min_trade_usdt', MIN_TRADE_USDT) for cat in SYMBOL_CATEGORIES.values()])
     
+    # Пауза и нехватка USDT останавливают только входы: режимы сравнения и теневые конфигурации
+    # оцениваются по всей вселенной
+    live_allowed = BOT_RUNNING
     if available_usdt < min_possible_trade:
         logger.warning(f"⏹️ Insufficient USDT: {available_usdt:.2f} < {min_possible_trade}")
-        return
+        if not observe:
+            update_correlation(scan_started)
+            return
+        live_allowed = False
+    if not live_allowed:
+        logger.info("👁️ Live entries off, scanning for compare modes and shadow configs only")
         
     logger.info(f"🔍 Scanning {len(active_symbols)} symbols ({CURRENT_MODE}), Balance: {available_usdt:.2f} USDT...")
     
@@ -2398,47 +2720,52 @@ def scan_for_opportunities():
         "NEUTRAL": 0
     }
     
-    for symbol in active_symbols:
-        if not BOT_RUNNING:
-            break
+    mode_scan_signals.clear()
+    mode_scan_coverage.update(universe=len(active_symbols), evaluated={})
+    if SCAN_WORKERS > 1 and exchange_cassette is None:
+        sharded_scan(settings, signals, trend_stats, live_allowed)
+    else:
+        live = live_allowed
+        for symbol in active_symbols:
+            # Пауза или занятые слоты останавливают живой скан; режимы сравнения и теневые
+            # конфигурации дооцениваются по всей вселенной
+            if live and not BOT_RUNNING:
+                live = False
+            if live and not can_open_new_trade():
+                logger.info("⏹️ Max trades reached, stopping scan")
+                live = False
+            if not live and not observe:
+                break
+            
+            if live:
+                trend_analysis = get_trend_analysis(symbol, settings['timeframe_trend'])
+                trend_stats[trend_analysis.get('direction', 'NEUTRAL')] += 1
+            
+            signal = analyze_symbol_all_modes(symbol, live) if observe else analyze_symbol_with_filters(symbol)
             
-        if not can_open_new_trade():
-            logger.info("⏹️ Max trades reached, stopping scan")
-            break
-        trend_analysis = get_trend_analysis(symbol, settings['timeframe_trend'])
-        trend_stats[trend_analysis.get('direction', 'NEUTRAL')] += 1
-        
-        signal = analyze_symbol_with_filters(symbol)
-
-        
-        if signal:
-            signals.append(signal)
-            trend_stats[signal.get('trend_direction', 'NEUTRAL')] += 1
+            if signal:
+                signals.append(signal)
+                trend_stats[signal.get('trend_direction', 'NEUTRAL')] += 1
+    
+    if shadow_configs:
+        finish_shadow_scan()
+    if COMPARE_MODES:
+        logger.info("🧮 Signals by mode: " + ", ".join(
+            f"{mode}={len(mode_scan_signals.get(mode, []))}" for mode in TRADING_MODES))
     
     logger.info(f"📊 Trend statistics: {trend_stats}")
+    update_correlation(scan_started)
     
     if signals and BOT_RUNNING:
         signals.sort(key=lambda x: x['score'], reverse=True)
-        best_signal = signals[0]
-        
-        if is_position_already_open(best_signal['symbol']):
-            logger.warning(f"⏹️ Position for {best_signal['symbol']} was opened during scan, skipping")
-            return
-        
-        logger.info(f"🎯 BEST {best_signal['signal_type']} SIGNAL: {best_signal['symbol']} "
-                   f"(Score: {best_signal['score']}, Trend: {best_signal.get('trend_direction')} "
-                   f"{best_signal.get('trend_strength', 0):.1f})")
+        opened = open_scan_signals(signals, settings, available_usdt)
         
-        if open_position(best_signal):
-            logger.info(f"{'🧪 DRY_RUN:' if DRY_RUN else '🚀 REAL:'} Position opened for {best_signal['symbol']}")
-            
-            if len(signals) > 1:
-                logger.info(f"📋 Other good signals:")
-                for i, sig in enumerate(signals[1:3], 1):
-                    logger.info(f"  {i}. {sig['symbol']} {sig['signal_type']} "
-                              f"(Score: {sig['score']}, Trend: {sig.get('trend_direction')})")
-        else:
-            logger.error(f"❌ Failed to open position for {best_signal['symbol']}")
+        others = [sig for sig in signals if sig not in opened][:3]
+        if opened and others:
+            logger.info(f"📋 Other good signals:")
+            for i, sig in enumerate(others, 1):
+                logger.info(f"  {i}. {sig['symbol']} {sig['signal_type']} "
+                          f"(Score: {sig['score']}, Trend: {sig.get('trend_direction')})")
             
     else:
         if signals:
@@ -2482,6 +2809,9 @@ def start(update, context):
 
 <b>Основные команды:</b>
 • /status - Статус бота
+• /modes - Все режимы на одних данных
+• /shadow - Теневые конфигурации
+• /correlation - Корреляция символов
 • /filter_stats - Статистика фильтров
 • /trend_stats - Анализ трендов
 • /positions - Открытые позиции
@@ -2491,6 +2821,8 @@ def start(update, context):
 • /limits - Лимиты и счетчики
 • /balance - Баланс
 • /reset_stats - Сброс статистики
+• /perf - Задержки по этапам
+• /profile N - Профилирование N циклов сканирования
 • /pause /resume - Управление работой
 """
     update.message.reply_text(welcome_msg, parse_mode=ParseMode.HTML)
@@ -2581,6 +2913,139 @@ def cmd_filter_stats(update, context):
         logger.error(f"❌ Filter stats error: {e}")
         update.message.reply_text(f"❌ Ошибка: {str(e)}")
 
+def cmd_modes(update, context):
+    """Воронка и сигналы последнего скана по всем режимам (BOT_COMPARE_MODES=1)"""
+    try:
+        if not COMPARE_MODES:
+            update.message.reply_text("🧮 Сравнение режимов выключено (BOT_COMPARE_MODES=1)")
+            return
+        
+        msg = "🧮 <b>РЕЖИМЫ НА ОДНИХ ДАННЫХ</b>\n"
+        universe = mode_scan_coverage["universe"]
+        for mode, settings in TRADING_MODES.items():
+            stats = filter_stats if mode == CURRENT_MODE else mode_filter_stats.get(mode)
+            marker = " (текущий)" if mode == CURRENT_MODE else ""
+            msg += f"\n<b>{settings['name']}</b>{marker}\n"
+            if universe:
+                evaluated = mode_scan_coverage["evaluated"].get(mode, 0)
+                msg += f"Охват последнего скана: {evaluated}/{universe}"
+                if evaluated < universe:
+                    # Текущий режим не оценивается без живых входов; остальные - только при ошибках/таймауте
+                    msg += " ⚠️ неполный" + (" (слоты заняты, пауза или мало USDT)" if mode == CURRENT_MODE else "")
+                msg += "\n"
+            if not stats or stats["total_signals"] == 0:
+                msg += "📭 Нет данных\n"
+                continue
+            pass_rate = stats["passed_filters"] / stats["total_signals"] * 100
+            msg += f"Прошло фильтры: {stats['passed_filters']}/{stats['total_signals']} ({pass_rate:.1f}%)\n"
+            top = [(name, count) for name, count in sorted(stats["filtered_by"].items(), key=lambda x: x[1], reverse=True)[:3] if count]
+            if top:
+                msg += "Топ фильтров: " + ", ".join(f"{name} {count}" for name, count in top) + "\n"
+            scan_signals = mode_scan_signals.get(mode, [])
+            msg += f"Сигналы последнего скана: {', '.join(scan_signals) if scan_signals else 'нет'}\n"
+        
+        update.message.reply_text(msg, parse_mode=ParseMode.HTML)
+        
+    except Exception as e:
+        logger.error(f"❌ Modes stats error: {e}")
+        update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+def format_shadow_report(shadow) -> str:
+    summary = shadow.summary()
+    overrides = " ".join(f"{k}={','.join(map(str, v)) if isinstance(v, (tuple, list)) else v}"
+                         for k, v in summary["overrides"].items()) or "без правок"
+    msg = f"\n👻 <b>{html.escape(summary['name'])}</b> ({summary['mode']}: {html.escape(overrides)})\n"
+    if summary["checked"]:
+        msg += f"Прошло фильтры: {summary['passed']}/{summary['checked']} ({summary['passed'] / summary['checked'] * 100:.1f}%)\n"
+    if summary["top_filters"]:
+        msg += "Топ фильтров: " + ", ".join(f"{name} {count}" for name, count in summary["top_filters"]) + "\n"
+    positions = ", ".join(f"{p['symbol']} {p['position_type']}" for p in shadow.positions.values())
+    msg += f"Открыто: {summary['open']}{' (' + positions + ')' if positions else ''}\n"
+    if summary["trades"]:
+        msg += (f"Сделок: {summary['trades']}, прибыльных {summary['wins']} ({summary['wins'] / summary['trades'] * 100:.0f}%)\n"
+                f"PnL: {summary['pnl_percent']:+.2f}% (в среднем {summary['avg_pnl_percent']:+.2f}% на сделку)\n")
+    else:
+        msg += "Сделок: 0\n"
+    return msg
+
+def cmd_shadow(update, context):
+    """/shadow - отчет; /shadow add ИМЯ РЕЖИМ ключ=значение ...; /shadow remove ИМЯ"""
+    try:
+        args = context.args or []
+        action = args[0].lower() if args else "report"
+        
+        if action == "add":
+            if len(args) < 3:
+                update.message.reply_text("❌ Формат: /shadow add ИМЯ РЕЖИМ [ключ=значение ...]\n"
+                                          "Например: /shadow add strict CONSERVATIVE min_score=85 rsi_range_long=35,55")
+                return
+            try:
+                shadow = register_shadow(args[1], args[2], args[3:])
+            except ValueError as e:
+                update.message.reply_text(f"❌ {e}")
+                return
+            update.message.reply_text(f"✅ Теневая конфигурация добавлена{format_shadow_report(shadow)}",
+                                      parse_mode=ParseMode.HTML)
+            return
+        
+        if action == "remove":
+            removed = [name for name in args[1:] if shadow_configs.pop(name, None) is not None]
+            update.message.reply_text(f"🗑️ Удалено: {', '.join(removed)}" if removed else "❌ Нет таких конфигураций")
+            return
+        
+        if not shadow_configs:
+            update.message.reply_text("👻 Теневых конфигураций нет\n/shadow add ИМЯ РЕЖИМ [ключ=значение ...]")
+            return
+        
+        msg = "👻 <b>ТЕНЕВЫЕ КОНФИГУРАЦИИ</b>\n"
+        for shadow in shadow_configs.values():
+            msg += format_shadow_report(shadow)
+        update.message.reply_text(msg, parse_mode=ParseMode.HTML)
+        
+    except Exception as e:
+        logger.error(f"❌ Shadow command error: {e}")
+        update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+def cmd_correlation(update, context):
+    """/correlation - самые связанные пары и открытые позиции; /correlation СИМВОЛ - соседи символа"""
+    try:
+        if correlation_tracker is None:
+            update.message.reply_text("🔗 Корреляция выключена (BOT_CORRELATION_WINDOW=0)")
+            return
+        
+        args = context.args or []
+        with correlation_lock:
+            tracker = correlation_tracker
+            info = tracker.coverage()
+            msg = (f"🔗 <b>КОРРЕЛЯЦИЯ ДОХОДНОСТЕЙ</b> ({tracker.timeframe}, окно {tracker.window})\n"
+                   f"Символов: {info['symbols']}, свечей в окне: {info['candles']}, с историей: {info['ready']}\n")
+            if info['last_ts']:
+                msg += f"Последняя свеча: {datetime.fromtimestamp(info['last_ts'] / 1000).strftime('%d.%m %H:%M')}\n"
+            msg += f"Порог дубля: {MAX_CORRELATION}, вес в приоритете: {CORRELATION_RANK_WEIGHT}\n"
+            
+            if args:
+                name = args[0].upper()
+                symbol = name if name in tracker.symbols else f"{name}/USDT:USDT"
+                neighbours = tracker.neighbours(symbol)
+                msg += f"\n<b>{html.escape(symbol)}</b>\n"
+                msg += "".join(f"{other}: {value:+.2f}\n" for other, value in neighbours) or "📭 Нет данных\n"
+            else:
+                positions = get_open_positions()
+                if len(positions) > 1:
+                    msg += "\n<b>Открытые позиции</b>\n"
+                    for a, b, value in tracker.top_pairs(limit=10, symbols=positions):
+                        same = positions[a]['position_type'] == positions[b]['position_type']
+                        msg += f"{a} / {b}: {value:+.2f}{'' if same else ' (разные стороны)'}\n"
+                pairs = tracker.top_pairs(limit=10)
+                msg += "\n<b>Самые связанные пары</b>\n"
+                msg += "".join(f"{a} / {b}: {value:+.2f}\n" for a, b, value in pairs) or "📭 Нет данных\n"
+        
+        update.message.reply_text(msg, parse_mode=ParseMode.HTML)
+        
+    except Exception as e:
+        logger.error(f"❌ Correlation command error: {e}")
+        update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
 def cmd_reset_stats(update, context):
     try:
         log_filter_stats(reset=True)
@@ -3045,25 +3510,274 @@ def cmd_commission_settings(update, context):
         logger.error(f"❌ Commission settings error: {e}")
         update.message.reply_text(f"❌ Ошибка: {str(e)}")
 
-def calculate_pnl_percent(open_price: float, close_price: float, position_type: str, leverage: int = 1):
+def cmd_perf(update, context):
+    """Сводка задержек по этапам (p50/p95/p99)"""
     try:
-        if position_type == 'LONG':
-            price_change_pct = (close_price - open_price) / open_price
-        else:
-            price_change_pct = (open_price - close_price) / open_price
+        rows = perf_metrics.summary()
+        if not rows:
+            update.message.reply_text("📈 <b>Метрики производительности</b>\n\n📭 Нет данных", parse_mode=ParseMode.HTML)
+            return
+        
+        msg = "📈 <b>ЗАДЕРЖКИ ПО ЭТАПАМ (мс)</b>\n"
+        msg += "<i>этап: n | p50 / p95 / p99</i>\n\n"
+        for row in rows[:25]:
+            label = row["stage"]
+            if row["labels"]:
+                label += "[" + ",".join(str(v) for v in row["labels"].values()) + "]"
+            msg += (f"• {label}: {row['count']} | "
+                    f"{row['p50']*1000:.1f} / {row['p95']*1000:.1f} / {row['p99']*1000:.1f}\n")
+        
+        if metrics_server is not None:
+            msg += f"\n🌐 http://{METRICS_HOST}:{METRICS_PORT}/metrics"
+        
+        update.message.reply_text(msg, parse_mode=ParseMode.HTML)
+        
+    except Exception as e:
+        logger.error(f"❌ Perf command error: {e}")
+        update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+def cmd_profile(update, context):
+    """Профилирование следующих N циклов сканирования"""
+    try:
+        cycles = int(context.args[0]) if context.args else PROFILE_DEFAULT_CYCLES
+        if cycles <= 0:
+            update.message.reply_text("❌ Укажите число циклов: /profile N")
+            return
         
-        pnl_percent = price_change_pct * leverage * 100
-        return pnl_percent
+        scan_profiler.request(cycles)
+        logger.info(f"🔬 Profiling requested for {cycles} scan cycles")
+        update.message.reply_text(
+            f"🔬 <b>Профилирование включено</b>\n"
+            f"Циклов сканирования: {cycles}\n"
+            f"Результат будет отправлен после завершения",
+            parse_mode=ParseMode.HTML
+        )
         
+    except ValueError:
+        update.message.reply_text("❌ Укажите число циклов: /profile N")
+    except Exception as e:
+        logger.error(f"❌ Profile command error: {e}")
+        update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+def calculate_pnl_percent(open_price: float, close_price: float, position_type: str, leverage: int = 1):
+    try:
+        return core_risk.calculate_pnl_percent(open_price, close_price, position_type, leverage)
     except Exception as e:
         logger.error(f"❌ PnL percent calculation error: {e}")
         return 0.0
 
 # ====== ГЛАВНЫЙ ЦИКЛ ======
-def main_trading_loop():
+# ====== СНИМОК СОСТОЯНИЯ (ТЕПЛЫЙ ПЕРЕЗАПУСК) ======
+SNAPSHOT_VERSION = 1
+
+def build_runtime_snapshot() -> Dict:
+    """Буферы свечей, воронка фильтров, рынки ccxt и последние цены"""
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "filter_stats": filter_stats,
+        "candles": candle_buffer.snapshot(),
+        "last_prices": {symbol: list(value) for symbol, value in list(last_prices.items())},
+        "markets": None,
+        "currencies": None,
+    }
+    # Кассета пишет/отдает load_markets сама - рынки в снимок не берем
+    if exchange is not None and exchange_cassette is None:
+        snapshot["markets"] = exchange.markets or None
+        snapshot["currencies"] = exchange.currencies or None
+    return snapshot
+
+def save_runtime_snapshot() -> bool:
+    """Атомарная запись: временный файл + fsync + os.replace (при падении остается прежний снимок)"""
+    if not SNAPSHOT_FILE:
+        return False
+    with perf_metrics.timer("snapshot_save"):
+        try:
+            payload = json.dumps(build_runtime_snapshot(), default=str, separators=(",", ":"))
+            tmp_file = f"{SNAPSHOT_FILE}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(gzip.compress(payload.encode("utf-8"), compresslevel=1))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, SNAPSHOT_FILE)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Snapshot save failed: {e}")
+            return False
+
+def restore_runtime_snapshot() -> Dict[str, int]:
+    """Восстановление после перезапуска; свечи потом догружаются с последней сохраненной"""
+    global filter_stats
+    if not SNAPSHOT_FILE or not os.path.exists(SNAPSHOT_FILE):
+        return {}
+    try:
+        with open(SNAPSHOT_FILE, "rb") as f:
+            data = json.loads(gzip.decompress(f.read()))
+    except Exception as e:
+        logger.warning(f"⚠️ Snapshot unreadable, cold start: {e}")
+        return {}
+    if data.get("version") != SNAPSHOT_VERSION:
+        logger.warning(f"⚠️ Snapshot version {data.get('version')} != {SNAPSHOT_VERSION}, cold start")
+        return {}
+    
+    age = time.time() - data.get("saved_at", 0)
+    restored = {}
+    
+    if CANDLE_BUFFER_ENABLED and data.get("candles"):
+        restored["candles"] = candle_buffer.restore(data["candles"])
+    
+    saved_stats = data.get("filter_stats")
+    if saved_stats:
+        stats = new_filter_stats()
+        stats.update(saved_stats)
+        stats["filtered_by"] = {**new_filter_stats()["filtered_by"], **saved_stats.get("filtered_by", {})}
+        filter_stats = stats
+        restored["filter_signals"] = stats["total_signals"]
+    
+    if age <= SNAPSHOT_MAX_AGE:
+        for symbol, value in (data.get("last_prices") or {}).items():
+            last_prices[symbol] = tuple(value)
+        restored["prices"] = len(last_prices)
+        if data.get("markets") and exchange is not None and exchange_cassette is None:
+            try:
+                exchange.set_markets(data["markets"], data.get("currencies"))
+                restored["markets"] = len(data["markets"])
+            except Exception as e:
+                logger.warning(f"⚠️ Snapshot markets not restored: {e}")
+    
+    logger.info(f"♻️ Snapshot restored ({age:.0f}s old): {restored}")
+    return restored
+
+# ====== ЗАПУСК ======
+STARTUP_TARGET_SECONDS = float(os.getenv("BOT_STARTUP_TARGET", "2.0"))
+STARTUP_WORKERS = 4
+# Порядок шагов в отчете о запуске
+STARTUP_STEPS = ("import", "exchange", "snapshot", "markets", "balance", "positions",
+                 "indicators_import", "warmup", "telegram", "ready", "total")
+
+startup_timings: Dict[str, float] = {}
+
+class StartupError(Exception):
+    """Шаг запуска не дает торговать; поднимается в потоке пула, выход - в главном потоке"""
+
+def startup_step(name: str, func, *args):
+    """Шаг запуска с замером (startup_timings и /perf, stage=startup)"""
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        elapsed = time.perf_counter() - started
+        startup_timings[name] = elapsed
+        perf_metrics.observe("startup", elapsed, step=name)
+
+def load_markets() -> int:
+    """Рынки (instruments-info) до первого ордера: дальше get_symbol_info и fetch_* берут их из кэша ccxt"""
+    try:
+        if getattr(exchange, "markets", None) and exchange.options.get("adjustForTimeDifference"):
+            # Рынки из снимка: ccxt не пойдет за ними в сеть, но смещение часов нужно для подписи
+            exchange.load_time_difference()
+        return len(exchange.load_markets())
+    except Exception as e:
+        logger.warning(f"⚠️ Markets preload failed: {e}")
+        return 0
+
+def startup_balance() -> float:
+    """Один fetch_balance: проверка связи и ключей и стартовый баланс (раньше - два запроса подряд)"""
+    try:
+        bal = exchange.fetch_balance()
+    except Exception as e:
+        # Шаг идет в потоке пула: sys.exit() здесь завершил бы только поток
+        raise StartupError(f"Exchange initialization failed: {e}") from e
+    logger.info("✅ Bybit Futures connected successfully")
+    if DRY_RUN:
+        return compute_available_usdt()
+    return max(safe_float_convert(bal.get('free', {}).get('USDT', 0)), 0.0)
+
+def sync_positions() -> Dict:
+    """Открытые позиции из БД; в реальной торговле - сверка с позициями на бирже"""
+    positions = get_open_positions()
+    if DRY_RUN:
+        return positions
+    try:
+        on_exchange = {p.get('symbol') for p in exchange.fetch_positions()
+                       if safe_float_convert(p.get('contracts')) > 0}
+    except Exception as e:
+        logger.warning(f"⚠️ Position sync failed: {e}")
+        return positions
+    missing = sorted(on_exchange - set(positions))
+    stale = sorted(set(positions) - on_exchange)
+    if missing:
+        logger.warning(f"⚠️ Positions on exchange but not in DB: {', '.join(missing)}")
+    if stale:
+        logger.warning(f"⚠️ Open positions in DB but not on exchange: {', '.join(stale)}")
+    return positions
+
+def warmup_candles(symbols: List[str]) -> int:
+    """Полный путь свечи -> индикаторы для символов открытых позиций (или первого символа):
+    первые вызовы ta/pandas и соединение с биржей оплачиваются до первого скана"""
+    settings = get_current_settings()
+    warmed = 0
+    for symbol in symbols:
+        if get_trend_analysis(symbol, settings['timeframe_trend']).get('strength', 0) > 0:
+            warmed += 1
+    return warmed
+
+def run_startup() -> float:
+    """Параллельный запуск: импорт индикаторов - сразу, биржа -> рынки, затем баланс, сверка позиций,
+    прогрев свечей и Telegram одновременно (Telegram не нужен для торговли - стартует последним,
+    чтобы его импорт не отнимал GIL у критического пути). Возвращает доступный баланс"""
+    started = time.perf_counter()
+    startup_timings.clear()
+    startup_timings["import"] = started - PROCESS_STARTED
+    
+    pool = ThreadPoolExecutor(max_workers=STARTUP_WORKERS, thread_name_prefix="startup")
+    try:
+        # Доступ к атрибуту пакета импортирует bybit_core.strategy (pandas, ta)
+        indicators_future = pool.submit(startup_step, "indicators_import", lambda: bybit_core.strategy)
+        
+        startup_step("exchange", initialize_exchange)
+        startup_step("snapshot", restore_runtime_snapshot)
+        startup_step("markets", load_markets)
+        
+        balance_future = pool.submit(startup_step, "balance", startup_balance)
+        positions_future = pool.submit(startup_step, "positions", sync_positions)
+        telegram_future = pool.submit(startup_step, "telegram", setup_telegram)
+        
+        indicators_future.result()
+        positions = positions_future.result()
+        if balance_future.done():
+            # Биржа уже отказала - не тратим время на прогрев
+            balance_future.result()
+        startup_step("warmup", warmup_candles, list(positions) or active_symbols[:1])
+        balance = balance_future.result()
+        startup_timings["ready"] = time.perf_counter() - PROCESS_STARTED
+        
+        telegram_future.result()
+    except BaseException as e:
+        # Незапущенные шаги отменяются, зависший Telegram не ждем; выход - из главного потока
+        pool.shutdown(wait=False, cancel_futures=True)
+        if isinstance(e, StartupError):
+            logger.error(f"❌ {e}")
+            sys.exit(1)
+        raise
+    pool.shutdown()
+    
+    startup_timings["total"] = time.perf_counter() - PROCESS_STARTED
+    perf_metrics.observe("startup", startup_timings["ready"], step="ready")
+    
+    logger.info(f"⏱️ Startup: {format_startup_timings()}")
+    if startup_timings["ready"] > STARTUP_TARGET_SECONDS:
+        logger.warning(f"⚠️ Startup slower than target: {startup_timings['ready']:.2f}s > {STARTUP_TARGET_SECONDS:.1f}s")
+    return balance
+
+def format_startup_timings(separator: str = ", ") -> str:
+    return separator.join(f"{name} {startup_timings[name]:.2f}s" for name in STARTUP_STEPS if name in startup_timings)
+
+def main_trading_loop(balance: Optional[float] = None):
     logger.info("🤖 Starting ULTIMATE TRADING BOT v7.2...")
     
-    balance = compute_available_usdt()
+    if balance is None:
+        balance = compute_available_usdt()
     settings = get_current_settings()
     
     mode_text = "🧪 DRY_RUN" if DRY_RUN else "🚀 РЕАЛЬНЫЙ"
@@ -3074,7 +3788,8 @@ def main_trading_loop():
         f"Режим: {settings['name']}\n" 
         f"Плечо: {settings['leverage']}x\n"
         f"Таймфрейм тренда: {settings['timeframe_trend']}\n"
-        f"Статус: 🟢 АКТИВЕН\n\n"
+        f"Статус: 🟢 АКТИВЕН\n"
+        f"Запуск: {startup_timings.get('ready', 0):.2f} с до готовности\n\n"
         f"<b>Ключевые изменения v7.2:</b>\n"
         f"• ✅ Исправлена логика подтверждения тренда\n"
         f"• ✅ require_trend_alignment=False для AGGRESSIVE\n"
@@ -3090,11 +3805,14 @@ def main_trading_loop():
     last_sync = 0
     last_exit_check = 0
     last_stats_print = 0
+    last_snapshot = time.time()
+    last_universe = 0
     STATS_INTERVAL = 3600
 
     while True:
         try:
-            if not BOT_RUNNING:
+            # На паузе продолжают работать только режимы сравнения и теневые конфигурации
+            if not BOT_RUNNING and not observers_active():
                 time.sleep(5)
                 continue
                 
@@ -3105,11 +3823,21 @@ def main_trading_loop():
                 last_sync = current_time
             
             if current_time - last_exit_check >= settings['exit_check_interval']:
-                check_position_exits()
+                if BOT_RUNNING:
+                    check_position_exits()
+                if shadow_configs:
+                    update_shadow_positions()
                 last_exit_check = current_time
             
+            if UNIVERSE_TOP_K and current_time - last_universe >= UNIVERSE_REFRESH:
+                refresh_universe()
+                last_universe = current_time
+            
             if current_time - last_scan >= settings['scan_interval']:
-                scan_for_opportunities()
+                if scan_profiler.remaining:
+                    scan_profiler.run(scan_for_opportunities)
+                else:
+                    scan_for_opportunities()
                 last_scan = current_time
             
             if current_time - last_status >= settings['status_interval']:
@@ -3119,6 +3847,10 @@ def main_trading_loop():
                 if filter_stats["total_signals"] > 0:
                     log_filter_stats()
                 last_stats_print = current_time
+            
+            if SNAPSHOT_FILE and current_time - last_snapshot >= SNAPSHOT_INTERVAL:
+                save_runtime_snapshot()
+                last_snapshot = current_time
                 
             time.sleep(1)
             
@@ -3132,9 +3864,26 @@ def main_trading_loop():
 
 def cleanup():
     try:
+        # Снимок только после полного запуска: иначе пустое состояние затрет сохраненное
+        if startup_timings.get("ready"):
+            save_runtime_snapshot()
+        
         if os.path.exists(LOCK_FILE):
             os.remove(LOCK_FILE)
         
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        
+        if scan_pool is not None:
+            scan_pool.stop()
+        
+        if shared_candles is not None:
+            shared_candles.close()
+        
+        if exchange_cassette is not None:
+            logger.info(exchange_cassette.summary())
+            exchange_cassette.close()
+        
         if filter_stats["total_signals"] > 0:
             log_filter_stats()
         
@@ -3150,15 +3899,15 @@ def signal_handler(signum, frame):
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, profile_signal_handler)
 
     try:
         if "YOUR_API" in API_KEY or "YOUR_API" in API_SECRET or "YOUR_TELEGRAM" in TELEGRAM_TOKEN:
             print("❌ ВНИМАНИЕ: Используются тестовые API ключи!")
             print("❌ Для реальной торговли установите настоящие ключи через переменные окружения")
             
-        initialize_exchange()
-        
-        balance = compute_available_usdt()
+        balance = run_startup()
         settings = get_current_settings()
         
         print(f"\n{'='*60}")
@@ -3173,6 +3922,7 @@ if __name__ == "__main__":
         print(f"📊 Таймфрейм тренда: {settings['timeframe_trend']}")
         print(f"🔰 Статус: {'🟢 ACTIVE' if BOT_RUNNING else '⏸️ PAUSED'}")
         print(f"⚡ Торговля: {'🧪 DRY_RUN' if DRY_RUN else '🚀 REAL'}")
+        print(f"⏱️ Запуск: {format_startup_timings()}")
         print(f"{'='*60}")
         print(f"Ключевые исправления v7.2:")
         print(f"• Исправлена ошибка require_trend_confirmation")
@@ -3184,12 +3934,16 @@ if __name__ == "__main__":
         print(f"Используйте /filter_stats для мониторинга фильтров")
         print(f"{'='*60}\n")
         
-        updater = setup_telegram()
         if updater:
             updater.start_polling()
             logger.info("✅ Telegram bot started")
         
-        main_trading_loop()
+        start_metrics_server()
+        start_shared_candles()
+        start_correlation()
+        load_shadow_configs()
+        
+        main_trading_loop(balance)
         
     except Exception as e:
         logger.error(f"❌ Fatal error: {e}")
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CANDLE ARCHIVE - ДОПИСЫВАЕМЫЙ БИНАРНЫЙ АРХИВ СВЕЧЕЙ ЧЕРЕЗ numpy.memmap
+Один файл на (символ, таймфрейм): заголовок 64 байта + записи фиксированной длины
+(timestamp int64, open/high/low/close/volume float64 - 48 байт). Чтение - memmap без разбора
+и копирования: годы минутных свечей открываются за миллисекунды.
+
+Читатели не берут блокировок: число записей = (размер файла - заголовок) // 48, недописанный
+хвост не виден. Писатели (бот, загрузчик истории) дописывают целыми записями под flock
+на соседнем .lock-файле. Свечи старше последней (заполнение пропусков) дописываются в конец
+с флагом "не отсортирован": читатель тогда отдает отсортированную копию, compact
+переписывает файл по порядку (новый файл + os.replace - открытые memmap читателей не ломаются).
+
+    python candle_archive.py info data/archive
+    python candle_archive.py compact data/archive --symbol BTC/USDT:USDT
+"""
+
+import os
+import sys
+import fcntl
+import struct
+import logging
+import argparse
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("candle_archive")
+
+MAGIC = b"BYBCNDL1"
+VERSION = 1
+HEADER_SIZE = 64
+# magic, версия, флаги, размер записи, таймфрейм (мс), символ (utf-8, дополнен нулями)
+HEADER_FORMAT = "<8sHHIq40s"
+FLAGS_OFFSET = 10
+FLAG_UNSORTED = 1
+FILE_SUFFIX = ".candles"
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"), ("open", "<f8"), ("high", "<f8"),
+    ("low", "<f8"), ("close", "<f8"), ("volume", "<f8"),
+])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+
+# ====== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ======
+def timeframe_to_ms(timeframe: str) -> int:
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+    return int(timeframe[:-1]) * units[timeframe[-1]] * 1000
+
+def archive_filename(symbol: str, timeframe: str) -> str:
+    """BTC/USDT:USDT + 15m -> BTC_USDT_USDT_15m.candles"""
+    return f"{symbol.replace('/', '_').replace(':', '_')}_{timeframe}{FILE_SUFFIX}"
+
+def to_records(rows) -> np.ndarray:
+    """Свечи ccxt ([ts, o, h, l, c, v]) или матрица (n, 6) -> записи архива по возрастанию времени"""
+    matrix = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+    records = np.empty(len(matrix), dtype=RECORD_DTYPE)
+    records["timestamp"] = matrix[:, 0].astype(np.int64)
+    for i, name in enumerate(RECORD_DTYPE.names[1:], 1):
+        records[name] = matrix[:, i]
+    return records[np.argsort(records["timestamp"], kind="stable")]
+
+def to_ohlcv_array(records: np.ndarray) -> np.ndarray:
+    """Записи архива -> матрица (n, 6) float64, как у backtest.load_candles_csv (одна векторная копия)"""
+    matrix = np.empty((len(records), 6), dtype=np.float64)
+    for i, name in enumerate(RECORD_DTYPE.names):
+        matrix[:, i] = records[name]
+    return matrix
+
+def sorted_unique(records: np.ndarray) -> np.ndarray:
+    """По возрастанию времени; из повторов одной свечи остается записанная позже"""
+    order = np.argsort(records["timestamp"], kind="stable")
+    ordered = records[order]
+    keep = np.ones(len(ordered), dtype=bool)
+    keep[:-1] = ordered["timestamp"][1:] != ordered["timestamp"][:-1]
+    return ordered[keep]
+
+# ====== АРХИВ ======
+class CandleArchive:
+    """Каталог файлов свечей; методы потокобезопасны, файлы можно читать из других процессов"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, archive_filename(symbol, timeframe))
+
+    # ---- заголовок ----
+    @staticmethod
+    def _pack_header(symbol: str, timeframe: str, flags: int = 0) -> bytes:
+        return struct.pack(HEADER_FORMAT, MAGIC, VERSION, flags, RECORD_SIZE,
+                           timeframe_to_ms(timeframe), symbol.encode("utf-8")[:40]).ljust(HEADER_SIZE, b"\0")
+
+    @staticmethod
+    def _parse_header(raw: bytes, path: str) -> Dict:
+        if len(raw) < HEADER_SIZE:
+            raise ValueError(f"Truncated archive header: {path}")
+        magic, version, flags, record_size, timeframe_ms, symbol = struct.unpack_from(HEADER_FORMAT, raw)
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            raise ValueError(f"Not a candle archive (magic={magic!r}, record={record_size}): {path}")
+        return {"version": version, "flags": flags, "timeframe_ms": timeframe_ms,
+                "symbol": symbol.rstrip(b"\0").decode("utf-8")}
+
+    @classmethod
+    def read_header(cls, path: str) -> Dict:
+        with open(path, "rb") as f:
+            return cls._parse_header(f.read(HEADER_SIZE), path)
+
+    @contextmanager
+    def _write_lock(self, path: str):
+        """flock на соседнем файле: переживает os.replace основного файла при compact"""
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ---- чтение ----
+    def _open(self, path: str) -> Tuple[Dict, np.ndarray]:
+        """Заголовок и записи из одного дескриптора: compact может заменить файл (os.replace)
+        между открытием и чтением, а флаги должны относиться к тем же записям"""
+        with open(path, "rb") as f:
+            header = self._parse_header(f.read(HEADER_SIZE), path)
+            count = (os.fstat(f.fileno()).st_size - HEADER_SIZE) // RECORD_SIZE
+            if count <= 0:
+                return header, np.empty(0, dtype=RECORD_DTYPE)
+            # memmap держит свое отображение - файл можно закрыть
+            return header, np.memmap(f, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+    def read(self, symbol: str, timeframe: str, start_ms: Optional[int] = None,
+             end_ms: Optional[int] = None) -> np.ndarray:
+        """Свечи [start_ms, end_ms): срез memmap без копирования; неотсортированный файл - отсортированная копия"""
+        path = self.path(symbol, timeframe)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=RECORD_DTYPE)
+        header, records = self._open(path)
+        if header["flags"] & FLAG_UNSORTED:
+            records = sorted_unique(records)
+        timestamps = records["timestamp"]
+        lo = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side="left"))
+        hi = len(records) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side="left"))
+        return records[lo:hi]
+
+    def tail(self, symbol: str, timeframe: str, limit: int) -> List[List[float]]:
+        """Последние limit свечей в формате ccxt (для прогрева буфера бота)"""
+        records = self.read(symbol, timeframe)[-limit:]
+        return [[int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5])] for r in records]
+
+    def last_timestamp(self, symbol: str, timeframe: str) -> Optional[int]:
+        path = self.path(symbol, timeframe)
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER_SIZE + RECORD_SIZE:
+            return None
+        header, records = self._open(path)
+        if not len(records):
+            return None
+        if header["flags"] & FLAG_UNSORTED:
+            return int(records["timestamp"].max())
+        return int(records["timestamp"][-1])
+
+    def entries(self) -> List[Tuple[str, str, str]]:
+        """(символ, таймфрейм, путь) всех файлов каталога"""
+        result = []
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(FILE_SUFFIX):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                header = self.read_header(path)
+            except ValueError as e:
+                logger.warning(f"⚠️ {e}")
+                continue
+            timeframe = name[:-len(FILE_SUFFIX)].rsplit("_", 1)[-1]
+            result.append((header["symbol"], timeframe, path))
+        return result
+
+    def info(self, symbol: str, timeframe: str) -> Dict:
+        path = self.path(symbol, timeframe)
+        header, records = self._open(path)
+        size = os.path.getsize(path)
+        raw_count = len(records)
+        if header["flags"] & FLAG_UNSORTED:
+            records = sorted_unique(records)
+        gaps = 0
+        if len(records) > 1:
+            gaps = int(np.count_nonzero(np.diff(records["timestamp"]) > header["timeframe_ms"]))
+        return {
+            "symbol": symbol, "timeframe": timeframe, "records": len(records),
+            "duplicates": raw_count - len(records), "gaps": gaps,
+            "sorted": not header["flags"] & FLAG_UNSORTED,
+            "first": int(records["timestamp"][0]) if len(records) else None,
+            "last": int(records["timestamp"][-1]) if len(records) else None,
+            "bytes": size,
+        }
+
+    # ---- запись ----
+    def append(self, symbol: str, timeframe: str, rows) -> int:
+        """Дописывает свечи, которых еще нет в файле; возвращает число записанных.
+        Повторы времени внутри rows - остается последняя строка"""
+        records = sorted_unique(to_records(rows))
+        if not len(records):
+            return 0
+        path = self.path(symbol, timeframe)
+        with self._write_lock(path):
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(self._pack_header(symbol, timeframe))
+            header, existing = self._open(path)
+            flags = header["flags"]
+            unsorted = False
+            if len(existing):
+                last_ts = int(existing["timestamp"].max() if flags & FLAG_UNSORTED else existing["timestamp"][-1])
+                newer = records[records["timestamp"] > last_ts]
+                older = records[records["timestamp"] <= last_ts]
+                if len(older):
+                    older = older[~np.isin(older["timestamp"], existing["timestamp"])]
+                records = np.concatenate([older, newer])
+                unsorted = len(older) > 0
+            del existing
+            if not len(records):
+                return 0
+            # Обрезаем недописанный хвост после падения, чтобы записи не сдвинулись
+            size = os.path.getsize(path)
+            valid = HEADER_SIZE + (size - HEADER_SIZE) // RECORD_SIZE * RECORD_SIZE
+            with open(path, "r+b") as f:
+                if unsorted and not flags & FLAG_UNSORTED:
+                    # Флаг - до записей: читатель без блокировки не должен увидеть старые свечи
+                    # в конце файла, считая его отсортированным
+                    f.seek(FLAGS_OFFSET)
+                    f.write(struct.pack("<H", flags | FLAG_UNSORTED))
+                    f.flush()
+                if valid != size:
+                    f.truncate(valid)
+                f.seek(valid)
+                f.write(records.tobytes())
+                f.flush()
+        return len(records)
+
+    def compact(self, symbol: str, timeframe: str) -> Dict:
+        """Переписать файл по возрастанию времени без повторов и недописанного хвоста"""
+        path = self.path(symbol, timeframe)
+        with self._write_lock(path):
+            before = os.path.getsize(path)
+            records = sorted_unique(np.array(self._open(path)[1]))
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self._pack_header(symbol, timeframe))
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        return {"symbol": symbol, "timeframe": timeframe, "records": len(records),
+                "bytes_before": before, "bytes_after": os.path.getsize(path)}
+
+# ====== CLI ======
+def _select(archive: CandleArchive, symbols: Optional[List[str]], timeframes: Optional[List[str]]) -> Iterable:
+    for symbol, timeframe, path in archive.entries():
+        if (not symbols or symbol in symbols) and (not timeframes or timeframe in timeframes):
+            yield symbol, timeframe
+
+def _format_ms(ms: Optional[int]) -> str:
+    if ms is None:
+        return "-"
+    return np.datetime64(ms, "ms").astype("datetime64[m]").astype(str).replace("T", " ")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бинарный архив свечей (numpy.memmap)")
+    parser.add_argument("command", choices=("info", "compact"))
+    parser.add_argument("archive_dir")
+    parser.add_argument("--symbol", nargs="*", dest="symbols", help="символы (по умолчанию все)")
+    parser.add_argument("--timeframe", nargs="*", dest="timeframes", help="таймфреймы (по умолчанию все)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    archive = CandleArchive(args.archive_dir)
+    for symbol, timeframe in _select(archive, args.symbols, args.timeframes):
+        if args.command == "info":
+            info = archive.info(symbol, timeframe)
+            print(f"{symbol:<22} {timeframe:>4} {info['records']:>9} свечей  "
+                  f"{_format_ms(info['first'])} .. {_format_ms(info['last'])}  "
+                  f"пропусков: {info['gaps']}  повторов: {info['duplicates']}  "
+                  f"{'' if info['sorted'] else 'НЕ ОТСОРТИРОВАН  '}{info['bytes'] / 1e6:.1f} МБ")
+        else:
+            result = archive.compact(symbol, timeframe)
+            logger.info(f"🗜️ {symbol} {timeframe}: {result['records']} записей, "
+                        f"{result['bytes_before']} -> {result['bytes_after']} байт")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VERSION COMPARISON - v5 / v6 / v7 / v7.1 / v7.2 НА ОДНИХ И ТЕХ ЖЕ СВЕЧАХ
+Каждая версия бота импортируется изолированно (временный каталог для БД и логов,
+без Telegram и без биржи), ее функция сигнала прогоняется по общему архиву свечей
+на SimExchange. Сделки - единые для всех версий: вход по цене сигнала, выход по
+max_stop_loss / take_profit режима (и max_position_time, если он есть у версии).
+По каждой паре (версия, символ): сигналы, сделки, PnL, время и запросы к бирже на оценку.
+
+Эталон (baselines/compare_versions_synthetic.csv) - детерминированные столбцы сводки
+на синтетических свечах. Пересоздать после намеренного изменения сигналов:
+    python compare_versions.py --synthetic-bars 3000 --scan-every 3 \
+        --symbols BTC/USDT:USDT ETH/USDT:USDT BNB/USDT:USDT SOL/USDT:USDT \
+        --write-baseline baselines/compare_versions_synthetic.csv
+Проверить текущее дерево - та же команда с --baseline вместо --write-baseline
+(код выхода 1 при расхождении). Время оценки в эталон не входит - оно зависит от машины.
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import importlib.util
+import time as _time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import (BASE_TIMEFRAME, SimClock, SimExchange, load_candle_dir, make_sim_datetime,
+                      parse_date_ms, synthetic_candles, timeframe_to_ms)
+from backtest_sweep import SharedCandles, attach_candles
+
+logger = logging.getLogger("compare_versions")
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Метка -> (файл бота, функция сигнала)
+VERSIONS = {
+    "v5": ("bybit_multi.py", "analyze_symbol"),
+    "v6": ("bybit_multy_v6.py", "analyze_symbol_with_filters"),
+    "v7": ("Bybit_multiv7.py", "analyze_symbol_with_filters"),
+    "v7.1": ("bybit_multy_v7_1.py", "analyze_symbol_with_filters"),
+    "v7.2": ("bybit_multy_7_2.py", "analyze_symbol_with_filters"),
+}
+
+# Сводка по версии: суммы по символам
+SUMMARY_COLUMNS = ["evaluations", "signals", "trades", "wins", "pnl_pct", "eval_sec", "api_calls"]
+# Столбцы эталона: не зависят от машины и нагрузки
+BASELINE_COLUMNS = ["evaluations", "signals", "trades", "wins", "pnl_pct", "api_calls"]
+
+# ====== ИЗОЛИРОВАННЫЙ ИМПОРТ ======
+class CountingExchange(SimExchange):
+    """SimExchange со счетчиком запросов (стоимость версии в API-вызовах)"""
+
+    def __init__(self, candles: Dict[str, np.ndarray], base_timeframe: str = BASE_TIMEFRAME):
+        super().__init__(candles, base_timeframe)
+        self.calls = 0
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        self.calls += 1
+        return super().fetch_ohlcv(symbol, timeframe, since, limit, params)
+
+    def fetch_ticker(self, symbol, params=None):
+        self.calls += 1
+        return super().fetch_ticker(symbol, params)
+
+def load_version(label: str):
+    """Импорт версии бота под отдельным именем модуля без побочных эффектов:
+    файлы БД/логов - во временном каталоге, корневой логгер и окружение восстанавливаются"""
+    filename, _ = VERSIONS[label]
+    workdir = tempfile.mkdtemp(prefix="bot_version_")
+    env_defaults = {
+        "TELEGRAM_CHAT_ID": "0",  # v5 делает int() от значения по умолчанию
+        "BOT_DB_FILE": ":memory:",
+        "BOT_LOG_FILE": os.devnull,
+        "BOT_METRICS_ENABLED": "0",
+        "BOT_CANDLE_BUFFER": "0",
+        "BOT_SNAPSHOT_FILE": "",
+        "BOT_CANDLE_ARCHIVE_DIR": "",
+    }
+    saved_env = {name: os.environ.get(name) for name in env_defaults}
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    cwd = os.getcwd()
+
+    module_name = "bot_" + label.replace(".", "_")
+    logging.getLogger(module_name).setLevel(logging.WARNING)
+    try:
+        for name, value in env_defaults.items():
+            os.environ.setdefault(name, value)
+        os.chdir(workdir)
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(PACKAGE_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        # Старые версии открывают БД по относительному пути - переводим в память
+        if module.db.db_file != ":memory:":
+            module.db._connection.close()
+            module.db.db_file = ":memory:"
+            module.db._initialize_database()
+    finally:
+        os.chdir(cwd)
+        for handler in root.handlers[:]:
+            if handler not in saved_handlers:
+                root.removeHandler(handler)
+                handler.close()
+        root.setLevel(saved_level)
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(workdir, ignore_errors=True)
+    return module
+
+def version_timeframes(settings: Dict) -> List[Tuple[str, int]]:
+    """Запросы свечей функции сигнала: (таймфрейм, глубина)"""
+    requests = [(settings['timeframe_entry'], 100), ("4h", 50)]
+    if 'timeframe_trend' in settings:
+        requests.append((settings['timeframe_trend'], 100))
+    if 'timeframe_volatility' in settings:
+        requests.append((settings['timeframe_volatility'], 50))
+    if settings.get('require_trend_confirmation', False):
+        requests.append(("4h" if settings.get('timeframe_trend') == "1h" else "1h", 50))
+    return requests
+
+def warmup_bars(settings: Dict, base_timeframe: str) -> int:
+    """Базовых свечей до первой оценки; таймфреймы версии должны собираться из базового"""
+    base_ms = timeframe_to_ms(base_timeframe)
+    bars = 0
+    for timeframe, limit in version_timeframes(settings):
+        tf_ms = timeframe_to_ms(timeframe)
+        if tf_ms % base_ms:
+            raise ValueError(f"Timeframe {timeframe} can't be built from {base_timeframe} candles")
+        bars = max(bars, limit * max(1, tf_ms // base_ms))
+    return bars
+
+def resolve_mode(module, mode: Optional[str]) -> str:
+    """Режим версии: запрошенный, если он у версии есть, иначе ее CURRENT_MODE"""
+    return mode if mode in module.TRADING_MODES else module.CURRENT_MODE
+
+# ====== ОЦЕНКА ОДНОЙ ПАРЫ (ВЕРСИЯ, СИМВОЛ) ======
+def _close_trade(trade: Dict, price: float, t_ms: int, reason: str, leverage: float, fee: float) -> Dict:
+    direction = 1 if trade['side'] == "LONG" else -1
+    trade.update(exit_price=float(price), exit_time=int(t_ms), reason=reason,
+                 pnl_pct=(direction * (price - trade['entry_price']) / trade['entry_price'] - 2 * fee) * leverage * 100)
+    return trade
+
+def evaluate_symbol(module, label: str, symbol: str, candles: Dict[str, np.ndarray],
+                    mode: Optional[str] = None, base_timeframe: str = BASE_TIMEFRAME,
+                    start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                    scan_every: int = 1) -> Dict:
+    """Прогон функции сигнала версии по символу; позиции - не более одной на символ"""
+    mode = resolve_mode(module, mode)
+    settings = module.TRADING_MODES[mode]
+    signal_func = getattr(module, VERSIONS[label][1])
+    base_ms = timeframe_to_ms(base_timeframe)
+    leverage = float(settings.get('leverage', 1))
+    fee = float(getattr(module, "TAKER_FEE", 0.0006))
+    max_hold_ms = settings.get('max_position_time', 0) * 1000
+
+    exchange = CountingExchange(candles, base_timeframe)
+    clock = SimClock()
+    saved = {name: getattr(module, name) for name in (
+        "exchange", "time", "datetime", "DRY_RUN", "CURRENT_MODE", "BOT_RUNNING", "bot", "safe_send")}
+    module.exchange = exchange
+    module.time = clock
+    module.datetime = make_sim_datetime(clock)
+    module.DRY_RUN = True
+    module.CURRENT_MODE = mode
+    module.BOT_RUNNING = True
+    module.bot = None
+    module.safe_send = lambda text, max_retries=3: False
+
+    rows = candles[symbol]
+    warmup = warmup_bars(settings, base_timeframe)
+    steps = np.arange(warmup, len(rows))
+    if start_ms is not None:
+        steps = steps[rows[steps, 0] >= start_ms]
+    if end_ms is not None:
+        steps = steps[rows[steps, 0] <= end_ms]
+    index = {s: c[:, 0] for s, c in candles.items()}
+
+    trades, eval_times = [], []
+    signals = 0
+    trade = None
+    try:
+        for n, i in enumerate(steps):
+            t_open = int(rows[i, 0])
+            o, h, l, c = rows[i, 1:5]
+            if trade is not None:
+                # Выход по траектории бара: O -> L -> H -> C (бычий) или O -> H -> L -> C (медвежий)
+                path = (o, l, h, c) if c >= o else (o, h, l, c)
+                for price in path:
+                    hit_sl = price <= trade['stop_loss'] if trade['side'] == "LONG" else price >= trade['stop_loss']
+                    hit_tp = price >= trade['take_profit'] if trade['side'] == "LONG" else price <= trade['take_profit']
+                    if hit_sl or hit_tp:
+                        level = trade['stop_loss'] if hit_sl else trade['take_profit']
+                        trades.append(_close_trade(trade, level, t_open, "SL" if hit_sl else "TP", leverage, fee))
+                        trade = None
+                        break
+                if trade is not None and max_hold_ms and t_open + base_ms - trade['entry_time'] >= max_hold_ms:
+                    trades.append(_close_trade(trade, c, t_open + base_ms, "TIME", leverage, fee))
+                    trade = None
+                if trade is not None or n % scan_every:
+                    continue
+
+            # Закрытие свечи - оценка сигнала
+            clock.now = (t_open + base_ms) / 1000
+            for s, timestamps in index.items():
+                exchange.cursor[s] = int(np.searchsorted(timestamps, t_open, side="right") - 1)
+                exchange.prices[s] = float(candles[s][exchange.cursor[s], 4]) if exchange.cursor[s] >= 0 else 0.0
+            exchange.new_step()
+
+            started = _time.perf_counter()
+            signal = signal_func(symbol)
+            eval_times.append(_time.perf_counter() - started)
+            if not signal:
+                continue
+
+            signals += 1
+            side = signal.get("signal_type", "LONG")
+            price = float(signal.get("price", c))
+            sl_pct, tp_pct = settings['max_stop_loss'], settings['take_profit']
+            trade = {
+                "version": label, "symbol": symbol, "side": side, "score": signal.get("score"),
+                "entry_time": t_open + base_ms, "entry_price": price,
+                "stop_loss": price * (1 - sl_pct) if side == "LONG" else price * (1 + sl_pct),
+                "take_profit": price * (1 + tp_pct) if side == "LONG" else price * (1 - tp_pct),
+            }
+
+        if trade is not None:
+            trades.append(_close_trade(trade, rows[steps[-1], 4], int(rows[steps[-1], 0]) + base_ms, "END", leverage, fee))
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+    pnls = np.array([t['pnl_pct'] for t in trades], dtype=np.float64)
+    times = np.array(eval_times, dtype=np.float64)
+    return {
+        "version": label,
+        "symbol": symbol,
+        "mode": mode,
+        "evaluations": len(eval_times),
+        "signals": signals,
+        "trades": len(trades),
+        "wins": int((pnls > 0).sum()),
+        "pnl_pct": float(pnls.sum()),
+        "eval_sec": float(times.sum()),
+        "eval_ms_mean": float(times.mean() * 1000) if len(times) else 0.0,
+        "eval_ms_p95": float(np.percentile(times, 95) * 1000) if len(times) else 0.0,
+        "api_calls": exchange.calls,
+        "api_calls_per_eval": exchange.calls / len(eval_times) if eval_times else 0.0,
+        "error": "",
+        "trade_log": trades,
+    }
+
+# ====== ВОРКЕР ======
+_worker: Dict = {}
+
+def _init_worker(candles_spec: Tuple, options: Dict):
+    shm, candles = attach_candles(*candles_spec)
+    _worker.update(shm=shm, candles=candles, options=options, modules={})
+
+def _run_task(task: Tuple[str, str]) -> Dict:
+    label, symbol = task
+    try:
+        module = _worker["modules"].get(label)
+        if module is None:
+            module = _worker["modules"][label] = load_version(label)
+        return evaluate_symbol(module, label, symbol, _worker["candles"], **_worker["options"])
+    except Exception as e:
+        return {"version": label, "symbol": symbol, "error": f"{type(e).__name__}: {e}", "trade_log": []}
+
+def compare_versions(candles: Dict[str, np.ndarray], versions: Optional[List[str]] = None,
+                     workers: Optional[int] = None, **options) -> Dict[str, pd.DataFrame]:
+    """Все пары (версия, символ) в пуле процессов; возвращает {"symbols", "versions", "trades"}"""
+    versions = versions or list(VERSIONS)
+    unknown = [v for v in versions if v not in VERSIONS]
+    if unknown:
+        raise ValueError(f"Unknown versions: {', '.join(unknown)}")
+    tasks = [(label, symbol) for label in versions for symbol in candles]
+
+    started = _time.perf_counter()
+    shared = SharedCandles(candles)
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                                 initargs=(shared.spec, options)) as pool:
+            rows = list(pool.map(_run_task, tasks))
+    finally:
+        shared.close()
+    logger.info(f"⏱ {len(tasks)} version/symbol runs in {_time.perf_counter() - started:.1f}s")
+
+    trades = pd.DataFrame([t for row in rows for t in row.pop("trade_log")])
+    per_symbol = pd.DataFrame(rows)
+    for row in rows:
+        if row.get("error"):
+            logger.warning(f"⚠️ {row['version']} {row['symbol']}: {row['error']}")
+    return {"symbols": per_symbol, "versions": version_summary(per_symbol), "trades": trades}
+
+def version_summary(per_symbol: pd.DataFrame) -> pd.DataFrame:
+    """Итог по версии: сигналы и PnL против стоимости оценки"""
+    ok = per_symbol[per_symbol["error"] == ""] if "error" in per_symbol else per_symbol
+    if ok.empty or "evaluations" not in ok:
+        return pd.DataFrame(columns=["version"] + SUMMARY_COLUMNS)
+    summary = ok.groupby("version", sort=False)[SUMMARY_COLUMNS].sum()
+    summary.insert(0, "mode", ok.groupby("version", sort=False)["mode"].first())
+    summary["win_rate"] = np.where(summary["trades"] > 0, summary["wins"] / summary["trades"].clip(lower=1) * 100, 0.0)
+    summary["pnl_per_trade"] = np.where(summary["trades"] > 0, summary["pnl_pct"] / summary["trades"].clip(lower=1), 0.0)
+    summary["eval_ms_mean"] = summary["eval_sec"] / summary["evaluations"].clip(lower=1) * 1000
+    summary["api_calls_per_eval"] = summary["api_calls"] / summary["evaluations"].clip(lower=1)
+    summary["pnl_per_cpu_sec"] = summary["pnl_pct"] / summary["eval_sec"].where(summary["eval_sec"] > 0, np.nan)
+    return summary.reset_index()
+
+def save_comparison(report: Dict[str, pd.DataFrame], out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    report["symbols"].to_csv(os.path.join(out_dir, "per_symbol.csv"), index=False)
+    report["trades"].to_csv(os.path.join(out_dir, "trades.csv"), index=False)
+    report["versions"].to_csv(os.path.join(out_dir, "versions.csv"), index=False)
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(report["versions"].to_dict(orient="records"), f, indent=2, default=float)
+
+# ====== ЭТАЛОН ======
+def write_baseline(versions: pd.DataFrame, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    versions[["version", "mode"] + BASELINE_COLUMNS].to_csv(path, index=False, float_format="%.6f")
+
+def check_baseline(versions: pd.DataFrame, path: str, tolerance: float = 1e-4) -> List[str]:
+    """Расхождения сводки с эталоном: по версиям из эталона, которые есть в текущем прогоне"""
+    baseline = pd.read_csv(path, dtype={"version": str}).set_index("version")
+    current = versions.set_index("version")
+    differences = []
+    for version, expected in baseline.iterrows():
+        if version not in current.index:
+            continue
+        actual = current.loc[version]
+        if actual["mode"] != expected["mode"]:
+            differences.append(f"{version}: mode {expected['mode']} -> {actual['mode']}")
+        for column in BASELINE_COLUMNS:
+            if abs(float(actual[column]) - float(expected[column])) > tolerance:
+                differences.append(f"{version}: {column} {expected[column]} -> {actual[column]}")
+    return differences
+
+def print_comparison(report: Dict[str, pd.DataFrame]):
+    versions = report["versions"]
+    print(f"\n{'='*106}")
+    print("🔬 СРАВНЕНИЕ ВЕРСИЙ НА ОДНИХ СВЕЧАХ")
+    print(f"{'='*106}")
+    print(f"{'version':<8}{'mode':<14}{'evals':>8}{'signals':>9}{'trades':>8}{'win %':>8}{'PnL %':>10}"
+          f"{'PnL/trade':>11}{'ms/eval':>9}{'api/eval':>10}{'cpu s':>9}")
+    for _, r in versions.iterrows():
+        print(f"{r['version']:<8}{r['mode']:<14}{int(r['evaluations']):>8}{int(r['signals']):>9}{int(r['trades']):>8}"
+              f"{r['win_rate']:>8.1f}{r['pnl_pct']:>10.2f}{r['pnl_per_trade']:>11.3f}"
+              f"{r['eval_ms_mean']:>9.2f}{r['api_calls_per_eval']:>10.2f}{r['eval_sec']:>9.1f}")
+    errors = report["symbols"][report["symbols"]["error"] != ""]
+    for _, r in errors.iterrows():
+        print(f"⚠️ {r['version']} {r['symbol']}: {r['error']}")
+    print(f"{'='*106}\n")
+
+# ====== CLI ======
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение сигналов v5/v6/v7/v7.1/v7.2 на одном архиве свечей")
+    parser.add_argument("--data-dir", default="data", help="каталог со свечами: <SYMBOL>_<tf>.csv или архив <SYMBOL>_<tf>.candles")
+    parser.add_argument("--symbols", nargs="*", help="символы (по умолчанию SYMBOLS из v7.2)")
+    parser.add_argument("--versions", nargs="*", choices=list(VERSIONS), help="версии (по умолчанию все)")
+    parser.add_argument("--mode", help="режим TRADING_MODES (если у версии его нет - ее CURRENT_MODE)")
+    parser.add_argument("--timeframe", default="5m", help="базовый таймфрейм архива (должен собирать 10m/15m/1h/4h)")
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    parser.add_argument("--scan-every", type=int, default=1, help="оценивать сигнал каждые N базовых свечей")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--synthetic-bars", type=int, help="вместо CSV - синтетические свечи")
+    parser.add_argument("--out", help="каталог для per_symbol.csv / versions.csv / trades.csv")
+    parser.add_argument("--baseline", help="сверить сводку с эталоном (csv), код выхода 1 при расхождении")
+    parser.add_argument("--write-baseline", help="записать сводку как эталон (csv)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.symbols:
+        symbols = args.symbols
+    else:
+        symbols = list(load_version("v7.2").SYMBOLS)
+
+    if args.synthetic_bars:
+        candles = {s: synthetic_candles(args.synthetic_bars, seed=n, timeframe=args.timeframe)
+                   for n, s in enumerate(symbols)}
+    else:
+        candles = load_candle_dir(args.data_dir, symbols, args.timeframe)
+    if not candles:
+        print("❌ Нет данных для сравнения")
+        return 1
+
+    report = compare_versions(candles, versions=args.versions, workers=args.workers, mode=args.mode,
+                              base_timeframe=args.timeframe, start_ms=parse_date_ms(args.start),
+                              end_ms=parse_date_ms(args.end), scan_every=args.scan_every)
+    print_comparison(report)
+    if args.out:
+        save_comparison(report, args.out)
+        print(f"💾 Результаты сохранены в {args.out}")
+    if args.write_baseline:
+        write_baseline(report["versions"], args.write_baseline)
+        print(f"💾 Эталон записан в {args.write_baseline}")
+    if args.baseline:
+        differences = check_baseline(report["versions"], args.baseline)
+        if differences:
+            print(f"❌ Расхождения с эталоном {args.baseline}:")
+            for line in differences:
+                print(f"  {line}")
+            return 1
+        print(f"✅ Совпадает с эталоном {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HISTORY DOWNLOADER - ПАРАЛЛЕЛЬНАЯ ЗАГРУЗКА ИСТОРИИ СВЕЧЕЙ BYBIT В АРХИВ
+Постранично (до 1000 свечей за запрос) качает klines по символам и таймфреймам за период
+в бинарный архив candle_archive.py. Несколько символов идут параллельно под общим лимитом
+запросов, прогресс пишется в checkpoint после каждой страницы - прерванная загрузка
+продолжается с места остановки. После загрузки пропуски внутри периода докачиваются.
+
+    python download_history.py --symbols BTC/USDT:USDT ETH/USDT:USDT --timeframes 15m 1h \\
+        --start 2024-01-01 --end 2024-07-01 --archive-dir data
+    # против локального mock_exchange.py
+    python download_history.py --api-url http://127.0.0.1:8765 --start 2024-01-01
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backtest import BASE_TIMEFRAME, parse_date_ms
+from bybit_core.config import SYMBOLS
+from candle_archive import FLAG_UNSORTED, CandleArchive, timeframe_to_ms
+
+logger = logging.getLogger("download_history")
+
+MAX_PAGE_LIMIT = 1000
+
+# ====== ЛИМИТ ЗАПРОСОВ ======
+class RateLimiter:
+    """Общий для всех потоков лимит: запросы равномерно, не чаще rate в секунду (0 - без лимита)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            slot = max(time.monotonic(), self._next)
+            self._next = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+# ====== ПРОГРЕСС ======
+class DownloadCheckpoint:
+    """(символ, таймфрейм) -> [начало, курсор]: с какого времени и до какого история уже скачана.
+    Файл переписывается атомарно после каждой страницы"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Dict[str, List[int]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except ValueError as e:
+                logger.warning(f"⚠️ Checkpoint unreadable, starting over: {e}")
+
+    @staticmethod
+    def key(symbol: str, timeframe: str) -> str:
+        return f"{symbol}|{timeframe}"
+
+    def get(self, symbol: str, timeframe: str, start_ms: int) -> Optional[int]:
+        """Курсор, если прошлый запуск начинал не позже start_ms (иначе начало периода не скачано)"""
+        with self._lock:
+            saved = self._state.get(self.key(symbol, timeframe))
+        if not saved or saved[0] > start_ms:
+            return None
+        return saved[1]
+
+    def update(self, symbol: str, timeframe: str, start_ms: int, cursor_ms: int):
+        with self._lock:
+            self._state[self.key(symbol, timeframe)] = [int(start_ms), int(cursor_ms)]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+# ====== БИРЖА ======
+def create_exchange(api_url: str = ""):
+    """Публичный клиент ccxt.bybit (ключи для klines не нужны), своя очередь запросов - RateLimiter"""
+    import ccxt
+    exchange = ccxt.bybit({
+        "enableRateLimit": False,
+        "options": {"defaultType": "swap", "fetchMarkets": {"types": ["linear"]}},
+        "timeout": 30000,
+    })
+    if api_url:
+        exchange.urls['api'] = {key: api_url for key in exchange.urls['api']}
+    return exchange
+
+# ====== ЗАГРУЗКА ======
+class HistoryDownloader:
+    def __init__(self, archive: CandleArchive, checkpoint: DownloadCheckpoint, api_url: str = "",
+                 rate: float = 10.0, workers: int = 4, page_limit: int = MAX_PAGE_LIMIT,
+                 max_retries: int = 5, retry_delay: float = 1.0):
+        self.archive = archive
+        self.checkpoint = checkpoint
+        self.api_url = api_url
+        self.limiter = RateLimiter(rate)
+        self.workers = max(1, workers)
+        self.page_limit = min(page_limit, MAX_PAGE_LIMIT)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.requests = 0
+        self._local = threading.local()
+        self._markets = None
+        self._markets_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+
+    def _exchange(self):
+        """Свой клиент на поток (requests.Session не делим), рынки - один раз на все"""
+        exchange = getattr(self._local, "exchange", None)
+        if exchange is None:
+            exchange = create_exchange(self.api_url)
+            with self._markets_lock:
+                if self._markets is None:
+                    self.limiter.acquire()
+                    exchange.load_markets()
+                    self._markets = (exchange.markets, exchange.currencies)
+                else:
+                    exchange.set_markets(*self._markets)
+            self._local.exchange = exchange
+        return exchange
+
+    def fetch_page(self, symbol: str, timeframe: str, since: int, until: int) -> List:
+        """Свечи [since, until] одним запросом; сетевые ошибки - повтор с экспоненциальной паузой"""
+        for attempt in range(self.max_retries):
+            self.limiter.acquire()
+            with self._counter_lock:
+                self.requests += 1
+            try:
+                rows = self._exchange().fetch_ohlcv(symbol, timeframe, since=since, limit=self.page_limit,
+                                                    params={"until": until})
+                return [row for row in rows if since <= row[0] <= until]
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                sleep_time = self.retry_delay * (2 ** attempt)
+                logger.warning(f"🔄 {symbol} {timeframe} retry {attempt + 1}/{self.max_retries} in {sleep_time:.1f}s: {e}")
+                time.sleep(sleep_time)
+        return []
+
+    def download_range(self, symbol: str, timeframe: str, start_ms: int, end_ms: int,
+                       resume: bool = True) -> Tuple[int, int]:
+        """[start_ms, end_ms) страницами в архив; resume - с позиции checkpoint. Возвращает (свечей, страниц)"""
+        tf_ms = timeframe_to_ms(timeframe)
+        cursor = start_ms
+        saved = self.checkpoint.get(symbol, timeframe, start_ms) if resume else None
+        if saved is not None and saved > start_ms:
+            cursor = min(saved, end_ms)
+            if cursor < end_ms:
+                logger.info(f"⏩ {symbol} {timeframe}: resuming from {_format_ms(cursor)}")
+        written = pages = 0
+        while cursor < end_ms:
+            until = min(cursor + self.page_limit * tf_ms, end_ms) - 1
+            rows = self.fetch_page(symbol, timeframe, cursor, until)
+            if rows:
+                written += self.archive.append(symbol, timeframe, rows)
+            pages += 1
+            # Пустая страница (символа еще не было на бирже) тоже сдвигает курсор
+            cursor = until + 1
+            if resume:
+                self.checkpoint.update(symbol, timeframe, start_ms, cursor)
+        return written, pages
+
+    def find_gaps(self, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+        """Пропущенные интервалы [from, to) внутри периода: между свечами архива и в конце периода.
+        До первой свечи - не пропуск (символ мог появиться позже начала периода)"""
+        tf_ms = timeframe_to_ms(timeframe)
+        timestamps = np.asarray(self.archive.read(symbol, timeframe, start_ms, end_ms)["timestamp"])
+        if not len(timestamps):
+            return []
+        gaps = []
+        holes = np.nonzero(np.diff(timestamps) > tf_ms)[0]
+        for i in holes:
+            gaps.append((int(timestamps[i]) + tf_ms, int(timestamps[i + 1])))
+        if int(timestamps[-1]) + tf_ms < end_ms:
+            gaps.append((int(timestamps[-1]) + tf_ms, end_ms))
+        return gaps
+
+    def download_series(self, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> Dict:
+        started = time.perf_counter()
+        written, pages = self.download_range(symbol, timeframe, start_ms, end_ms)
+
+        gaps = self.find_gaps(symbol, timeframe, start_ms, end_ms)
+        for gap_start, gap_end in gaps:
+            gap_written, gap_pages = self.download_range(symbol, timeframe, gap_start, gap_end, resume=False)
+            written += gap_written
+            pages += gap_pages
+        gaps_left = self.find_gaps(symbol, timeframe, start_ms, end_ms)
+
+        path = self.archive.path(symbol, timeframe)
+        if os.path.exists(path) and self.archive.read_header(path)["flags"] & FLAG_UNSORTED:
+            self.archive.compact(symbol, timeframe)
+
+        records = len(self.archive.read(symbol, timeframe, start_ms, end_ms))
+        logger.info(f"✅ {symbol} {timeframe}: +{written} candles, {pages} pages, "
+                    f"{records} in range, gaps filled {len(gaps) - len(gaps_left)}/{len(gaps)}")
+        return {"symbol": symbol, "timeframe": timeframe, "written": written, "pages": pages,
+                "records": records, "gaps_found": len(gaps), "gaps_left": len(gaps_left),
+                "seconds": time.perf_counter() - started}
+
+    def run(self, symbols: List[str], timeframes: List[str], start_ms: int, end_ms: Optional[int] = None) -> List[Dict]:
+        now_ms = int(time.time() * 1000)
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download") as pool:
+            futures = {}
+            for symbol in symbols:
+                for timeframe in timeframes:
+                    tf_ms = timeframe_to_ms(timeframe)
+                    # Только закрытые свечи: конец - не позже начала текущей
+                    series_end = min(end_ms or now_ms, now_ms - now_ms % tf_ms)
+                    series_start = start_ms - start_ms % tf_ms
+                    future = pool.submit(self.download_series, symbol, timeframe, series_start, series_end)
+                    futures[future] = (symbol, timeframe)
+            for future in as_completed(futures):
+                symbol, timeframe = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"❌ {symbol} {timeframe}: {e}")
+                    results.append({"symbol": symbol, "timeframe": timeframe, "error": str(e)})
+        return sorted(results, key=lambda r: (r["symbol"], r["timeframe"]))
+
+# ====== CLI ======
+def _format_ms(ms: int) -> str:
+    return np.datetime64(int(ms), "ms").astype("datetime64[m]").astype(str).replace("T", " ")
+
+def print_results(results: List[Dict], requests: int, seconds: float):
+    print(f"\n{'='*60}")
+    print(f"📥 ЗАГРУЗКА ИСТОРИИ: {len(results)} серий, {requests} запросов, {seconds:.1f}s")
+    print(f"{'='*60}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['symbol']:<22} {r['timeframe']:>4}  ❌ {r['error']}")
+            continue
+        gaps = f"пропусков осталось: {r['gaps_left']}" if r['gaps_left'] else "без пропусков"
+        print(f"{r['symbol']:<22} {r['timeframe']:>4}  +{r['written']:>7} свечей  {r['pages']:>4} стр.  "
+              f"в периоде {r['records']:>7}  {gaps}")
+    print(f"{'='*60}\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Параллельная загрузка истории свечей Bybit в архив")
+    parser.add_argument("--symbols", nargs="*", help="символы ccxt (по умолчанию SYMBOLS из бота)")
+    parser.add_argument("--timeframes", nargs="*", default=[BASE_TIMEFRAME])
+    parser.add_argument("--start", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD (по умолчанию - последняя закрытая свеча)")
+    parser.add_argument("--archive-dir", default="data", help="каталог архива (как --data-dir бэктеста)")
+    parser.add_argument("--checkpoint", help="файл прогресса (по умолчанию <archive-dir>/download_checkpoint.json)")
+    parser.add_argument("--workers", type=int, default=4, help="серий параллельно")
+    parser.add_argument("--rate", type=float, default=10.0, help="запросов в секунду на все потоки")
+    parser.add_argument("--page-limit", type=int, default=MAX_PAGE_LIMIT)
+    parser.add_argument("--api-url", default=os.getenv("BYBIT_API_URL", ""), help="свой REST API (mock_exchange.py)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    archive = CandleArchive(args.archive_dir)
+    checkpoint = DownloadCheckpoint(args.checkpoint or os.path.join(args.archive_dir, "download_checkpoint.json"))
+    downloader = HistoryDownloader(archive, checkpoint, api_url=args.api_url, rate=args.rate,
+                                   workers=args.workers, page_limit=args.page_limit)
+
+    started = time.perf_counter()
+    results = downloader.run(args.symbols or list(SYMBOLS), args.timeframes,
+                             parse_date_ms(args.start), parse_date_ms(args.end))
+    print_results(results, downloader.requests, time.perf_counter() - started)
+    return 1 if any("error" in r for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,685 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MOCK BYBIT v5 - ЛОКАЛЬНАЯ ЗАМЕНА БИРЖИ ДЛЯ НАГРУЗОЧНЫХ ТЕСТОВ
+HTTP-сервер с теми REST-эндпоинтами Bybit v5, которые дергает ccxt.bybit в боте:
+instruments-info, kline, tickers, wallet-balance, position/list, order/create|cancel|realtime|history,
+position/set-leverage. Цены - детерминированный процесс (одинаковый seed и время -> одинаковые свечи),
+задержки, ошибки и лимиты запросов настраиваются. Бот направляется сюда через BYBIT_API_URL.
+"""
+
+import sys
+import json
+import time
+import zlib
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+logger = logging.getLogger("mock_exchange")
+
+MINUTE_MS = 60 * 1000
+INTERVAL_MINUTES = {
+    "1": 1, "3": 3, "5": 5, "15": 15, "30": 30, "60": 60, "120": 120, "240": 240,
+    "360": 360, "720": 720, "D": 1440, "W": 10080
+}
+WEEK_OFFSET_MS = 4 * 1440 * MINUTE_MS
+MAX_KLINE_LIMIT = 1000
+INSTRUMENTS_PAGE = 500
+TAKER_FEE = 0.00055
+MAKER_FEE = 0.0002
+
+# Стартовые цены известных монет, остальные - из seed
+BASE_PRICES = {"BTC": 65000.0, "ETH": 3200.0, "BNB": 580.0, "SOL": 150.0, "XRP": 0.55, "DOGE": 0.12}
+DEFAULT_BASES = ["BTC", "ETH", "BNB", "SOL"]
+
+# ====== ЦЕНОВОЙ ПРОЦЕСС ======
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def _hash_uniform(keys: np.ndarray, seed: int) -> np.ndarray:
+    """splitmix64(key ^ seed) -> [0, 1): случайное, но воспроизводимое значение для каждого целого ключа"""
+    with np.errstate(over="ignore"):
+        z = keys.astype(np.uint64) ^ np.uint64(seed & 0xFFFFFFFFFFFFFFFF)
+        z = (z + np.uint64(0x9E3779B97F4A7C15)) & _MASK64
+        z = ((z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK64
+        z = ((z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK64
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+class PriceProcess:
+    """Лог-цена - сумма октав value noise по минутам: непрерывна, без состояния,
+    любая точка времени считается напрямую (тысячи символов без истории в памяти)"""
+
+    # (период в минутах, амплитуда лог-цены)
+    OCTAVES = ((8192, 0.08), (1024, 0.03), (128, 0.01), (16, 0.003), (2, 0.001))
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+
+    def symbol_seed(self, base: str) -> int:
+        return zlib.crc32(f"{self.seed}:{base}".encode()) * 1000003
+
+    def base_price(self, base: str) -> float:
+        if base in BASE_PRICES:
+            return BASE_PRICES[base]
+        u = _hash_uniform(np.array([1]), self.symbol_seed(base))[0]
+        return float(round(10 ** (u * 4 - 1), 4))
+
+    def log_offset(self, base: str, minutes: np.ndarray) -> np.ndarray:
+        seed = self.symbol_seed(base)
+        total = np.zeros(len(minutes))
+        for octave, (period, amplitude) in enumerate(self.OCTAVES):
+            x = minutes / period
+            i = np.floor(x)
+            f = x - i
+            f = f * f * (3 - 2 * f)
+            a = _hash_uniform(i.astype(np.int64), seed + octave)
+            b = _hash_uniform(i.astype(np.int64) + 1, seed + octave)
+            total += amplitude * ((a + (b - a) * f) * 2 - 1)
+        return total
+
+    def prices(self, base: str, minutes: np.ndarray) -> np.ndarray:
+        return self.base_price(base) * np.exp(self.log_offset(base, np.asarray(minutes, dtype=np.float64)))
+
+    def price(self, base: str, ts_ms: float) -> float:
+        return float(self.prices(base, np.array([ts_ms / MINUTE_MS]))[0])
+
+    def candles(self, base: str, interval_minutes: int, end_ms: int, limit: int,
+                now_ms: Optional[int] = None) -> List[List[float]]:
+        """limit свечей, последняя - содержащая end_ms; текущая свеча обрезается по now_ms.
+        Любой интервал собирается из одних и тех же минутных свечей, поэтому 15m и 4h
+        согласованы между собой, как у биржи"""
+        now_ms = end_ms if now_ms is None else now_ms
+        bar_ms = interval_minutes * MINUTE_MS
+        # Недельные свечи Bybit - с понедельника (эпоха - четверг)
+        offset = WEEK_OFFSET_MS if interval_minutes == INTERVAL_MINUTES["W"] else 0
+        last_open = (end_ms - offset) // bar_ms * bar_ms + offset
+        first_open = last_open - (limit - 1) * bar_ms
+        first_minute = first_open // MINUTE_MS
+        n_minutes = limit * interval_minutes
+        path = self.prices(base, np.arange(first_minute, first_minute + n_minutes + 1, dtype=np.float64))
+        # Текущая свеча: минуты после now заменяются ценой now
+        now_index = int(min(max((now_ms - first_open) / MINUTE_MS, 0), n_minutes))
+        if now_index < n_minutes:
+            path[now_index + 1:] = self.price(base, now_ms)
+
+        # Минутные свечи: тени и объем - от номера минуты; после now объема и теней нет
+        minute_index = np.arange(first_minute, first_minute + n_minutes)
+        seed = self.symbol_seed(base)
+        m_opens, m_closes = path[:-1], path[1:]
+        wick = 1 + 0.0015 * _hash_uniform(minute_index, seed + 101)
+        moves = np.abs(m_closes / m_opens - 1)
+        m_volumes = 1000.0 * (0.5 + _hash_uniform(minute_index, seed + 107)) * (1 + 50 * moves)
+        m_volumes /= self.base_price(base)
+        if now_index < n_minutes:
+            wick[now_index:] = 1.0
+            m_volumes[now_index:] = 0.0
+        m_highs = np.maximum(m_opens, m_closes) * wick
+        m_lows = np.minimum(m_opens, m_closes) / wick
+
+        shape = (limit, interval_minutes)
+        opens = m_opens[::interval_minutes]
+        closes = m_closes[interval_minutes - 1::interval_minutes]
+        highs = m_highs.reshape(shape).max(axis=1)
+        lows = m_lows.reshape(shape).min(axis=1)
+        volumes = m_volumes.reshape(shape).sum(axis=1)
+        timestamps = first_open + np.arange(limit) * bar_ms
+        return np.column_stack([timestamps, opens, highs, lows, closes, volumes]).tolist()
+
+# ====== ЗАДЕРЖКИ, ОШИБКИ, ЛИМИТЫ ======
+def parse_latency(spec: str):
+    """'0' | 'const:MS' | 'uniform:LO:HI' | 'normal:MEAN:STD' | 'lognormal:MEDIAN:SIGMA' -> генератор секунд"""
+    parts = spec.split(":") if spec else ["0"]
+    kind, args = parts[0], [float(x) for x in parts[1:]]
+    if kind in ("0", "none"):
+        return lambda rng: 0.0
+    if kind == "const":
+        return lambda rng: args[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(args[0], args[1]), 0.0) / 1000
+    if kind == "lognormal":
+        return lambda rng: args[0] * rng.lognormvariate(0.0, args[1]) / 1000
+    raise ValueError(f"Unknown latency spec '{spec}'")
+
+class FaultInjector:
+    """Задержка, случайные 503 и лимит запросов в секунду (token bucket на группу эндпоинтов)"""
+
+    def __init__(self, latency: str = "0", error_rate: float = 0.0, rate_limit: float = 0.0, seed: int = 0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._rng = random.Random(seed)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def draw(self, group: str) -> Tuple[float, Optional[str]]:
+        """(задержка в секундах, None | 'error' | 'rate_limit')"""
+        with self._lock:
+            delay = self.latency(self._rng)
+            if self.rate_limit > 0:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(group, (self.rate_limit, now))
+                tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+                if tokens < 1:
+                    self._buckets[group] = (tokens, now)
+                    return delay, "rate_limit"
+                self._buckets[group] = (tokens - 1, now)
+            if self.error_rate > 0 and self._rng.random() < self.error_rate:
+                return delay, "error"
+        return delay, None
+
+# ====== СЧЕТ ======
+class MockAccount:
+    """USDT-баланс, позиции one-way и ордера; условные и лимитные ордера исполняются при запросах по символу"""
+
+    def __init__(self, prices: PriceProcess, balance: float = 10000.0, clock=time.time):
+        self.prices = prices
+        self.clock = clock
+        self.wallet = balance
+        self.positions: Dict[str, Dict] = {}
+        self.orders: Dict[str, Dict] = {}
+        self.leverage: Dict[str, float] = {}
+        self._next_id = 1
+        self.lock = threading.RLock()
+
+    def now_ms(self) -> int:
+        return int(self.clock() * 1000)
+
+    def mark(self, market: Dict) -> float:
+        return self.prices.price(market["base"], self.now_ms())
+
+    def set_leverage(self, market: Dict, leverage: float) -> bool:
+        with self.lock:
+            changed = self.leverage.get(market["id"]) != leverage
+            self.leverage[market["id"]] = leverage
+            return changed
+
+    def create_order(self, market: Dict, body: Dict) -> Dict:
+        with self.lock:
+            order_id = f"mock-{self._next_id:08d}"
+            self._next_id += 1
+            now = self.now_ms()
+            order = {
+                "orderId": order_id,
+                "orderLinkId": body.get("orderLinkId", ""),
+                "symbol": market["id"],
+                "side": body["side"],
+                "orderType": body.get("orderType", "Market"),
+                "price": str(body.get("price", "0")),
+                "qty": str(body["qty"]),
+                "triggerPrice": str(body.get("triggerPrice", "")),
+                "triggerDirection": int(body.get("triggerDirection", 0) or 0),
+                "reduceOnly": bool(body.get("reduceOnly", False)),
+                "timeInForce": body.get("timeInForce", "GTC"),
+                "orderStatus": "Untriggered" if body.get("triggerPrice") else "New",
+                "avgPrice": "",
+                "cumExecQty": "0",
+                "cumExecValue": "0",
+                "cumExecFee": "0",
+                "leavesQty": str(body["qty"]),
+                "createdTime": str(now),
+                "updatedTime": str(now),
+                "category": "linear",
+                "positionIdx": 0,
+            }
+            self.orders[order_id] = order
+            self.process(market, taker_id=order_id)
+            return order
+
+    def cancel_order(self, market: Dict, order_id: str) -> Optional[Dict]:
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None or order["symbol"] != market["id"] or order["orderStatus"] not in ("New", "Untriggered"):
+                return None
+            order["orderStatus"] = "Cancelled"
+            order["updatedTime"] = str(self.now_ms())
+            return order
+
+    def process(self, market: Dict, taker_id: Optional[str] = None):
+        """Исполнение ордеров символа по текущей цене; taker_id - только что выставленный ордер:
+        если он сразу исполним, то по рынку и с комиссией тейкера"""
+        with self.lock:
+            price = self.mark(market)
+            for order in list(self.orders.values()):
+                if order["symbol"] != market["id"] or order["orderStatus"] not in ("New", "Untriggered"):
+                    continue
+                if order["orderStatus"] == "Untriggered":
+                    trigger = float(order["triggerPrice"])
+                    rising = order["triggerDirection"] == 1
+                    if (rising and price >= trigger) or (not rising and price <= trigger):
+                        order["orderStatus"] = "New"
+                    else:
+                        continue
+                if order["orderType"] == "Limit":
+                    limit = float(order["price"])
+                    marketable = price <= limit if order["side"] == "Buy" else price >= limit
+                    if not marketable:
+                        continue
+                    if order["orderId"] == taker_id:
+                        self._fill(market, order, price, TAKER_FEE)
+                    else:
+                        self._fill(market, order, limit, MAKER_FEE)
+                else:
+                    self._fill(market, order, price, TAKER_FEE)
+
+    def _fill(self, market: Dict, order: Dict, price: float, fee_rate: float):
+        qty = float(order["qty"])
+        signed = qty if order["side"] == "Buy" else -qty
+        position = self.positions.get(market["id"], {"size": 0.0, "entry": 0.0, "realized": 0.0})
+        size = position["size"]
+        if order["reduceOnly"]:
+            if size == 0 or (size > 0) == (signed > 0):
+                order["orderStatus"] = "Deactivated"
+                return
+            signed = max(-abs(size), min(abs(size), signed)) if size > 0 else min(abs(size), max(-abs(size), signed))
+            qty = abs(signed)
+
+        fee = qty * price * fee_rate
+        if size == 0 or (size > 0) == (signed > 0):
+            new_size = size + signed
+            position["entry"] = (abs(size) * position["entry"] + qty * price) / abs(new_size)
+        else:
+            closed = min(abs(size), qty)
+            pnl = closed * (price - position["entry"]) * (1 if size > 0 else -1)
+            position["realized"] += pnl
+            self.wallet += pnl
+            new_size = size + signed
+            if new_size != 0 and (new_size > 0) != (size > 0):
+                position["entry"] = price
+        position["size"] = new_size
+        self.wallet -= fee
+        self.positions[market["id"]] = position
+
+        order.update(orderStatus="Filled", avgPrice=str(price), cumExecQty=str(qty),
+                     cumExecValue=str(qty * price), cumExecFee=str(fee), leavesQty="0",
+                     updatedTime=str(self.now_ms()))
+
+    def position_view(self, market: Dict) -> Dict:
+        with self.lock:
+            position = self.positions.get(market["id"], {"size": 0.0, "entry": 0.0, "realized": 0.0})
+            mark = self.mark(market)
+            size = position["size"]
+            leverage = self.leverage.get(market["id"], 10)
+            value = abs(size) * position["entry"]
+            return {
+                "symbol": market["id"],
+                "side": "Buy" if size > 0 else ("Sell" if size < 0 else ""),
+                "size": str(abs(size)),
+                "avgPrice": str(position["entry"]),
+                "positionValue": str(value),
+                "leverage": str(leverage),
+                "markPrice": str(mark),
+                "positionIM": str(value / leverage if leverage else 0),
+                "positionMM": str(value * 0.005),
+                "unrealisedPnl": str(size * (mark - position["entry"])),
+                "cumRealisedPnl": str(position["realized"]),
+                "liqPrice": "",
+                "takeProfit": "0",
+                "stopLoss": "0",
+                "tradeMode": 0,
+                "positionIdx": 0,
+                "positionStatus": "Normal",
+                "createdTime": "0",
+                "updatedTime": str(self.now_ms()),
+            }
+
+    def equity(self, markets: Dict[str, Dict]) -> Tuple[float, float]:
+        """(equity, начальная маржа позиций)"""
+        with self.lock:
+            unrealized, margin = 0.0, 0.0
+            for market_id, position in self.positions.items():
+                if position["size"]:
+                    mark = self.mark(markets[market_id])
+                    unrealized += position["size"] * (mark - position["entry"])
+                    margin += abs(position["size"]) * position["entry"] / self.leverage.get(market_id, 10)
+            return self.wallet + unrealized, margin
+
+# ====== HTTP ======
+class MockBybitHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят разными write: без TCP_NODELAY keep-alive ловит 40 мс delayed ACK
+    disable_nagle_algorithm = True
+    exchange: "MockBybit" = None
+
+    def do_GET(self):
+        self._dispatch(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            params = json.loads(raw) if raw else {}
+        except ValueError:
+            params = {}
+        self._dispatch(params)
+
+    def _dispatch(self, params: Dict):
+        path = urlparse(self.path).path
+        params = {k: (v[0] if isinstance(v, list) else v) for k, v in params.items()}
+        status, payload, headers = self.exchange.handle(self.command, path, params)
+        body = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if status == 200 else "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MockBybit:
+    """Маршрутизация Bybit v5 -> рынок/счет; без HTTP можно вызывать handle() напрямую"""
+
+    def __init__(self, symbols: Optional[List[str]] = None, n_symbols: int = 0, seed: int = 0,
+                 balance: float = 10000.0, latency: str = "0", error_rate: float = 0.0,
+                 rate_limit: float = 0.0, clock=time.time):
+        bases = [s.split("/")[0] for s in symbols] if symbols else list(DEFAULT_BASES)
+        bases += [f"SYN{i:04d}" for i in range(n_symbols)]
+        self.prices = PriceProcess(seed)
+        self.clock = clock
+        self.markets = {f"{base}USDT": self._market(base) for base in dict.fromkeys(bases)}
+        self.account = MockAccount(self.prices, balance, clock)
+        self.faults = FaultInjector(latency, error_rate, rate_limit, seed)
+        self.requests = 0
+        self.routes = {
+            ("GET", "/v5/market/time"): self.market_time,
+            ("GET", "/v5/market/instruments-info"): self.instruments_info,
+            ("GET", "/v5/market/kline"): self.kline,
+            ("GET", "/v5/market/tickers"): self.tickers,
+            ("GET", "/v5/user/query-api"): self.query_api,
+            ("GET", "/v5/account/info"): self.account_info,
+            ("GET", "/v5/account/wallet-balance"): self.wallet_balance,
+            ("GET", "/v5/asset/coin/query-info"): self.coin_info,
+            ("GET", "/v5/position/list"): self.position_list,
+            ("POST", "/v5/position/set-leverage"): self.set_leverage,
+            ("POST", "/v5/order/create"): self.order_create,
+            ("POST", "/v5/order/cancel"): self.order_cancel,
+            ("GET", "/v5/order/realtime"): self.order_realtime,
+            ("GET", "/v5/order/history"): self.order_history,
+        }
+
+    @property
+    def symbols(self) -> List[str]:
+        """Символы в формате ccxt (BTC/USDT:USDT)"""
+        return [f"{m['base']}/USDT:USDT" for m in self.markets.values()]
+
+    def _market(self, base: str) -> Dict:
+        price = self.prices.base_price(base)
+        tick = 10 ** (np.floor(np.log10(price)) - 4)
+        qty_step = 10 ** min(max(np.floor(np.log10(5 / price)), -3), 2)
+        return {"id": f"{base}USDT", "base": base, "tick": float(tick), "qty_step": float(qty_step)}
+
+    # ----- обработка запроса -----
+    def handle(self, method: str, path: str, params: Dict) -> Tuple[int, object, Dict]:
+        self.requests += 1
+        route = self.routes.get((method, path))
+        if route is None:
+            return 404, "Not Found", {}
+        group = path.split("/")[2] if path.count("/") >= 2 else path
+        delay, fault = self.faults.draw(group)
+        if delay:
+            time.sleep(delay)
+        if fault == "error":
+            return 503, "Service Unavailable", {}
+        if fault == "rate_limit":
+            return 200, self._envelope({}, 10006, "Too many visits!"), {"X-Bapi-Limit-Status": "0"}
+        try:
+            result = route(params)
+        except MockError as e:
+            return 200, self._envelope({}, e.code, str(e)), {}
+        return 200, self._envelope(result), {}
+
+    def _envelope(self, result, code: int = 0, message: str = "OK") -> Dict:
+        return {"retCode": code, "retMsg": message, "result": result, "retExtInfo": {},
+                "time": int(self.clock() * 1000)}
+
+    def _market_for(self, params: Dict) -> Dict:
+        market = self.markets.get(params.get("symbol", ""))
+        if market is None:
+            raise MockError(10001, f"params error: symbol invalid {params.get('symbol')}")
+        return market
+
+    # ----- market -----
+    def market_time(self, params: Dict) -> Dict:
+        now = self.clock()
+        return {"timeSecond": str(int(now)), "timeNano": str(int(now * 1e9))}
+
+    def instruments_info(self, params: Dict) -> Dict:
+        category = params.get("category", "linear")
+        if category != "linear":
+            return {"category": category, "list": [], "nextPageCursor": ""}
+        ids = list(self.markets)
+        start = int(params.get("cursor") or 0)
+        limit = min(int(params.get("limit") or INSTRUMENTS_PAGE), 1000)
+        page = ids[start:start + limit]
+        next_cursor = str(start + limit) if start + limit < len(ids) else ""
+        return {"category": "linear", "list": [self._instrument(self.markets[i]) for i in page],
+                "nextPageCursor": next_cursor}
+
+    def _instrument(self, market: Dict) -> Dict:
+        return {
+            "symbol": market["id"], "contractType": "LinearPerpetual", "status": "Trading",
+            "baseCoin": market["base"], "quoteCoin": "USDT", "settleCoin": "USDT",
+            "launchTime": "1585526400000", "deliveryTime": "0", "deliveryFeeRate": "",
+            "priceScale": str(max(0, -int(np.log10(market["tick"])))),
+            "leverageFilter": {"minLeverage": "1", "maxLeverage": "50.00", "leverageStep": "0.01"},
+            "priceFilter": {"minPrice": str(market["tick"]), "maxPrice": "9999999", "tickSize": str(market["tick"])},
+            "lotSizeFilter": {"maxOrderQty": "1000000", "minOrderQty": str(market["qty_step"]),
+                              "qtyStep": str(market["qty_step"]), "postOnlyMaxOrderQty": "1000000",
+                              "maxMktOrderQty": "1000000", "minNotionalValue": "5"},
+            "unifiedMarginTrade": True, "fundingInterval": 480, "copyTrading": "both",
+            "upperFundingRate": "0.00375", "lowerFundingRate": "-0.00375", "isPreListing": False,
+        }
+
+    def kline(self, params: Dict) -> Dict:
+        market = self._market_for(params)
+        interval = INTERVAL_MINUTES.get(str(params.get("interval", "1")))
+        if interval is None:
+            raise MockError(10001, f"params error: interval invalid {params.get('interval')}")
+        limit = min(int(params.get("limit") or 200), MAX_KLINE_LIMIT)
+        now = int(self.clock() * 1000)
+        end = min(int(params.get("end") or now), now)
+        if params.get("start") and not params.get("end"):
+            end = min(int(params["start"]) + (limit - 1) * interval * MINUTE_MS, now)
+        rows = self.prices.candles(market["base"], interval, end, limit, now)
+        if params.get("start"):
+            rows = [r for r in rows if r[0] >= int(params["start"])]
+        # Bybit отдает от новых к старым
+        return {"category": "linear", "symbol": market["id"],
+                "list": [[str(int(r[0])), *(repr(float(x)) for x in r[1:]), repr(float(r[5] * r[4]))]
+                         for r in reversed(rows)]}
+
+    def tickers(self, params: Dict) -> Dict:
+        markets = [self._market_for(params)] if params.get("symbol") else list(self.markets.values())
+        now = int(self.clock() * 1000)
+        return {"category": "linear", "list": [self._ticker(m, now) for m in markets]}
+
+    def _ticker(self, market: Dict, now: int) -> Dict:
+        self.account.process(market)
+        day = self.prices.candles(market["base"], 60, now, 24, now)
+        last = day[-1][4]
+        spread = market["tick"]
+        return {
+            "symbol": market["id"], "lastPrice": str(last), "indexPrice": str(last), "markPrice": str(last),
+            "prevPrice24h": str(day[0][1]), "price24hPcnt": str(last / day[0][1] - 1),
+            "highPrice24h": str(max(r[2] for r in day)), "lowPrice24h": str(min(r[3] for r in day)),
+            "prevPrice1h": str(day[-1][1]), "openInterest": "0", "openInterestValue": "0",
+            "turnover24h": str(sum(r[5] * r[4] for r in day)), "volume24h": str(sum(r[5] for r in day)),
+            "fundingRate": "0.0001", "nextFundingTime": str((now // 28800000 + 1) * 28800000),
+            "bid1Price": str(last - spread), "bid1Size": "1", "ask1Price": str(last + spread), "ask1Size": "1",
+        }
+
+    # ----- account -----
+    def query_api(self, params: Dict) -> Dict:
+        return {"id": "1", "note": "mock", "apiKey": "mock", "readOnly": 0, "unified": 0, "uta": 1,
+                "permissions": {"ContractTrade": ["Order", "Position"], "Wallet": ["AccountTransfer"]}}
+
+    def account_info(self, params: Dict) -> Dict:
+        return {"unifiedMarginStatus": 6, "marginMode": "REGULAR_MARGIN", "isMasterTrader": False,
+                "spotHedgingStatus": "OFF", "updatedTime": str(int(self.clock() * 1000))}
+
+    def coin_info(self, params: Dict) -> Dict:
+        return {"rows": [{"name": "USDT", "coin": "USDT", "remainAmount": "1000000",
+                          "chains": [{"chain": "ETH", "chainType": "ERC20", "confirmation": "6",
+                                      "withdrawFee": "1", "depositMin": "0", "withdrawMin": "2",
+                                      "minAccuracy": "4", "chainDeposit": "1", "chainWithdraw": "1"}]}]}
+
+    def wallet_balance(self, params: Dict) -> Dict:
+        equity, margin = self.account.equity(self.markets)
+        wallet = self.account.wallet
+        available = max(equity - margin, 0.0)
+        coin = {"coin": "USDT", "equity": str(equity), "walletBalance": str(wallet), "usdValue": str(equity),
+                "availableToWithdraw": str(available), "free": str(available), "locked": "0",
+                "totalPositionIM": str(margin), "totalOrderIM": "0", "unrealisedPnl": str(equity - wallet),
+                "cumRealisedPnl": "0", "borrowAmount": "0", "accruedInterest": "0", "bonus": "0",
+                "collateralSwitch": True, "marginCollateral": True}
+        return {"list": [{"accountType": params.get("accountType", "UNIFIED"), "totalEquity": str(equity),
+                          "totalWalletBalance": str(wallet), "totalAvailableBalance": str(available),
+                          "totalMarginBalance": str(equity), "totalInitialMargin": str(margin),
+                          "totalMaintenanceMargin": str(margin * 0.1), "accountIMRate": "0", "accountMMRate": "0",
+                          "totalPerpUPL": str(equity - wallet), "coin": [coin]}]}
+
+    def position_list(self, params: Dict) -> Dict:
+        if params.get("symbol"):
+            markets = [self._market_for(params)]
+        else:
+            markets = [self.markets[i] for i, p in self.account.positions.items() if p["size"]]
+        for market in markets:
+            self.account.process(market)
+        return {"category": "linear", "list": [self.account.position_view(m) for m in markets], "nextPageCursor": ""}
+
+    def set_leverage(self, params: Dict) -> Dict:
+        market = self._market_for(params)
+        if not self.account.set_leverage(market, float(params.get("buyLeverage", 1))):
+            # Как у Bybit: повторная установка того же плеча - ошибка 110043 (ccxt/бот ее игнорируют)
+            raise MockError(110043, "leverage not modified")
+        return {}
+
+    # ----- orders -----
+    def order_create(self, params: Dict) -> Dict:
+        market = self._market_for(params)
+        try:
+            qty = float(params.get("qty", 0))
+        except (TypeError, ValueError):
+            raise MockError(10001, "params error: qty invalid")
+        if qty <= 0:
+            raise MockError(10001, "params error: qty invalid")
+        if params.get("orderType") == "Limit" and not params.get("price"):
+            raise MockError(10001, "params error: price required for Limit")
+        mark = self.account.mark(market)
+        if params.get("triggerPrice") and not params.get("triggerDirection"):
+            params = dict(params, triggerDirection=1 if float(params["triggerPrice"]) > mark else 2)
+        if not params.get("reduceOnly"):
+            equity, margin = self.account.equity(self.markets)
+            cost = qty * mark / self.account.leverage.get(market["id"], 10)
+            if cost > equity - margin:
+                raise MockError(110007, "ab not enough for new order")
+        order = self.account.create_order(market, params)
+        return {"orderId": order["orderId"], "orderLinkId": order["orderLinkId"]}
+
+    def order_cancel(self, params: Dict) -> Dict:
+        market = self._market_for(params)
+        order = self.account.cancel_order(market, params.get("orderId", ""))
+        if order is None:
+            raise MockError(110001, "order not exists or too late to cancel")
+        return {"orderId": order["orderId"], "orderLinkId": order["orderLinkId"]}
+
+    def _orders(self, params: Dict, open_only: bool) -> Dict:
+        if params.get("symbol"):
+            self.account.process(self._market_for(params))
+        with self.account.lock:
+            orders = [o for o in self.account.orders.values()
+                      if (not params.get("symbol") or o["symbol"] == params["symbol"])
+                      and (not params.get("orderId") or o["orderId"] == params["orderId"])
+                      and (not open_only or o["orderStatus"] in ("New", "Untriggered", "PartiallyFilled"))]
+        orders = sorted(orders, key=lambda o: o["createdTime"], reverse=True)[:int(params.get("limit") or 50)]
+        return {"category": "linear", "list": [dict(o) for o in orders], "nextPageCursor": ""}
+
+    def order_realtime(self, params: Dict) -> Dict:
+        # Bybit отдает в realtime и недавно закрытые ордера, если указан orderId
+        return self._orders(params, open_only=not params.get("orderId"))
+
+    def order_history(self, params: Dict) -> Dict:
+        return self._orders(params, open_only=False)
+
+class MockError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+# ====== СЕРВЕР ======
+class MockBybitServer:
+    """MockBybit за ThreadingHTTPServer в фоновом потоке; port=0 - любой свободный"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **kwargs):
+        self.exchange = MockBybit(**kwargs)
+        handler = type("BoundMockBybitHandler", (MockBybitHandler,), {"exchange": self.exchange})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockBybitServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-bybit", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockBybitServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def point_exchange(exchange, url: str):
+    """Все группы API ccxt.bybit на один адрес (так делает initialize_exchange при BYBIT_API_URL)"""
+    exchange.urls["api"] = {key: url for key in exchange.urls["api"]}
+    return exchange
+
+# ====== CLI ======
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный mock Bybit v5 для нагрузочных тестов бота")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", nargs="*", help="символы ccxt (по умолчанию BTC/ETH/BNB/SOL)")
+    parser.add_argument("--extra-symbols", type=int, default=0, help="добавить N синтетических SYNxxxx/USDT:USDT")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--balance", type=float, default=10000.0)
+    parser.add_argument("--latency", default="0", help="const:MS | uniform:LO:HI | normal:MEAN:STD | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="запросов в секунду на группу (0 - без лимита)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = MockBybitServer(args.host, args.port, symbols=args.symbols, n_symbols=args.extra_symbols,
+                             seed=args.seed, balance=args.balance, latency=args.latency,
+                             error_rate=args.error_rate, rate_limit=args.rate_limit)
+    logger.info(f"🧪 Mock Bybit: {server.url} ({len(server.exchange.markets)} symbols)")
+    logger.info(f"   BYBIT_API_URL={server.url} python bybit_multy_7_2.py")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RESAMPLE CHECK - СВЕРКА СВЕЧЕЙ, СОБРАННЫХ ИЗ БАЗОВОГО ТАЙМФРЕЙМА, СО СВЕЧАМИ БИРЖИ
+Бот собирает старшие таймфреймы из базового (BOT_RESAMPLE_BASE, bybit_core.resample) вместо
+отдельных запросов klines. Скрипт качает базовые и старшие свечи за одно окно и сравнивает
+закрытые свечи по времени открытия; код возврата 1 - есть расхождения.
+
+    python resample_check.py --symbols BTC/USDT:USDT ETH/USDT:USDT --timeframes 30m 1h 2h 4h
+    # против локального mock_exchange.py
+    python resample_check.py --api-url http://127.0.0.1:8765
+"""
+
+import os
+import sys
+import argparse
+from typing import Dict, List
+
+from bybit_core.config import SYMBOLS
+from bybit_core.resample import base_limit, can_resample, compare_candles, resample_ohlcv
+from download_history import MAX_PAGE_LIMIT, create_exchange
+
+def check_symbol(exchange, symbol: str, base_timeframe: str, timeframes: List[str], limit: int) -> List[Dict]:
+    """Одна загрузка базовых свечей на символ, сверка с каждым старшим таймфреймом"""
+    targets = [tf for tf in timeframes if can_resample(base_timeframe, tf)]
+    if not targets:
+        return []
+    needed = min(max(base_limit(base_timeframe, tf, limit) for tf in targets), MAX_PAGE_LIMIT)
+    base = exchange.fetch_ohlcv(symbol, timeframe=base_timeframe, limit=needed)
+
+    results = []
+    for timeframe in targets:
+        resampled = resample_ohlcv(base, timeframe)
+        # Последняя свеча еще формируется - сравниваются только закрытые и только
+        # в пределах окна базовых свечей (страница базовых может не покрыть limit старших)
+        reference = [row for row in exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)[:-1]
+                     if resampled and row[0] >= resampled[0][0]]
+        result = compare_candles(resampled[:-1], reference)
+        result.update(symbol=symbol, timeframe=timeframe)
+        results.append(result)
+    return results
+
+def print_results(results: List[Dict], skipped: List[str]):
+    print(f"{'symbol':<22}{'tf':>5}{'compared':>10}{'missing':>9}{'mismatch':>10}{'max price':>12}{'max vol':>12}")
+    for r in results:
+        print(f"{r['symbol']:<22}{r['timeframe']:>5}{r['compared']:>10}{r['missing']:>9}{r['mismatched']:>10}"
+              f"{r['max_price_diff']:>12.2e}{r['max_volume_diff']:>12.2e}")
+    if skipped:
+        print(f"Не собираются из базового: {', '.join(skipped)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сверка свечей старших таймфреймов, собранных из базового, с биржей")
+    parser.add_argument("--symbols", nargs="*", help="символы ccxt (по умолчанию SYMBOLS из бота)")
+    parser.add_argument("--base-timeframe", default=os.getenv("BOT_RESAMPLE_BASE", "15m") or "15m")
+    parser.add_argument("--timeframes", nargs="*", default=["30m", "1h", "2h", "4h"])
+    parser.add_argument("--limit", type=int, default=50, help="свечей старшего таймфрейма")
+    parser.add_argument("--api-url", default=os.getenv("BYBIT_API_URL", ""), help="свой REST API (mock_exchange.py)")
+    args = parser.parse_args(argv)
+
+    exchange = create_exchange(args.api_url)
+    exchange.load_markets()
+    skipped = [tf for tf in args.timeframes if not can_resample(args.base_timeframe, tf)]
+
+    results = []
+    for symbol in args.symbols or list(SYMBOLS):
+        results.extend(check_symbol(exchange, symbol, args.base_timeframe, args.timeframes, args.limit))
+
+    print_results(results, skipped)
+    failed = any(r["mismatched"] or r["missing"] or not r["compared"] for r in results)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SHARED CANDLES - ОБЩИЕ СВЕЧИ И ИНДИКАТОРЫ В РАЗДЕЛЯЕМОЙ ПАМЯТИ ДЛЯ НЕСКОЛЬКИХ ПРОЦЕССОВ
+Один писатель (бот) кладет свечи и последние значения индикаторов в сегмент POSIX shared memory,
+любое число читателей (скан-воркеры, монитор выходов, Telegram, бэктест) подключаются по имени
+и получают массивы numpy поверх того же сегмента: одна копия в памяти и один набор запросов к бирже.
+
+Раскладка фиксирована при создании: заголовок, таблицы таймфреймов, полей индикаторов и символов,
+затем по слоту (символ x таймфрейм) - счетчики (seq, число свечей, голова кольца, время записи),
+значения индикаторов и кольцо свечей [timestamp, open, high, low, close, volume] float64.
+Кольцо записано дважды подряд (строка i и i + ring): последние n свечей всегда одним куском,
+без копии и склейки.
+
+Читатели не берут блокировок - seqlock на слот: писатель делает seq нечетным, пишет, делает четным;
+read_* повторяет чтение, пока seq до и после копии не совпал и не был четным. *_view отдают
+представления без копии вместе с seq - после обработки changed(..., seq) скажет, не переписан ли слот.
+
+    python shared_candles.py info --name bybit_candles
+    python shared_candles.py show --name bybit_candles --symbol BTC/USDT:USDT --timeframe 15m -n 5
+"""
+
+import sys
+import time
+import struct
+import logging
+import argparse
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bybit_core.config import timeframe_ms
+
+logger = logging.getLogger("shared_candles")
+
+MAGIC = b"BYBSHM01"
+VERSION = 1
+HEADER_SIZE = 64
+# magic, версия, резерв, символов максимум, символов занято, таймфреймов, длина кольца, полей индикаторов
+HEADER_FORMAT = "<8sHHIIIII"
+SYMBOLS_USED_OFFSET = 16
+NAME_SIZE = 32
+TIMEFRAME_SIZE = 8
+ALIGN = 64
+
+CANDLE_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+# Поля индикаторов по умолчанию - числовые поля результата get_trend_analysis
+TREND_FIELDS = ("strength", "plus_di", "minus_di", "ema_9", "ema_21", "ema_50", "ema_200", "age")
+
+# Счетчики слота (int64)
+META_SEQ, META_COUNT, META_HEAD, META_CANDLES_AT, META_INDICATORS_AT = range(5)
+META_SIZE = 8
+
+READ_RETRIES = 1000
+
+class SlotBusyError(RuntimeError):
+    """Писатель не отпускает слот дольше READ_RETRIES попыток чтения"""
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def _layout(capacity: int, n_timeframes: int, ring: int, n_fields: int) -> Dict[str, int]:
+    """Смещения таблиц и массивов в сегменте и полный размер"""
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, size in (("timeframes", n_timeframes * TIMEFRAME_SIZE),
+                       ("fields", n_fields * NAME_SIZE),
+                       ("symbols", capacity * NAME_SIZE),
+                       ("meta", capacity * n_timeframes * META_SIZE * 8),
+                       ("indicators", capacity * n_timeframes * n_fields * 8),
+                       ("candles", capacity * n_timeframes * 2 * ring * len(CANDLE_COLUMNS) * 8)):
+        offset = _aligned(offset)
+        offsets[name] = offset
+        offset += size
+    offsets["size"] = _aligned(offset)
+    return offsets
+
+def _encode(name: str, size: int) -> bytes:
+    raw = name.encode("utf-8")
+    if len(raw) > size:
+        raise ValueError(f"Name {name!r} is longer than {size} bytes")
+    return raw.ljust(size, b"\0")
+
+def _decode(raw: bytes) -> str:
+    return bytes(raw).rstrip(b"\0").decode("utf-8")
+
+class SharedCandleStore:
+    """Сегмент разделяемой памяти со свечами и индикаторами. Создает и пишет один процесс
+    (create), остальные только читают (attach)"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self.owner = owner
+        self.name = shm.name
+        magic, version, _, capacity, _, n_timeframes, ring, n_fields = struct.unpack_from(HEADER_FORMAT, shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Shared memory {shm.name!r} is not a candle store (magic {magic!r}, version {version})")
+        self.capacity, self.ring = capacity, ring
+        layout = _layout(capacity, n_timeframes, ring, n_fields)
+
+        buf = shm.buf
+        self.timeframes = [_decode(buf[layout["timeframes"] + i * TIMEFRAME_SIZE:][:TIMEFRAME_SIZE])
+                           for i in range(n_timeframes)]
+        self.fields = [_decode(buf[layout["fields"] + i * NAME_SIZE:][:NAME_SIZE]) for i in range(n_fields)]
+        self._timeframe_index = {tf: i for i, tf in enumerate(self.timeframes)}
+        self._field_index = {field: i for i, field in enumerate(self.fields)}
+        self._symbols_offset = layout["symbols"]
+        self._symbol_index: Dict[str, int] = {}
+
+        self._meta = np.ndarray((capacity, n_timeframes, META_SIZE), dtype=np.int64,
+                                buffer=buf, offset=layout["meta"])
+        self._indicators = np.ndarray((capacity, n_timeframes, n_fields), dtype=np.float64,
+                                      buffer=buf, offset=layout["indicators"])
+        self._candles = np.ndarray((capacity, n_timeframes, 2 * ring, len(CANDLE_COLUMNS)), dtype=np.float64,
+                                   buffer=buf, offset=layout["candles"])
+        if not owner:
+            for array in (self._meta, self._indicators, self._candles):
+                array.flags.writeable = False
+
+    # ====== СОЗДАНИЕ И ПОДКЛЮЧЕНИЕ ======
+    @classmethod
+    def create(cls, name: Optional[str], timeframes: Sequence[str], capacity: int = 128, ring: int = 1000,
+               fields: Sequence[str] = TREND_FIELDS, replace: bool = True) -> "SharedCandleStore":
+        """Новый сегмент; replace - сегмент с тем же именем (от упавшего процесса) удаляется"""
+        layout = _layout(capacity, len(timeframes), ring, len(fields))
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=layout["size"])
+        except FileExistsError:
+            if not replace:
+                raise
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=layout["size"])
+
+        buf = shm.buf
+        for i, timeframe in enumerate(timeframes):
+            buf[layout["timeframes"] + i * TIMEFRAME_SIZE:][:TIMEFRAME_SIZE] = _encode(timeframe, TIMEFRAME_SIZE)
+        for i, field in enumerate(fields):
+            buf[layout["fields"] + i * NAME_SIZE:][:NAME_SIZE] = _encode(field, NAME_SIZE)
+        # Заголовок последним: читатель, успевший подключиться раньше, получит ValueError, а не мусор
+        struct.pack_into(HEADER_FORMAT, buf, 0, MAGIC, VERSION, 0, capacity, 0, len(timeframes), ring, len(fields))
+        store = cls(shm, owner=True)
+        store._indicators[:] = np.nan
+        logger.info(f"🧠 Shared candle store {shm.name}: {capacity} symbols x {len(timeframes)} timeframes x "
+                    f"{ring} candles, {layout['size'] / 1e6:.1f} MB")
+        return store
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedCandleStore":
+        """Подключение читателя к существующему сегменту"""
+        if sys.version_info >= (3, 13):
+            return cls(shared_memory.SharedMemory(name=name, track=False), owner=False)
+        # resource_tracker удалил бы сегмент при выходе читателя, а unregister после подключения
+        # снял бы и регистрацию владельца (трекер у процессов multiprocessing общий) - регистрация
+        # на время подключения отключается; удаляет сегмент только владелец
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    def close(self):
+        """Отключение; владелец еще и удаляет сегмент. Полученные представления после этого недействительны"""
+        self._meta = self._indicators = self._candles = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Живы представления, отданные наружу: mmap закроется вместе с ними
+            pass
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ====== СЛОТЫ ======
+    def symbols(self) -> List[str]:
+        used = struct.unpack_from("<I", self._shm.buf, SYMBOLS_USED_OFFSET)[0]
+        return [_decode(self._shm.buf[self._symbols_offset + i * NAME_SIZE:][:NAME_SIZE]) for i in range(used)]
+
+    def _symbol(self, symbol: str, create: bool = False) -> Optional[int]:
+        index = self._symbol_index.get(symbol)
+        if index is not None:
+            return index
+        # Писатель мог добавить символ после прошлого чтения таблицы
+        self._symbol_index = {s: i for i, s in enumerate(self.symbols())}
+        index = self._symbol_index.get(symbol)
+        if index is not None or not create:
+            return index
+        index = len(self._symbol_index)
+        if index >= self.capacity:
+            raise ValueError(f"Shared candle store is full ({self.capacity} symbols)")
+        # Имя пишется до счетчика: читатель не увидит символ без имени
+        self._shm.buf[self._symbols_offset + index * NAME_SIZE:][:NAME_SIZE] = _encode(symbol, NAME_SIZE)
+        struct.pack_into("<I", self._shm.buf, SYMBOLS_USED_OFFSET, index + 1)
+        self._symbol_index[symbol] = index
+        return index
+
+    def _slot(self, symbol: str, timeframe: str, create: bool = False) -> Optional[Tuple[int, int]]:
+        t = self._timeframe_index.get(timeframe)
+        if t is None:
+            if create:
+                raise KeyError(f"Timeframe {timeframe} is not in the store ({', '.join(self.timeframes)})")
+            return None
+        s = self._symbol(symbol, create)
+        return None if s is None else (s, t)
+
+    def _begin(self, meta: np.ndarray):
+        meta[META_SEQ] += 1
+
+    def _end(self, meta: np.ndarray, stamp: int):
+        meta[stamp] = int(time.time() * 1000)
+        meta[META_SEQ] += 1
+
+    # ====== ЗАПИСЬ (ТОЛЬКО ВЛАДЕЛЕЦ) ======
+    def write_candles(self, symbol: str, timeframe: str, rows) -> int:
+        """Свечи ccxt ([ts, o, h, l, c, v] по возрастанию) поверх слота: перекрывающиеся с хвостом
+        переписываются на месте, новые дописываются; разрыв с хвостом - слот заполняется заново.
+        Возвращает число свечей в слоте"""
+        data = np.asarray(rows, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+        if not len(data):
+            return 0
+        s, t = self._slot(symbol, timeframe, create=True)
+        meta, ring = self._meta[s, t], self.ring
+        candles = self._candles[s, t]
+
+        count, head = int(meta[META_COUNT]), int(meta[META_HEAD])
+        self._begin(meta)
+        try:
+            if count:
+                end = (head - 1) % ring + ring + 1
+                tail = candles[end - count:end, 0]
+                if data[0, 0] > tail[-1] + timeframe_ms(timeframe):
+                    count = head = 0
+                else:
+                    # Хвостовые свечи слота, начиная со времени первой новой, переписываются
+                    overlap = count - int(np.searchsorted(tail, data[0, 0]))
+                    head -= overlap
+                    count -= overlap
+            data = data[-ring:]
+            n = len(data)
+            positions = (head + np.arange(n)) % ring
+            candles[positions] = data
+            candles[positions + ring] = data
+            meta[META_HEAD] = (head + n) % ring
+            meta[META_COUNT] = min(count + n, ring)
+        finally:
+            self._end(meta, META_CANDLES_AT)
+        return int(meta[META_COUNT])
+
+    def write_indicators(self, symbol: str, timeframe: str, values: Mapping[str, float]):
+        """Последние значения индикаторов слота; поля не из values - NaN, лишние ключи игнорируются"""
+        s, t = self._slot(symbol, timeframe, create=True)
+        meta = self._meta[s, t]
+        row = np.full(len(self.fields), np.nan)
+        for field, i in self._field_index.items():
+            value = values.get(field)
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                row[i] = value
+        self._begin(meta)
+        try:
+            self._indicators[s, t] = row
+        finally:
+            self._end(meta, META_INDICATORS_AT)
+
+    # ====== ЧТЕНИЕ (БЕЗ БЛОКИРОВОК) ======
+    def seq(self, symbol: str, timeframe: str) -> int:
+        """Счетчик seqlock слота; неизвестный слот - 0, как у *_view и info (пустой слот не пишется)"""
+        slot = self._slot(symbol, timeframe)
+        return 0 if slot is None else int(self._meta[slot][META_SEQ])
+
+    def changed(self, symbol: str, timeframe: str, seq: int) -> bool:
+        """Слот переписывался (или пишется сейчас) после получения seq"""
+        return seq % 2 == 1 or self.seq(symbol, timeframe) != seq
+
+    def candles_view(self, symbol: str, timeframe: str, limit: Optional[int] = None) -> Tuple[np.ndarray, int]:
+        """(последние limit свечей (n, 6) без копии, seq). Пишется прямо сейчас - seq нечетный;
+        представление валидно, пока changed(symbol, timeframe, seq) - False"""
+        slot = self._slot(symbol, timeframe)
+        if slot is None:
+            return np.empty((0, len(CANDLE_COLUMNS))), 0
+        meta = self._meta[slot]
+        seq = int(meta[META_SEQ])
+        count, head = int(meta[META_COUNT]), int(meta[META_HEAD])
+        n = count if limit is None else min(limit, count)
+        end = (head - 1) % self.ring + self.ring + 1 if count else 0
+        view = self._candles[slot][end - n:end]
+        view.flags.writeable = False
+        return view, seq
+
+    def indicators_view(self, symbol: str, timeframe: str) -> Tuple[np.ndarray, int]:
+        """(значения индикаторов в порядке fields без копии, seq)"""
+        slot = self._slot(symbol, timeframe)
+        if slot is None:
+            return np.full(len(self.fields), np.nan), 0
+        seq = int(self._meta[slot][META_SEQ])
+        view = self._indicators[slot]
+        view.flags.writeable = False
+        return view, seq
+
+    def _consistent(self, symbol: str, timeframe: str, read):
+        for _ in range(READ_RETRIES):
+            result, seq = read()
+            if seq % 2 == 0:
+                result = result.copy()
+                if not self.changed(symbol, timeframe, seq):
+                    return result
+            time.sleep(0)
+        raise SlotBusyError(f"Slot {symbol} {timeframe} is being rewritten for too long")
+
+    def read_candles(self, symbol: str, timeframe: str, limit: Optional[int] = None) -> np.ndarray:
+        """Согласованная копия последних limit свечей (n, 6); неизвестный слот - пустой массив"""
+        return self._consistent(symbol, timeframe, lambda: self.candles_view(symbol, timeframe, limit))
+
+    def read_ohlcv(self, symbol: str, timeframe: str, limit: Optional[int] = None) -> List[List[float]]:
+        """То же в формате ccxt: [[ts (int), o, h, l, c, v], ...]"""
+        rows = self.read_candles(symbol, timeframe, limit).tolist()
+        for row in rows:
+            row[0] = int(row[0])
+        return rows
+
+    def read_indicators(self, symbol: str, timeframe: str) -> Dict[str, float]:
+        """Согласованная копия индикаторов слота {поле: значение}; не записанные - NaN"""
+        values = self._consistent(symbol, timeframe, lambda: self.indicators_view(symbol, timeframe))
+        return dict(zip(self.fields, values.tolist()))
+
+    def info(self, symbol: str, timeframe: str) -> Dict:
+        slot = self._slot(symbol, timeframe)
+        if slot is None:
+            return {"candles": 0, "seq": 0, "candles_at": 0, "indicators_at": 0}
+        meta = self._meta[slot]
+        return {"candles": int(meta[META_COUNT]), "seq": int(meta[META_SEQ]),
+                "candles_at": int(meta[META_CANDLES_AT]), "indicators_at": int(meta[META_INDICATORS_AT])}
+
+# ====== CLI ======
+def _format_ms(ms: int) -> str:
+    if not ms:
+        return "-"
+    return np.datetime64(ms, "ms").astype("datetime64[s]").astype(str).replace("T", " ")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Свечи и индикаторы в разделяемой памяти (только чтение)")
+    parser.add_argument("command", choices=("info", "show"))
+    parser.add_argument("--name", required=True, help="имя сегмента (BOT_SHARED_CANDLES)")
+    parser.add_argument("--symbol", nargs="*", dest="symbols", help="символы (по умолчанию все)")
+    parser.add_argument("--timeframe", nargs="*", dest="timeframes", help="таймфреймы (по умолчанию все)")
+    parser.add_argument("-n", type=int, default=5, help="свечей для show")
+    args = parser.parse_args(argv)
+
+    with SharedCandleStore.attach(args.name) as store:
+        if args.command == "info":
+            print(f"{store.name}: {len(store.symbols())}/{store.capacity} символов, "
+                  f"таймфреймы {' '.join(store.timeframes)}, кольцо {store.ring}, поля {' '.join(store.fields)}")
+        for symbol in args.symbols or store.symbols():
+            for timeframe in args.timeframes or store.timeframes:
+                info = store.info(symbol, timeframe)
+                if not info["candles"]:
+                    continue
+                if args.command == "info":
+                    print(f"{symbol:<22} {timeframe:>4} {info['candles']:>6} свечей  seq {info['seq']:<8} "
+                          f"свечи {_format_ms(info['candles_at'])}  индикаторы {_format_ms(info['indicators_at'])}")
+                    continue
+                print(f"{symbol} {timeframe}")
+                for row in store.read_ohlcv(symbol, timeframe, args.n):
+                    print(f"  {_format_ms(row[0])}  " + "  ".join(f"{v:.8g}" for v in row[1:]))
+                indicators = {k: v for k, v in store.read_indicators(symbol, timeframe).items() if v == v}
+                if indicators:
+                    print("  " + "  ".join(f"{k}={v:.6g}" for k, v in indicators.items()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
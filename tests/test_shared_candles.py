@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Чтение SharedCandleStore: неизвестный символ или таймфрейм - пустой результат, а не SlotBusyError"""
+
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_candles import SharedCandleStore, TREND_FIELDS
+
+@pytest.fixture
+def store():
+    with SharedCandleStore.create(None, ["15m"], capacity=4, ring=16) as store:
+        yield store
+
+def test_unknown_symbol_read_is_empty(store):
+    assert store.read_candles("X/USDT:USDT", "15m").shape == (0, 6)
+    assert store.read_ohlcv("X/USDT:USDT", "15m") == []
+    values = store.read_indicators("X/USDT:USDT", "15m")
+    assert list(values) == list(TREND_FIELDS)
+    assert all(math.isnan(value) for value in values.values())
+
+def test_unknown_timeframe_read_is_empty(store):
+    store.write_candles("A/USDT:USDT", "15m", [[900_000, 1, 2, 0.5, 1.5, 10]])
+    assert store.read_candles("A/USDT:USDT", "1h").shape == (0, 6)
+
+def test_symbol_published_later_is_read(store):
+    assert store.read_candles("A/USDT:USDT", "15m").shape == (0, 6)
+    store.write_candles("A/USDT:USDT", "15m", [[900_000, 1, 2, 0.5, 1.5, 10], [1_800_000, 1.5, 2, 1, 1.8, 12]])
+    with SharedCandleStore.attach(store.name) as reader:
+        assert reader.read_ohlcv("A/USDT:USDT", "15m", limit=1) == [[1_800_000, 1.5, 2.0, 1.0, 1.8, 12.0]]